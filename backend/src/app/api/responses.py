@@ -0,0 +1,44 @@
+"""Fast JSON responses for the list endpoints.
+
+List endpoints select plain rows with SQLAlchemy Core and encode them straight to JSON bytes
+with orjson, instead of hydrating ORM objects and re-validating every one of them through the
+response model. Routes keep their response_model, so the OpenAPI schema doesn't change;
+returning a Response directly is what makes FastAPI skip the validation step.
+"""
+
+from collections.abc import Iterable, Mapping
+from typing import get_args
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import Float, Integer, Table, cast
+from sqlalchemy.sql.elements import ColumnElement
+
+# Matches Pydantic's JSON for the types these rows hold, e.g. UTC datetimes end in "Z"
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def response_columns(table: Table, model: type[BaseModel]) -> list[ColumnElement]:
+    """Columns of table selected in the order and JSON types of the model's fields.
+
+    Integer columns behind float fields are cast, so e.g. distance_ft still comes out as 125.0.
+    """
+    columns = []
+    for name, field in model.model_fields.items():
+        column = table.c[name]
+        if isinstance(column.type, Integer) and float in (
+            field.annotation,
+            *get_args(field.annotation),
+        ):
+            column = cast(column, Float).label(name)
+        columns.append(column)
+    return columns
+
+
+def json_rows(rows: Iterable[Mapping]) -> Response:
+    """JSON array response from row mappings, no response model validation"""
+    return Response(
+        content=orjson.dumps([dict(row) for row in rows], option=ORJSON_OPTIONS),
+        media_type="application/json",
+    )
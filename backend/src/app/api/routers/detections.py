@@ -1,12 +1,47 @@
+import asyncio
+from datetime import UTC, datetime
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
 
+from app.api.responses import json_rows, response_columns
 from app.database.database import get_db
-from app.database.schemas import DetectionCreate, DetectionResponse, DetectionStats
-from app.repositories import DetectionRepository
+from app.database.schemas import (
+    DeliveredRequest,
+    DeliveredResponse,
+    DetectionBatchResponse,
+    DetectionCreate,
+    DetectionExportParams,
+    DetectionListParams,
+    DetectionQueuedResponse,
+    DetectionResponse,
+    DetectionSeries,
+    DetectionSeriesParams,
+    DetectionStats,
+    ExportFormatEnum,
+    LatencyReport,
+    QuantileParams,
+    QuantileReport,
+    ScoreQuantiles,
+    SortOrderEnum,
+    StreamQuantiles,
+)
+from app.downsample import DOWNSAMPLERS, SERIES
+from app.export import ENCODERS, EXPORT_COLUMNS, MEDIA_TYPES, gzip_chunks
+from app.ingest import MAX_BATCH, MAX_BATCH_BYTES, decode_batch, record_count
+from app.ingest import MEDIA_TYPE as BATCH_MEDIA_TYPE
+from app.latency import summarize
+from app.models.detection import Detection
+from app.quantiles import SKETCH_BUCKET_S, SKETCH_FIELDS, bucket_end, bucket_start, quantile_label
+from app.repositories import DetectionRepository, SketchRepository, TraceRepository
+from app.write_behind import QueueClosedError, QueueFullError, WriteBehindQueue
 
 router = APIRouter(
     prefix="/detections",
@@ -14,6 +49,36 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+RESPONSE_COLUMNS = response_columns(Detection.__table__, DetectionResponse)
+SERIES_COLUMNS = [Detection.detected_at, *(getattr(Detection, name) for name in SERIES)]
+DETECTION_BATCH = TypeAdapter(list[DetectionCreate])
+
+
+def check_batch_size(count: int):
+    if count > MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Batch has {count} detections, the limit is {MAX_BATCH}",
+        )
+
+
+async def read_batch_body(request: Request) -> bytes:
+    """The request body, refused with a 413 once it is over MAX_BATCH_BYTES (by its
+    Content-Length, or while reading a chunked one)"""
+    too_large = HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"Batch body is over {MAX_BATCH_BYTES} bytes",
+    )
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_BATCH_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BATCH_BYTES:
+            raise too_large
+    return bytes(body)
+
 
 @router.post(
     "",
@@ -21,8 +86,17 @@ router = APIRouter(
     status_code=status.HTTP_201_CREATED,
     summary="Create a new detection record",
     description="Creates a new drone detection record with all associated metrics",
+    responses={
+        202: {
+            "model": DetectionQueuedResponse,
+            "description": "Queued for a group commit (write-behind mode)",
+        },
+        503: {"description": "Write-behind queue full or the group commit failed"},
+    },
 )
-async def create_detection(detection: DetectionCreate, db: Annotated[Session, Depends(get_db)]):
+async def create_detection(
+    detection: DetectionCreate, request: Request, db: Annotated[Session, Depends(get_db)]
+):
     """
     Create a new detection record with the following information:
 
@@ -35,10 +109,292 @@ async def create_detection(detection: DetectionCreate, db: Annotated[Session, De
     - **fused_score**: Fused multimodal score (0-1)
     - **frame_snapshot_url**: URL to stored frame snapshot
     - **stream_name**: Name of the video stream
+    - **track_id**: Track ID assigned by the edge tracker
+    - **track_event**: Track lifecycle event (start, update, end)
+    - **trace**: Optional edge latency trace, see GET /detections/traces/latency
+
+    With WRITE_BEHIND=1 the detection is queued and group-committed by a background writer
+    instead, and the response is 202 with its ID (see app/write_behind.py).
     """
+    received_at = datetime.now(UTC)
+    write_behind = getattr(request.app.state, "write_behind", None)
+    if write_behind is not None:
+        return await queue_detection(write_behind, detection, received_at)
     repo = DetectionRepository(db)
-    db_detection = repo.create(detection)
-    return db_detection
+    # off the event loop, like the batch endpoint: blocking it here also blocks the
+    # threadpool teardowns that return connections to the pool
+    return await run_in_threadpool(repo.create, detection, received_at)
+
+
+async def queue_detection(
+    write_behind: WriteBehindQueue, detection: DetectionCreate, received_at: datetime
+) -> JSONResponse:
+    try:
+        detection_id, committed = write_behind.submit(detection, received_at)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Detection queue is full",
+            headers={"Retry-After": "1"},
+        ) from None
+    except QueueClosedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Shutting down",
+            headers={"Retry-After": "5"},
+        ) from None
+    if committed is not None:
+        try:
+            await asyncio.wrap_future(committed)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Detection could not be stored",
+                headers={"Retry-After": "1"},
+            ) from None
+    queued = DetectionQueuedResponse(
+        id=detection_id,
+        status="queued" if committed is None else "committed",
+        queue_depth=write_behind.depth,
+    )
+    return JSONResponse(queued.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.post(
+    "/batch",
+    response_model=DetectionBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Create a batch of detection records",
+    description="Stores a batch of detections sent as a JSON array or in the binary edge format",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/DetectionCreate"},
+                    }
+                },
+                BATCH_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+    responses={
+        400: {"description": "Malformed binary batch"},
+        413: {"description": f"More than {MAX_BATCH} detections or {MAX_BATCH_BYTES} bytes"},
+        415: {"description": "Unsupported content type"},
+    },
+)
+async def create_detection_batch(request: Request, db: Annotated[Session, Depends(get_db)]):
+    """
+    Create detection records in one transaction. The body is either:
+
+    - a JSON array of detections, each as in POST /detections
+    - a binary batch (Content-Type: application/vnd.drone-detections), the compact format the
+      edge sends: 42 bytes per detection, see app/ingest.py
+
+    Both are validated exactly like POST /detections, any invalid detection rejects the batch.
+    """
+    received_at = datetime.now(UTC)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in ("application/json", BATCH_MEDIA_TYPE):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Send application/json or {BATCH_MEDIA_TYPE}",
+        )
+    # size and count are checked before anything is decoded or validated
+    body = await read_batch_body(request)
+    try:
+        if content_type == BATCH_MEDIA_TYPE:
+            try:
+                check_batch_size(record_count(body))
+                rows = decode_batch(body)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+                ) from None
+            detections = DETECTION_BATCH.validate_python(rows)
+        else:
+            try:
+                items = orjson.loads(body)
+            except orjson.JSONDecodeError:
+                items = None
+            if isinstance(items, list):
+                check_batch_size(len(items))
+                detections = DETECTION_BATCH.validate_python(items)
+            else:
+                # not a JSON array, validating it gives the usual 422
+                detections = DETECTION_BATCH.validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=None) from None
+
+    repo = DetectionRepository(db)
+    # one transaction for the whole batch, off the event loop
+    await run_in_threadpool(repo.create_many, detections, received_at)
+    return DetectionBatchResponse(created=len(detections))
+
+
+@router.post(
+    "/traces/delivered",
+    response_model=DeliveredResponse,
+    summary="Acknowledge delivered detections",
+    description="Record when traced detections were first shown on a dashboard",
+)
+async def acknowledge_delivered(
+    delivered: DeliveredRequest, db: Annotated[Session, Depends(get_db)]
+):
+    """
+    Dashboards post the IDs of the detections they have just shown, which stamps the last
+    hop of their latency traces with the time the acknowledgement arrived (backend clock, so
+    the dashboard's own clock doesn't matter). Only the first acknowledgement counts.
+    """
+    repo = TraceRepository(db)
+    updated = repo.mark_delivered(delivered.ids)
+    return DeliveredResponse(updated=updated)
+
+
+@router.get(
+    "/traces/latency",
+    response_model=LatencyReport,
+    summary="Latency report",
+    description="Per hop latency distribution of traced detections, sensor to dashboard",
+)
+async def get_latency_report(
+    db: Annotated[Session, Depends(get_db)],
+    stream_name: Annotated[
+        str | None, Query(min_length=1, max_length=100, description="Filter by stream name")
+    ] = None,
+    start: Annotated[
+        datetime | None, Query(description="Only traces received at or after this time")
+    ] = None,
+    end: Annotated[
+        datetime | None, Query(description="Only traces received before this time")
+    ] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=100000, description="Most recent traces to include")
+    ] = 10000,
+):
+    """
+    Latency of each hop a detection goes through, in milliseconds (mean, p50, p90, p99, max):
+
+    - **capture_to_appsink**: Sensor capture (frame PTS) to the appsink callback
+    - **appsink_to_inference**: Waiting in the shared buffer for the inference loop
+    - **inference**: Inference itself
+    - **inference_to_upload**: Queued in the edge uploader (batching)
+    - **network**: Upload to the backend receiving the request
+    - **commit**: Request received to the detection committed
+    - **delivery**: Committed to a dashboard acknowledging it
+    - **capture_to_commit** / **capture_to_delivery**: End to end
+
+    Hops that cross from the edge to the backend are only as accurate as the edge's clock
+    offset estimate, **max_clock_error_ms** bounds the error.
+    """
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="start must be before end"
+        )
+    repo = TraceRepository(db)
+    rows = repo.get_rows(stream_name=stream_name, start=start, end=end, limit=limit)
+    traces, hops = summarize(rows)
+    errors = [row["clock_error_ms"] for row in rows if row["clock_error_ms"] is not None]
+    return LatencyReport(
+        traces=traces,
+        start=start,
+        end=end,
+        stream_name=stream_name,
+        max_clock_error_ms=max(errors, default=None),
+        hops=hops,
+    )
+
+
+@router.get(
+    "/export",
+    summary="Export detections",
+    description="Stream every detection matching the filters as CSV, NDJSON or Parquet",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in MEDIA_TYPES.values()}},
+        501: {"description": "Parquet export needs pyarrow installed"},
+    },
+)
+def export_detections(
+    db: Annotated[Session, Depends(get_db)],
+    params: Annotated[DetectionExportParams, Query()],
+):
+    """
+    Export detections without pagination. Accepts the same filters as listing detections
+    (time range, score and distance ranges, directions, stream name), plus:
+
+    - **format**: csv (default), ndjson or parquet
+    - **gzip**: Compress the response with gzip (Content-Encoding), for csv and ndjson
+    - **order**: asc (default, oldest first) or desc
+
+    Rows are read through a server-side cursor and written out in chunks as they arrive, so
+    memory use doesn't depend on how many rows are exported.
+    """
+    if params.format == ExportFormatEnum.PARQUET:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Parquet export needs pyarrow installed (the 'export' extra)",
+            ) from None
+
+    repo = DetectionRepository(db)
+    partitions = repo.iter_partitions(
+        params, EXPORT_COLUMNS, descending=params.order == SortOrderEnum.DESC
+    )
+    chunks = ENCODERS[params.format](partitions)
+    headers = {
+        "Content-Disposition": f'attachment; filename="detections.{params.format}"',
+    }
+    if params.gzip and params.format != ExportFormatEnum.PARQUET:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[params.format], headers=headers)
+
+
+@router.get(
+    "/series",
+    response_model=DetectionSeries,
+    summary="Confidence over time",
+    description="Confidence and fused score over a time range, downsampled for charting",
+)
+def get_detection_series(
+    db: Annotated[Session, Depends(get_db)],
+    params: Annotated[DetectionSeriesParams, Query()],
+):
+    """
+    Confidence and fused score of the detections matching the filters (same as listing
+    detections), reduced to at most **points** points per series:
+
+    - **method**: lttb (default, Largest-Triangle-Three-Buckets, keeps the line's shape) or
+      minmax (lowest and highest value per time bucket)
+
+    The rows are streamed through a server-side cursor and downsampled in one pass, so memory
+    and the response size stay the same however many detections the range holds. When they fit
+    in the budget they are returned as is and **method** is null.
+    """
+    repo = DetectionRepository(db)
+    count, first, last = repo.time_range(params)
+    partitions = repo.iter_partitions(params, SERIES_COLUMNS)
+    if count <= params.points:
+        rows = [row for partition in partitions for row in partition]
+        series = [[(row[0], row[i]) for row in rows] for i in range(1, len(SERIES) + 1)]
+        method = None
+    else:
+        series, _ = DOWNSAMPLERS[params.method](partitions, first, last, params.points)
+        method = params.method
+    return DetectionSeries(
+        start=params.start,
+        end=params.end,
+        stream_name=params.stream_name,
+        method=method,
+        rows=count,
+        **dict(zip(SERIES, series, strict=True)),
+    )
 
 
 @router.get(
@@ -70,13 +426,7 @@ async def get_detection(
 )
 async def list_detections(
     db: Annotated[Session, Depends(get_db)],
-    skip: Annotated[int, Query(ge=0, description="Number of records to skip (pagination)")] = 0,
-    limit: Annotated[
-        int, Query(ge=1, le=1000, description="Maximum number of records to return")
-    ] = 100,
-    stream_name: Annotated[
-        str | None, Query(min_length=1, max_length=100, description="Filter by stream name")
-    ] = None,
+    params: Annotated[DetectionListParams, Query()],
 ):
     """
     List detections with optional filters:
@@ -84,15 +434,24 @@ async def list_detections(
     - **skip**: Number of records to skip (pagination)
     - **limit**: Maximum number of records to return (1-1000)
     - **stream_name**: Filter by stream name (e.g., "drone")
+    - **start** / **end**: Time range, start inclusive and end exclusive
+    - **min_confidence** / **max_confidence**: Confidence range (0-1)
+    - **min_fused_score** / **max_fused_score**: Fused score range (0-1)
+    - **direction**: One or more directions, e.g. `?direction=N&direction=NE`
+    - **min_distance_ft** / **max_distance_ft**: Distance range in feet
+    - **sort_by**: detected_at (default), confidence, fused_score or distance_ft
+    - **order**: desc (default) or asc
     """
     repo = DetectionRepository(db)
-
-    if stream_name:
-        detections = repo.get_by_stream(stream_name, skip=skip, limit=limit)
-    else:
-        detections = repo.get_all(skip=skip, limit=limit)
-
-    return detections
+    rows = repo.search_rows(
+        params,
+        RESPONSE_COLUMNS,
+        sort_by=params.sort_by,
+        descending=params.order == SortOrderEnum.DESC,
+        skip=params.skip,
+        limit=params.limit,
+    )
+    return json_rows(rows)
 
 
 @router.delete(
@@ -149,3 +508,51 @@ async def get_detection_stats(
         non_drone_detections=total - drone_detections,
         stream_name=stream_name,
     )
+
+
+@router.get(
+    "/stats/quantiles",
+    response_model=QuantileReport,
+    summary="Score quantiles",
+    description="Per stream quantiles of the detection scores over a time window",
+)
+def get_detection_quantiles(
+    db: Annotated[Session, Depends(get_db)],
+    params: Annotated[QuantileParams, Query()],
+):
+    """
+    Estimated quantiles of **confidence**, **visual_confidence**, **thermal_confidence** and
+    **fused_score** for each stream, e.g. to pick detection thresholds:
+
+    - **stream_name**: Only this stream
+    - **start** / **end**: Window, rounded out to whole sketch buckets (an hour by default);
+      the response says which window was used
+    - **q**: Quantiles to estimate, default `?q=0.5&q=0.9&q=0.99`
+
+    Each stream keeps a t-digest per score and bucket, updated as detections are inserted.
+    The window's digests are merged, so the cost depends on the number of buckets and not on
+    the number of detections. Deleted detections stay in the sketches until they are rebuilt
+    (`python -m app.sketches`).
+    """
+    start = bucket_start(params.start) if params.start is not None else None
+    end = bucket_end(params.end) if params.end is not None else None
+    merged = SketchRepository(db).merged(params.stream_name, start, end)
+    streams = []
+    for stream_name, (detections, digests) in merged.items():
+        scores = {}
+        for field in SKETCH_FIELDS:
+            digest = digests[field]
+            scores[field] = ScoreQuantiles(
+                count=digest.count,
+                min=digest.min if digest.count else None,
+                max=digest.max if digest.count else None,
+                quantiles={
+                    quantile_label(q): round(digest.quantile(q), 6)
+                    for q in params.q
+                    if digest.count
+                },
+            )
+        streams.append(
+            StreamQuantiles(stream_name=stream_name or None, detections=detections, **scores)
+        )
+    return QuantileReport(start=start, end=end, bucket_s=SKETCH_BUCKET_S, streams=streams)
@@ -1,14 +1,16 @@
 import time
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.database.database import get_db
 from app.database.schemas import (
+    ClockResponse,
     DatabaseHealthResponse,
     HealthCheckResponse,
+    IngestHealthResponse,
     LivenessCheckResponse,
     ReadinessCheckResponse,
 )
@@ -135,3 +137,36 @@ async def liveness_check() -> LivenessCheckResponse:
     Simple check to verify the service is running.
     """
     return LivenessCheckResponse(status="alive", timestamp=str(time.time()))
+
+
+@router.get(
+    "/clock",
+    response_model=ClockResponse,
+    summary="Clock probe",
+    description="Backend time for estimating an edge device's clock offset",
+)
+async def clock_probe() -> ClockResponse:
+    """
+    NTP style clock probe. The edge notes its own send and receive times around the request,
+    and with these two the offset to the backend clock is
+    ((received_at - sent) + (sent_at - received)) / 2, give or take half the round trip.
+    """
+    received_at = time.time()
+    return ClockResponse(received_at=received_at, sent_at=time.time())
+
+
+@router.get(
+    "/ingest",
+    response_model=IngestHealthResponse,
+    summary="Detection ingest queue",
+    description="Depth and counters of the write-behind queue for POST /detections",
+)
+async def ingest_health(request: Request) -> IngestHealthResponse:
+    """
+    Write-behind queue status. A queue_depth that keeps growing towards queue_capacity means
+    the database can't keep up, posts get 503 once it is full.
+    """
+    write_behind = getattr(request.app.state, "write_behind", None)
+    if write_behind is None:
+        return IngestHealthResponse(enabled=False, timestamp=time.time())
+    return IngestHealthResponse(**write_behind.stats(), timestamp=time.time())
@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from sqlalchemy.orm import Session
+
+from app.api.responses import json_rows, response_columns
+from app.database.database import get_db
+from app.database.schemas import DetectionResponse, IncidentResponse
+from app.models.detection import Detection
+from app.models.incident import Incident
+from app.repositories import IncidentRepository
+
+router = APIRouter(
+    prefix="/incidents",
+    tags=["incidents"],
+    responses={404: {"description": "Not found"}},
+)
+
+INCIDENT_COLUMNS = response_columns(Incident.__table__, IncidentResponse)
+DETECTION_COLUMNS = response_columns(Detection.__table__, DetectionResponse)
+
+
+@router.get(
+    "",
+    response_model=list[IncidentResponse],
+    summary="List incidents",
+    description="List incidents (detections grouped by stream, time and direction), newest first",
+)
+async def list_incidents(
+    db: Annotated[Session, Depends(get_db)],
+    skip: Annotated[int, Query(ge=0, description="Number of records to skip (pagination)")] = 0,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of records to return")
+    ] = 100,
+    stream_name: Annotated[
+        str | None, Query(min_length=1, max_length=100, description="Filter by stream name")
+    ] = None,
+    start: Annotated[
+        datetime | None, Query(description="Only incidents still going at or after this time")
+    ] = None,
+    end: Annotated[
+        datetime | None, Query(description="Only incidents that started before this time")
+    ] = None,
+):
+    """
+    List incidents with optional filters:
+
+    - **skip**: Number of records to skip (pagination)
+    - **limit**: Maximum number of records to return (1-1000)
+    - **stream_name**: Filter by stream name (e.g., "thermal")
+    - **start**, **end**: Only incidents overlapping this time range
+    """
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="start must be before end"
+        )
+    repo = IncidentRepository(db)
+    rows = repo.get_all_rows(
+        INCIDENT_COLUMNS, stream_name=stream_name, start=start, end=end, skip=skip, limit=limit
+    )
+    return json_rows(rows)
+
+
+@router.get(
+    "/{incident_id}",
+    response_model=IncidentResponse,
+    summary="Get incident by ID",
+    description="Retrieve the summary of a single incident",
+)
+async def get_incident(
+    incident_id: Annotated[UUID, Path(description="The UUID of the incident to retrieve")],
+    db: Annotated[Session, Depends(get_db)],
+):
+    """Get a single incident summary by ID"""
+    repo = IncidentRepository(db)
+    incident = repo.get_by_id(incident_id)
+    if not incident:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Incident with id {incident_id} not found",
+        )
+    return incident
+
+
+@router.get(
+    "/{incident_id}/detections",
+    response_model=list[DetectionResponse],
+    summary="List detections of an incident",
+    description="List the detections grouped into an incident in time order",
+)
+async def list_incident_detections(
+    incident_id: Annotated[UUID, Path(description="The UUID of the incident")],
+    db: Annotated[Session, Depends(get_db)],
+    skip: Annotated[int, Query(ge=0, description="Number of records to skip (pagination)")] = 0,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of records to return")
+    ] = 100,
+):
+    """Get the detections that make up an incident"""
+    repo = IncidentRepository(db)
+    if not repo.get_by_id(incident_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Incident with id {incident_id} not found",
+        )
+    rows = repo.get_detection_rows(incident_id, DETECTION_COLUMNS, skip=skip, limit=limit)
+    return json_rows(rows)
@@ -0,0 +1,126 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app import mediamtx
+from app.database.database import get_db
+from app.database.schemas import NodeListResponse, NodeRegister, NodeResponse, StreamAssignment
+from app.models.edge_node import EdgeNode
+from app.repositories import NodeRepository
+from app.repositories.node_repository import NoFreePortError
+
+router = APIRouter(
+    prefix="/nodes",
+    tags=["nodes"],
+    responses={404: {"description": "Not found"}},
+)
+
+NodeId = Annotated[str, Path(pattern=r"^[A-Za-z0-9_]{1,12}$", description="The node ID")]
+
+
+def node_response(node: EdgeNode) -> NodeResponse:
+    return NodeResponse(
+        id=node.id,
+        address=node.address,
+        registered_at=node.registered_at,
+        last_seen_at=node.last_seen_at,
+        streams=[
+            StreamAssignment(
+                sensor=stream.sensor,
+                stream_name=stream.name,
+                rtp_port=stream.rtp_port,
+                rtsp_url=mediamtx.rtsp_url(stream.name),
+                hls_url=mediamtx.hls_url(stream.name),
+            )
+            for stream in node.streams
+        ],
+    )
+
+
+@router.post(
+    "/register",
+    response_model=NodeResponse,
+    summary="Register an edge node",
+    description="Register a node's sensors and get the RTP port and stream name for each",
+)
+async def register_node(
+    node: NodeRegister, request: Request, db: Annotated[Session, Depends(get_db)]
+) -> NodeResponse:
+    """
+    Register an edge node, or refresh its registration.
+
+    Each sensor becomes the stream "<node_id>-<sensor>": the node sends its RTP to the assigned
+    port on the MediaMTX host and tags its detections with the stream name. Registering again
+    keeps the same ports. The MediaMTX config is rewritten when MEDIAMTX_CONFIG_PATH is set.
+    """
+    repo = NodeRepository(db)
+    address = request.client.host if request.client else None
+    try:
+        db_node = repo.register(node, address)
+    except NoFreePortError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+        ) from None
+    mediamtx.write_config(repo.get_streams())
+    return node_response(db_node)
+
+
+@router.get(
+    "",
+    response_model=NodeListResponse,
+    summary="List edge nodes",
+    description="List the registered edge nodes and their stream assignments",
+)
+async def list_nodes(db: Annotated[Session, Depends(get_db)]) -> NodeListResponse:
+    """List all registered edge nodes"""
+    nodes = [node_response(node) for node in NodeRepository(db).get_all()]
+    return NodeListResponse(nodes=nodes, total=len(nodes))
+
+
+@router.get(
+    "/mediamtx.yml",
+    response_class=PlainTextResponse,
+    summary="MediaMTX paths",
+    description="The MediaMTX paths section for the static and the registered streams",
+)
+async def get_mediamtx_paths(db: Annotated[Session, Depends(get_db)]):
+    """Paths for mediamtx.yml, for setups where the backend can't write the config itself"""
+    paths = mediamtx.render_paths(NodeRepository(db).get_streams())
+    return PlainTextResponse(paths, media_type="application/yaml")
+
+
+@router.get(
+    "/{node_id}",
+    response_model=NodeResponse,
+    summary="Get edge node",
+    description="Get a registered edge node and its stream assignments",
+)
+async def get_node(node_id: NodeId, db: Annotated[Session, Depends(get_db)]) -> NodeResponse:
+    """Get a single edge node by ID"""
+    node = NodeRepository(db).get_by_id(node_id)
+    if not node:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Node with id {node_id} not found",
+        )
+    return node_response(node)
+
+
+@router.delete(
+    "/{node_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Unregister an edge node",
+    description="Remove a node and free its streams' ports",
+)
+async def delete_node(node_id: NodeId, db: Annotated[Session, Depends(get_db)]):
+    """Unregister an edge node, its detections keep their node_id"""
+    repo = NodeRepository(db)
+    if not repo.delete(node_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Node with id {node_id} not found",
+        )
+    mediamtx.write_config(repo.get_streams())
+    return None
@@ -0,0 +1,154 @@
+import asyncio
+import re
+from typing import Annotated
+from uuid import UUID
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from app.database.database import get_db
+from app.repositories import DetectionRepository, IncidentRepository
+from app.snapshots import (
+    SNAPSHOT_WIDTHS,
+    SnapshotForbiddenError,
+    SnapshotInvalidError,
+    SnapshotNotFoundError,
+    SnapshotService,
+    SnapshotUnavailableError,
+    media_type,
+    variant_key,
+)
+
+router = APIRouter(
+    prefix="/snapshots",
+    tags=["snapshots"],
+    responses={404: {"description": "Not found"}},
+)
+
+# snapshots never change, browsers and proxies may keep them for a day without asking again
+CACHE_CONTROL = "public, max-age=86400, immutable"
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def snapshot_url(db: Session, snapshot_id: UUID) -> str | None:
+    """Snapshot URL of a detection, or of an incident (its highest scoring snapshot)"""
+    detection = DetectionRepository(db).get_by_id(snapshot_id)
+    if detection is not None:
+        return detection.frame_snapshot_url
+    incident = IncidentRepository(db).get_by_id(snapshot_id)
+    return incident.snapshot_url if incident is not None else None
+
+
+def byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """(first, last) byte of a single range Range header, None to send everything. Raises 416
+    when the range starts past the end."""
+    match = RANGE.match(header.replace(" ", ""))
+    if match is None or match.groups() == ("", ""):
+        return None  # several ranges or not bytes: the whole file is a valid answer too
+    first, last = match.groups()
+    if first == "":
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise HTTPException(
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            detail=f"Range {header} is outside the {size} byte snapshot",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return first, last
+
+
+@router.get(
+    "/{snapshot_id}",
+    summary="Get a snapshot",
+    description="Frame snapshot of a detection or incident, optionally resized",
+    response_class=Response,
+    responses={
+        200: {"content": {"image/jpeg": {}, "image/png": {}}},
+        206: {"description": "The requested byte range"},
+        304: {"description": "Not modified (If-None-Match)"},
+        403: {"description": "The snapshot URL's host isn't in SNAPSHOT_HTTP_HOSTS"},
+        416: {"description": "Range not satisfiable"},
+        501: {"description": "Resizing needs Pillow installed"},
+        502: {"description": "The object store couldn't be reached or didn't return an image"},
+    },
+)
+async def get_snapshot(
+    request: Request,
+    snapshot_id: Annotated[UUID, Path(description="ID of a detection or an incident")],
+    db: Annotated[Session, Depends(get_db)],
+    width: Annotated[
+        int | None,
+        Query(description=f"Resize to this width, one of {', '.join(map(str, SNAPSHOT_WIDTHS))}"),
+    ] = None,
+):
+    """
+    The frame snapshot of a detection (**frame_snapshot_url**), or of an incident's highest
+    scoring detection, fetched from the object store:
+
+    - **width**: Scaled down JPEG of this width instead of the original. Variants are made on
+      first request and then served from a disk cache
+
+    Responses carry an ETag and long lived Cache-Control, answer If-None-Match with 304 and
+    honour a single byte Range.
+    """
+    if width is not None and width not in SNAPSHOT_WIDTHS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"width must be one of {', '.join(map(str, SNAPSHOT_WIDTHS))}",
+        )
+    url = await run_in_threadpool(snapshot_url, db, snapshot_id)
+    if url is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No snapshot for detection or incident {snapshot_id}",
+        )
+    etag = f'"{variant_key(url, width)}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    snapshots: SnapshotService = request.app.state.snapshots
+    try:
+        data = await asyncio.wrap_future(snapshots.get(url, width))
+    except SnapshotNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Snapshot {url} is not in the store"
+        ) from None
+    except SnapshotUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Resized snapshots need Pillow installed (the 'snapshots' extra)",
+        ) from None
+    except SnapshotForbiddenError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Snapshot URL points at a host that isn't allowed (SNAPSHOT_HTTP_HOSTS)",
+        ) from None
+    except SnapshotInvalidError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Snapshot is not an image: {e}"
+        ) from None
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Fetching {url} failed: {e}"
+        ) from None
+
+    requested = request.headers.get("range")
+    # If-Range with another ETag means the client's partial copy is stale, send it all
+    if requested and request.headers.get("if-range", etag) == etag:
+        span = byte_range(requested, len(data))
+        if span is not None:
+            first, last = span
+            headers["Content-Range"] = f"bytes {first}-{last}/{len(data)}"
+            return Response(
+                content=data[first : last + 1],
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type(url, width),
+                headers=headers,
+            )
+    return Response(content=data, media_type=media_type(url, width), headers=headers)
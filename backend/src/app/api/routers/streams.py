@@ -1,10 +1,17 @@
 import logging
+import os
+from typing import Annotated
 
 import httpx
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
 
+from app import mediamtx
+from app.database.database import get_db
 from app.database.schemas import StreamInfo, StreamListResponse
+from app.models.stream import Stream
+from app.repositories import NodeRepository
 
 router = APIRouter(
     prefix="/streams",
@@ -12,6 +19,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# MediaMTX HLS server the /hls endpoint proxies to
+MEDIAMTX_HLS_URL = os.getenv("MEDIAMTX_HLS_URL", "http://mediamtx:8888")
+
 # Available stream configurations
 STREAMS = {
     "thermal": StreamInfo(
@@ -31,19 +41,47 @@ STREAMS = {
 }
 
 
+def registered_stream_info(stream: Stream) -> StreamInfo:
+    return StreamInfo(
+        name=stream.name,
+        description=f"{stream.sensor.capitalize()} stream of edge node {stream.node_id}",
+        rtsp_url=mediamtx.rtsp_url(stream.name),
+        hls_url=mediamtx.hls_url(stream.name),
+        status="active",
+        node_id=stream.node_id,
+        sensor=stream.sensor,
+        rtp_port=stream.rtp_port,
+    )
+
+
+def find_stream(stream_name: str, db: Session) -> StreamInfo:
+    """A static stream or one registered by an edge node, 404 if neither"""
+    if stream_name in STREAMS:
+        return STREAMS[stream_name]
+    stream = NodeRepository(db).get_stream(stream_name)
+    if stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Stream '{stream_name}' not found"
+        )
+    return registered_stream_info(stream)
+
+
 @router.get(
     "",
     response_model=StreamListResponse,
     summary="List all streams",
     description="Get a list of all available video streams",
 )
-async def list_streams() -> StreamListResponse:
+async def list_streams(db: Annotated[Session, Depends(get_db)]) -> StreamListResponse:
     """
     List all configured video streams with their connection details.
 
-    Returns information about RTSP and HLS URLs for each stream.
+    Returns information about RTSP and HLS URLs for each stream: the static ones first, then
+    the streams registered by edge nodes (see /nodes).
     """
-    return StreamListResponse(streams=list(STREAMS.values()), total=len(STREAMS))
+    streams = list(STREAMS.values())
+    streams += [registered_stream_info(stream) for stream in NodeRepository(db).get_streams()]
+    return StreamListResponse(streams=streams, total=len(streams))
 
 
 @router.get(
@@ -52,19 +90,15 @@ async def list_streams() -> StreamListResponse:
     summary="Get stream information",
     description="Get detailed information about a specific stream",
 )
-async def get_stream_info(stream_name: str) -> StreamInfo:
+async def get_stream_info(stream_name: str, db: Annotated[Session, Depends(get_db)]) -> StreamInfo:
     """
     Get detailed information about a specific video stream.
 
-    - **stream_name**: Name of the stream (e.g. "thermal", "visual")
+    - **stream_name**: Name of the stream (e.g. "thermal", "visual", "jetson01-visual")
 
     Returns RTSP and HLS connection URLs and stream status.
     """
-    if stream_name not in STREAMS:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail=f"Stream '{stream_name}' not found"
-        )
-    return STREAMS[stream_name]
+    return find_stream(stream_name, db)
 
 
 @router.get(
@@ -72,7 +106,9 @@ async def get_stream_info(stream_name: str) -> StreamInfo:
     summary="Get HLS stream",
     description="Get HLS playlist or segment files from MediaMTX",
 )
-async def get_hls(stream_name: str, file_path: str = "index.m3u8"):
+async def get_hls(
+    stream_name: str, db: Annotated[Session, Depends(get_db)], file_path: str = "index.m3u8"
+):
     """
     Get HLS stream files from MediaMTX.
 
@@ -81,12 +117,9 @@ async def get_hls(stream_name: str, file_path: str = "index.m3u8"):
 
     Use in video player: http://localhost:8000/streams/thermal/hls/index.m3u8
     """
-    if stream_name not in STREAMS:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail=f"Stream '{stream_name}' not found"
-        )
+    find_stream(stream_name, db)
 
-    mediamtx_url = f"http://mediamtx:8888/{stream_name}/{file_path}"
+    mediamtx_url = f"{MEDIAMTX_HLS_URL}/{stream_name}/{file_path}"
 
     try:
         async with httpx.AsyncClient() as client:
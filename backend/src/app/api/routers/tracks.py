@@ -0,0 +1,100 @@
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from sqlalchemy.orm import Session
+
+from app.api.responses import json_rows, response_columns
+from app.database.database import get_db
+from app.database.schemas import DetectionResponse, TrackResponse
+from app.models.detection import Detection
+from app.models.track import Track
+from app.repositories import TrackRepository
+
+router = APIRouter(
+    prefix="/tracks",
+    tags=["tracks"],
+    responses={404: {"description": "Not found"}},
+)
+
+TRACK_COLUMNS = response_columns(Track.__table__, TrackResponse)
+DETECTION_COLUMNS = response_columns(Detection.__table__, DetectionResponse)
+
+
+@router.get(
+    "",
+    response_model=list[TrackResponse],
+    summary="List tracks",
+    description="List track summaries built from edge tracker events, most recent first",
+)
+async def list_tracks(
+    db: Annotated[Session, Depends(get_db)],
+    skip: Annotated[int, Query(ge=0, description="Number of records to skip (pagination)")] = 0,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of records to return")
+    ] = 100,
+    stream_name: Annotated[
+        str | None, Query(min_length=1, max_length=100, description="Filter by stream name")
+    ] = None,
+    active_only: Annotated[
+        bool, Query(description="Only return tracks that haven't ended")
+    ] = False,
+):
+    """
+    List track summaries with optional filters:
+
+    - **skip**: Number of records to skip (pagination)
+    - **limit**: Maximum number of records to return (1-1000)
+    - **stream_name**: Filter by stream name (e.g., "drone")
+    - **active_only**: Only return tracks that haven't ended
+    """
+    repo = TrackRepository(db)
+    rows = repo.get_all_rows(
+        TRACK_COLUMNS, stream_name=stream_name, active_only=active_only, skip=skip, limit=limit
+    )
+    return json_rows(rows)
+
+
+@router.get(
+    "/{track_id}",
+    response_model=TrackResponse,
+    summary="Get track by ID",
+    description="Retrieve the summary of a single track",
+)
+async def get_track(
+    track_id: Annotated[UUID, Path(description="The UUID of the track to retrieve")],
+    db: Annotated[Session, Depends(get_db)],
+):
+    """Get a single track summary by ID"""
+    repo = TrackRepository(db)
+    track = repo.get_by_id(track_id)
+    if not track:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Track with id {track_id} not found",
+        )
+    return track
+
+
+@router.get(
+    "/{track_id}/detections",
+    response_model=list[DetectionResponse],
+    summary="List detections of a track",
+    description="List the detections reported for a track in time order",
+)
+async def list_track_detections(
+    track_id: Annotated[UUID, Path(description="The UUID of the track")],
+    db: Annotated[Session, Depends(get_db)],
+    skip: Annotated[int, Query(ge=0, description="Number of records to skip (pagination)")] = 0,
+    limit: Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of records to return")
+    ] = 100,
+):
+    """Get the start/update/end detections that make up a track"""
+    repo = TrackRepository(db)
+    if not repo.get_by_id(track_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Track with id {track_id} not found",
+        )
+    return json_rows(repo.get_detection_rows(track_id, DETECTION_COLUMNS, skip=skip, limit=limit))
@@ -3,7 +3,7 @@ from enum import StrEnum
 from typing import Literal
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class DirectionEnum(StrEnum):
@@ -19,6 +19,61 @@ class DirectionEnum(StrEnum):
     NW = "NW"
 
 
+class DetectionSortEnum(StrEnum):
+    """Columns detections can be sorted by"""
+
+    DETECTED_AT = "detected_at"
+    CONFIDENCE = "confidence"
+    FUSED_SCORE = "fused_score"
+    DISTANCE_FT = "distance_ft"
+
+
+class SortOrderEnum(StrEnum):
+    """Sort direction"""
+
+    ASC = "asc"
+    DESC = "desc"
+
+
+class ExportFormatEnum(StrEnum):
+    """File formats for detection exports"""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
+class SeriesMethodEnum(StrEnum):
+    """Downsampling algorithms for detection time series"""
+
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+
+class TrackEventEnum(StrEnum):
+    """Lifecycle events emitted by the edge tracker"""
+
+    START = "start"
+    UPDATE = "update"
+    END = "end"
+
+
+class DetectionTraceCreate(BaseModel):
+    """Edge timings of a detection, already converted to the backend's clock"""
+
+    captured_at: datetime | None = Field(None, description="Sensor capture time (frame PTS)")
+    appsink_at: datetime | None = Field(None, description="Frame pair reached the appsink")
+    inference_started_at: datetime | None = Field(None, description="Inference started")
+    inference_ended_at: datetime | None = Field(None, description="Inference finished")
+    uploaded_at: datetime | None = Field(None, description="Sent to the backend")
+    clock_offset_ms: float | None = Field(
+        None, description="Backend minus edge clock offset used for the conversion"
+    )
+    clock_error_ms: float | None = Field(
+        None, ge=0.0, description="Bound on the offset error (half the probe round trip)"
+    )
+
+
 class DetectionCreate(BaseModel):
     """Schema for creating a new detection"""
 
@@ -41,6 +96,16 @@ class DetectionCreate(BaseModel):
     stream_name: str | None = Field(
         None, min_length=1, max_length=100, description="Name of the video stream"
     )
+    track_id: UUID | None = Field(None, description="Track ID assigned by the edge tracker")
+    track_event: TrackEventEnum | None = Field(
+        None, description="Track lifecycle event this detection reports (start, update, end)"
+    )
+    # excluded from model_dump(), the dump is what becomes the detections row
+    trace: DetectionTraceCreate | None = Field(
+        None,
+        exclude=True,
+        description="Edge latency trace, stored in detection_traces rather than detections",
+    )
 
     @field_validator("frame_snapshot_url")
     @classmethod
@@ -76,6 +141,8 @@ class DetectionCreate(BaseModel):
                 "fused_score": 0.94,
                 "frame_snapshot_url": "s3://detections/drone/2026-02-21/detection_123.jpg",
                 "stream_name": "drone",
+                "track_id": "0b7a6f7e-2f43-4d0c-9a55-3f1e6c1d2b9a",
+                "track_event": "start",
             }
         }
     )
@@ -98,12 +165,116 @@ class DetectionResponse(BaseModel):
     fused_score: float = Field(..., ge=0.0, le=1.0, description="Fused multimodal score")
     frame_snapshot_url: str | None = Field(None, description="URL to stored frame snapshot")
     stream_name: str | None = Field(None, description="Stream name")
+    track_id: UUID | None = Field(None, description="Track ID assigned by the edge tracker")
+    track_event: str | None = Field(None, description="Track lifecycle event")
+    incident_id: UUID | None = Field(None, description="Incident the detection was grouped into")
+    node_id: str | None = Field(None, description="Edge node whose stream the detection is from")
     created_at: datetime = Field(..., description="Record creation time")
     updated_at: datetime = Field(..., description="Last update time")
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class DetectionQueuedResponse(BaseModel):
+    """Schema for a detection accepted by the write-behind queue"""
+
+    id: UUID = Field(..., description="ID the detection will be stored under")
+    status: Literal["queued", "committed"] = Field(
+        ..., description="queued: accepted, not yet written; committed: stored"
+    )
+    queue_depth: int = Field(..., ge=0, description="Detections waiting to be written")
+
+
+class TrackResponse(BaseModel):
+    """Schema for a track summary"""
+
+    id: UUID = Field(..., description="Track ID assigned by the edge tracker")
+    stream_name: str | None = Field(None, description="Stream name")
+    status: Literal["active", "ended"] = Field(..., description="Track status")
+    started_at: datetime = Field(..., description="Time of the first detection in the track")
+    last_seen_at: datetime = Field(..., description="Time of the latest detection in the track")
+    ended_at: datetime | None = Field(None, description="Time the track ended, if it has")
+    detection_count: int = Field(..., ge=0, description="Number of detections in the track")
+    peak_confidence: float | None = Field(None, description="Highest confidence in the track")
+    peak_fused_score: float | None = Field(None, description="Highest fused score in the track")
+    last_direction: str | None = Field(None, description="Most recent direction")
+    last_distance_ft: float | None = Field(None, description="Most recent distance in feet")
+    created_at: datetime = Field(..., description="Record creation time")
+    updated_at: datetime = Field(..., description="Last update time")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class IncidentResponse(BaseModel):
+    """Schema for an incident, consecutive detections of one stream grouped together"""
+
+    id: UUID = Field(..., description="Unique incident ID")
+    stream_name: str | None = Field(None, description="Stream name")
+    started_at: datetime = Field(..., description="Time of the first detection in the incident")
+    last_seen_at: datetime = Field(..., description="Time of the latest detection in the incident")
+    detection_count: int = Field(..., ge=0, description="Number of detections in the incident")
+    peak_confidence: float | None = Field(None, description="Highest confidence in the incident")
+    peak_fused_score: float | None = Field(None, description="Highest fused score in the incident")
+    first_direction: str | None = Field(None, description="Direction at the start")
+    last_direction: str | None = Field(None, description="Most recent direction")
+    min_distance_ft: float | None = Field(None, description="Closest distance in feet")
+    snapshot_url: str | None = Field(
+        None, description="Snapshot of the highest fused score detection that had one"
+    )
+    snapshot_fused_score: float | None = Field(
+        None, description="Fused score of the detection the snapshot is from"
+    )
+    created_at: datetime = Field(..., description="Record creation time")
+    updated_at: datetime = Field(..., description="Last update time")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DetectionBatchResponse(BaseModel):
+    """Schema for the result of a batch ingest"""
+
+    created: int = Field(..., ge=0, description="Number of detections stored")
+
+
+class DeliveredRequest(BaseModel):
+    """Schema for a dashboard acknowledging the detections it has shown"""
+
+    ids: list[UUID] = Field(..., min_length=1, max_length=1000, description="Detection IDs")
+
+
+class DeliveredResponse(BaseModel):
+    """Schema for the result of a delivery acknowledgement"""
+
+    updated: int = Field(..., ge=0, description="Traces that got their first delivery time")
+
+
+class HopLatency(BaseModel):
+    """Latency distribution of one hop, in milliseconds"""
+
+    hop: str = Field(..., description="Hop name, e.g. network or capture_to_commit")
+    start: str = Field(..., description="Trace timestamp the hop starts at")
+    end: str = Field(..., description="Trace timestamp the hop ends at")
+    count: int = Field(..., ge=0, description="Traces that have both timestamps")
+    mean_ms: float | None = Field(None, description="Mean latency")
+    p50_ms: float | None = Field(None, description="Median latency")
+    p90_ms: float | None = Field(None, description="90th percentile latency")
+    p99_ms: float | None = Field(None, description="99th percentile latency")
+    max_ms: float | None = Field(None, description="Largest latency")
+
+
+class LatencyReport(BaseModel):
+    """Schema for the per hop latency report"""
+
+    traces: int = Field(..., ge=0, description="Traces the report was computed from")
+    start: datetime | None = Field(None, description="Traces received at or after this time")
+    end: datetime | None = Field(None, description="Traces received before this time")
+    stream_name: str | None = Field(None, description="Stream name if filtered")
+    max_clock_error_ms: float | None = Field(
+        None, description="Largest clock offset error among the traces, bounds the edge hops"
+    )
+    hops: list[HopLatency] = Field(..., description="One entry per hop, in pipeline order")
+
+
 class DetectionStats(BaseModel):
     """Schema for detection statistics"""
 
@@ -124,6 +295,66 @@ class DetectionStats(BaseModel):
     )
 
 
+class QuantileParams(BaseModel):
+    """Query parameters for GET /detections/stats/quantiles"""
+
+    stream_name: str | None = Field(
+        None, min_length=1, max_length=100, description="Only this stream"
+    )
+    start: datetime | None = Field(None, description="Window start, rounded down to a bucket")
+    end: datetime | None = Field(None, description="Window end, rounded up to a bucket")
+    q: list[float] = Field(
+        default_factory=lambda: [0.5, 0.9, 0.99],
+        min_length=1,
+        max_length=20,
+        description="Quantiles to estimate, 0-1 (repeat the parameter for several)",
+    )
+
+    @field_validator("q")
+    @classmethod
+    def validate_quantiles(cls, q: list[float]) -> list[float]:
+        if any(not 0.0 <= value <= 1.0 for value in q):
+            raise ValueError("quantiles must be between 0 and 1")
+        return q
+
+    @model_validator(mode="after")
+    def validate_window(self) -> "QuantileParams":
+        if self.start is not None and self.end is not None and self.start > self.end:
+            raise ValueError("start must not be greater than end")
+        return self
+
+
+class ScoreQuantiles(BaseModel):
+    """Estimated distribution of one score"""
+
+    count: int = Field(..., ge=0, description="Detections that have the score")
+    min: float | None = Field(None, description="Lowest value")
+    max: float | None = Field(None, description="Highest value")
+    quantiles: dict[str, float] = Field(
+        ..., description="Estimate per requested quantile, keyed p50, p90, p99.9..."
+    )
+
+
+class StreamQuantiles(BaseModel):
+    """Score distributions of one stream's detections in the window"""
+
+    stream_name: str | None = Field(None, description="Stream name, null for detections without")
+    detections: int = Field(..., ge=0, description="Detections in the window")
+    confidence: ScoreQuantiles
+    visual_confidence: ScoreQuantiles
+    thermal_confidence: ScoreQuantiles
+    fused_score: ScoreQuantiles
+
+
+class QuantileReport(BaseModel):
+    """Schema for per stream score quantiles over a time window"""
+
+    start: datetime | None = Field(None, description="Detections at or after this time")
+    end: datetime | None = Field(None, description="Detections before this time")
+    bucket_s: int = Field(..., description="Sketch bucket width the window was rounded to")
+    streams: list[StreamQuantiles] = Field(..., description="One entry per stream")
+
+
 # Query parameter models
 class DetectionQueryParams(BaseModel):
     """Query parameters for listing detections"""
@@ -134,6 +365,88 @@ class DetectionQueryParams(BaseModel):
     drone_only: bool = Field(False, description="If true, only return positive drone detections")
 
 
+class DetectionFilters(BaseModel):
+    """Query filters shared by the detection list endpoints"""
+
+    stream_name: str | None = Field(
+        None, min_length=1, max_length=100, description="Filter by stream name"
+    )
+    node_id: str | None = Field(
+        None, min_length=1, max_length=12, description="Filter by edge node"
+    )
+    start: datetime | None = Field(None, description="Only detections at or after this time")
+    end: datetime | None = Field(None, description="Only detections before this time")
+    min_confidence: float | None = Field(None, ge=0.0, le=1.0, description="Minimum confidence")
+    max_confidence: float | None = Field(None, ge=0.0, le=1.0, description="Maximum confidence")
+    min_fused_score: float | None = Field(None, ge=0.0, le=1.0, description="Minimum fused score")
+    max_fused_score: float | None = Field(None, ge=0.0, le=1.0, description="Maximum fused score")
+    direction: list[DirectionEnum] | None = Field(
+        None, description="Only these directions (repeat the parameter for several)"
+    )
+    min_distance_ft: float | None = Field(None, ge=0.0, description="Minimum distance in feet")
+    max_distance_ft: float | None = Field(None, ge=0.0, description="Maximum distance in feet")
+
+    @model_validator(mode="after")
+    def validate_ranges(self) -> "DetectionFilters":
+        """Reject ranges whose lower bound is above the upper bound"""
+        for low, high in (
+            ("start", "end"),
+            ("min_confidence", "max_confidence"),
+            ("min_fused_score", "max_fused_score"),
+            ("min_distance_ft", "max_distance_ft"),
+        ):
+            low_value, high_value = getattr(self, low), getattr(self, high)
+            if low_value is not None and high_value is not None and low_value > high_value:
+                raise ValueError(f"{low} must not be greater than {high}")
+        return self
+
+
+class DetectionListParams(DetectionFilters):
+    """Query parameters for GET /detections: filters plus pagination and sorting"""
+
+    skip: int = Field(0, ge=0, description="Number of records to skip (pagination)")
+    limit: int = Field(100, ge=1, le=1000, description="Maximum number of records to return")
+    sort_by: DetectionSortEnum = Field(DetectionSortEnum.DETECTED_AT, description="Sort column")
+    order: SortOrderEnum = Field(SortOrderEnum.DESC, description="Sort order")
+
+
+class DetectionExportParams(DetectionFilters):
+    """Query parameters for GET /detections/export"""
+
+    format: ExportFormatEnum = Field(ExportFormatEnum.CSV, description="Export file format")
+    gzip: bool = Field(
+        False, description="gzip the response (Parquet is already compressed internally)"
+    )
+    order: SortOrderEnum = Field(SortOrderEnum.ASC, description="Time order of the rows")
+
+
+class DetectionSeriesParams(DetectionFilters):
+    """Query parameters for GET /detections/series"""
+
+    points: int = Field(
+        500, ge=4, le=10000, description="Most points to return per series (the chart's width)"
+    )
+    method: SeriesMethodEnum = Field(SeriesMethodEnum.LTTB, description="Downsampling algorithm")
+
+
+class DetectionSeries(BaseModel):
+    """Schema for downsampled confidence and fused score over time"""
+
+    start: datetime | None = Field(None, description="Detections at or after this time")
+    end: datetime | None = Field(None, description="Detections before this time")
+    stream_name: str | None = Field(None, description="Stream name if filtered")
+    method: SeriesMethodEnum | None = Field(
+        ..., description="Downsampling algorithm, null if every row fit in the budget"
+    )
+    rows: int = Field(..., ge=0, description="Detections the series were computed from")
+    confidence: list[tuple[datetime, float]] = Field(
+        ..., description="(detected_at, confidence) pairs in time order"
+    )
+    fused_score: list[tuple[datetime, float]] = Field(
+        ..., description="(detected_at, fused_score) pairs in time order"
+    )
+
+
 # Stream schemas
 class StreamInfo(BaseModel):
     """Schema for stream information"""
@@ -143,6 +456,9 @@ class StreamInfo(BaseModel):
     rtsp_url: str = Field(..., description="RTSP streaming URL")
     hls_url: str = Field(..., description="HLS streaming URL")
     status: Literal["active", "inactive", "error"] = Field(..., description="Stream status")
+    node_id: str | None = Field(None, description="Edge node publishing the stream, if registered")
+    sensor: str | None = Field(None, description="Sensor on the edge node")
+    rtp_port: int | None = Field(None, description="UDP port the node sends RTP to")
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -164,6 +480,82 @@ class StreamListResponse(BaseModel):
     total: int = Field(..., ge=0, description="Total number of streams")
 
 
+# Edge node schemas
+class SensorAnnouncement(BaseModel):
+    """A sensor an edge node wants to publish"""
+
+    name: str = Field(
+        ...,
+        pattern=r"^[a-z0-9]{1,7}$",
+        description="Sensor name, unique on the node (e.g. visual, thermal)",
+    )
+    codec: Literal["H264", "H265"] = Field("H264", description="RTP payload codec")
+    width: int | None = Field(None, gt=0, description="Frame width in pixels")
+    height: int | None = Field(None, gt=0, description="Frame height in pixels")
+    fps: int | None = Field(None, gt=0, le=240, description="Frame rate")
+
+
+class NodeRegister(BaseModel):
+    """Schema for POST /nodes/register"""
+
+    node_id: str = Field(
+        ..., pattern=r"^[A-Za-z0-9_]{1,12}$", description="Stable node ID, e.g. its hostname"
+    )
+    sensors: list[SensorAnnouncement] = Field(
+        ..., min_length=1, max_length=8, description="Sensors the node publishes"
+    )
+
+    @field_validator("sensors")
+    @classmethod
+    def validate_unique_sensors(cls, v: list[SensorAnnouncement]) -> list[SensorAnnouncement]:
+        """Each sensor maps to one stream, so names can't repeat"""
+        names = [sensor.name for sensor in v]
+        if len(set(names)) != len(names):
+            raise ValueError("sensor names must be unique")
+        return v
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "node_id": "jetson01",
+                "sensors": [
+                    {"name": "visual", "codec": "H264", "width": 1920, "height": 1080, "fps": 30},
+                    {"name": "thermal", "codec": "H264", "width": 640, "height": 512, "fps": 30},
+                ],
+            }
+        }
+    )
+
+
+class StreamAssignment(BaseModel):
+    """Where a node sends one sensor's RTP and where viewers find it"""
+
+    sensor: str = Field(..., description="Sensor name")
+    stream_name: str = Field(
+        ..., description="Stream and MediaMTX path name, also the detections' stream_name"
+    )
+    rtp_port: int = Field(..., description="UDP port to send RTP to, RTCP goes to rtp_port + 1")
+    rtsp_url: str = Field(..., description="RTSP streaming URL")
+    hls_url: str = Field(..., description="HLS streaming URL")
+
+
+class NodeResponse(BaseModel):
+    """Schema for a registered edge node and its stream assignments"""
+
+    id: str = Field(..., description="Node ID")
+    address: str | None = Field(None, description="Address the node registered from")
+    registered_at: datetime = Field(..., description="First registration time")
+    last_seen_at: datetime = Field(..., description="Last registration time")
+    streams: list[StreamAssignment] = Field(..., description="One assignment per sensor")
+
+
+class NodeListResponse(BaseModel):
+    """Schema for node list response"""
+
+    nodes: list[NodeResponse] = Field(..., description="Registered edge nodes")
+    total: int = Field(..., ge=0, description="Total number of nodes")
+
+
 # Health check schemas
 class HealthCheckResponse(BaseModel):
     """Schema for basic health check"""
@@ -195,6 +587,31 @@ class ReadinessCheckResponse(BaseModel):
     timestamp: float = Field(..., gt=0, description="Unix timestamp")
 
 
+class ClockResponse(BaseModel):
+    """Schema for a clock offset probe (NTP style, see jetson sensor_ingestion/tracing.py)"""
+
+    received_at: float = Field(..., gt=0, description="Unix time the request was handled")
+    sent_at: float = Field(..., gt=0, description="Unix time the response was produced")
+
+
+class IngestHealthResponse(BaseModel):
+    """Schema for the write-behind queue status (see app/write_behind.py)"""
+
+    enabled: bool = Field(..., description="Whether POST /detections goes through the queue")
+    durability: Literal["accepted", "committed"] | None = Field(
+        None, description="When a queued detection is acknowledged"
+    )
+    queue_depth: int = Field(0, ge=0, description="Detections waiting to be written")
+    queue_capacity: int | None = Field(None, ge=1, description="Queue bound, 503 when full")
+    written: int = Field(0, ge=0, description="Detections written since startup")
+    failed: int = Field(0, ge=0, description="Queued detections lost to failed commits")
+    rejected: int = Field(0, ge=0, description="Posts turned away because the queue was full")
+    batches: int = Field(0, ge=0, description="Group commits since startup")
+    mean_batch_size: float | None = Field(None, description="Detections per group commit")
+    last_commit_ms: float | None = Field(None, description="Duration of the last group commit")
+    timestamp: float = Field(..., gt=0, description="Unix timestamp")
+
+
 class LivenessCheckResponse(BaseModel):
     """Schema for liveness check"""
 
@@ -0,0 +1,139 @@
+"""Server-side downsampling of detection scores over time for GET /detections/series.
+
+A day of detections is tens of thousands of rows, far more than a chart has pixels for. These
+take the matching rows as a time ordered stream of partitions (``iter_partitions``) and reduce
+each series (confidence, fused score) to a fixed point budget in the same single pass:
+
+    lttb     Largest-Triangle-Three-Buckets. The time range is cut into points - 2 equal
+             buckets and each keeps the one row forming the largest triangle with the row kept
+             before it and the average of the next bucket, so peaks and dips survive. The first
+             and last row are kept too. Only the current and next bucket are held in memory.
+    minmax   The lowest and highest value of points / 2 equal buckets, in time order. Constant
+             memory and exact extremes, at the cost of a more jagged line.
+
+Work is linear in the rows scanned and the output is at most ``points`` long per series,
+however many rows match.
+"""
+
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime
+
+# row layout the downsamplers expect: the time, then one value per series
+SERIES = ("confidence", "fused_score")
+
+
+def _rows(partitions: Iterable[Sequence]) -> Iterator[Sequence]:
+    for rows in partitions:
+        yield from rows
+
+
+def _buckets(
+    rows: Iterable[Sequence], first: float, width: float, count: int
+) -> Iterator[list[tuple[float, Sequence]]]:
+    """Consecutive non-empty time buckets as lists of (seconds, row)"""
+    bucket: list[tuple[float, Sequence]] = []
+    index = None
+    for row in rows:
+        x = row[0].timestamp()
+        i = min(int((x - first) / width), count - 1) if width > 0 else 0
+        if i != index and bucket:
+            yield bucket
+            bucket = []
+        index = i
+        bucket.append((x, row))
+    if bucket:
+        yield bucket
+
+
+def lttb(
+    partitions: Iterable[Sequence], first: datetime, last: datetime, points: int
+) -> tuple[list[list[tuple[datetime, float]]], int]:
+    """Downsample every series to at most points rows. first and last are the times of the
+    first and last row. Returns one list of (time, value) per series and the rows scanned."""
+    rows = _rows(partitions)
+    head = next(rows, None)
+    if head is None:
+        return [[] for _ in SERIES], 0
+    columns = range(1, len(SERIES) + 1)
+    selected = [[(head[0], head[c])] for c in columns]
+    # the last row kept per series, the first corner of the next triangle
+    anchors = [(head[0].timestamp(), head[c]) for c in columns]
+    scanned = 1
+
+    def keep(bucket, after):
+        """The row of bucket with the largest triangle between the anchor and after"""
+        for s, c in enumerate(columns):
+            ax, ay = anchors[s]
+            cx, cy = after[s]
+            best, best_area = None, -1.0
+            for x, row in bucket:
+                area = abs((ax - cx) * (row[c] - ay) - (ax - x) * (cy - ay))
+                if area > best_area:
+                    best, best_area = (x, row), area
+            anchors[s] = (best[0], best[1][c])
+            selected[s].append((best[1][0], best[1][c]))
+
+    def average(bucket):
+        x = sum(x for x, _ in bucket) / len(bucket)
+        return [(x, sum(row[c] for _, row in bucket) / len(bucket)) for c in columns]
+
+    count = max(points - 2, 1)
+    width = (last.timestamp() - first.timestamp()) / count
+    pending = None
+    for bucket in _buckets(rows, first.timestamp(), width, count):
+        scanned += len(bucket)
+        if pending is not None:
+            keep(pending, average(bucket))
+        pending = bucket
+    if pending:
+        # the last row is kept as is and is the far corner for the last bucket
+        x, tail = pending.pop()
+        if pending:
+            keep(pending, [(x, tail[c]) for c in columns])
+        for s, c in enumerate(columns):
+            selected[s].append((tail[0], tail[c]))
+    return selected, scanned
+
+
+def minmax(
+    partitions: Iterable[Sequence], first: datetime, last: datetime, points: int
+) -> tuple[list[list[tuple[datetime, float]]], int]:
+    """Minimum and maximum of every series per bucket, same arguments and result as lttb()"""
+    columns = range(1, len(SERIES) + 1)
+    selected: list[list[tuple[datetime, float]]] = [[] for _ in SERIES]
+    count = max(points // 2, 1)
+    width = (last.timestamp() - first.timestamp()) / count
+    scanned = 0
+    index = None
+    extremes: list[list[Sequence]] = []  # [lowest row, highest row] per series
+
+    def flush():
+        for s, c in enumerate(columns):
+            low, high = extremes[s]
+            if low is high:
+                selected[s].append((low[0], low[c]))
+            else:
+                for row in sorted((low, high), key=lambda row: row[0]):
+                    selected[s].append((row[0], row[c]))
+
+    for row in _rows(partitions):
+        scanned += 1
+        x = row[0].timestamp() - first.timestamp()
+        i = min(int(x / width), count - 1) if width > 0 else 0
+        if i != index:
+            if extremes:
+                flush()
+            index = i
+            extremes = [[row, row] for _ in columns]
+            continue
+        for s, c in enumerate(columns):
+            if row[c] < extremes[s][0][c]:
+                extremes[s][0] = row
+            if row[c] > extremes[s][1][c]:
+                extremes[s][1] = row
+    if extremes:
+        flush()
+    return selected, scanned
+
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": minmax}
@@ -0,0 +1,135 @@
+"""Streaming encoders for GET /detections/export.
+
+Every encoder takes an iterator of row partitions (lists of result rows, as produced by a
+``yield_per`` query) and yields encoded byte chunks, so only one partition is ever in memory.
+"""
+
+import csv
+import io
+import json
+import zlib
+from collections.abc import Iterable, Iterator, Sequence
+
+from sqlalchemy import Column, DateTime, Float, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.models.detection import Detection
+
+EXPORT_COLUMNS: list[Column] = list(Detection.__table__.columns)
+EXPORT_FIELDS = [column.name for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Only these columns need converting for text formats, the rest are str/float/int/None already
+_UUID_COLUMNS = [i for i, c in enumerate(EXPORT_COLUMNS) if isinstance(c.type, UUID)]
+_DATETIME_COLUMNS = [i for i, c in enumerate(EXPORT_COLUMNS) if isinstance(c.type, DateTime)]
+
+
+def _text_rows(rows: Sequence) -> list[list]:
+    """Rows with UUIDs and datetimes as strings"""
+    converted = []
+    for row in rows:
+        values = list(row)
+        for i in _UUID_COLUMNS:
+            if values[i] is not None:
+                values[i] = str(values[i])
+        for i in _DATETIME_COLUMNS:
+            if values[i] is not None:
+                values[i] = values[i].isoformat()
+        converted.append(values)
+    return converted
+
+
+def csv_chunks(partitions: Iterable[Sequence]) -> Iterator[bytes]:
+    """Header line, then one chunk of CSV rows per partition"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in partitions:
+        writer.writerows(_text_rows(rows))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # only the header is left when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(partitions: Iterable[Sequence]) -> Iterator[bytes]:
+    """One JSON object per line"""
+    for rows in partitions:
+        lines = [json.dumps(dict(zip(EXPORT_FIELDS, row, strict=True))) for row in _text_rows(rows)]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _arrow_schema(pa):
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since the last take()"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(partitions: Iterable[Sequence]) -> Iterator[bytes]:
+    """One Parquet row group per partition, streamed as the writer produces it"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in partitions:
+            columns = list(zip(*rows, strict=True))
+            for i in _UUID_COLUMNS:
+                columns[i] = [None if v is None else str(v) for v in columns[i]]
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, schema, strict=True)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    # footer, written on close
+    yield sink.take()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """gzip-compress a chunk stream on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+ENCODERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
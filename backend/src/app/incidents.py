@@ -0,0 +1,33 @@
+"""Group detections stored without an incident (e.g. before the incidents table existed).
+
+New detections are grouped as they are inserted, so this only needs to run once per database:
+
+    python -m app.incidents [--batch-size 5000]
+"""
+
+import argparse
+import logging
+
+from app.database.database import Base, SessionLocal, engine
+from app.repositories import IncidentRepository
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Group existing detections into incidents")
+    parser.add_argument("--batch-size", type=int, default=5000, help="detections per commit")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        grouped = IncidentRepository(db).backfill(args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Grouped {grouped} detections into incidents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""Optional server-side detection on the MediaMTX RTSP streams.
+
+Needs the ``inference`` extra (PyAV, NumPy, OpenCV); run with ``python -m app.inference``.
+"""
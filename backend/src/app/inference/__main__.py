@@ -0,0 +1,5 @@
+import sys
+
+from app.inference.worker import main
+
+main(sys.argv[1:])
@@ -0,0 +1,94 @@
+"""CPU detector run in the inference worker processes.
+
+BlobDetector is the edge baseline detector of jetson/src/ml/detector.py, kept as a copy: the
+backend image is built from backend/ alone, and the edge package targets the Jetson's Python 3.6,
+so neither can import the other. tests/test_inference.py checks both find the same blobs, so
+change them together.
+"""
+
+import cv2
+import numpy as np
+
+_detectors: dict[str, "BlobDetector"] = {}
+
+
+class BlobDetector:
+    """Finds small blobs that stand out from the local background.
+
+    Contrast against a box-blurred background, thresholded at k robust standard deviations,
+    then connected components; see jetson/src/ml/detector.py for the parameters.
+    """
+
+    def __init__(
+        self,
+        polarity: str = "both",
+        background_px: int = 31,
+        k: float = 8.0,
+        min_contrast: float = 10.0,
+        min_area: int = 3,
+        max_area: int = 2500,
+    ):
+        if polarity not in ("both", "bright", "dark"):
+            raise ValueError(f"Unknown polarity {polarity}")
+        self.polarity = polarity
+        self.background_px = background_px
+        self.k = k
+        self.min_contrast = min_contrast
+        self.min_area = min_area
+        self.max_area = max_area
+
+    def detect(self, gray: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Grayscale uint8 frame -> (boxes (N, 4) [x1, y1, x2, y2], scores (N,))"""
+        image = gray.astype(np.float32)
+        contrast = image - cv2.blur(image, (self.background_px, self.background_px))
+        if self.polarity == "bright":
+            contrast = np.maximum(contrast, 0)
+        elif self.polarity == "dark":
+            contrast = np.maximum(-contrast, 0)
+        else:
+            contrast = np.abs(contrast)
+
+        sample = contrast[::4, ::4]
+        sigma = 1.4826 * float(np.median(np.abs(sample - np.median(sample))))
+        threshold = max(self.k * sigma, self.min_contrast)
+        mask = (contrast > threshold).astype(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        empty = np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        if count <= 1:
+            return empty
+
+        stats = stats[1:]
+        area = stats[:, cv2.CC_STAT_AREA]
+        keep = (area >= self.min_area) & (area <= self.max_area)
+        if not keep.any():
+            return empty
+
+        on = mask.ravel().nonzero()[0]
+        peaks = np.zeros(count, dtype=np.float32)
+        np.maximum.at(peaks, labels.ravel()[on], contrast.ravel()[on])
+        peaks = peaks[1:][keep]
+
+        x, y = stats[keep, cv2.CC_STAT_LEFT], stats[keep, cv2.CC_STAT_TOP]
+        w, h = stats[keep, cv2.CC_STAT_WIDTH], stats[keep, cv2.CC_STAT_HEIGHT]
+        boxes = np.stack([x, y, x + w, y + h], axis=1).astype(np.float32)
+        scores = np.clip(1.0 - np.exp(-(peaks / threshold - 1.0)), 0.0, 1.0)
+        return boxes, scores.astype(np.float32)
+
+
+def init_worker() -> None:
+    """Process pool initializer: one OpenCV thread per process, workers scale across cores"""
+    cv2.setNumThreads(1)
+    for polarity in ("both", "bright", "dark"):
+        _detectors[polarity] = BlobDetector(polarity=polarity)
+
+
+def detect_frame(
+    stream_name: str, captured_at: float, gray: np.ndarray, polarity: str = "both"
+) -> tuple[str, float, list[tuple[float, list[float]]]]:
+    """Runs in a worker process. Returns (stream_name, captured_at, [(score, box), ...])"""
+    boxes, scores = _detectors[polarity].detect(gray)
+    return (
+        stream_name,
+        captured_at,
+        [(float(s), b.tolist()) for s, b in zip(scores, boxes, strict=True)],
+    )
@@ -0,0 +1,77 @@
+"""Decides which decoded frames are sent to the detector pool"""
+
+
+class FrameSampler:
+    """Reduced-rate frame selection that backs off under load.
+
+    Frames are sampled every ``stride / target_fps`` seconds of stream time. While the number of
+    frames in flight for the stream stays at or above ``high_water`` the stride doubles, up to
+    ``max_stride``, after which the reader switches the decoder to keyframes only. Once the
+    backlog drains to ``low_water`` it steps back the same way. Changes are at least
+    ``settle_s`` apart so the pool gets a chance to catch up before the next step.
+    """
+
+    def __init__(
+        self,
+        target_fps: float,
+        high_water: int,
+        low_water: int = 0,
+        max_stride: int = 8,
+        settle_s: float = 2.0,
+    ):
+        if target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+        self.target_fps = target_fps
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_stride = max_stride
+        self.settle_s = settle_s
+        self.stride = 1
+        self.keyframes_only = False
+        self._next_due: float | None = None
+        self._changed_at = float("-inf")
+
+    @property
+    def interval_s(self) -> float:
+        return self.stride / self.target_fps
+
+    @property
+    def effective_fps(self) -> float:
+        """Upper bound on the sampled rate, keyframe mode is bounded by the GOP instead"""
+        return self.target_fps / self.stride
+
+    def adjust(self, backlog: int, now: float) -> bool:
+        """Step the load level from the current backlog. Returns True when it changed."""
+        if now - self._changed_at < self.settle_s:
+            return False
+        if backlog >= self.high_water:
+            if self.stride < self.max_stride:
+                self.stride *= 2
+            elif not self.keyframes_only:
+                self.keyframes_only = True
+            else:
+                return False
+        elif backlog <= self.low_water and (self.keyframes_only or self.stride > 1):
+            if self.keyframes_only:
+                self.keyframes_only = False
+            else:
+                self.stride //= 2
+        else:
+            return False
+        self._changed_at = now
+        return True
+
+    def should_sample(self, frame_time: float, key_frame: bool = False) -> bool:
+        """Whether the frame decoded at frame_time (seconds, stream clock) goes to the pool"""
+        if self.keyframes_only:
+            return key_frame
+        # a looped or restarted source jumps back in time, start the schedule over
+        if self._next_due is None or frame_time < self._next_due - self.interval_s:
+            self._next_due = frame_time
+        if frame_time < self._next_due:
+            return False
+        self._next_due += self.interval_s
+        # fell behind (stall, stride change): don't burst to catch up
+        if self._next_due < frame_time:
+            self._next_due = frame_time + self.interval_s
+        return True
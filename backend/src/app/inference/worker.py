@@ -0,0 +1,284 @@
+"""RTSP inference service: MediaMTX streams -> detector process pool -> detections table.
+
+One reader thread per stream decodes with PyAV and samples frames at ``INFERENCE_FPS``. Sampled
+frames are fanned out to a process pool running the CPU detector, and a writer thread batches
+the results into ``DetectionRepository.create_many``. When a stream's frames pile up in the pool
+its sampler backs off to every Nth frame and then to keyframes only, decoded with
+``skip_frame=NONKEY`` so the skipped frames are never decoded at all.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import UTC, datetime
+
+import av
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.api.routers.streams import STREAMS
+from app.database.database import SessionLocal
+from app.database.schemas import DetectionCreate
+from app.inference.detector import detect_frame, init_worker
+from app.inference.sampler import FrameSampler
+from app.repositories import DetectionRepository
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_STREAMS = os.getenv("INFERENCE_STREAMS", ",".join(STREAMS))
+INFERENCE_FPS = float(os.getenv("INFERENCE_FPS", "5"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+# frames in flight per stream before the sampler backs off
+INFERENCE_MAX_BACKLOG = int(os.getenv("INFERENCE_MAX_BACKLOG", "4"))
+INFERENCE_MIN_SCORE = float(os.getenv("INFERENCE_MIN_SCORE", "0.5"))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "50"))
+INFERENCE_FLUSH_S = float(os.getenv("INFERENCE_FLUSH_S", "1.0"))
+RECONNECT_S = 5.0
+STATS_S = 30.0
+
+# Hot targets are bright in thermal, drones against the sky are dark in RGB
+POLARITY = {"thermal": "bright", "visual": "dark"}
+SENSOR_FIELD = {"thermal": "thermal_confidence", "visual": "visual_confidence"}
+
+_STOP = object()
+
+
+class DetectorPool:
+    """Process pool running the detector, replaced by a fresh one when a worker dies (e.g. the
+    OOM killer), which breaks a ProcessPoolExecutor for good"""
+
+    def __init__(self, workers: int, context=None):
+        self.workers = workers
+        # spawn: forking a process that already runs decoder threads isn't safe
+        self.context = context or multiprocessing.get_context("spawn")
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self.executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, mp_context=self.context, initializer=init_worker)
+
+    def submit(self, fn, *args) -> Future:
+        """Submit to the current pool. Raises BrokenProcessPool if it broke, after starting
+        a new one for the next submit."""
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # once, however many readers find it broken
+        with self._lock:
+            if self.executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._start()
+            self.restarts += 1
+        logger.error(f"Detector pool broke, restarted it ({self.restarts} restarts)")
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+
+
+class StreamReader(threading.Thread):
+    """Decodes one stream and submits the sampled frames to the pool"""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        pool: DetectorPool,
+        results: queue.Queue,
+        stop: threading.Event,
+    ):
+        super().__init__(name=f"reader-{name}", daemon=True)
+        self.stream_name = name
+        self.url = url
+        self.pool = pool
+        self.results = results
+        self.stop = stop
+        self.polarity = POLARITY.get(name, "both")
+        self.sampler = FrameSampler(INFERENCE_FPS, high_water=INFERENCE_MAX_BACKLOG)
+        self.pending: set[Future] = set()
+        self.decoded = 0
+        self.submitted = 0
+        self.dropped = 0
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                self._read()
+            except (av.FFmpegError, OSError) as e:
+                logger.warning(f"Stream {self.stream_name} ({self.url}): {e}")
+            except Exception:
+                # anything else would end the thread and the stream's inference silently
+                logger.exception(f"Stream {self.stream_name}: reader failed, reconnecting")
+            self.stop.wait(RECONNECT_S)
+
+    def _read(self):
+        options = {"rtsp_transport": "tcp"} if self.url.startswith("rtsp://") else {}
+        with av.open(self.url, options=options, timeout=10.0) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            self._apply_mode(stream)
+            logger.info(f"Reading {self.stream_name} from {self.url}")
+            for frame in container.decode(stream):
+                if self.stop.is_set():
+                    return
+                self.decoded += 1
+                now = time.monotonic()
+                self.pending = {f for f in self.pending if not f.done()}
+                if self.sampler.adjust(len(self.pending), now):
+                    self._apply_mode(stream)
+                    logger.info(
+                        f"Stream {self.stream_name}: stride {self.sampler.stride}, "
+                        f"keyframes only {self.sampler.keyframes_only}"
+                    )
+
+                frame_time = frame.time if frame.time is not None else now
+                if not self.sampler.should_sample(frame_time, frame.key_frame):
+                    continue
+                # the backlog is bounded no matter how far behind the pool is
+                if len(self.pending) >= self.sampler.high_water:
+                    self.dropped += 1
+                    continue
+                gray = frame.to_ndarray(format="gray")
+                try:
+                    future = self.pool.submit(
+                        detect_frame, self.stream_name, time.time(), gray, self.polarity
+                    )
+                except BrokenProcessPool:
+                    # the pool was restarted, the next sampled frame goes to the new one
+                    self.dropped += 1
+                    continue
+                future.add_done_callback(self.results.put)
+                self.pending.add(future)
+                self.submitted += 1
+
+    def _apply_mode(self, stream):
+        stream.codec_context.skip_frame = "NONKEY" if self.sampler.keyframes_only else "DEFAULT"
+
+
+class DetectionWriter(threading.Thread):
+    """Turns finished detector futures into detections and writes them in batches"""
+
+    def __init__(self, results: queue.Queue):
+        super().__init__(name="detection-writer", daemon=True)
+        self.results = results
+        self.written = 0
+
+    def run(self):
+        batch: list[DetectionCreate] = []
+        deadline = time.monotonic() + INFERENCE_FLUSH_S
+        while True:
+            try:
+                item = self.results.get(timeout=max(deadline - time.monotonic(), 0.0))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                try:
+                    batch.extend(self._to_detections(item))
+                except Exception:
+                    # never let the writer die: readers would keep queueing results for nobody
+                    logger.exception("Dropped a detector result")
+            if len(batch) >= INFERENCE_BATCH_SIZE or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + INFERENCE_FLUSH_S
+        self._write(batch)
+
+    def _to_detections(self, future: Future) -> list[DetectionCreate]:
+        if future.cancelled():
+            return []
+        if future.exception() is not None:
+            logger.error(f"Detector failed: {future.exception()}")
+            return []
+        stream_name, captured_at, hits = future.result()
+        detected_at = datetime.fromtimestamp(captured_at, UTC)
+        sensor = SENSOR_FIELD.get(stream_name)
+        detections = []
+        for score, _box in hits:
+            if score < INFERENCE_MIN_SCORE:
+                continue
+            fields = {sensor: score} if sensor else {}
+            detections.append(
+                DetectionCreate(
+                    detected_at=detected_at,
+                    confidence=score,
+                    fused_score=score,
+                    stream_name=stream_name,
+                    **fields,
+                )
+            )
+        return detections
+
+    def _write(self, batch: list[DetectionCreate]):
+        if not batch:
+            return
+        try:
+            with SessionLocal() as db:
+                DetectionRepository(db).create_many(batch)
+            self.written += len(batch)
+        except SQLAlchemyError as e:
+            logger.error(f"Dropped {len(batch)} detections, write failed: {e}")
+        except Exception:
+            logger.exception(f"Dropped {len(batch)} detections, write failed")
+
+
+def parse_sources(args: list[str]) -> dict[str, str]:
+    """``name=url`` arguments, or the configured STREAMS named in INFERENCE_STREAMS"""
+    if args:
+        return dict(arg.split("=", 1) for arg in args)
+    names = [n.strip() for n in INFERENCE_STREAMS.split(",") if n.strip()]
+    unknown = [n for n in names if n not in STREAMS]
+    if unknown:
+        raise SystemExit(f"Unknown streams in INFERENCE_STREAMS: {', '.join(unknown)}")
+    return {name: STREAMS[name].rtsp_url for name in names}
+
+
+def main(args: list[str] | None = None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sources = parse_sources(args or [])
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    results: queue.Queue = queue.Queue()
+    writer = DetectionWriter(results)
+    writer.start()
+    pool = DetectorPool(INFERENCE_WORKERS)
+    try:
+        readers = [StreamReader(name, url, pool, results, stop) for name, url in sources.items()]
+        for reader in readers:
+            reader.start()
+        logger.info(f"Inference on {len(readers)} streams with {INFERENCE_WORKERS} workers")
+
+        last = {reader.stream_name: 0 for reader in readers}
+        while not stop.wait(STATS_S):
+            for reader in readers:
+                fps = (reader.submitted - last[reader.stream_name]) / STATS_S
+                last[reader.stream_name] = reader.submitted
+                logger.info(
+                    f"{reader.stream_name}: decoded {reader.decoded} submitted {reader.submitted} "
+                    f"dropped {reader.dropped} in flight {len(reader.pending)} "
+                    f"stride {reader.sampler.stride} keyframes only "
+                    f"{reader.sampler.keyframes_only} inference {fps:.1f} fps"
+                )
+            logger.info(f"{writer.written} detections written, {pool.restarts} pool restarts")
+        for reader in readers:
+            reader.join()
+    finally:
+        pool.shutdown()
+
+    results.put(_STOP)
+    writer.join()
+    logger.info(f"Stopped, {writer.written} detections written")
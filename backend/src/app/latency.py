@@ -0,0 +1,68 @@
+"""Per hop latency of traced detections, from sensor capture to the dashboard.
+
+A trace holds one timestamp per hop (see DetectionTrace). The edge timestamps are converted to
+the backend's clock by the edge, so differences across the edge/backend boundary (network,
+capture_to_commit...) are only as good as the clock offset, clock_error_ms bounds how far off
+they can be. Hops within one machine don't depend on the offset at all.
+"""
+
+import math
+from collections.abc import Iterable, Mapping
+
+# (hop, start timestamp, end timestamp), in pipeline order
+HOPS = [
+    ("capture_to_appsink", "captured_at", "appsink_at"),
+    ("appsink_to_inference", "appsink_at", "inference_started_at"),
+    ("inference", "inference_started_at", "inference_ended_at"),
+    ("inference_to_upload", "inference_ended_at", "uploaded_at"),
+    ("network", "uploaded_at", "received_at"),
+    ("commit", "received_at", "committed_at"),
+    ("delivery", "committed_at", "delivered_at"),
+    ("capture_to_commit", "captured_at", "committed_at"),
+    ("capture_to_delivery", "captured_at", "delivered_at"),
+]
+
+TRACE_TIMES = [
+    "captured_at",
+    "appsink_at",
+    "inference_started_at",
+    "inference_ended_at",
+    "uploaded_at",
+    "received_at",
+    "committed_at",
+    "delivered_at",
+]
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """q-th percentile (0-100) of sorted values, interpolating between the closest ranks"""
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(rows: Iterable[Mapping]) -> tuple[int, list[dict]]:
+    """Trace rows -> (number of traces, one latency summary per hop in HOPS)"""
+    samples: dict[str, list[float]] = {hop: [] for hop, _, _ in HOPS}
+    traces = 0
+    for row in rows:
+        traces += 1
+        for hop, start, end in HOPS:
+            if row[start] is not None and row[end] is not None:
+                samples[hop].append((row[end] - row[start]).total_seconds() * 1000)
+
+    hops = []
+    for hop, start, end in HOPS:
+        values = sorted(samples[hop])
+        summary = {"hop": hop, "start": start, "end": end, "count": len(values)}
+        if values:
+            summary.update(
+                mean_ms=round(sum(values) / len(values), 3),
+                p50_ms=round(percentile(values, 50), 3),
+                p90_ms=round(percentile(values, 90), 3),
+                p99_ms=round(percentile(values, 99), 3),
+                max_ms=round(values[-1], 3),
+            )
+        hops.append(summary)
+    return traces, hops
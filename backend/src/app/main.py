@@ -1,17 +1,30 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routers import detections, health, streams
+from app.api.routers import detections, health, incidents, nodes, snapshots, streams, tracks
 from app.database.database import Base, engine
+from app.sketches import SketchCompactor
+from app.snapshots import SnapshotService
+from app.write_behind import WRITE_BEHIND, WriteBehindQueue
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create database tables on startup
     Base.metadata.create_all(bind=engine)
+    # Opt-in group commit of single detection posts, drained before shutdown
+    app.state.write_behind = WriteBehindQueue().start() if WRITE_BEHIND else None
+    app.state.snapshots = SnapshotService()
+    # folds the score sketch deltas of new detections into their buckets
+    app.state.sketches = SketchCompactor().start()
     yield
+    app.state.snapshots.close()
+    if app.state.write_behind is not None:
+        await run_in_threadpool(app.state.write_behind.stop)
+    await run_in_threadpool(app.state.sketches.stop)
 
 
 app = FastAPI(
@@ -34,6 +47,10 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(detections.router)
 app.include_router(streams.router)
+app.include_router(tracks.router)
+app.include_router(incidents.router)
+app.include_router(nodes.router)
+app.include_router(snapshots.router)
 
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,85 @@
+"""MediaMTX configuration for the registered edge nodes' streams.
+
+Every registered sensor gets its own MediaMTX path, named like its stream, that reads RTP
+straight from the UDP port the node was assigned (udp+rtp source, MediaMTX 1.12+). The static
+visual/thermal publisher paths stay as they are for the single node setup and the simulators.
+
+When MEDIAMTX_CONFIG_PATH points at the mounted mediamtx.yml, the paths section is rewritten
+after every registration change. MediaMTX watches its config file and applies path changes
+without dropping the other paths' readers.
+"""
+
+import logging
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+from app.models.stream import Stream
+
+MEDIAMTX_CONFIG_PATH = os.getenv("MEDIAMTX_CONFIG_PATH")
+MEDIAMTX_RTSP_URL = os.getenv("MEDIAMTX_RTSP_URL", "rtsp://mediamtx:8554")
+MEDIAMTX_PUBLIC_HLS_URL = os.getenv("MEDIAMTX_PUBLIC_HLS_URL", "http://mediamtx:8888")
+
+# Paths published by the single node setup (ingest_gi.py without NODE_ID) and the simulators
+STATIC_PATHS = ["visual", "thermal"]
+
+# RTP payload type of the rtpSDP blocks, the dynamic one the edge payloaders use
+PAYLOAD_TYPE = 96
+
+
+def rtsp_url(stream_name: str) -> str:
+    return f"{MEDIAMTX_RTSP_URL}/{stream_name}"
+
+
+def hls_url(stream_name: str) -> str:
+    return f"{MEDIAMTX_PUBLIC_HLS_URL}/{stream_name}/index.m3u8"
+
+
+def render_paths(streams: Iterable[Stream]) -> str:
+    """The paths: section for the static paths plus one udp+rtp path per registered stream"""
+    lines = ["paths:"]
+    for name in STATIC_PATHS:
+        lines += [f"  {name}:", "    source: publisher"]
+    for stream in streams:
+        lines += [
+            f"  {stream.name}:",
+            f"    source: udp+rtp://0.0.0.0:{stream.rtp_port}",
+            "    rtpSDP: |",
+            "      v=0",
+            "      o=- 0 0 IN IP4 127.0.0.1",
+            f"      s={stream.name}",
+            "      c=IN IP4 0.0.0.0",
+            "      t=0 0",
+            f"      m=video {stream.rtp_port} RTP/AVP {PAYLOAD_TYPE}",
+            f"      a=rtpmap:{PAYLOAD_TYPE} {stream.codec}/90000",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def render_config(base: str, streams: Iterable[Stream]) -> str:
+    """base (a mediamtx.yml) with everything from its paths: line on replaced"""
+    kept = []
+    for line in base.splitlines():
+        if line.startswith("paths:"):
+            break
+        kept.append(line)
+    head = "\n".join(kept).rstrip("\n")
+    return (head + "\n\n" if head else "") + render_paths(streams)
+
+
+def write_config(streams: Iterable[Stream]) -> bool:
+    """Rewrite MEDIAMTX_CONFIG_PATH's paths for streams, False if not configured or failed.
+
+    Written in place rather than renamed over, the config is usually a single file bind mount
+    shared with the MediaMTX container and a rename would replace the backend's view only.
+    """
+    if not MEDIAMTX_CONFIG_PATH:
+        return False
+    path = Path(MEDIAMTX_CONFIG_PATH)
+    try:
+        config = render_config(path.read_text() if path.exists() else "", streams)
+        path.write_text(config)
+    except OSError as e:
+        logging.error(f"Failed to write MediaMTX config {path}: {str(e)}")
+        return False
+    return True
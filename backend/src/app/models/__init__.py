@@ -1,3 +1,18 @@
 from app.models.detection import Detection
+from app.models.detection_sketch import DetectionSketch, DetectionSketchDelta
+from app.models.detection_trace import DetectionTrace
+from app.models.edge_node import EdgeNode
+from app.models.incident import Incident
+from app.models.stream import Stream
+from app.models.track import Track
 
-__all__ = ["Detection"]
+__all__ = [
+    "Detection",
+    "DetectionSketch",
+    "DetectionSketchDelta",
+    "DetectionTrace",
+    "EdgeNode",
+    "Incident",
+    "Stream",
+    "Track",
+]
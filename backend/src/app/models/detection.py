@@ -1,4 +1,6 @@
-from sqlalchemy import Column, DateTime, Float, Integer, String, Text
+import uuid
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
@@ -8,7 +10,12 @@ from app.database.database import Base
 class Detection(Base):
     __tablename__ = "detections"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.uuid_generate_v4())
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        server_default=func.uuid_generate_v4(),
+    )
     detected_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     confidence = Column(Float, nullable=False)
     direction = Column(String(2))
@@ -18,6 +25,11 @@ class Detection(Base):
     fused_score = Column(Float, nullable=False)
     frame_snapshot_url = Column(Text)
     stream_name = Column(String(20))
+    track_id = Column(UUID(as_uuid=True), index=True)
+    track_event = Column(String(6))
+    incident_id = Column(UUID(as_uuid=True), index=True)
+    # Edge node that sent the detection, from the stream registry (see app/models/stream.py)
+    node_id = Column(String(12))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -34,6 +46,31 @@ class Detection(Base):
             "fused_score": self.fused_score,
             "frame_snapshot_url": self.frame_snapshot_url,
             "stream_name": self.stream_name,
+            "track_id": str(self.track_id) if self.track_id else None,
+            "track_event": self.track_event,
+            "incident_id": str(self.incident_id) if self.incident_id else None,
+            "node_id": self.node_id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+# Same indexes as sql/init.sql, so tables created by create_all() get them too
+Index("idx_detections_detected_at", Detection.detected_at.desc())
+Index("idx_detections_confidence", Detection.confidence.desc())
+Index("idx_detections_stream_detected_at", Detection.stream_name, Detection.detected_at.desc())
+Index("idx_detections_direction_detected_at", Detection.direction, Detection.detected_at.desc())
+Index("idx_detections_fused_score", Detection.fused_score.desc())
+Index("idx_detections_node_detected_at", Detection.node_id, Detection.detected_at.desc())
+Index(
+    "idx_detections_high_confidence",
+    Detection.detected_at.desc(),
+    postgresql_where=Detection.confidence >= 0.8,
+    sqlite_where=Detection.confidence >= 0.8,
+)
+Index(
+    "idx_detections_distance",
+    Detection.distance_ft,
+    postgresql_where=Detection.distance_ft.isnot(None),
+    sqlite_where=Detection.distance_ft.isnot(None),
+)
@@ -0,0 +1,52 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, LargeBinary, String
+from sqlalchemy.sql import func
+
+from app.database.database import Base
+
+
+class DetectionSketch(Base):
+    """Quantile sketches (serialized t-digests, see app.quantiles) of the scores of one stream's
+    detections in one time bucket, updated as detections are inserted.
+
+    Each detection is in two rows: its SKETCH_BUCKET_S bucket and its SKETCH_ROLLUP_S bucket.
+    Detections without a stream are kept under the empty stream name.
+    """
+
+    __tablename__ = "detection_sketches"
+
+    stream_name = Column(String(20), primary_key=True)
+    bucket_s = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    detection_count = Column(Integer, nullable=False, default=0)
+    confidence = Column(LargeBinary)
+    visual_confidence = Column(LargeBinary)
+    thermal_confidence = Column(LargeBinary)
+    fused_score = Column(LargeBinary)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DetectionSketchDelta(Base):
+    """Sketches of the detections one transaction inserted into one bucket, appended without
+    locking anything and folded into their DetectionSketch row by SketchRepository.compact()"""
+
+    __tablename__ = "detection_sketch_deltas"
+
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    stream_name = Column(String(20), nullable=False)
+    bucket_s = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    detection_count = Column(Integer, nullable=False)
+    confidence = Column(LargeBinary)
+    visual_confidence = Column(LargeBinary)
+    thermal_confidence = Column(LargeBinary)
+    fused_score = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+Index(
+    "idx_detection_sketch_deltas_bucket",
+    DetectionSketchDelta.stream_name,
+    DetectionSketchDelta.bucket_s,
+    DetectionSketchDelta.bucket_start,
+)
@@ -0,0 +1,54 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database.database import Base
+
+
+class DetectionTrace(Base):
+    """When a detection passed each hop from the sensor to the dashboard.
+
+    The edge hops are converted to the backend's clock by the edge before upload, using the
+    offset it estimated against GET /health/clock; clock_error_ms bounds how far off that can be.
+    """
+
+    __tablename__ = "detection_traces"
+
+    detection_id = Column(
+        UUID(as_uuid=True), ForeignKey("detections.id", ondelete="CASCADE"), primary_key=True
+    )
+    # edge: sensor capture (buffer PTS), appsink callback, inference, handed to the uploader
+    captured_at = Column(DateTime(timezone=True))
+    appsink_at = Column(DateTime(timezone=True))
+    inference_started_at = Column(DateTime(timezone=True))
+    inference_ended_at = Column(DateTime(timezone=True))
+    uploaded_at = Column(DateTime(timezone=True))
+    # backend: request received, detection committed, acknowledged by a dashboard
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    committed_at = Column(DateTime(timezone=True), nullable=False)
+    delivered_at = Column(DateTime(timezone=True))
+    clock_offset_ms = Column(Float)
+    clock_error_ms = Column(Float)
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "detection_id": str(self.detection_id),
+            "captured_at": self.captured_at.isoformat() if self.captured_at else None,
+            "appsink_at": self.appsink_at.isoformat() if self.appsink_at else None,
+            "inference_started_at": self.inference_started_at.isoformat()
+            if self.inference_started_at
+            else None,
+            "inference_ended_at": self.inference_ended_at.isoformat()
+            if self.inference_ended_at
+            else None,
+            "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
+            "received_at": self.received_at.isoformat() if self.received_at else None,
+            "committed_at": self.committed_at.isoformat() if self.committed_at else None,
+            "delivered_at": self.delivered_at.isoformat() if self.delivered_at else None,
+            "clock_offset_ms": self.clock_offset_ms,
+            "clock_error_ms": self.clock_error_ms,
+        }
+
+
+# Same indexes as sql/init.sql, so tables created by create_all() get them too
+Index("idx_detection_traces_received_at", DetectionTrace.received_at.desc())
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.database.database import Base
+
+
+class EdgeNode(Base):
+    __tablename__ = "edge_nodes"
+
+    # Chosen by the node (e.g. its hostname), so no server default here
+    id = Column(String(12), primary_key=True)
+    # Address the node last registered from
+    address = Column(String(45))
+    registered_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    streams = relationship(
+        "Stream", back_populates="node", order_by="Stream.name", cascade="all, delete-orphan"
+    )
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "id": self.id,
+            "address": self.address,
+            "registered_at": self.registered_at.isoformat() if self.registered_at else None,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,56 @@
+import uuid
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.database.database import Base
+
+
+class Incident(Base):
+    __tablename__ = "incidents"
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        server_default=func.uuid_generate_v4(),
+    )
+    stream_name = Column(String(20))
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    detection_count = Column(Integer, nullable=False, default=0)
+    peak_confidence = Column(Float)
+    peak_fused_score = Column(Float)
+    first_direction = Column(String(2))
+    last_direction = Column(String(2))
+    min_distance_ft = Column(Integer)
+    # snapshot of the highest fused score detection that had one, and that detection's score
+    snapshot_url = Column(Text)
+    snapshot_fused_score = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "id": str(self.id),
+            "stream_name": self.stream_name,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+            "detection_count": self.detection_count,
+            "peak_confidence": self.peak_confidence,
+            "peak_fused_score": self.peak_fused_score,
+            "first_direction": self.first_direction,
+            "last_direction": self.last_direction,
+            "min_distance_ft": self.min_distance_ft,
+            "snapshot_url": self.snapshot_url,
+            "snapshot_fused_score": self.snapshot_fused_score,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+# Same indexes as sql/init.sql, so tables created by create_all() get them too
+Index("idx_incidents_started_at", Incident.started_at.desc())
+Index("idx_incidents_stream_started_at", Incident.stream_name, Incident.started_at.desc())
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.database.database import Base
+
+
+class Stream(Base):
+    __tablename__ = "streams"
+
+    # "<node id>-<sensor>", also the MediaMTX path and the detections' stream_name
+    name = Column(String(20), primary_key=True)
+    node_id = Column(
+        String(12), ForeignKey("edge_nodes.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    sensor = Column(String(7), nullable=False)
+    # UDP port the node sends RTP to (RTCP on the next one), unique across nodes
+    rtp_port = Column(Integer, nullable=False, unique=True)
+    codec = Column(String(4), nullable=False, default="H264")
+    width = Column(Integer)
+    height = Column(Integer)
+    fps = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    node = relationship("EdgeNode", back_populates="streams")
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "name": self.name,
+            "node_id": self.node_id,
+            "sensor": self.sensor,
+            "rtp_port": self.rtp_port,
+            "codec": self.codec,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.fps,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.database.database import Base
+
+
+class Track(Base):
+    __tablename__ = "tracks"
+
+    # Track IDs are assigned by the edge tracker, so no server default here
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    stream_name = Column(String(20))
+    status = Column(String(10), nullable=False, default="active")
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True))
+    detection_count = Column(Integer, nullable=False, default=0)
+    peak_confidence = Column(Float)
+    peak_fused_score = Column(Float)
+    last_direction = Column(String(2))
+    last_distance_ft = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "id": str(self.id),
+            "stream_name": self.stream_name,
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+            "detection_count": self.detection_count,
+            "peak_confidence": self.peak_confidence,
+            "peak_fused_score": self.peak_fused_score,
+            "last_direction": self.last_direction,
+            "last_distance_ft": self.last_distance_ft,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
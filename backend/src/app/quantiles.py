@@ -0,0 +1,182 @@
+"""Mergeable quantile sketches (t-digest) of detection scores, for GET /detections/stats/quantiles.
+
+A t-digest summarises a distribution as a short sorted list of centroids (mean, weight). Centroids
+are kept small at the tails and large around the median (the k1 arcsine scale function), so
+extreme quantiles like p99 stay accurate with about ``compression / 2`` centroids whatever the
+number of values. Two digests merge by sorting their centroids together and compressing again, so
+a digest per stream and time bucket can be combined into any window's distribution without
+touching the detections.
+
+Values are buffered and compressed in bulk. A serialized digest is its count, min and max and the
+centroids (plus the values added since it was last compressed) as little endian float64 pairs.
+"""
+
+import math
+import os
+import struct
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+# centroids a digest is compressed to is about half of this; higher is more accurate and larger
+SKETCH_COMPRESSION = float(os.getenv("SKETCH_COMPRESSION", "100"))
+# width of the time buckets sketches are kept for, windows are rounded out to whole buckets
+SKETCH_BUCKET_S = int(os.getenv("SKETCH_BUCKET_S", "3600"))
+# sketches are also kept per rollup bucket (a multiple of SKETCH_BUCKET_S), so a long window
+# merges its whole rollup buckets and only the bucket sketches at its edges
+SKETCH_ROLLUP_S = int(os.getenv("SKETCH_ROLLUP_S", "86400"))
+
+# detection columns with a sketch, each a nullable column of DetectionSketch
+SKETCH_FIELDS = ["confidence", "visual_confidence", "thermal_confidence", "fused_score"]
+
+HEADER = struct.Struct("<Qdd")  # count, min, max
+
+
+def bucket_start(moment: datetime, bucket_s: int = SKETCH_BUCKET_S) -> datetime:
+    """Start of the bucket a moment falls in (naive moments are taken as UTC)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    seconds = math.floor(moment.timestamp() / bucket_s) * bucket_s
+    return datetime.fromtimestamp(seconds, UTC)
+
+
+def bucket_end(moment: datetime, bucket_s: int = SKETCH_BUCKET_S) -> datetime:
+    """End of the last bucket needed to cover everything before a moment"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    seconds = math.ceil(moment.timestamp() / bucket_s) * bucket_s
+    return datetime.fromtimestamp(seconds, UTC)
+
+
+def quantile_label(q: float) -> str:
+    """Response key of a quantile, 0.5 -> p50, 0.999 -> p99.9"""
+    return f"p{round(q * 100, 6):g}"
+
+
+class TDigest:
+    """Merging t-digest, see the module docstring"""
+
+    def __init__(self, compression: float = SKETCH_COMPRESSION):
+        self.compression = compression
+        self.means: list[float] = []
+        self.weights: list[float] = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        # (mean, weight) added since the last compression
+        self._buffer: list[tuple[float, float]] = []
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) > 10 * self.compression:
+            self.compress()
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TDigest"):
+        """Add another digest's centroids and buffered values"""
+        for mean, weight in (*zip(other.means, other.weights, strict=True), *other._buffer):
+            self.add(mean, weight)
+        # a centroid's mean isn't the smallest or largest value in it
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def merged(cls, digests: Iterable["TDigest"], compression: float = SKETCH_COMPRESSION):
+        """One digest of many, compressed once at the end"""
+        result = cls(compression)
+        for digest in digests:
+            if digest.count:
+                result._buffer.extend(zip(digest.means, digest.weights, strict=True))
+                result._buffer.extend(digest._buffer)
+                result.count += digest.count
+                result.min = min(result.min, digest.min)
+                result.max = max(result.max, digest.max)
+        result.compress()
+        return result
+
+    def _q_limit(self, q: float) -> float:
+        """Largest quantile a centroid starting at q may reach: one unit of k1 further"""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def compress(self):
+        if not self._buffer:
+            return
+        centroids = sorted([*zip(self.means, self.weights, strict=True), *self._buffer])
+        self._buffer = []
+        total = self.count
+        means, weights = [], []
+        mean, weight = centroids[0]
+        so_far = 0.0
+        limit = total * self._q_limit(0.0)
+        for next_mean, next_weight in centroids[1:]:
+            if so_far + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                so_far += weight
+                limit = total * self._q_limit(so_far / total)
+                mean, weight = next_mean, next_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated q-quantile (0-1), None for an empty digest"""
+        self.compress()
+        if not self.count:
+            return None
+        means, weights = self.means, self.weights
+        if len(means) == 1:
+            return means[0]
+        # centroid i covers its weight around its mean; interpolate between neighbouring means,
+        # and between min/max and the first/last mean at the ends
+        index = q * self.count
+        if index <= weights[0] / 2:
+            if weights[0] <= 1:
+                return self.min
+            return self.min + (means[0] - self.min) * index / (weights[0] / 2)
+        if index >= self.count - weights[-1] / 2:
+            if weights[-1] <= 1:
+                return self.max
+            return self.max - (self.max - means[-1]) * (self.count - index) / (weights[-1] / 2)
+        so_far = weights[0] / 2
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i + 1]) / 2
+            if so_far + step > index:
+                return means[i] + (means[i + 1] - means[i]) * (index - so_far) / step
+            so_far += step
+        return means[-1]
+
+    def to_bytes(self) -> bytes:
+        """Count, min, max and the centroids. Values added since the last compression are
+        written as they are until there are more than compression pairs, so adding a value or two
+        to a stored digest doesn't compress it every time."""
+        if len(self.means) + len(self._buffer) > self.compression:
+            self.compress()
+        pairs = [
+            value
+            for pair in (*zip(self.means, self.weights, strict=True), *self._buffer)
+            for value in pair
+        ]
+        return HEADER.pack(int(self.count), self.min, self.max) + struct.pack(
+            f"<{len(pairs)}d", *pairs
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes, compression: float = SKETCH_COMPRESSION) -> "TDigest":
+        digest = cls(compression)
+        digest.count, digest.min, digest.max = HEADER.unpack_from(data)
+        pairs = struct.unpack_from(f"<{(len(data) - HEADER.size) // 8}d", data, HEADER.size)
+        # possibly not in order, compressed (and sorted) before use
+        digest._buffer = list(zip(pairs[0::2], pairs[1::2], strict=True))
+        return digest
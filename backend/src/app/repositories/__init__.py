@@ -1,3 +1,15 @@
 from app.repositories.detection_repository import DetectionRepository
+from app.repositories.incident_repository import IncidentRepository
+from app.repositories.node_repository import NodeRepository
+from app.repositories.sketch_repository import SketchRepository
+from app.repositories.trace_repository import TraceRepository
+from app.repositories.track_repository import TrackRepository
 
-__all__ = ["DetectionRepository"]
+__all__ = [
+    "DetectionRepository",
+    "IncidentRepository",
+    "NodeRepository",
+    "SketchRepository",
+    "TraceRepository",
+    "TrackRepository",
+]
@@ -1,10 +1,19 @@
+import uuid
+from collections.abc import Iterator, Sequence
+from datetime import UTC, datetime
 from uuid import UUID
 
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import Column, RowMapping, asc, desc, func
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
 
-from app.database.schemas import DetectionCreate
+from app.database.schemas import DetectionCreate, DetectionFilters, DetectionTraceCreate
 from app.models.detection import Detection
+from app.repositories.incident_repository import IncidentRepository
+from app.repositories.node_repository import NodeRepository
+from app.repositories.sketch_repository import SketchRepository
+from app.repositories.trace_repository import TraceRepository
+from app.repositories.track_repository import TrackRepository
 
 
 class DetectionRepository:
@@ -13,14 +22,86 @@ class DetectionRepository:
     def __init__(self, db: Session):
         self.db = db
 
-    def create(self, detection: DetectionCreate) -> Detection:
-        """Create a new detection record"""
+    def create(self, detection: DetectionCreate, received_at: datetime | None = None) -> Detection:
+        """Create a new detection record, and its latency trace if it carries one"""
         db_detection = Detection(**detection.model_dump())
+        self._assign_nodes([db_detection])
+        traced = []
+        if detection.trace is not None:
+            db_detection.id = uuid.uuid4()
+            traced.append((db_detection.id, detection.trace, received_at))
         self.db.add(db_detection)
+        # stream first, then track and sketch rows, the order create_many locks them in
+        incidents = IncidentRepository(self.db)
+        incidents.lock_streams([db_detection.stream_name])
+        if db_detection.track_id is not None:
+            TrackRepository(self.db).apply_detection(db_detection)
+        incidents.apply_detection(db_detection)
+        SketchRepository(self.db).apply_detections([db_detection])
+        self._record_traces(traced)
         self.db.commit()
         self.db.refresh(db_detection)
         return db_detection
 
+    def create_many(
+        self,
+        detections: list[DetectionCreate],
+        received_at: datetime | list[datetime | None] | None = None,
+        ids: list[UUID] | None = None,
+    ) -> list[Detection]:
+        """Create several detection records and their latency traces in one transaction.
+
+        received_at is one time for the whole batch or one per detection (write-behind groups
+        detections received at different times), ids are assigned up front if given.
+        """
+        db_detections = [Detection(**detection.model_dump()) for detection in detections]
+        if ids is not None:
+            for db_detection, detection_id in zip(db_detections, ids, strict=True):
+                db_detection.id = detection_id
+        if not isinstance(received_at, list):
+            received_at = [received_at] * len(detections)
+        self._assign_nodes(db_detections)
+        traced = []
+        for db_detection, detection, received in zip(
+            db_detections, detections, received_at, strict=True
+        ):
+            if detection.trace is not None:
+                # known before the commit, reading it back after would reload every row
+                if db_detection.id is None:
+                    db_detection.id = uuid.uuid4()
+                traced.append((db_detection.id, detection.trace, received))
+        self.db.add_all(db_detections)
+        tracks = TrackRepository(self.db)
+        incidents = IncidentRepository(self.db)
+        incidents.lock_streams(db_detection.stream_name for db_detection in db_detections)
+        tracks.lock(db_detections)
+        for db_detection in db_detections:
+            if db_detection.track_id is not None:
+                tracks.apply_detection(db_detection)
+            incidents.apply_detection(db_detection)
+        SketchRepository(self.db).apply_detections(db_detections)
+        self._record_traces(traced)
+        self.db.commit()
+        return db_detections
+
+    def _assign_nodes(self, db_detections: list[Detection]) -> None:
+        """Tag detections of registered streams with their node, one lookup per call"""
+        node_ids = NodeRepository(self.db).node_ids(d.stream_name for d in db_detections)
+        if node_ids:
+            for db_detection in db_detections:
+                db_detection.node_id = node_ids.get(db_detection.stream_name)
+
+    def _record_traces(
+        self, traces: list[tuple[UUID, DetectionTraceCreate, datetime | None]]
+    ) -> None:
+        """Add the traces to the transaction, committed now: call right before the commit"""
+        if traces:
+            committed_at = datetime.now(UTC)
+            TraceRepository(self.db).record(
+                [(id_, trace, received_at or committed_at) for id_, trace, received_at in traces],
+                committed_at,
+            )
+
     def get_by_id(self, detection_id: UUID) -> Detection | None:
         """Get detection by ID"""
         return self.db.query(Detection).filter(Detection.id == detection_id).first()
@@ -35,6 +116,103 @@ class DetectionRepository:
             .all()
         )
 
+    def filtered_query(
+        self,
+        filters: DetectionFilters,
+        sort_by: str = "detected_at",
+        descending: bool = True,
+    ) -> Query:
+        """Query for the detections matching filters, in the requested order.
+
+        Kept to plain comparisons on indexed columns so Postgres can use the indexes in
+        init.sql (time range, stream + time, direction + time, high confidence, fused score).
+        """
+        query = self.db.query(Detection)
+        if filters.stream_name:
+            query = query.filter(Detection.stream_name == filters.stream_name)
+        if filters.node_id:
+            query = query.filter(Detection.node_id == filters.node_id)
+        if filters.start is not None:
+            query = query.filter(Detection.detected_at >= filters.start)
+        if filters.end is not None:
+            query = query.filter(Detection.detected_at < filters.end)
+        if filters.min_confidence is not None:
+            query = query.filter(Detection.confidence >= filters.min_confidence)
+        if filters.max_confidence is not None:
+            query = query.filter(Detection.confidence <= filters.max_confidence)
+        if filters.min_fused_score is not None:
+            query = query.filter(Detection.fused_score >= filters.min_fused_score)
+        if filters.max_fused_score is not None:
+            query = query.filter(Detection.fused_score <= filters.max_fused_score)
+        if filters.direction:
+            query = query.filter(Detection.direction.in_([str(d) for d in filters.direction]))
+        if filters.min_distance_ft is not None:
+            query = query.filter(Detection.distance_ft >= filters.min_distance_ft)
+        if filters.max_distance_ft is not None:
+            query = query.filter(Detection.distance_ft <= filters.max_distance_ft)
+
+        column = getattr(Detection, sort_by)
+        ordering = desc(column) if descending else asc(column)
+        # distance is optional, rows without one go last either way
+        if sort_by == "distance_ft":
+            ordering = ordering.nulls_last()
+        return query.order_by(ordering)
+
+    def search(
+        self,
+        filters: DetectionFilters,
+        sort_by: str = "detected_at",
+        descending: bool = True,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[Detection]:
+        """Get filtered, sorted detections with pagination"""
+        return self.filtered_query(filters, sort_by, descending).offset(skip).limit(limit).all()
+
+    def search_rows(
+        self,
+        filters: DetectionFilters,
+        columns: list[ColumnElement],
+        sort_by: str = "detected_at",
+        descending: bool = True,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[RowMapping]:
+        """Same as search(), as plain row mappings of the given columns (no ORM objects)"""
+        query = self.filtered_query(filters, sort_by, descending).with_entities(*columns)
+        return self.db.execute(query.offset(skip).limit(limit).statement).mappings().all()
+
+    def iter_partitions(
+        self,
+        filters: DetectionFilters,
+        columns: list[Column],
+        descending: bool = False,
+        batch_size: int = 5000,
+    ) -> Iterator[Sequence]:
+        """Stream the matching rows in time order as lists of at most batch_size plain rows.
+
+        Uses a server-side cursor on Postgres (yield_per implies stream_results), so memory
+        stays bounded by batch_size however many rows match.
+        """
+        query = self.filtered_query(filters, "detected_at", descending).with_entities(*columns)
+        result = self.db.execute(query.statement.execution_options(yield_per=batch_size))
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    def time_range(self, filters: DetectionFilters) -> tuple[int, datetime | None, datetime | None]:
+        """How many detections match filters, and the first and last one's time"""
+        query = (
+            self.filtered_query(filters)
+            .order_by(None)
+            .with_entities(
+                func.count(), func.min(Detection.detected_at), func.max(Detection.detected_at)
+            )
+        )
+        count, first, last = self.db.execute(query.statement).one()
+        return count, first, last
+
     def get_by_stream(self, stream_name: str, skip: int = 0, limit: int = 100) -> list[Detection]:
         """Get detections by stream name"""
         return (
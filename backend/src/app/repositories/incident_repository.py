@@ -0,0 +1,246 @@
+import os
+import uuid
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import RowMapping, desc, func, select
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.database.schemas import DirectionEnum
+from app.models.detection import Detection
+from app.models.incident import Incident
+from app.repositories.track_repository import _as_utc
+
+# Detections of a stream closer together than this belong to the same incident
+INCIDENT_GAP_S = float(os.getenv("INCIDENT_GAP_S", "60"))
+# Largest change of direction between consecutive detections of an incident, in compass
+# points (1 = 45 degrees, 4 = any)
+INCIDENT_MAX_TURN = int(os.getenv("INCIDENT_MAX_TURN", "1"))
+
+COMPASS = [direction.value for direction in DirectionEnum]
+# first key of the per stream advisory locks, so they can't collide with other advisory locks
+INCIDENT_LOCK_KEY = 0x1C1D
+
+
+def compass_turn(a: str | None, b: str | None) -> int:
+    """Compass points between two directions (0-4), 0 when either is unknown"""
+    if not a or not b:
+        return 0
+    steps = abs(COMPASS.index(a) - COMPASS.index(b)) % len(COMPASS)
+    return min(steps, len(COMPASS) - steps)
+
+
+class IncidentRepository:
+    """Repository for Incident operations.
+
+    Incidents are built incrementally: every inserted detection is folded into the latest
+    incident of its stream if it continues it (within the time gap and turning no more than
+    max_turn compass points), otherwise it opens a new incident. The latest incident of a
+    stream is looked up once per repository, so a batch costs one indexed lookup per stream
+    and no extra flushes; only detections arriving from before that incident look further
+    back.
+
+    On Postgres a transaction takes an advisory lock per stream (held until it ends) before
+    reading the stream's incidents, so concurrent inserts for a stream extend or open its
+    incidents one after the other instead of updating stale counts or both opening one. Callers
+    with several streams lock them up front with lock_streams(), which goes in sorted order so
+    two batches can't deadlock.
+    """
+
+    def __init__(
+        self, db: Session, gap_s: float = INCIDENT_GAP_S, max_turn: int = INCIDENT_MAX_TURN
+    ):
+        self.db = db
+        self.gap = timedelta(seconds=gap_s)
+        self.max_turn = max_turn
+        # most recent incident of each stream seen by this repository, looked up once
+        self._latest: dict[str | None, Incident | None] = {}
+        # last older incident a late detection went into, e.g. while backfilling in time order
+        self._earlier: dict[str | None, Incident] = {}
+        # streams locked in the current transaction
+        self._locked: set[str] = set()
+
+    def continues(self, incident: Incident, detection: Detection) -> bool:
+        """Whether a detection belongs to an existing incident"""
+        detected_at = _as_utc(detection.detected_at)
+        last_seen_at = _as_utc(incident.last_seen_at)
+        if detected_at > last_seen_at + self.gap:
+            return False
+        if detected_at < _as_utc(incident.started_at) - self.gap:
+            return False
+        # arrived late, inside the incident: its direction says nothing about continuity
+        if detected_at < last_seen_at:
+            return True
+        return compass_turn(incident.last_direction, detection.direction) <= self.max_turn
+
+    def lock_streams(self, stream_names: Iterable[str | None]) -> None:
+        """Lock the streams' incidents until the transaction ends (Postgres only, SQLite
+        serializes writers anyway)"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return
+        for name in sorted({name or "" for name in stream_names} - self._locked):
+            self.db.execute(
+                select(func.pg_advisory_xact_lock(INCIDENT_LOCK_KEY, func.hashtext(name)))
+            )
+            self._locked.add(name)
+
+    def latest(self, stream_name: str | None) -> Incident | None:
+        """Most recent incident of a stream (a stream's incidents don't overlap much, so the
+        last one to start)"""
+        if stream_name not in self._latest:
+            self.lock_streams([stream_name])
+            self._latest[stream_name] = (
+                self.db.query(Incident)
+                .filter(Incident.stream_name == stream_name)
+                .order_by(desc(Incident.started_at))
+                .populate_existing()
+                .first()
+            )
+        return self._latest[stream_name]
+
+    def _find_earlier(self, stream_name: str | None, detected_at: datetime) -> Incident | None:
+        """Last incident of the stream to start before detected_at (plus the gap)"""
+        return (
+            self.db.query(Incident)
+            .filter(
+                Incident.stream_name == stream_name,
+                Incident.started_at <= detected_at + self.gap,
+            )
+            .order_by(desc(Incident.started_at))
+            .first()
+        )
+
+    def apply_detection(self, detection: Detection) -> Incident:
+        """Attach a detection to its incident, opening one if needed (does not commit)"""
+        stream_name = detection.stream_name
+        latest = self.latest(stream_name)
+        incident = None
+        if latest is not None:
+            if self.continues(latest, detection):
+                incident = latest
+            elif _as_utc(detection.detected_at) < _as_utc(latest.started_at):
+                # late arrival from before the latest incident, only then look further back
+                earlier = self._earlier.get(stream_name)
+                if earlier is None or not self.continues(earlier, detection):
+                    earlier = self._find_earlier(stream_name, detection.detected_at)
+                if earlier is not None and self.continues(earlier, detection):
+                    incident = earlier
+        if incident is None:
+            incident = Incident(
+                id=uuid.uuid4(),
+                stream_name=stream_name,
+                started_at=detection.detected_at,
+                last_seen_at=detection.detected_at,
+                detection_count=0,
+                first_direction=detection.direction,
+            )
+            self.db.add(incident)
+            if latest is None or _as_utc(detection.detected_at) >= _as_utc(latest.last_seen_at):
+                self._latest[stream_name] = incident
+        if incident is not self._latest[stream_name]:
+            self._earlier[stream_name] = incident
+
+        detected_at = _as_utc(detection.detected_at)
+        incident.detection_count += 1
+        if detected_at < _as_utc(incident.started_at):
+            incident.started_at = detection.detected_at
+            incident.first_direction = detection.direction or incident.first_direction
+        if detected_at >= _as_utc(incident.last_seen_at):
+            incident.last_seen_at = detection.detected_at
+            incident.last_direction = detection.direction or incident.last_direction
+        if detection.distance_ft is not None:
+            incident.min_distance_ft = (
+                detection.distance_ft
+                if incident.min_distance_ft is None
+                else min(incident.min_distance_ft, detection.distance_ft)
+            )
+        incident.peak_confidence = max(incident.peak_confidence or 0.0, detection.confidence)
+        # compared with the kept snapshot's score, the peak may be a detection without one
+        if detection.frame_snapshot_url and (
+            incident.snapshot_url is None
+            or detection.fused_score > (incident.snapshot_fused_score or 0.0)
+        ):
+            incident.snapshot_url = detection.frame_snapshot_url
+            incident.snapshot_fused_score = detection.fused_score
+        incident.peak_fused_score = max(incident.peak_fused_score or 0.0, detection.fused_score)
+
+        detection.incident_id = incident.id
+        return incident
+
+    def backfill(self, batch_size: int = 5000) -> int:
+        """Group detections stored without an incident, oldest first. Returns how many."""
+        total = 0
+        while True:
+            batch = (
+                self.db.query(Detection)
+                .filter(Detection.incident_id.is_(None))
+                .order_by(Detection.detected_at)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                return total
+            self.lock_streams(detection.stream_name for detection in batch)
+            for detection in batch:
+                self.apply_detection(detection)
+            self.db.commit()
+            # the locks went with the commit, ingest may have moved the streams on meanwhile
+            self._locked.clear()
+            self._latest.clear()
+            self._earlier.clear()
+            total += len(batch)
+
+    def get_by_id(self, incident_id: UUID) -> Incident | None:
+        """Get incident by ID"""
+        return self.db.get(Incident, incident_id)
+
+    def _list_query(
+        self, stream_name: str | None, start: datetime | None, end: datetime | None
+    ) -> Query:
+        query = self.db.query(Incident)
+        if stream_name:
+            query = query.filter(Incident.stream_name == stream_name)
+        # incidents overlapping [start, end)
+        if start is not None:
+            query = query.filter(Incident.last_seen_at >= start)
+        if end is not None:
+            query = query.filter(Incident.started_at < end)
+        return query.order_by(desc(Incident.started_at))
+
+    def get_all(
+        self,
+        stream_name: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[Incident]:
+        """Get incidents, most recent first"""
+        return self._list_query(stream_name, start, end).offset(skip).limit(limit).all()
+
+    def get_all_rows(
+        self,
+        columns: list[ColumnElement],
+        stream_name: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[RowMapping]:
+        """Same as get_all(), as plain row mappings of the given columns"""
+        query = self._list_query(stream_name, start, end).with_entities(*columns)
+        return self.db.execute(query.offset(skip).limit(limit).statement).mappings().all()
+
+    def get_detection_rows(
+        self, incident_id: UUID, columns: list[ColumnElement], skip: int = 0, limit: int = 100
+    ) -> list[RowMapping]:
+        """Detections grouped into an incident in time order, as plain row mappings"""
+        query = (
+            self.db.query(Detection)
+            .filter(Detection.incident_id == incident_id)
+            .order_by(Detection.detected_at)
+            .with_entities(*columns)
+        )
+        return self.db.execute(query.offset(skip).limit(limit).statement).mappings().all()
@@ -0,0 +1,124 @@
+import os
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+
+from app.database.schemas import NodeRegister
+from app.models.edge_node import EdgeNode
+from app.models.stream import Stream
+
+# UDP range handed out to the nodes' streams, an even RTP port each with RTCP on the next one.
+# MediaMTX has to be reachable on the whole range (see docker-compose-dev.yml).
+NODE_PORT_BASE = int(os.getenv("NODE_PORT_BASE", "5000"))
+NODE_PORT_MAX = int(os.getenv("NODE_PORT_MAX", "5999"))
+
+# Concurrent registrations can pick the same free port, the unique constraint rejects all but one
+REGISTER_ATTEMPTS = 3
+
+
+class NoFreePortError(Exception):
+    """Every RTP port in NODE_PORT_BASE..NODE_PORT_MAX is assigned"""
+
+
+class NodeRepository:
+    """Repository for edge node registration and the stream registry.
+
+    A stream is one sensor of one node, named "<node id>-<sensor>". Registering is idempotent:
+    a node that comes back (reboot, network change) keeps its streams and ports, so MediaMTX
+    and the viewers don't notice; sensors it no longer announces are dropped and their ports
+    freed.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def register(self, node: NodeRegister, address: str | None = None) -> EdgeNode:
+        """Create or refresh a node and assign a port to each of its sensors"""
+        for attempt in range(REGISTER_ATTEMPTS):
+            try:
+                return self._register(node, address)
+            except IntegrityError:
+                self.db.rollback()
+                if attempt == REGISTER_ATTEMPTS - 1:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _register(self, node: NodeRegister, address: str | None) -> EdgeNode:
+        now = datetime.now(UTC)
+        db_node = self.get_by_id(node.node_id)
+        if db_node is None:
+            db_node = EdgeNode(id=node.node_id, registered_at=now)
+            self.db.add(db_node)
+        db_node.address = address
+        db_node.last_seen_at = now
+
+        announced = {f"{node.node_id}-{sensor.name}": sensor for sensor in node.sensors}
+        for stream in list(db_node.streams):
+            if stream.name not in announced:
+                db_node.streams.remove(stream)
+        # dropped streams' ports are free for the new ones
+        self.db.flush()
+
+        existing = {stream.name: stream for stream in db_node.streams}
+        for name, sensor in announced.items():
+            stream = existing.get(name)
+            if stream is None:
+                stream = Stream(name=name, sensor=sensor.name, rtp_port=self._free_port())
+                db_node.streams.append(stream)
+            stream.codec = sensor.codec
+            stream.width = sensor.width
+            stream.height = sensor.height
+            stream.fps = sensor.fps
+            self.db.flush()
+        self.db.commit()
+        self.db.refresh(db_node)
+        return db_node
+
+    def _free_port(self) -> int:
+        """Lowest even port in the range no stream has, including ones flushed but uncommitted"""
+        used = {port for (port,) in self.db.query(Stream.rtp_port)}
+        start = NODE_PORT_BASE + NODE_PORT_BASE % 2
+        for port in range(start, NODE_PORT_MAX, 2):
+            if port not in used:
+                return port
+        raise NoFreePortError(f"No free RTP port in {NODE_PORT_BASE}-{NODE_PORT_MAX}")
+
+    def get_by_id(self, node_id: str) -> EdgeNode | None:
+        """Get a node by ID"""
+        return self.db.query(EdgeNode).filter(EdgeNode.id == node_id).first()
+
+    def get_all(self) -> list[EdgeNode]:
+        """All registered nodes with their streams, by ID"""
+        return (
+            self.db.query(EdgeNode)
+            .options(selectinload(EdgeNode.streams))
+            .order_by(EdgeNode.id)
+            .all()
+        )
+
+    def delete(self, node_id: str) -> bool:
+        """Unregister a node, its streams and ports go with it"""
+        db_node = self.get_by_id(node_id)
+        if db_node is None:
+            return False
+        self.db.delete(db_node)
+        self.db.commit()
+        return True
+
+    def get_streams(self) -> list[Stream]:
+        """Every registered stream, by name"""
+        return self.db.query(Stream).order_by(Stream.name).all()
+
+    def get_stream(self, name: str) -> Stream | None:
+        """Get a registered stream by name"""
+        return self.db.query(Stream).filter(Stream.name == name).first()
+
+    def node_ids(self, stream_names: Iterable[str | None]) -> dict[str, str]:
+        """Stream name -> node ID for the registered ones among stream_names"""
+        names = {name for name in stream_names if name}
+        if not names:
+            return {}
+        rows = self.db.query(Stream.name, Stream.node_id).filter(Stream.name.in_(names))
+        return dict(rows.all())
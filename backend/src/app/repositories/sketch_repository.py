@@ -0,0 +1,237 @@
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlalchemy import and_, delete, or_, select, tuple_, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.detection import Detection
+from app.models.detection_sketch import DetectionSketch, DetectionSketchDelta
+from app.quantiles import (
+    SKETCH_BUCKET_S,
+    SKETCH_FIELDS,
+    SKETCH_ROLLUP_S,
+    TDigest,
+    bucket_end,
+    bucket_start,
+)
+from app.repositories.track_repository import INSERTS, _as_utc
+
+# (stream_name, bucket_s, bucket_start) of a sketch row
+SketchKey = tuple[str, int, datetime]
+
+
+class SketchRepository:
+    """Repository for DetectionSketch operations.
+
+    Every inserted detection is added to the sketches of its stream's bucket and rollup bucket,
+    so a window's distributions come from merging a few sketches instead of reading its
+    detections. The inserting transaction only appends a DetectionSketchDelta row per bucket
+    with the sketches of its own detections, so concurrent inserts into one bucket don't wait
+    for each other or touch a shared row. compact(), run every few seconds by the backend,
+    claims the pending deltas with DELETE ... RETURNING and folds them into the DetectionSketch
+    rows, which it reads and locks in one SELECT ... FOR UPDATE (Postgres), in key order, after
+    creating missing ones with INSERT ... ON CONFLICT DO NOTHING. Reads merge the rows and the
+    pending deltas in one statement, so they are exact however far compaction is behind.
+
+    Sketches only ever grow: deleting detections doesn't take them out, rebuild() does.
+    """
+
+    def __init__(
+        self, db: Session, bucket_s: int = SKETCH_BUCKET_S, rollup_s: int = SKETCH_ROLLUP_S
+    ):
+        self.db = db
+        self.bucket_s = bucket_s
+        self.rollup_s = rollup_s
+
+    def _digests(
+        self, detections: Sequence[Detection]
+    ) -> dict[SketchKey, tuple[int, dict[str, TDigest]]]:
+        """Detection count and a digest of each field per bucket the detections fall in"""
+        groups: dict[SketchKey, list[Detection]] = defaultdict(list)
+        for detection in detections:
+            for width in dict.fromkeys((self.bucket_s, self.rollup_s)):
+                start = bucket_start(detection.detected_at, width)
+                groups[(detection.stream_name or "", width, start)].append(detection)
+        parts = {}
+        for key, group in groups.items():
+            digests = {}
+            for field in SKETCH_FIELDS:
+                values = [getattr(d, field) for d in group if getattr(d, field) is not None]
+                if values:
+                    digests[field] = TDigest()
+                    digests[field].extend(values)
+            parts[key] = (len(group), digests)
+        return parts
+
+    def apply_detections(self, detections: Sequence[Detection]) -> None:
+        """Append the sketches of detections (or rows with their columns) as one delta per
+        bucket (does not commit)"""
+        self.db.add_all(
+            DetectionSketchDelta(
+                stream_name=name,
+                bucket_s=width,
+                bucket_start=start,
+                detection_count=count,
+                **{field: digest.to_bytes() for field, digest in digests.items()},
+            )
+            for (name, width, start), (count, digests) in sorted(self._digests(detections).items())
+        )
+
+    def compact(self, limit: int = 10000) -> int:
+        """Fold up to limit pending deltas, oldest first, into their sketches and commit.
+        Returns how many there were. Concurrent compactions don't take the same deltas: the
+        DELETE claims them, and a second one waits for the first and finds them gone."""
+        oldest = select(DetectionSketchDelta.id).order_by(DetectionSketchDelta.id).limit(limit)
+        deltas = self.db.execute(
+            delete(DetectionSketchDelta)
+            .where(DetectionSketchDelta.id.in_(oldest.scalar_subquery()))
+            .returning(*self._columns(DetectionSketchDelta), DetectionSketchDelta.bucket_s)
+            .execution_options(synchronize_session=False)
+        ).all()
+        parts: dict[SketchKey, tuple[int, dict[str, TDigest]]] = {}
+        for delta in deltas:
+            key = (delta.stream_name, delta.bucket_s, _as_utc(delta.bucket_start))
+            count, digests = parts.get(key, (0, {}))
+            for field in SKETCH_FIELDS:
+                if getattr(delta, field):
+                    digest = TDigest.from_bytes(getattr(delta, field))
+                    digests.setdefault(field, TDigest()).merge(digest)
+            parts[key] = (count + delta.detection_count, digests)
+        if parts:
+            self._fold(parts)
+        self.db.commit()
+        return len(deltas)
+
+    def _fold(self, parts: dict[SketchKey, tuple[int, dict[str, TDigest]]]) -> None:
+        """Add counts and digests to their sketch rows, locked in key order (does not commit)"""
+        keys = sorted(parts)
+        sketches = self._locked(keys)
+        missing = [key for key in keys if key not in sketches]
+        if missing:
+            # a stream's first detections in a bucket, another compaction may be creating it too
+            insert = INSERTS[self.db.get_bind().dialect.name]
+            self.db.execute(
+                insert(DetectionSketch)
+                .values(
+                    [
+                        {"stream_name": name, "bucket_s": width, "bucket_start": start}
+                        for name, width, start in missing
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+            sketches.update(self._locked(missing))
+        for key in keys:
+            (count, digests), sketch = parts[key], sketches[key]
+            for field, digest in digests.items():
+                stored = getattr(sketch, field)
+                merged = TDigest.from_bytes(stored) if stored else TDigest()
+                merged.merge(digest)
+                setattr(sketch, field, merged.to_bytes())
+            sketch.detection_count += count
+
+    def _locked(self, keys: list[SketchKey]) -> dict[SketchKey, DetectionSketch]:
+        """The existing rows of keys, locked in key order (FOR UPDATE is ignored on SQLite)"""
+        sketches = (
+            self.db.query(DetectionSketch)
+            .filter(
+                tuple_(
+                    DetectionSketch.stream_name,
+                    DetectionSketch.bucket_s,
+                    DetectionSketch.bucket_start,
+                ).in_(keys)
+            )
+            .order_by(
+                DetectionSketch.stream_name, DetectionSketch.bucket_s, DetectionSketch.bucket_start
+            )
+            .with_for_update()
+            .populate_existing()
+        )
+        return {
+            (sketch.stream_name, sketch.bucket_s, _as_utc(sketch.bucket_start)): sketch
+            for sketch in sketches
+        }
+
+    @staticmethod
+    def _columns(model) -> list[ColumnElement]:
+        """Columns of a sketch row or delta that merged() and compact() read"""
+        return [model.stream_name, model.bucket_start, model.detection_count] + [
+            getattr(model, field) for field in SKETCH_FIELDS
+        ]
+
+    def _window(self, model, start: datetime | None, end: datetime | None) -> ColumnElement[bool]:
+        """Rows of model (sketches or deltas) covering [start, end) (on bucket boundaries)
+        exactly once: the rollup buckets inside it and the buckets at its edges"""
+        width, begins = model.bucket_s, model.bucket_start
+        inner_start = bucket_end(start, self.rollup_s) if start is not None else None
+        inner_end = bucket_start(end, self.rollup_s) if end is not None else None
+        if inner_start is not None and inner_end is not None and inner_start >= inner_end:
+            # no whole rollup bucket inside
+            return and_(width == self.bucket_s, begins >= start, begins < end)
+        conditions = [width == self.rollup_s]
+        if inner_start is not None:
+            conditions.append(begins >= inner_start)
+        if inner_end is not None:
+            conditions.append(begins < inner_end)
+        window = [and_(*conditions)]
+        if inner_start is not None:
+            window.append(and_(width == self.bucket_s, begins >= start, begins < inner_start))
+        if inner_end is not None:
+            window.append(and_(width == self.bucket_s, begins >= inner_end, begins < end))
+        return or_(*window)
+
+    def merged(
+        self, stream_name: str | None, start: datetime | None, end: datetime | None
+    ) -> dict[str, tuple[int, dict[str, TDigest]]]:
+        """Per stream detection count and merged digest of each field over [start, end), which
+        must be on bucket boundaries (None for unbounded)"""
+        queries = []
+        for model in (DetectionSketch, DetectionSketchDelta):
+            query = select(*self._columns(model)).where(self._window(model, start, end))
+            if stream_name is not None:
+                query = query.where(model.stream_name == stream_name)
+            queries.append(query)
+        # one statement, so a compaction committing meanwhile can't move deltas out of sight
+        streams: dict[str, list] = defaultdict(list)
+        for row in self.db.execute(union_all(*queries)):
+            streams[row.stream_name].append(row)
+        return {
+            name: (
+                sum(row.detection_count for row in rows),
+                {
+                    field: TDigest.merged(
+                        TDigest.from_bytes(getattr(row, field))
+                        for row in rows
+                        if getattr(row, field)
+                    )
+                    for field in SKETCH_FIELDS
+                },
+            )
+            for name, rows in sorted(streams.items())
+        }
+
+    def rebuild(self, batch_size: int = 5000) -> int:
+        """Recompute every sketch from the detections table in one transaction, streaming the
+        detections in time order. Returns how many there were."""
+        self.db.execute(delete(DetectionSketchDelta))
+        self.db.execute(delete(DetectionSketch))
+        columns = [Detection.stream_name, Detection.detected_at] + [
+            getattr(Detection, field) for field in SKETCH_FIELDS
+        ]
+        query = select(*columns).order_by(Detection.detected_at)
+        result = self.db.execute(query.execution_options(yield_per=batch_size))
+        total = 0
+        try:
+            for partition in result.partitions():
+                self._fold(self._digests(partition))
+                # finished buckets needn't stay in the session, a bucket spanning two
+                # partitions is read back
+                self.db.flush()
+                self.db.expunge_all()
+                total += len(partition)
+        finally:
+            result.close()
+        self.db.commit()
+        return total
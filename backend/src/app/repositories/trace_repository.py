@@ -0,0 +1,91 @@
+from datetime import UTC, datetime
+from uuid import UUID
+
+from sqlalchemy import RowMapping, desc, insert, update
+from sqlalchemy.orm import Session
+
+from app.database.schemas import DetectionTraceCreate
+from app.latency import TRACE_TIMES
+from app.models.detection import Detection
+from app.models.detection_trace import DetectionTrace
+
+
+class TraceRepository:
+    """Repository for DetectionTrace operations"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(
+        self,
+        traces: list[tuple[UUID, DetectionTraceCreate, datetime]],
+        committed_at: datetime,
+    ) -> None:
+        """Store the traces of detections in the detections' transaction, with their backend
+        hops (does not commit).
+
+        Each trace comes with its detection's ID and when the backend received it. Called last
+        before the commit, with committed_at stamped then, so a trace can't fail on its own
+        after its detection committed. One multi-row insert for the batch.
+        """
+        if not traces:
+            return
+        # the detections go in first, the traces reference them
+        self.db.flush()
+        self.db.execute(
+            insert(DetectionTrace),
+            [
+                {
+                    "detection_id": detection_id,
+                    **trace.model_dump(),
+                    "received_at": received_at,
+                    "committed_at": committed_at,
+                }
+                for detection_id, trace, received_at in traces
+            ],
+        )
+
+    def get_by_detection(self, detection_id: UUID) -> DetectionTrace | None:
+        """Get the trace of a detection"""
+        return (
+            self.db.query(DetectionTrace)
+            .filter(DetectionTrace.detection_id == detection_id)
+            .first()
+        )
+
+    def mark_delivered(
+        self, detection_ids: list[UUID], delivered_at: datetime | None = None
+    ) -> int:
+        """Stamp the first delivery to a dashboard, later acknowledgements don't move it"""
+        result = self.db.execute(
+            update(DetectionTrace)
+            .where(
+                DetectionTrace.detection_id.in_(detection_ids),
+                DetectionTrace.delivered_at.is_(None),
+            )
+            .values(delivered_at=delivered_at or datetime.now(UTC))
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def get_rows(
+        self,
+        stream_name: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        limit: int = 10000,
+    ) -> list[RowMapping]:
+        """Timestamps of the most recently received traces, newest first"""
+        query = self.db.query(
+            *(getattr(DetectionTrace, name) for name in TRACE_TIMES), DetectionTrace.clock_error_ms
+        )
+        if stream_name:
+            query = query.join(Detection, Detection.id == DetectionTrace.detection_id).filter(
+                Detection.stream_name == stream_name
+            )
+        if start is not None:
+            query = query.filter(DetectionTrace.received_at >= start)
+        if end is not None:
+            query = query.filter(DetectionTrace.received_at < end)
+        query = query.order_by(desc(DetectionTrace.received_at)).limit(limit)
+        return self.db.execute(query.statement).mappings().all()
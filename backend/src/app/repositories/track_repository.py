@@ -0,0 +1,142 @@
+from collections.abc import Sequence
+from datetime import UTC, datetime
+from uuid import UUID
+
+from sqlalchemy import RowMapping, desc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.detection import Detection
+from app.models.track import Track
+
+INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite hands timestamps back naive, Postgres hands them back aware"""
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+class TrackRepository:
+    """Repository for Track summary operations.
+
+    A transaction locks the tracks it updates (SELECT ... FOR UPDATE on Postgres, in id order)
+    before reading them, so concurrent detections of a track count one after the other. A
+    track's first detection creates its row with INSERT ... ON CONFLICT DO NOTHING first, so two
+    transactions starting the same track don't fail.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        # tracks locked in the current transaction
+        self._locked: dict[UUID, Track] = {}
+
+    def lock(self, detections: Sequence[Detection]) -> None:
+        """Create the missing tracks of detections and lock them all (does not commit)"""
+        first: dict[UUID, Detection] = {}
+        for detection in detections:
+            if detection.track_id is not None and detection.track_id not in self._locked:
+                first.setdefault(detection.track_id, detection)
+        if not first:
+            return
+        ids = sorted(first)
+        insert = INSERTS[self.db.get_bind().dialect.name]
+        self.db.execute(
+            insert(Track)
+            .values(
+                [
+                    {
+                        "id": track_id,
+                        "stream_name": first[track_id].stream_name,
+                        "status": "active",
+                        "started_at": first[track_id].detected_at,
+                        "last_seen_at": first[track_id].detected_at,
+                        "detection_count": 0,
+                    }
+                    for track_id in ids
+                ]
+            )
+            .on_conflict_do_nothing()
+        )
+        tracks = (
+            self.db.query(Track)
+            .filter(Track.id.in_(ids))
+            .order_by(Track.id)
+            .with_for_update()
+            .populate_existing()
+        )
+        self._locked.update((track.id, track) for track in tracks)
+
+    def apply_detection(self, detection: Detection) -> Track:
+        """Fold a tracked detection into its track summary (does not commit)"""
+        self.lock([detection])
+        track = self._locked[detection.track_id]
+
+        detected_at = _as_utc(detection.detected_at)
+        track.detection_count += 1
+        if detected_at < _as_utc(track.started_at):
+            track.started_at = detection.detected_at
+        if detected_at >= _as_utc(track.last_seen_at):
+            track.last_seen_at = detection.detected_at
+            track.last_direction = detection.direction or track.last_direction
+            if detection.distance_ft is not None:
+                track.last_distance_ft = detection.distance_ft
+        track.peak_confidence = max(track.peak_confidence or 0.0, detection.confidence)
+        track.peak_fused_score = max(track.peak_fused_score or 0.0, detection.fused_score)
+        if detection.track_event == "end":
+            track.status = "ended"
+            track.ended_at = detection.detected_at
+        return track
+
+    def get_by_id(self, track_id: UUID) -> Track | None:
+        """Get track by ID"""
+        return self.db.get(Track, track_id)
+
+    def _list_query(self, stream_name: str | None, active_only: bool) -> Query:
+        query = self.db.query(Track)
+        if stream_name:
+            query = query.filter(Track.stream_name == stream_name)
+        if active_only:
+            query = query.filter(Track.status == "active")
+        return query.order_by(desc(Track.last_seen_at))
+
+    def get_all(
+        self,
+        stream_name: str | None = None,
+        active_only: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[Track]:
+        """Get tracks, most recently seen first"""
+        return self._list_query(stream_name, active_only).offset(skip).limit(limit).all()
+
+    def get_all_rows(
+        self,
+        columns: list[ColumnElement],
+        stream_name: str | None = None,
+        active_only: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> list[RowMapping]:
+        """Same as get_all(), as plain row mappings of the given columns"""
+        query = self._list_query(stream_name, active_only).with_entities(*columns)
+        return self.db.execute(query.offset(skip).limit(limit).statement).mappings().all()
+
+    def _detections_query(self, track_id: UUID) -> Query:
+        return (
+            self.db.query(Detection)
+            .filter(Detection.track_id == track_id)
+            .order_by(Detection.detected_at)
+        )
+
+    def get_detections(self, track_id: UUID, skip: int = 0, limit: int = 100) -> list[Detection]:
+        """Get the detections reported for a track, in time order"""
+        return self._detections_query(track_id).offset(skip).limit(limit).all()
+
+    def get_detection_rows(
+        self, track_id: UUID, columns: list[ColumnElement], skip: int = 0, limit: int = 100
+    ) -> list[RowMapping]:
+        """Same as get_detections(), as plain row mappings of the given columns"""
+        query = self._detections_query(track_id).with_entities(*columns)
+        return self.db.execute(query.offset(skip).limit(limit).statement).mappings().all()
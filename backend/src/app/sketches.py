@@ -0,0 +1,85 @@
+"""Compact and rebuild the score quantile sketches behind GET /detections/stats/quantiles.
+
+Inserts append their detections' sketches as deltas, and the backend's SketchCompactor folds
+them into the per bucket sketches every ``SKETCH_COMPACT_S`` seconds.
+
+Rebuilding is only needed for a database that predates the sketches, after deleting detections
+(sketches don't forget) or after changing SKETCH_BUCKET_S or SKETCH_ROLLUP_S. It runs in one
+transaction, best with ingest stopped:
+
+    python -m app.sketches [--batch-size 5000]
+"""
+
+import argparse
+import logging
+import os
+import threading
+
+from app.database.database import Base, SessionLocal, engine
+from app.repositories import SketchRepository
+
+logger = logging.getLogger(__name__)
+
+SKETCH_COMPACT_S = float(os.getenv("SKETCH_COMPACT_S", "5"))
+# deltas folded per transaction
+SKETCH_COMPACT_BATCH = 10000
+
+
+class SketchCompactor:
+    """Thread that folds pending sketch deltas into the sketches every interval, and once more
+    when stopped. Several backend processes can each run one."""
+
+    def __init__(self, session_factory=SessionLocal, interval_s: float = SKETCH_COMPACT_S):
+        self.session_factory = session_factory
+        self.interval_s = interval_s
+        self.compacted = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sketch-compactor", daemon=True)
+
+    def start(self) -> "SketchCompactor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.compact()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.compact()
+
+    def compact(self) -> int:
+        """Fold every pending delta, a batch per transaction. Returns how many."""
+        folded = 0
+        try:
+            with self.session_factory() as db:
+                repo = SketchRepository(db)
+                while (count := repo.compact(SKETCH_COMPACT_BATCH)) > 0:
+                    folded += count
+                    if count < SKETCH_COMPACT_BATCH:
+                        break
+        except Exception:
+            # the deltas stay (the failed transaction rolled back), reads still count them
+            logger.exception("Sketch compaction failed")
+        self.compacted += folded
+        return folded
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Rebuild the detection score sketches")
+    parser.add_argument("--batch-size", type=int, default=5000, help="detections per fetch")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        added = SketchRepository(db).rebuild(args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Rebuilt the sketches from {added} detections")
+
+
+if __name__ == "__main__":
+    main()
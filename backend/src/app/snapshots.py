@@ -0,0 +1,251 @@
+"""Detection snapshots for GET /snapshots/{id}, resized on demand and cached on disk.
+
+Detections point at their frame with ``frame_snapshot_url``: ``s3://bucket/key`` or an
+``http(s)://`` URL. S3 URLs are read from ``SNAPSHOT_STORE``, a directory laid out as
+``<bucket>/<key>`` that stands in for the object store. HTTP URLs are fetched only from the
+hosts in ``SNAPSHOT_HTTP_HOSTS`` (none by default), redirects only to those hosts, and only
+image responses are served: the URL comes from whoever posted the detection, so it mustn't be
+a way to read internal services through the backend.
+
+Thumbnails are JPEGs scaled to one of ``SNAPSHOT_WIDTHS``, generated with Pillow (the
+``snapshots`` extra) in a pool of ``SNAPSHOT_WORKERS`` threads, so resizing never blocks the
+event loop. Concurrent requests for the same variant share one fetch and resize. Originals and
+variants are kept in a disk cache of at most ``SNAPSHOT_CACHE_MB`` under ``SNAPSHOT_CACHE_DIR``,
+evicting the least recently used files. Recency is the files' mtime, so it survives restarts.
+
+A snapshot never changes once written, so a variant's ETag is derived from its URL and width.
+A matching If-None-Match is answered without fetching anything.
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import httpx
+
+SNAPSHOT_STORE = os.getenv("SNAPSHOT_STORE", "snapshots")
+SNAPSHOT_CACHE_DIR = os.getenv(
+    "SNAPSHOT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "snapshot-cache")
+)
+SNAPSHOT_CACHE_MB = float(os.getenv("SNAPSHOT_CACHE_MB", "256"))
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", "2"))
+SNAPSHOT_WIDTHS = [int(w) for w in os.getenv("SNAPSHOT_WIDTHS", "160,320,640,1280").split(",")]
+SNAPSHOT_QUALITY = int(os.getenv("SNAPSHOT_QUALITY", "85"))
+SNAPSHOT_FETCH_TIMEOUT_S = float(os.getenv("SNAPSHOT_FETCH_TIMEOUT_S", "10"))
+# hosts (or host:port) http(s) snapshot URLs may point at, comma separated
+SNAPSHOT_HTTP_HOSTS = {
+    host.strip().lower() for host in os.getenv("SNAPSHOT_HTTP_HOSTS", "").split(",") if host.strip()
+}
+MAX_REDIRECTS = 3
+
+MEDIA_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+
+class SnapshotNotFoundError(Exception):
+    """The snapshot isn't in the store"""
+
+
+class SnapshotUnavailableError(Exception):
+    """Resizing needs Pillow installed"""
+
+
+class SnapshotForbiddenError(Exception):
+    """The snapshot URL (or a redirect) points at a host that isn't allowed"""
+
+
+class SnapshotInvalidError(Exception):
+    """The snapshot isn't an image (or not one Pillow can decode)"""
+
+
+class DiskLRU:
+    """Files under directory, at most max_bytes in total, least recently used evicted first"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # key -> bytes, oldest first
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.size += size
+        self._evict()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:  # removed behind our back
+            with self._lock:
+                self.size -= self._entries.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = os.path.join(self.directory, key)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self.size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, key))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def variant_key(url: str, width: int | None) -> str:
+    """Cache key and ETag of a snapshot at width (None for the original)"""
+    return hashlib.sha256(f"{url}\n{width or 'original'}".encode()).hexdigest()[:32]
+
+
+def media_type(url: str, width: int | None) -> str:
+    if width is not None:
+        return "image/jpeg"
+    return MEDIA_TYPES.get(os.path.splitext(urlparse(url).path)[1].lower(), "image/jpeg")
+
+
+class SnapshotService:
+    """Fetches, resizes and caches snapshots, see the module docstring"""
+
+    def __init__(
+        self,
+        store: str = SNAPSHOT_STORE,
+        cache_dir: str = SNAPSHOT_CACHE_DIR,
+        cache_mb: float = SNAPSHOT_CACHE_MB,
+        workers: int = SNAPSHOT_WORKERS,
+        http_hosts: set[str] = SNAPSHOT_HTTP_HOSTS,
+    ):
+        self.store = os.path.abspath(store)
+        self.http_hosts = http_hosts
+        self.cache = DiskLRU(cache_dir, int(cache_mb * 1024 * 1024))
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="snapshot")
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}  # variants being made, shared by their requests
+        self.generated = 0
+
+    def get(self, url: str, width: int | None) -> Future:
+        """Future of the snapshot's bytes at width, from the cache or made in the pool"""
+        key = variant_key(url, width)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self._pool.submit(self._load, url, width, key)
+            self._pending[key] = future
+        # outside the lock, a future that is already done runs the callback right here
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _load(self, url: str, width: int | None, key: str) -> bytes:
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        if width is None:
+            data = self._fetch(url)
+        else:
+            data = self._resize(self._load(url, None, variant_key(url, None)), width)
+            self.generated += 1
+        self.cache.put(key, data)
+        return data
+
+    def _fetch(self, url: str) -> bytes:
+        parsed = urlparse(url)
+        if parsed.scheme == "s3":
+            path = os.path.abspath(os.path.join(self.store, parsed.netloc, parsed.path.lstrip("/")))
+            if not path.startswith(self.store + os.sep):
+                raise SnapshotNotFoundError(url)
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except (FileNotFoundError, IsADirectoryError):
+                raise SnapshotNotFoundError(url) from None
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_host(url)
+            response = httpx.get(url, timeout=SNAPSHOT_FETCH_TIMEOUT_S)
+            if not response.is_redirect:
+                break
+            url = str(response.next_request.url)
+        else:
+            raise SnapshotInvalidError(f"{url}: more than {MAX_REDIRECTS} redirects")
+        if response.status_code == 404:
+            raise SnapshotNotFoundError(url)
+        response.raise_for_status()
+        if not response.headers.get("content-type", "").startswith("image/"):
+            raise SnapshotInvalidError(f"{url} is {response.headers.get('content-type')}")
+        return response.content
+
+    def _check_host(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or (
+            (parsed.hostname or "").lower() not in self.http_hosts
+            and parsed.netloc.lower() not in self.http_hosts
+        ):
+            raise SnapshotForbiddenError(url)
+
+    @staticmethod
+    def _resize(data: bytes, width: int) -> bytes:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise SnapshotUnavailableError from None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.draft("RGB", (width, width))  # let the JPEG decoder scale down for free
+                image = image.convert("RGB")
+                if image.width > width:
+                    height = max(round(image.height * width / image.width), 1)
+                    image = image.resize((width, height), Image.Resampling.LANCZOS)
+                out = io.BytesIO()
+                image.save(out, "JPEG", quality=SNAPSHOT_QUALITY, optimize=True)
+        # UnidentifiedImageError is an OSError, so are truncated and corrupt images
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise SnapshotInvalidError(f"can't decode the image: {e}") from None
+        return out.getvalue()
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "generated": self.generated, "pending": len(self._pending)}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,201 @@
+"""Write-behind queue for single detection posts (opt-in, ``WRITE_BEHIND=1``).
+
+Without it every POST /detections is its own transaction: insert, track and incident updates,
+commit, then a refresh to read the row back, all while the request waits. With it the request
+validates the detection, gives it its UUID and puts it on a bounded in-process queue. One writer
+thread takes the queue in groups of up to ``WRITE_BEHIND_BATCH_SIZE`` rows, or whatever arrived
+within ``WRITE_BEHIND_FLUSH_MS`` of the first, and stores each group with
+``DetectionRepository.create_many``: one transaction and one commit (one fsync) for the group.
+
+``WRITE_BEHIND_DURABILITY`` picks what the 202 response promises:
+
+    accepted   returned as soon as the detection is queued. Queued detections are lost if the
+               process dies, or if they fail to commit (logged and counted).
+    committed  returned once the detection's group has committed, 503 if it failed. Requests
+               still share commits, so throughput rises, but each waits up to a flush interval.
+
+A full queue answers 503 with Retry-After, so an overloaded database pushes back on the edge
+(which buffers and retries) instead of growing memory. On shutdown the queue stops taking
+detections and the writer drains what is queued, for at most ``WRITE_BEHIND_DRAIN_S``.
+GET /health/ingest reports the queue depth and the writer's counters.
+"""
+
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy.exc import OperationalError
+
+from app.database.database import SessionLocal
+from app.database.schemas import DetectionCreate
+from app.repositories import DetectionRepository
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "accepted")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "20"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "20000"))
+WRITE_BEHIND_DRAIN_S = float(os.getenv("WRITE_BEHIND_DRAIN_S", "30"))
+
+DURABILITY_MODES = ("accepted", "committed")
+
+
+class QueueFullError(Exception):
+    """The write-behind queue is at capacity"""
+
+
+class QueueClosedError(Exception):
+    """The write-behind queue is draining for shutdown"""
+
+
+class WriteBehindQueue:
+    """Bounded queue of detections and the thread that group-commits them"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        durability: str = WRITE_BEHIND_DURABILITY,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_ms: float = WRITE_BEHIND_FLUSH_MS,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"WRITE_BEHIND_DURABILITY must be one of {', '.join(DURABILITY_MODES)}"
+            )
+        self.session_factory = session_factory
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000
+        self.capacity = max_queue
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_commit_ms: float | None = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> "WriteBehindQueue":
+        self._thread.start()
+        return self
+
+    def submit(
+        self, detection: DetectionCreate, received_at: datetime | None = None
+    ) -> tuple[UUID, Future | None]:
+        """Queue a validated detection. Returns its ID and, with committed durability, a
+        future that resolves once its group has committed."""
+        if self._closed.is_set():
+            raise QueueClosedError
+        detection_id = uuid.uuid4()
+        future = Future() if self.durability == "committed" else None
+        try:
+            self._queue.put_nowait((detection_id, detection, received_at, future))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError from None
+        return detection_id, future
+
+    def stop(self, timeout: float = WRITE_BEHIND_DRAIN_S) -> bool:
+        """Stop taking detections and wait for the queued ones to be written. False if the
+        writer didn't finish within timeout (the rest are lost)."""
+        self._closed.set()
+        self._thread.join(timeout)
+        drained = not self._thread.is_alive()
+        if not drained:
+            logger.error(f"Write-behind drain timed out, {self.depth} detections not written")
+        return drained
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "durability": self.durability,
+            "queue_depth": self.depth,
+            "queue_capacity": self.capacity,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": round(self.written / self.batches, 1) if self.batches else None,
+            "last_commit_ms": self.last_commit_ms,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            batch = [first]
+            # group whatever arrives within the flush interval, draining needn't wait
+            deadline = time.monotonic() + (0.0 if self._closed.is_set() else self.flush_s)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                # never let the writer die: the queue would fill and posts wait forever
+                logger.exception("Write-behind writer failed")
+                for _, _, _, future in batch:
+                    resolve(future, e)
+
+    def _write(self, batch: list):
+        """Store a group in one commit. A group that fails is split in halves and each half
+        retried, so a detection the database rejects fails alone instead of taking its group
+        with it. When the database can't be reached the whole group fails at once."""
+        ids, detections, received_at, futures = zip(*batch, strict=True)
+        start = time.perf_counter()
+        try:
+            with self.session_factory() as db:
+                DetectionRepository(db).create_many(
+                    list(detections), received_at=list(received_at), ids=list(ids)
+                )
+        except Exception as e:
+            if len(batch) > 1 and not isinstance(e, OperationalError):
+                middle = len(batch) // 2
+                self._write(batch[:middle])
+                self._write(batch[middle:])
+                return
+            self.failed += len(batch)
+            if len(batch) == 1:
+                logger.error(f"Dropped queued detection {ids[0]}, write failed: {e}")
+            else:
+                logger.error(f"Dropped {len(batch)} queued detections, write failed: {e}")
+            for future in futures:
+                resolve(future, e)
+            return
+        self.last_commit_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.written += len(batch)
+        self.batches += 1
+        for future in futures:
+            resolve(future)
+
+
+def resolve(future: Future | None, error: Exception | None = None):
+    """Complete a poster's future, unless it gave up waiting (the request was cancelled)"""
+    if future is None:
+        return
+    with contextlib.suppress(InvalidStateError):
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
@@ -0,0 +1,39 @@
+"""Stand-in for MediaMTX's HLS server, used by the load test to exercise the /streams proxy.
+
+Every path serves a live-style rolling playlist and fixed-size segments sized like the
+simulator's 2 Mbps stream, so viewers behave as they would against the real server:
+
+    uvicorn benchmarks.fake_mediamtx:app --port 8889
+"""
+
+import math
+import os
+import time
+
+from fastapi import FastAPI, Response
+
+SEGMENT_S = float(os.getenv("FAKE_HLS_SEGMENT_S", "1.0"))
+SEGMENT_BYTES = int(os.getenv("FAKE_HLS_SEGMENT_BYTES", str(2_000_000 // 8)))
+WINDOW = 3
+
+app = FastAPI(title="Fake MediaMTX HLS")
+_segment = bytes(SEGMENT_BYTES)
+
+
+@app.get("/{stream_name}/index.m3u8")
+def playlist(stream_name: str) -> Response:
+    newest = int(time.time() / SEGMENT_S)
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{math.ceil(SEGMENT_S)}",
+        f"#EXT-X-MEDIA-SEQUENCE:{newest - WINDOW + 1}",
+    ]
+    for sequence in range(newest - WINDOW + 1, newest + 1):
+        lines += [f"#EXTINF:{SEGMENT_S:.3f},", f"segment{sequence}.ts"]
+    return Response("\n".join(lines) + "\n", media_type="application/vnd.apple.mpegurl")
+
+
+@app.get("/{stream_name}/{segment}.ts")
+def segment(stream_name: str, segment: str) -> Response:
+    return Response(_segment, media_type="video/mp2t")
@@ -0,0 +1,133 @@
+"""Microbenchmark: detection ingest as JSON vs the binary batch format, bytes and decode time.
+
+Compares what the edge sends today (one POST /detections per detection) with POST
+/detections/batch as a JSON array and as a binary batch. Bytes include the HTTP/1.1 request
+and response headers and bodies; decode time is body -> validated DetectionCreate objects.
+Run from backend/src:
+
+    python -m benchmarks.ingest_formats --batch 50 --iterations 200
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+
+from app.database.schemas import DetectionCreate
+from app.ingest import MEDIA_TYPE, decode_batch, encode_batch
+from pydantic import TypeAdapter
+
+SINGLE = TypeAdapter(DetectionCreate)
+BATCH = TypeAdapter(list[DetectionCreate])
+
+
+def sample(count: int) -> list[dict]:
+    """Edge tracker style detections: a few tracks, start/update/end events"""
+    rng = random.Random(0)
+    start = datetime(2026, 5, 1, tzinfo=UTC)
+    detections = []
+    for i in range(count):
+        score = round(rng.uniform(0.5, 1.0), 3)
+        detections.append(
+            {
+                "detected_at": (start + timedelta(seconds=i * 0.2)).isoformat(),
+                "confidence": score,
+                "fused_score": score,
+                "visual_confidence": round(rng.uniform(0.5, 1.0), 3),
+                "thermal_confidence": round(rng.uniform(0.3, 1.0), 3),
+                "direction": rng.choice(["N", "NE", "E"]),
+                "distance_ft": round(rng.uniform(50, 2000), 1),
+                "frame_snapshot_url": f"s3://detections/thermal/2026-05-01/{i}.jpg",
+                "stream_name": "thermal",
+                "track_id": str(uuid.UUID(int=i // 20 + 1)),
+                "track_event": "start" if i % 20 == 0 else "update",
+            }
+        )
+    return detections
+
+
+def http_bytes(path: str, content_type: str, body: bytes, response: bytes) -> int:
+    """Request + response on the wire, with the headers http.client and uvicorn send"""
+    request_head = (
+        f"POST {path} HTTP/1.1\r\nHost: 192.168.50.1:8000\r\nAccept-Encoding: identity\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    response_head = (
+        "HTTP/1.1 201 Created\r\ndate: Fri, 01 May 2026 12:00:00 GMT\r\nserver: uvicorn\r\n"
+        f"content-length: {len(response)}\r\ncontent-type: application/json\r\n\r\n"
+    )
+    return len(request_head) + len(body) + len(response_head) + len(response)
+
+
+def measure(label: str, fn, detections: int, iterations: int) -> float:
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_detection = (time.perf_counter() - start) / (iterations * detections) * 1e6
+    print(f"  {label:34s} {per_detection:8.2f} us/detection")
+    return per_detection
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=50, help="detections per batch")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    detections = sample(args.batch)
+    singles = [json.dumps(d).encode() for d in detections]
+    json_batch = json.dumps(detections).encode()
+    binary_batch = encode_batch(detections)
+    assert BATCH.validate_python(decode_batch(binary_batch)) == BATCH.validate_json(json_batch), (
+        "both formats must decode to the same detections"
+    )
+
+    # POST /detections echoes the stored row back, roughly the body plus id and timestamps
+    echo = len(singles[0]) + 150
+    batch_response = json.dumps({"created": args.batch}).encode()
+    wire = {
+        "POST /detections per detection": sum(
+            http_bytes("/detections", "application/json", body, b"x" * echo) for body in singles
+        ),
+        "POST /detections/batch JSON": http_bytes(
+            "/detections/batch", "application/json", json_batch, batch_response
+        ),
+        "POST /detections/batch binary": http_bytes(
+            "/detections/batch", MEDIA_TYPE, binary_batch, batch_response
+        ),
+    }
+    print(f"{args.batch} detections per batch, bytes on the wire per detection:")
+    for label, total in wire.items():
+        print(f"  {label:34s} {total / args.batch:8.1f} B")
+    print(f"  {'body only: JSON / binary':34s} {len(json_batch) / len(binary_batch):8.1f}x")
+
+    print("decode + validate:")
+    single = measure(
+        "JSON, one body per detection",
+        lambda: [SINGLE.validate_json(body) for body in singles],
+        args.batch,
+        args.iterations,
+    )
+    batch = measure(
+        "JSON batch", lambda: BATCH.validate_json(json_batch), args.batch, args.iterations
+    )
+    measure(
+        "binary batch, decode only", lambda: decode_batch(binary_batch), args.batch, args.iterations
+    )
+    binary = measure(
+        "binary batch",
+        lambda: BATCH.validate_python(decode_batch(binary_batch)),
+        args.batch,
+        args.iterations,
+    )
+    print(
+        f"binary batch takes {binary / single:.2f}x the time of one JSON body per detection, "
+        f"{binary / batch:.2f}x that of a JSON batch"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""Load test for the backend with realistic edge, dashboard and HLS viewer traffic.
+
+Scenarios:
+    edge       edge nodes posting detections (track start/update/end events)
+    dashboard  dashboards polling the detection list, stats and active tracks
+    hls        viewers pulling HLS playlists and segments through the /streams proxy
+    mixed      all three at once
+
+Point it at a running backend, or let it start one with --serve (SQLite by default, or any
+--database-url) together with a fake MediaMTX for the HLS proxy. Run from backend/src:
+
+    python -m benchmarks.loadtest mixed --serve --duration 30
+    python -m benchmarks.loadtest edge --base-url http://localhost:8000 --writers 50 --rate 0
+    python -m benchmarks.loadtest mixed --serve --baseline loadtest-mixed.json
+
+Each run writes throughput and p50/p95/p99 latency per endpoint to a JSON report, and
+--baseline prints the change against an earlier report. The generator is a single asyncio
+process, so check its CPU isn't saturated before reading too much into the server numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+DIRECTIONS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+STREAMS = ["thermal", "visual"]
+
+
+class Recorder:
+    """Latencies and errors per endpoint label"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kw):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kw)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies[label].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[label] += 1
+        return response if ok else None
+
+
+async def pace(started: float, interval: float):
+    """Sleep whatever is left of interval since started (closed loop when interval is 0)"""
+    remaining = interval - (time.perf_counter() - started)
+    await asyncio.sleep(max(remaining, 0.0))
+
+
+async def edge_writer(client, recorder, stop: asyncio.Event, rate: float, writer_id: int):
+    """One edge node: a track every ~20 posts, start/update.../end like the edge tracker"""
+    rng = random.Random(writer_id)
+    stream_name = f"edge-{writer_id}"
+    interval = 1.0 / rate if rate > 0 else 0.0
+    while not stop.is_set():
+        track_id = str(uuid.uuid4())
+        length = rng.randint(5, 40)
+        for i in range(length):
+            if stop.is_set():
+                return
+            started = time.perf_counter()
+            score = round(rng.uniform(0.5, 1.0), 3)
+            event = "start" if i == 0 else "end" if i == length - 1 else "update"
+            await recorder.request(
+                client,
+                "POST /detections",
+                "POST",
+                "/detections",
+                json={
+                    "detected_at": datetime.now(UTC).isoformat(),
+                    "confidence": score,
+                    "fused_score": score,
+                    "visual_confidence": score,
+                    "thermal_confidence": round(rng.uniform(0.3, 1.0), 3),
+                    "direction": rng.choice(DIRECTIONS),
+                    "distance_ft": round(rng.uniform(50, 2000), 1),
+                    "stream_name": stream_name,
+                    "track_id": track_id,
+                    "track_event": event,
+                },
+            )
+            await pace(started, interval)
+
+
+async def dashboard(client, recorder, stop: asyncio.Event, poll_s: float, viewer_id: int):
+    """One dashboard tab refreshing its panels every poll_s"""
+    # tabs don't all refresh in lockstep
+    await asyncio.sleep(random.Random(viewer_id).uniform(0, poll_s))
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.gather(
+            recorder.request(
+                client, "GET /detections", "GET", "/detections", params={"limit": 100}
+            ),
+            recorder.request(
+                client,
+                "GET /detections (filtered)",
+                "GET",
+                "/detections",
+                params={"min_confidence": 0.8, "limit": 50, "sort_by": "fused_score"},
+            ),
+            recorder.request(
+                client, "GET /detections/stats/summary", "GET", "/detections/stats/summary"
+            ),
+            recorder.request(client, "GET /tracks", "GET", "/tracks", params={"active_only": True}),
+        )
+        await pace(started, poll_s)
+
+
+async def hls_viewer(client, recorder, stop: asyncio.Event, segment_s: float, viewer_id: int):
+    """One video player: reload the playlist, fetch segments it hasn't seen yet"""
+    stream_name = STREAMS[viewer_id % len(STREAMS)]
+    base = f"/streams/{stream_name}/hls"
+    seen: set[str] = set()
+    await asyncio.sleep(random.Random(viewer_id).uniform(0, segment_s))
+    while not stop.is_set():
+        started = time.perf_counter()
+        playlist = await recorder.request(
+            client, "GET /streams/{name}/hls playlist", "GET", f"{base}/index.m3u8"
+        )
+        if playlist is not None:
+            segments = [line for line in playlist.text.splitlines() if line.endswith(".ts")]
+            # a player starts at the live edge, then follows along
+            new = [s for s in segments if s not in seen] if seen else segments[-1:]
+            for segment in new:
+                await recorder.request(
+                    client, "GET /streams/{name}/hls segment", "GET", f"{base}/{segment}"
+                )
+            seen.update(segments)
+        await pace(started, segment_s)
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    ms = sorted(x * 1e3 for x in latencies)
+    if len(ms) < 2:
+        value = round(ms[0], 2) if ms else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value, "max_ms": value}
+    cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(ms[-1], 2),
+    }
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for label in sorted(recorder.latencies):
+        latencies = recorder.latencies[label]
+        endpoints[label] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[label],
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            **percentiles(latencies),
+        }
+    everything = [x for latencies in recorder.latencies.values() for x in latencies]
+    total = {
+        "requests": len(everything),
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(len(everything) / elapsed, 1),
+        **percentiles(everything),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+async def run_scenario(args) -> dict:
+    writers = args.writers if args.scenario in ("edge", "mixed") else 0
+    dashboards = args.dashboards if args.scenario in ("dashboard", "mixed") else 0
+    viewers = args.viewers if args.scenario in ("hls", "mixed") else 0
+
+    recorder = Recorder()
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=writers + dashboards * 4 + viewers + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30.0) as client:
+        tasks = [edge_writer(client, recorder, stop, args.rate, i) for i in range(writers)]
+        tasks += [dashboard(client, recorder, stop, args.poll_s, i) for i in range(dashboards)]
+        tasks += [hls_viewer(client, recorder, stop, args.segment_s, i) for i in range(viewers)]
+        running = [asyncio.create_task(task) for task in tasks]
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*running)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": args.scenario,
+        "started_at": datetime.now(UTC).isoformat(),
+        "duration_s": round(elapsed, 2),
+        "config": {
+            "writers": writers,
+            "rate_per_writer": args.rate,
+            "dashboards": dashboards,
+            "poll_s": args.poll_s,
+            "viewers": viewers,
+            "segment_s": args.segment_s,
+        },
+        "target": {"base_url": args.base_url, "database": args.database_label},
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "git_commit": git_commit(),
+        },
+        **summarize(recorder, elapsed),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def wait_for(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f} s")
+
+
+def start_servers(args) -> list[subprocess.Popen]:
+    """Backend (one uvicorn process) plus the fake MediaMTX it proxies HLS from"""
+    mediamtx_url = f"http://127.0.0.1:{args.port + 1}"
+    for url in (args.base_url, mediamtx_url):
+        try:
+            httpx.get(url, timeout=1.0)
+        except httpx.HTTPError:
+            continue
+        raise RuntimeError(f"Something is already listening on {url}, pick another --port")
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        MEDIAMTX_HLS_URL=mediamtx_url,
+        FAKE_HLS_SEGMENT_S=str(args.segment_s),
+    )
+    uvicorn = [sys.executable, "-m", "uvicorn", "--log-level", "warning", "--host", "127.0.0.1"]
+    servers = [
+        subprocess.Popen(
+            [*uvicorn, "--port", str(args.port + 1), "benchmarks.fake_mediamtx:app"],
+            cwd=SRC_DIR,
+            env=env,
+        ),
+        subprocess.Popen(
+            [*uvicorn, "--port", str(args.port), "app.main:app"], cwd=SRC_DIR, env=env
+        ),
+    ]
+    try:
+        wait_for(f"{mediamtx_url}/thermal/index.m3u8")
+        wait_for(f"{args.base_url}/health")
+    except RuntimeError:
+        stop_servers(servers)
+        raise
+    return servers
+
+
+def stop_servers(servers: list[subprocess.Popen]):
+    for server in servers:
+        server.terminate()
+    for server in servers:
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # graceful shutdown waits on requests stuck behind an overloaded server
+            server.kill()
+            server.wait()
+
+
+def print_report(report: dict, baseline: dict | None):
+    print(f"\n{report['scenario']} for {report['duration_s']} s against {report['target']}")
+    header = f"{'endpoint':36s} {'req/s':>8s} {'errors':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s}"
+    print(header)
+    rows = {**report["endpoints"], "total": report["total"]}
+    old_rows = {**baseline["endpoints"], "total": baseline["total"]} if baseline else {}
+    for label, stats in rows.items():
+        print(
+            f"{label:36s} {stats['throughput_rps']:8.1f} {stats['errors']:7d} "
+            f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}"
+        )
+        old = old_rows.get(label)
+        if old:
+            print(
+                f"{'  vs baseline':36s} {change(old['throughput_rps'], stats['throughput_rps'])} "
+                f"{'':7s} {change(old['p50_ms'], stats['p50_ms'])} "
+                f"{change(old['p95_ms'], stats['p95_ms'])} {change(old['p99_ms'], stats['p99_ms'])}"
+            )
+
+
+def change(old: float | None, new: float | None) -> str:
+    if not old or new is None:
+        return f"{'-':>8s}"
+    return f"{(new - old) / old * 100:+7.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend load test")
+    parser.add_argument("scenario", choices=("edge", "dashboard", "hls", "mixed"))
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--writers", type=int, default=10, help="edge nodes posting detections")
+    parser.add_argument(
+        "--rate", type=float, default=5.0, help="posts/s per writer, 0 = as fast as possible"
+    )
+    parser.add_argument("--dashboards", type=int, default=20, help="dashboard tabs polling")
+    parser.add_argument("--poll-s", type=float, default=2.0, help="dashboard refresh interval")
+    parser.add_argument("--viewers", type=int, default=20, help="HLS video players")
+    parser.add_argument("--segment-s", type=float, default=1.0, help="HLS segment duration")
+    parser.add_argument("--base-url", default=None, help="backend to test (default: --serve)")
+    parser.add_argument(
+        "--serve", action="store_true", help="start the backend and a fake MediaMTX locally"
+    )
+    parser.add_argument("--port", type=int, default=8010, help="port for --serve")
+    parser.add_argument(
+        "--database-url", default=None, help="DATABASE_URL for --serve (default: temp SQLite)"
+    )
+    parser.add_argument("--report", default=None, help="JSON report path")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    args = parser.parse_args()
+
+    if args.base_url and args.serve:
+        parser.error("--base-url and --serve are mutually exclusive")
+    if not args.base_url and not args.serve:
+        parser.error("pass --base-url of a running backend, or --serve")
+
+    sqlite_path = None
+    servers = []
+    if args.serve:
+        if args.database_url is None:
+            sqlite_path = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+            args.database_url = f"sqlite:///{sqlite_path}"
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        args.database_label = args.database_url.split(":", 1)[0]
+        servers = start_servers(args)
+    else:
+        args.database_label = "external"
+
+    try:
+        report = asyncio.run(run_scenario(args))
+    finally:
+        stop_servers(servers)
+        if sqlite_path and os.path.exists(sqlite_path):
+            os.remove(sqlite_path)
+
+    # read before writing, the baseline may be the report path from the last run
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    path = args.report or f"loadtest-{args.scenario}.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report, baseline)
+    print(f"\nReport written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Microbenchmark: detection list serialization, ORM + response model vs Core rows + orjson.
+
+Run from backend/src (uses a throwaway SQLite file unless DATABASE_URL is set):
+
+    python -m benchmarks.serialize_detections --rows 1000 --iterations 50
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+
+_db_path = os.path.join(tempfile.gettempdir(), "serialize_benchmark.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_path}")
+
+from app.api.responses import json_rows, response_columns  # noqa: E402
+from app.database.database import Base, SessionLocal, engine  # noqa: E402
+from app.database.schemas import DetectionCreate, DetectionFilters, DetectionResponse  # noqa: E402
+from app.models.detection import Detection  # noqa: E402
+from app.repositories import DetectionRepository  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+
+def seed(db, rows: int):
+    directions = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+    start = datetime(2026, 1, 1, tzinfo=UTC)
+    DetectionRepository(db).create_many(
+        [
+            DetectionCreate(
+                detected_at=start + timedelta(seconds=i),
+                confidence=(i % 1000) / 1000,
+                fused_score=(i * 7 % 1000) / 1000,
+                visual_confidence=0.5,
+                thermal_confidence=0.5,
+                direction=directions[i % 8],
+                distance_ft=100 + i % 900,
+                stream_name="bench",
+            )
+            for i in range(rows)
+        ]
+    )
+
+
+def orm_path(db, limit: int, adapter: TypeAdapter) -> bytes:
+    """What FastAPI does with a response_model: validate the ORM objects, dump, json encode"""
+    detections = DetectionRepository(db).search(DetectionFilters(), limit=limit)
+    validated = adapter.validate_python(detections, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def core_path(db, limit: int, columns) -> bytes:
+    rows = DetectionRepository(db).search_rows(DetectionFilters(), columns, limit=limit)
+    return json_rows(rows).body
+
+
+def measure(label: str, fn, rows: int, iterations: int):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_call_ms = elapsed / iterations * 1e3
+    print(f"{label:32s} {per_call_ms:8.2f} ms/call {rows * iterations / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per call (limit)")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if DetectionRepository(db).count() < args.rows:
+            seed(db, args.rows)
+
+        adapter = TypeAdapter(list[DetectionResponse])
+        columns = response_columns(Detection.__table__, DetectionResponse)
+        assert json.loads(orm_path(db, args.rows, adapter)) == json.loads(
+            core_path(db, args.rows, columns)
+        ), "both paths must return the same JSON"
+
+        print(f"{engine.url.get_backend_name()}, {args.rows} rows per call")
+        before = measure(
+            "ORM + response model",
+            lambda: orm_path(db, args.rows, adapter),
+            args.rows,
+            args.iterations,
+        )
+        after = measure(
+            "Core rows + orjson",
+            lambda: core_path(db, args.rows, columns),
+            args.rows,
+            args.iterations,
+        )
+        print(f"speedup {before / after:.1f}x")
+
+        # serialization alone, on rows that were already fetched
+        detections = DetectionRepository(db).search(DetectionFilters(), limit=args.rows)
+        rows = DetectionRepository(db).search_rows(DetectionFilters(), columns, limit=args.rows)
+        before = measure(
+            "serialize only: response model",
+            lambda: json.dumps(
+                adapter.dump_python(
+                    adapter.validate_python(detections, from_attributes=True), mode="json"
+                )
+            ),
+            args.rows,
+            args.iterations,
+        )
+        after = measure(
+            "serialize only: orjson", lambda: json_rows(rows), args.rows, args.iterations
+        )
+        print(f"speedup {before / after:.1f}x")
+
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Microbenchmark: single detection inserts, one commit each vs the write-behind queue.
+
+Concurrent posters each store detections one at a time, the way POST /detections does: either
+DetectionRepository.create (a transaction per detection) or WriteBehindQueue.submit with both
+durability modes. Committed mode waits for the group commit like the request would, so it is
+the like-for-like comparison. HTTP is left out, this measures what the database side sustains.
+Run from backend/src (uses a throwaway SQLite file unless DATABASE_URL is set):
+
+    python -m benchmarks.write_behind --posters 32 --duration 5
+    DATABASE_URL=postgresql://... python -m benchmarks.write_behind --posters 64
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import UTC, datetime
+
+_db_path = os.path.join(tempfile.gettempdir(), "write_behind_benchmark.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_path}")
+
+from app.database.database import Base, SessionLocal, engine  # noqa: E402
+from app.database.schemas import DetectionCreate  # noqa: E402
+from app.repositories import DetectionRepository  # noqa: E402
+from app.write_behind import QueueFullError, WriteBehindQueue  # noqa: E402
+
+
+def detection(poster: int) -> DetectionCreate:
+    return DetectionCreate(
+        detected_at=datetime.now(UTC),
+        confidence=0.9,
+        fused_score=0.9,
+        direction="NE",
+        distance_ft=400,
+        stream_name=f"bench-{poster}",
+    )
+
+
+def run_posters(posters: int, duration: float, post) -> int:
+    """posters threads calling post(poster) back to back, returns how many succeeded"""
+    counts = [0] * posters
+    deadline = time.perf_counter() + duration
+
+    def poster(i):
+        while time.perf_counter() < deadline:
+            post(i)
+            counts[i] += 1
+
+    threads = [threading.Thread(target=poster, args=(i,)) for i in range(posters)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def one_commit_each(poster: int):
+    with SessionLocal() as db:
+        DetectionRepository(db).create(detection(poster))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posters", type=int, default=32, help="concurrent posters")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    print(f"{engine.url.get_backend_name()}, {args.posters} posters, {args.duration:.0f} s each")
+
+    stored = run_posters(args.posters, args.duration, one_commit_each)
+    baseline = stored / args.duration
+    print(f"{'one commit per detection':28s} {baseline:10.0f} detections/s")
+
+    for durability in ("committed", "accepted"):
+        queue = WriteBehindQueue(durability=durability).start()
+
+        def post(poster, queue=queue):
+            while True:
+                try:
+                    _, committed = queue.submit(detection(poster))
+                    break
+                except QueueFullError:
+                    time.sleep(0.01)  # what a 503 with Retry-After does to the edge
+            if committed is not None:
+                committed.result()
+
+        start = time.perf_counter()
+        run_posters(args.posters, args.duration, post)
+        queue.stop()
+        # accepted posts return early, the rate is what got written including the drain
+        rate = queue.written / (time.perf_counter() - start)
+        print(
+            f"{'write-behind, ' + durability:28s} {rate:10.0f} detections/s "
+            f"{rate / baseline:5.1f}x  {queue.stats()['mean_batch_size']} per commit"
+        )
+
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+
+
+if __name__ == "__main__":
+    main()
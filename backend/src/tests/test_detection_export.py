@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+import pytest
+from app.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+STREAM = "exporttest"
+
+
+def setup_module():
+    for minute, confidence in enumerate([0.9, 0.4, 0.7]):
+        response = client.post(
+            "/detections",
+            json={
+                "detected_at": f"2026-05-01T08:0{minute}:00Z",
+                "confidence": confidence,
+                "fused_score": confidence,
+                "direction": "SW",
+                "stream_name": STREAM,
+            },
+        )
+        assert response.status_code == 201
+
+
+def export(**params):
+    response = client.get("/detections/export", params={"stream_name": STREAM, **params})
+    assert response.status_code == 200
+    return response
+
+
+def test_export_csv_is_time_ordered():
+    """CSV export has a header row and the matching rows oldest first."""
+    response = export(min_confidence=0.5)
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [float(r["confidence"]) for r in rows] == [0.9, 0.7]
+    assert rows[0]["detected_at"].startswith("2026-05-01T08:00:00")
+
+
+def test_export_ndjson_gzip():
+    """NDJSON can be gzip encoded on the fly, one object per line."""
+    response = export(format="ndjson", gzip=True, order="desc")
+    assert response.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["confidence"] for line in lines] == [0.7, 0.4, 0.9]
+    assert lines[0]["stream_name"] == STREAM
+
+
+def test_export_parquet():
+    """Parquet export round-trips through pyarrow."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = export(format="parquet")
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 3
+    assert table.column("direction").to_pylist() == ["SW", "SW", "SW"]
+
+
+def test_export_empty_csv_has_header():
+    """An export that matches nothing is still a valid CSV file."""
+    response = export(min_confidence=1.0)
+    assert response.text.splitlines()[0].startswith("id,detected_at")
+    assert len(response.text.splitlines()) == 1
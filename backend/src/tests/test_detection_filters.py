@@ -0,0 +1,78 @@
+from app.database.schemas import DetectionResponse
+from app.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+STREAM = "filtertest"
+ROWS = [
+    # (detected_at, confidence, fused_score, direction, distance_ft)
+    ("2026-04-01T10:00:00Z", 0.95, 0.90, "N", 100),
+    ("2026-04-01T11:00:00Z", 0.55, 0.60, "NE", 300),
+    ("2026-04-01T12:00:00Z", 0.85, 0.80, "E", None),
+    ("2026-04-02T09:00:00Z", 0.40, 0.35, "N", 800),
+]
+
+
+def setup_module():
+    for detected_at, confidence, fused_score, direction, distance_ft in ROWS:
+        response = client.post(
+            "/detections",
+            json={
+                "detected_at": detected_at,
+                "confidence": confidence,
+                "fused_score": fused_score,
+                "direction": direction,
+                "distance_ft": distance_ft,
+                "stream_name": STREAM,
+            },
+        )
+        assert response.status_code == 201
+
+
+def list_detections(**params):
+    response = client.get("/detections", params={"stream_name": STREAM, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_filters_combine():
+    """Time range, score ranges, direction set and distance range all narrow the result."""
+    assert len(list_detections()) == 4
+
+    day = list_detections(start="2026-04-01T00:00:00Z", end="2026-04-02T00:00:00Z")
+    assert [d["confidence"] for d in day] == [0.85, 0.55, 0.95]
+
+    confident = list_detections(min_confidence=0.8, max_fused_score=0.85)
+    assert [d["direction"] for d in confident] == ["E"]
+
+    north_east = list_detections(direction=["N", "NE"])
+    assert sorted(d["direction"] for d in north_east) == ["N", "N", "NE"]
+
+    near = list_detections(min_distance_ft=200, max_distance_ft=900)
+    assert sorted(d["distance_ft"] for d in near) == [300, 800]
+
+
+def test_sort_options():
+    """Results can be sorted by score or distance, ascending or descending."""
+    by_score = list_detections(sort_by="fused_score", order="asc")
+    assert [d["fused_score"] for d in by_score] == [0.35, 0.60, 0.80, 0.90]
+
+    by_distance = list_detections(sort_by="distance_ft", order="desc")
+    assert [d["distance_ft"] for d in by_distance] == [800, 300, 100, None]
+
+
+def test_inverted_range_is_rejected():
+    """A lower bound above its upper bound is a validation error."""
+    response = client.get("/detections", params={"min_confidence": 0.9, "max_confidence": 0.1})
+    assert response.status_code == 422
+
+
+def test_list_rows_match_response_model():
+    """The fast list path returns exactly the DetectionResponse fields and JSON types."""
+    rows = list_detections(direction="N", sort_by="detected_at", order="asc")
+    for row in rows:
+        assert set(row) == set(DetectionResponse.model_fields)
+        DetectionResponse.model_validate(row)
+    assert rows[0]["distance_ft"] == 100.0
+    assert isinstance(rows[0]["distance_ft"], float)
@@ -0,0 +1,119 @@
+import json
+import struct
+from uuid import uuid4
+
+import pytest
+from app.api.routers import detections as detections_router
+from app.ingest import HEADER, MAX_BATCH, MEDIA_TYPE, RECORD, decode_batch, encode_batch
+from app.main import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def sample_detections(stream_name):
+    track_id = str(uuid4())
+    return [
+        {
+            "detected_at": "2026-05-01T12:00:00.250000+00:00",
+            "confidence": 0.941,
+            "fused_score": 0.93,
+            "visual_confidence": 0.9,
+            "thermal_confidence": 0.0,
+            "direction": "NE",
+            "distance_ft": 125.5,
+            "frame_snapshot_url": "s3://detections/a.jpg",
+            "stream_name": stream_name,
+            "track_id": track_id,
+            "track_event": "start",
+        },
+        {
+            "detected_at": "2026-05-01T12:00:01+00:00",
+            "confidence": 1.0,
+            "fused_score": 0.5,
+            "stream_name": stream_name,
+            "track_id": track_id,
+            "track_event": "end",
+        },
+    ]
+
+
+def post_batch(body, content_type):
+    return client.post("/detections/batch", content=body, headers={"Content-Type": content_type})
+
+
+def test_binary_and_json_batches_store_the_same_detections():
+    """A binary batch decodes to exactly what the same batch sent as JSON stores."""
+    binary = sample_detections("ingest-bin")
+    response = post_batch(encode_batch(binary), MEDIA_TYPE)
+    assert response.status_code == 201
+    assert response.json() == {"created": 2}
+
+    json_batch = sample_detections("ingest-json")
+    response = client.post("/detections/batch", json=json_batch)
+    assert response.status_code == 201
+
+    fields = ["detected_at", "confidence", "fused_score", "visual_confidence"]
+    fields += ["thermal_confidence", "direction", "distance_ft", "frame_snapshot_url"]
+    fields += ["track_event"]
+    stored = {}
+    for stream_name in ("ingest-bin", "ingest-json"):
+        rows = client.get("/detections", params={"stream_name": stream_name, "order": "asc"}).json()
+        stored[stream_name] = [{f: row[f] for f in fields} for row in rows]
+    assert stored["ingest-bin"] == stored["ingest-json"]
+    assert stored["ingest-bin"][0]["confidence"] == 0.941
+    assert stored["ingest-bin"][1]["direction"] is None
+
+
+def test_binary_batch_is_validated_like_json():
+    """Values DetectionCreate rejects are rejected in either format, with 422."""
+    bad = sample_detections("bad stream!")
+    assert client.post("/detections/batch", json=bad).status_code == 422
+    assert post_batch(encode_batch(bad), MEDIA_TYPE).status_code == 422
+
+    body = bytearray(encode_batch(sample_detections("ingest-bad-code")))
+    # direction byte of the first record: one past NW
+    direction_offset = len(body) - 2 * RECORD.size + struct.calcsize("<qHHHHf")
+    body[direction_offset] = 8
+    response = post_batch(bytes(body), MEDIA_TYPE)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] == "direction"
+
+
+@pytest.mark.parametrize(
+    ("body", "content_type", "status_code"),
+    [
+        (b"DDET", MEDIA_TYPE, 400),
+        (HEADER.pack(b"DDET", 1, 0, 0, 2), MEDIA_TYPE, 400),
+        (b"{}", "text/plain", 415),
+    ],
+)
+def test_malformed_batches_are_rejected(body, content_type, status_code):
+    """Truncated framing is a 400 and unknown content types a 415."""
+    assert post_batch(body, content_type).status_code == status_code
+
+
+def test_oversized_batches_are_refused_before_validation(monkeypatch):
+    """Too many detections is a 413 whether or not they would validate, as is a large body."""
+    # the header's count is enough, the records needn't be there
+    assert post_batch(HEADER.pack(b"DDET", 1, 0, 0, MAX_BATCH + 1), MEDIA_TYPE).status_code == 413
+    assert post_batch(b"[" + b"{}," * MAX_BATCH + b"{}]", "application/json").status_code == 413
+
+    monkeypatch.setattr(detections_router, "MAX_BATCH_BYTES", 1000)
+    body = json.dumps(sample_detections("ingest-large") * 10).encode()
+    assert len(body) > 1000
+    assert post_batch(body, "application/json").status_code == 413
+    chunked = client.post(
+        "/detections/batch",
+        content=iter([body[:600], body[600:]]),
+        headers={"Content-Type": "application/json"},
+    )
+    assert chunked.status_code == 413
+
+
+def test_records_are_a_fraction_of_the_json_size():
+    """42 bytes a record, strings repeated across the batch are sent once."""
+    detections = sample_detections("ingest-size") * 50
+    body = encode_batch(detections)
+    assert len(decode_batch(body)) == 100
+    assert len(body) < sum(len(str(d)) for d in detections) / 5
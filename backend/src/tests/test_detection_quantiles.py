@@ -0,0 +1,165 @@
+import bisect
+import random
+from datetime import UTC, datetime, timedelta
+
+from app.database.schemas import DetectionCreate
+from app.latency import percentile
+from app.main import app
+from app.models import DetectionSketch, DetectionSketchDelta
+from app.quantiles import TDigest
+from app.repositories import DetectionRepository, SketchRepository
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+
+client = TestClient(app)
+
+STREAM = "quantiletest"
+START = datetime(2026, 7, 1, tzinfo=UTC)
+HOURS = 6
+PER_HOUR = 500
+
+
+def confidences() -> list[float]:
+    rng = random.Random(7)
+    return [round(rng.betavariate(5, 2), 4) for _ in range(HOURS * PER_HOUR)]
+
+
+def setup_module():
+    values = confidences()
+    detections = [
+        DetectionCreate(
+            detected_at=START + timedelta(seconds=i * 3600 / PER_HOUR),
+            confidence=value,
+            # thermal only on every other detection
+            thermal_confidence=value / 2 if i % 2 else None,
+            fused_score=value,
+            stream_name=STREAM,
+        )
+        for i, value in enumerate(values)
+    ]
+    with TestingSessionLocal() as db:
+        # in several batches and one at a time, as ingest would
+        repo = DetectionRepository(db)
+        repo.create_many(detections[:1000])
+        repo.create_many(detections[1000:-10])
+        for detection in detections[-10:]:
+            repo.create(detection)
+
+
+def quantiles(**params):
+    response = client.get("/detections/stats/quantiles", params={"stream_name": STREAM, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_quantiles_match_the_exact_percentiles():
+    body = quantiles(q=[0.5, 0.9, 0.99, 0.999])
+    (stream,) = body["streams"]
+    assert stream["stream_name"] == STREAM and stream["detections"] == HOURS * PER_HOUR
+    exact = sorted(confidences())
+    confidence = stream["confidence"]
+    assert confidence["count"] == len(exact)
+    assert confidence["min"] == exact[0] and confidence["max"] == exact[-1]
+    assert list(confidence["quantiles"]) == ["p50", "p90", "p99", "p99.9"]
+    for label, q in (("p50", 50), ("p90", 90), ("p99", 99), ("p99.9", 99.9)):
+        assert abs(confidence["quantiles"][label] - percentile(exact, q)) < 0.005
+    assert stream["thermal_confidence"]["count"] == len(exact) // 2
+    assert stream["visual_confidence"] == {"count": 0, "min": None, "max": None, "quantiles": {}}
+
+
+def test_window_is_rounded_to_buckets():
+    # 01:30 to 02:10 covers the 01:00 and 02:00 buckets
+    body = quantiles(
+        start=(START + timedelta(minutes=90)).isoformat(),
+        end=(START + timedelta(minutes=130)).isoformat(),
+    )
+    assert body["start"].startswith("2026-07-01T01:00:00")
+    assert body["end"].startswith("2026-07-01T03:00:00")
+    assert body["streams"][0]["detections"] == 2 * PER_HOUR
+
+    assert quantiles(start="2020-01-01T00:00:00Z", end="2020-01-02T00:00:00Z")["streams"] == []
+    response = client.get("/detections/stats/quantiles", params={"q": 1.5})
+    assert response.status_code == 422
+
+
+def test_long_window_uses_daily_rollups_and_hourly_edges():
+    """Three days, one detection every 10 minutes; the window takes in one whole day and the
+    hours either side of it exactly once."""
+    stream, first = "quantilerollup", datetime(2026, 7, 10, tzinfo=UTC)
+    with TestingSessionLocal() as db:
+        DetectionRepository(db).create_many(
+            [
+                DetectionCreate(
+                    detected_at=first + timedelta(minutes=10 * i),
+                    confidence=(i % 100) / 100,
+                    fused_score=0.5,
+                    stream_name=stream,
+                )
+                for i in range(3 * 24 * 6)
+            ]
+        )
+    start, end = first + timedelta(hours=20), first + timedelta(days=2, hours=3)
+    response = client.get(
+        "/detections/stats/quantiles",
+        params={"stream_name": stream, "start": start.isoformat(), "end": end.isoformat()},
+    )
+    (body,) = response.json()["streams"]
+    assert body["detections"] == (4 + 24 + 3) * 6
+    assert body["fused_score"]["quantiles"] == {"p50": 0.5, "p90": 0.5, "p99": 0.5}
+    whole = client.get("/detections/stats/quantiles", params={"stream_name": stream}).json()
+    assert whole["streams"][0]["detections"] == 3 * 24 * 6
+
+
+def test_compaction_changes_no_result():
+    """Inserts only append deltas; quantiles are the same with them pending, partly folded into
+    the sketches and all folded."""
+
+    def same(a, b):
+        assert a["detections"] == b["detections"]
+        for field in ("confidence", "thermal_confidence", "fused_score"):
+            assert a[field]["count"] == b[field]["count"]
+            for label, value in a[field]["quantiles"].items():
+                assert abs(b[field]["quantiles"][label] - value) < 0.005
+
+    (pending,) = quantiles()["streams"]
+    with TestingSessionLocal() as db:
+        repo = SketchRepository(db)
+        assert db.query(DetectionSketchDelta).count() > 0
+        assert repo.compact(limit=5) == 5
+        (partly,) = quantiles()["streams"]
+        while repo.compact(limit=50):
+            pass
+        assert db.query(DetectionSketchDelta).count() == 0
+        assert db.query(DetectionSketch).filter_by(stream_name=STREAM).count() == HOURS + 1
+    (folded,) = quantiles()["streams"]
+    same(pending, partly)
+    same(pending, folded)
+
+
+def test_rebuild_matches_incremental_sketches():
+    (before,) = quantiles()["streams"]
+    with TestingSessionLocal() as db:
+        assert SketchRepository(db).rebuild(batch_size=700) >= HOURS * PER_HOUR
+    (after,) = quantiles()["streams"]
+    assert after["detections"] == before["detections"]
+    for field in ("confidence", "thermal_confidence", "fused_score"):
+        assert after[field]["count"] == before[field]["count"]
+        for label, value in before[field]["quantiles"].items():
+            assert abs(after[field]["quantiles"][label] - value) < 0.005
+
+
+def test_merged_digests_stay_accurate():
+    rng = random.Random(3)
+    values = [rng.gauss(0, 1) for _ in range(50000)]
+    parts = [TDigest() for _ in range(50)]
+    for i, value in enumerate(values):
+        parts[i % 50].add(value)
+    digest = TDigest.merged(TDigest.from_bytes(part.to_bytes()) for part in parts)
+    assert digest.count == len(values) and len(digest.means) <= 100
+    # rank error: the share of values below the estimate is close to q
+    exact = sorted(values)
+    for q in (0.001, 0.01, 0.5, 0.99, 0.999):
+        rank = bisect.bisect(exact, digest.quantile(q)) / len(exact)
+        assert abs(rank - q) < max(q * (1 - q) * 0.1, 0.0005)
+    assert TDigest().quantile(0.5) is None
@@ -0,0 +1,77 @@
+import math
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from app.database.schemas import DetectionCreate
+from app.downsample import lttb
+from app.main import app
+from app.repositories import DetectionRepository
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+
+client = TestClient(app)
+
+STREAM = "seriestest"
+START = datetime(2026, 6, 1, tzinfo=UTC)
+ROWS = 2000
+SPIKE = 1234
+
+
+def score(i: int) -> float:
+    """A slow wave with one sharp spike a chart must not lose"""
+    return 1.0 if i == SPIKE else round(0.5 + 0.3 * math.sin(i / 100), 4)
+
+
+def setup_module():
+    detections = [
+        DetectionCreate(
+            detected_at=START + timedelta(seconds=i),
+            confidence=score(i),
+            fused_score=score(i) / 2,
+            stream_name=STREAM,
+        )
+        for i in range(ROWS)
+    ]
+    with TestingSessionLocal() as db:
+        DetectionRepository(db).create_many(detections)
+
+
+def series(**params):
+    response = client.get("/detections/series", params={"stream_name": STREAM, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_series_is_downsampled_to_the_budget(method):
+    """Both series fit the point budget, stay in time order and keep the spike."""
+    body = series(points=100, method=method)
+    assert body["rows"] == ROWS and body["method"] == method
+    for name, scale in (("confidence", 1.0), ("fused_score", 0.5)):
+        points = body[name]
+        assert 50 <= len(points) <= 100
+        times = [t for t, _ in points]
+        assert times == sorted(times)
+        assert max(v for _, v in points) == scale
+    if method == "lttb":
+        first, last = body["confidence"][0], body["confidence"][-1]
+        assert first[0].startswith("2026-06-01T00:00:00") and first[1] == score(0)
+        assert last[1] == score(ROWS - 1)
+
+
+def test_series_within_budget_is_returned_as_is():
+    end = START + timedelta(seconds=10)
+    body = series(start=START.isoformat(), end=end.isoformat(), points=50)
+    assert body["method"] is None and body["rows"] == 10
+    assert [v for _, v in body["confidence"]] == [score(i) for i in range(10)]
+
+
+def test_lttb_streams_partitions():
+    """Single pass over partitions, nothing matched returns empty series."""
+    rows = [(START + timedelta(seconds=i), float(i % 7), 0.0) for i in range(1000)]
+    partitions = [rows[i : i + 64] for i in range(0, len(rows), 64)]
+    (values, flat), scanned = lttb(iter(partitions), rows[0][0], rows[-1][0], 20)
+    assert scanned == 1000 and len(values) <= 20 and len(flat) == len(values)
+    assert values[0] == (rows[0][0], 0.0) and values[-1] == (rows[-1][0], rows[-1][1])
+    assert lttb(iter([]), START, START, 20) == ([[], []], 0)
@@ -0,0 +1,136 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from app.database.schemas import DetectionCreate
+from app.main import app
+from app.models.detection import Detection
+from app.repositories import DetectionRepository, IncidentRepository
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+
+client = TestClient(app)
+
+
+def post_detection(stream_name, detected_at, direction, fused_score, snapshot=None):
+    response = client.post(
+        "/detections",
+        json={
+            "detected_at": detected_at,
+            "confidence": fused_score,
+            "fused_score": fused_score,
+            "direction": direction,
+            "distance_ft": 400,
+            "frame_snapshot_url": snapshot,
+            "stream_name": stream_name,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_detections_group_into_incidents():
+    """Close detections turning gradually share an incident, a gap or sharp turn starts one."""
+    first = post_detection("inc-api", "2026-04-01T08:00:00Z", "N", 0.6, "s3://a.jpg")
+    post_detection("inc-api", "2026-04-01T08:00:20Z", "NE", 0.9, "s3://b.jpg")
+    post_detection("inc-api", "2026-04-01T08:00:40Z", "E", 0.7, "s3://c.jpg")
+    # sharp turn: a different drone
+    turned = post_detection("inc-api", "2026-04-01T08:00:50Z", "W", 0.8)
+    # long gap
+    later = post_detection("inc-api", "2026-04-01T09:00:00Z", "W", 0.5)
+    # other stream, same time
+    other = post_detection("inc-api-2", "2026-04-01T08:00:10Z", "N", 0.5)
+
+    assert len({first["incident_id"], turned["incident_id"], later["incident_id"]}) == 3
+    assert other["incident_id"] != first["incident_id"]
+
+    incident = client.get(f"/incidents/{first['incident_id']}").json()
+    assert incident["detection_count"] == 3
+    assert incident["started_at"].startswith("2026-04-01T08:00:00")
+    assert incident["last_seen_at"].startswith("2026-04-01T08:00:40")
+    assert incident["peak_fused_score"] == 0.9
+    assert (incident["first_direction"], incident["last_direction"]) == ("N", "E")
+    assert incident["snapshot_url"] == "s3://b.jpg"
+
+    detections = client.get(f"/incidents/{first['incident_id']}/detections").json()
+    assert [d["direction"] for d in detections] == ["N", "NE", "E"]
+
+    listed = client.get(
+        "/incidents",
+        params={
+            "stream_name": "inc-api",
+            "start": "2026-04-01T08:30:00Z",
+            "end": "2026-04-01T10:00:00Z",
+        },
+    ).json()
+    assert [i["id"] for i in listed] == [later["incident_id"]]
+
+
+def test_batch_insert_and_backfill_group_the_same_way():
+    """create_many and backfill of ungrouped rows give the same incidents."""
+    times = ["10:00:00", "10:00:30", "10:01:00", "10:05:00", "10:05:10"]
+    detections = [
+        DetectionCreate(
+            detected_at=f"2026-04-02T{t}Z", confidence=0.7, fused_score=0.7, stream_name=stream
+        )
+        for stream in ("inc-batch", "inc-backfill")
+        for t in times
+    ]
+    with TestingSessionLocal() as db:
+        created = DetectionRepository(db).create_many(detections[: len(times)])
+        batch_incidents = [str(d.incident_id) for d in created]
+
+        for detection in detections[len(times) :]:
+            db.add(Detection(**detection.model_dump()))
+        db.commit()
+        assert IncidentRepository(db).backfill(batch_size=2) == len(times)
+        backfilled = (
+            db.query(Detection)
+            .filter(Detection.stream_name == "inc-backfill")
+            .order_by(Detection.detected_at)
+            .all()
+        )
+        backfill_incidents = [str(d.incident_id) for d in backfilled]
+
+    for incidents in (batch_incidents, backfill_incidents):
+        assert incidents[0] == incidents[1] == incidents[2]
+        assert incidents[3] == incidents[4] != incidents[0]
+
+
+def test_snapshot_is_from_the_best_detection_with_one():
+    """A higher score without a snapshot doesn't stop a better snapshot replacing the kept one."""
+    first = post_detection("inc-snap", "2026-04-02T08:00:00Z", "N", 0.5, "s3://a.jpg")
+    post_detection("inc-snap", "2026-04-02T08:00:10Z", "N", 0.9)
+    post_detection("inc-snap", "2026-04-02T08:00:20Z", "N", 0.8, "s3://b.jpg")
+    post_detection("inc-snap", "2026-04-02T08:00:30Z", "N", 0.7, "s3://c.jpg")
+    incident = client.get(f"/incidents/{first['incident_id']}").json()
+    assert incident["peak_fused_score"] == 0.9
+    assert incident["snapshot_url"] == "s3://b.jpg" and incident["snapshot_fused_score"] == 0.8
+
+
+def test_zero_distance_is_kept_as_the_minimum():
+    """A stored row at 0 ft (the API only takes positive distances) stays the incident's
+    minimum when farther detections follow."""
+    with TestingSessionLocal() as db:
+        for second, distance in ((0, 0.0), (10, 300.0)):
+            db.add(
+                Detection(
+                    detected_at=datetime(2026, 4, 3, 8, 0, second, tzinfo=UTC),
+                    confidence=0.5,
+                    fused_score=0.5,
+                    distance_ft=distance,
+                    stream_name="inc-zero",
+                )
+            )
+        db.commit()
+        IncidentRepository(db).backfill()
+        (incident_id,) = {
+            d.incident_id for d in db.query(Detection).filter_by(stream_name="inc-zero")
+        }
+    incident = client.get(f"/incidents/{incident_id}").json()
+    assert incident["min_distance_ft"] == 0.0
+
+
+def test_unknown_incident_returns_404():
+    """Requesting an incident that doesn't exist returns 404."""
+    assert client.get(f"/incidents/{uuid4()}").status_code == 404
@@ -0,0 +1,121 @@
+import importlib.util
+import os
+from concurrent.futures.process import BrokenProcessPool
+from datetime import UTC, datetime
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from app.database.schemas import DetectionCreate
+from app.inference.sampler import FrameSampler
+from app.models import Detection
+from app.repositories import DetectionRepository, TrackRepository
+
+from tests.conftest import TestingSessionLocal
+
+
+def test_create_many_writes_batch_and_folds_tracks():
+    """A batch is written in one go, repeated detections of a new track land in one summary."""
+    track_id = uuid4()
+    batch = [
+        DetectionCreate(
+            detected_at=datetime(2026, 3, 2, 9, 0, second, tzinfo=UTC),
+            confidence=0.5 + second / 10,
+            fused_score=0.5 + second / 10,
+            stream_name="batchtest",
+            track_id=track_id,
+        )
+        for second in range(3)
+    ]
+    with TestingSessionLocal() as db:
+        created = DetectionRepository(db).create_many(batch)
+        assert len(created) == 3
+        assert DetectionRepository(db).count_by_stream("batchtest") == 3
+        track = TrackRepository(db).get_by_id(track_id)
+        assert track.detection_count == 3
+        assert track.peak_confidence == 0.7
+
+
+def test_frame_sampler_backs_off_under_load():
+    """Samples at the target rate, then every Nth frame and keyframes only while backlogged."""
+    sampler = FrameSampler(target_fps=5, high_water=4, max_stride=2, settle_s=1.0)
+    frames = [i / 30 for i in range(60)]
+    assert sum(sampler.should_sample(t) for t in frames) == 10
+
+    assert sampler.adjust(backlog=4, now=0.0)
+    assert sampler.stride == 2
+    assert not sampler.adjust(backlog=4, now=0.5)
+    assert sum(sampler.should_sample(t + 2) for t in frames) == 5
+
+    assert sampler.adjust(backlog=4, now=2.0)
+    assert sampler.keyframes_only
+    assert sampler.should_sample(5.0, key_frame=True)
+    assert not sampler.should_sample(5.1, key_frame=False)
+
+    assert sampler.adjust(backlog=0, now=4.0)
+    assert not sampler.keyframes_only
+    assert sampler.adjust(backlog=0, now=6.0)
+    assert sampler.stride == 1
+
+
+def test_detector_matches_the_edge_detector():
+    """The backend's copy of the edge baseline detector finds the same blobs."""
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("cv2")
+    from app.inference.detector import BlobDetector
+
+    path = Path(__file__).resolve().parents[3] / "jetson" / "src" / "ml" / "detector.py"
+    if not path.exists():
+        pytest.skip("edge tree not checked out")
+    spec = importlib.util.spec_from_file_location("edge_detector", path)
+    edge = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(edge)
+
+    rng = np.random.default_rng(5)
+    frame = rng.normal(120, 3, (240, 320)).clip(0, 255).astype(np.uint8)
+    frame[40:44, 50:54] = 250
+    frame[100:103, 200:206] = 10
+    frame[180:190, 280:288] = 230
+    for polarity in ("both", "bright", "dark"):
+        boxes, scores = BlobDetector(polarity=polarity).detect(frame)
+        edge_boxes, edge_scores = edge.BlobDetector(polarity=polarity).detect(frame)
+        assert len(boxes) > 0
+        np.testing.assert_array_equal(boxes, edge_boxes)
+        np.testing.assert_allclose(scores, edge_scores, rtol=1e-6)
+
+
+def test_detector_pool_restarts_after_a_worker_dies():
+    """A dead worker breaks the pool: submitting to it raises once, then goes to a new pool."""
+    np = pytest.importorskip("numpy")
+    worker = pytest.importorskip("app.inference.worker")
+    pool = worker.DetectorPool(1)
+    try:
+        assert isinstance(pool.submit(os._exit, 1).exception(timeout=60), BrokenProcessPool)
+        gray = np.zeros((64, 64), dtype=np.uint8)
+        gray[30:33, 30:33] = 255
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(worker.detect_frame, "thermal", 0.0, gray, "bright")
+        assert pool.restarts == 1
+        future = pool.submit(worker.detect_frame, "thermal", 0.0, gray, "bright")
+        stream_name, _, hits = future.result(timeout=60)
+        assert stream_name == "thermal" and len(hits) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_detection_writer_survives_a_bad_result(caplog):
+    """A result that doesn't make a valid detection is logged and dropped, the next is written."""
+    worker = pytest.importorskip("app.inference.worker")
+    results = worker.queue.Queue()
+    writer = worker.DetectionWriter(results)
+    writer.start()
+    for stream_name in ("not a stream name", "writertest"):
+        future = worker.Future()
+        future.set_result((stream_name, 1777636800.0, [(0.9, (0, 0, 4, 4))]))
+        results.put(future)
+    results.put(worker._STOP)
+    writer.join(timeout=30)
+    assert not writer.is_alive() and writer.written == 1
+    assert "Dropped a detector result" in caplog.text
+    with TestingSessionLocal() as db:
+        assert db.query(Detection).filter_by(stream_name="writertest").count() == 1
@@ -0,0 +1,125 @@
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+import pytest
+from app.ingest import MEDIA_TYPE, decode_batch, encode_batch
+from app.latency import percentile
+from app.main import app
+from app.repositories import DetectionRepository, TraceRepository
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+
+client = TestClient(app)
+
+
+def traced_detection(stream_name, captured, trace=True):
+    ms = timedelta(milliseconds=1)
+    detection = {
+        "detected_at": captured.isoformat(),
+        "confidence": 0.9,
+        "fused_score": 0.9,
+        "stream_name": stream_name,
+    }
+    if trace:
+        detection["trace"] = {
+            "captured_at": captured.isoformat(),
+            "appsink_at": (captured + 20 * ms).isoformat(),
+            "inference_started_at": (captured + 25 * ms).isoformat(),
+            "inference_ended_at": (captured + 65 * ms).isoformat(),
+            "uploaded_at": (captured + 100 * ms).isoformat(),
+            "clock_offset_ms": -12.5,
+            "clock_error_ms": 0.75,
+        }
+    return detection
+
+
+def test_clock_probe():
+    """The probe brackets the backend's handling time, in Unix seconds."""
+    before = datetime.now(UTC).timestamp()
+    body = client.get("/health/clock").json()
+    assert before <= body["received_at"] <= body["sent_at"] <= datetime.now(UTC).timestamp()
+
+
+def test_traces_are_stored_and_reported_per_hop():
+    """Edge hops come from the trace, backend hops are stamped on insert and acknowledgement."""
+    captured = datetime.now(UTC) - timedelta(seconds=1)
+    single = client.post("/detections", json=traced_detection("trace-api", captured))
+    assert single.status_code == 201
+    assert "trace" not in single.json()
+    batch = [traced_detection("trace-api", captured + timedelta(seconds=i)) for i in range(3)]
+    batch.append(traced_detection("trace-api", captured, trace=False))
+    response = client.post(
+        "/detections/batch", content=encode_batch(batch), headers={"Content-Type": MEDIA_TYPE}
+    )
+    assert response.status_code == 201
+
+    with TestingSessionLocal() as db:
+        stored = TraceRepository(db).get_by_detection(UUID(single.json()["id"]))
+        assert stored.clock_offset_ms == -12.5
+        assert stored.committed_at >= stored.received_at
+
+    report = client.get("/detections/traces/latency", params={"stream_name": "trace-api"}).json()
+    assert report["traces"] == 4
+    assert report["max_clock_error_ms"] == 0.75
+    hops = {hop["hop"]: hop for hop in report["hops"]}
+    assert hops["capture_to_appsink"]["p50_ms"] == 20.0
+    assert hops["inference"]["max_ms"] == 40.0
+    assert hops["network"]["count"] == 4
+    assert hops["commit"]["p99_ms"] >= 0
+    assert hops["delivery"]["count"] == 0
+
+    delivered = {"ids": [single.json()["id"]]}
+    assert client.post("/detections/traces/delivered", json=delivered).json() == {"updated": 1}
+    # the first acknowledgement is the one that counts
+    assert client.post("/detections/traces/delivered", json=delivered).json() == {"updated": 0}
+    report = client.get("/detections/traces/latency", params={"stream_name": "trace-api"}).json()
+    assert report["hops"][6]["hop"] == "delivery"
+    assert report["hops"][6]["count"] == 1
+    assert report["hops"][8]["count"] == 1
+
+
+def test_binary_traces_round_trip():
+    """A trace survives the binary format to the microsecond, missing hops stay missing."""
+    captured = datetime(2026, 5, 1, 12, 0, tzinfo=UTC)
+    detection = traced_detection("trace-bin", captured)
+    del detection["trace"]["inference_started_at"]
+    (row,) = decode_batch(encode_batch([detection]))
+    trace = row["trace"]
+    assert trace["inference_started_at"] is None
+    assert round(trace["uploaded_at"] - trace["captured_at"], 6) == 0.1
+    assert trace["clock_error_ms"] == 0.75
+    assert "trace" not in decode_batch(encode_batch([traced_detection("x", captured, False)]))[0]
+
+
+def test_latency_report_rejects_an_empty_range():
+    start = "2026-05-01T12:00:00Z"
+    response = client.get("/detections/traces/latency", params={"start": start, "end": start})
+    assert response.status_code == 422
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [10.0, 20.0, 30.0, 40.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 50) == 25.0
+    assert percentile(values, 100) == 40.0
+
+
+def test_trace_failure_rolls_back_its_detection(monkeypatch):
+    """The trace is in the detection's transaction, so a failed trace stores nothing and a
+    retry can't duplicate the detection."""
+
+    def fail(self, traces, committed_at):
+        raise RuntimeError("trace insert failed")
+
+    monkeypatch.setattr(TraceRepository, "record", fail)
+    captured = datetime.now(UTC)
+    with pytest.raises(RuntimeError):
+        client.post("/detections", json=traced_detection("trace-rollback", captured))
+    monkeypatch.undo()
+    assert (
+        client.post("/detections", json=traced_detection("trace-rollback", captured)).status_code
+        == 201
+    )
+    with TestingSessionLocal() as db:
+        assert DetectionRepository(db).count_by_stream("trace-rollback") == 1
@@ -0,0 +1,85 @@
+from app import mediamtx
+from app.main import app
+from app.models.stream import Stream
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+
+def register(node_id, *sensors):
+    response = client.post(
+        "/nodes/register",
+        json={"node_id": node_id, "sensors": [{"name": s, "fps": 30} for s in sensors]},
+    )
+    assert response.status_code == 200
+    return {s["sensor"]: s for s in response.json()["streams"]}
+
+
+def test_registration_assigns_stable_unique_ports():
+    """Every sensor gets its own even port, a node registering again keeps its ports."""
+    first = register("edgea", "visual", "thermal")
+    second = register("edgeb", "visual", "thermal")
+    ports = [s["rtp_port"] for s in [*first.values(), *second.values()]]
+    assert len(set(ports)) == 4
+    assert all(port % 2 == 0 for port in ports)
+    assert first["visual"]["stream_name"] == "edgea-visual"
+    assert first["visual"]["hls_url"].endswith("/edgea-visual/index.m3u8")
+
+    assert register("edgea", "visual", "thermal") == first
+    # a dropped sensor frees its port for the next new one
+    assert register("edgeb", "visual") == {"visual": second["visual"]}
+    assert register("edgec", "visual")["visual"]["rtp_port"] == second["thermal"]["rtp_port"]
+
+
+def test_registered_streams_are_listed_and_routed():
+    """Registered streams show up next to the static ones and in the MediaMTX paths."""
+    ports = register("edged", "visual", "ir")
+    streams = {s["name"]: s for s in client.get("/streams").json()["streams"]}
+    assert {"visual", "thermal", "edged-visual", "edged-ir"} <= streams.keys()
+    assert streams["edged-ir"]["node_id"] == "edged"
+    assert client.get("/streams/edged-ir").json()["rtp_port"] == ports["ir"]["rtp_port"]
+    assert client.get("/nodes/edged").json()["streams"][0]["sensor"] == "ir"
+
+    paths = client.get("/nodes/mediamtx.yml").text
+    assert f"source: udp+rtp://0.0.0.0:{ports['ir']['rtp_port']}" in paths
+    assert "a=rtpmap:96 H264/90000" in paths
+
+    assert client.delete("/nodes/edged").status_code == 204
+    assert client.get("/streams/edged-ir").status_code == 404
+    assert client.get("/nodes/edged").status_code == 404
+
+
+def test_detections_are_partitioned_by_node():
+    """Detections of a registered stream carry its node and can be filtered by it."""
+    register("edgee", "visual")
+    for stream_name in ("edgee-visual", "edgee-visual", "visual"):
+        detection = {
+            "detected_at": "2026-06-01T12:00:00Z",
+            "confidence": 0.8,
+            "fused_score": 0.8,
+            "stream_name": stream_name,
+        }
+        assert client.post("/detections", json=detection).status_code == 201
+    rows = client.get("/detections", params={"node_id": "edgee"}).json()
+    assert len(rows) == 2
+    assert {row["node_id"] for row in rows} == {"edgee"}
+
+
+def test_render_config_keeps_settings_and_replaces_paths():
+    base = "rtspAddress: :8554\nhlsAddress: :8888\n\npaths:\n  old:\n    source: publisher\n"
+    stream = Stream(name="n1-visual", node_id="n1", sensor="visual", rtp_port=5000, codec="H265")
+    config = mediamtx.render_config(base, [stream])
+    assert config.startswith("rtspAddress: :8554\nhlsAddress: :8888\n\npaths:\n")
+    assert "old:" not in config
+    assert "  visual:\n    source: publisher" in config
+    assert "a=rtpmap:96 H265/90000" in config
+
+
+def test_registration_rejects_invalid_nodes():
+    for body in (
+        {"node_id": "a-b", "sensors": [{"name": "visual"}]},
+        {"node_id": "edgef", "sensors": []},
+        {"node_id": "edgef", "sensors": [{"name": "visual"}, {"name": "visual"}]},
+        {"node_id": "edgef", "sensors": [{"name": "Visual!"}]},
+    ):
+        assert client.post("/nodes/register", json=body).status_code == 422
@@ -0,0 +1,156 @@
+import io
+import os
+import threading
+from datetime import UTC, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.main import app
+from app.snapshots import DiskLRU, SnapshotService
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+STREAM = "snapshottest"
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    """Snapshot service on a temporary store and cache for one test"""
+    service = SnapshotService(store=tmp_path / "store", cache_dir=tmp_path / "cache", cache_mb=1)
+    app.state.snapshots = service
+    yield service
+    del app.state.snapshots
+    service.close()
+
+
+def post_detection(url: str) -> str:
+    """Post a detection with a snapshot URL, returns the detection ID"""
+    response = client.post(
+        "/detections",
+        json={
+            "detected_at": datetime.now(UTC).isoformat(),
+            "confidence": 0.9,
+            "fused_score": 0.9,
+            "stream_name": STREAM,
+            "frame_snapshot_url": url,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def store_snapshot(service: SnapshotService, key: str, data: bytes) -> str:
+    """Put data in the store and post a detection pointing at it, returns the detection ID"""
+    path = os.path.join(service.store, "detections", key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return post_detection(f"s3://detections/{key}")
+
+
+class SnapshotHost(BaseHTTPRequestHandler):
+    """An image, a page and a redirect to another host"""
+
+    def do_GET(self):
+        port = self.server.server_address[1]
+        if self.path == "/frame.png":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            body = b"png bytes"
+        elif self.path == "/moved.png":
+            self.send_response(302)
+            self.send_header("Location", f"http://localhost:{port}/frame.png")
+            body = b""
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            body = b"<html>internal</html>"
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_original_with_etag_and_range(snapshots):
+    data = bytes(range(256)) * 4
+    detection_id = store_snapshot(snapshots, "original.png", data)
+
+    response = client.get(f"/snapshots/{detection_id}")
+    assert response.status_code == 200 and response.content == data
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+
+    cached = client.get(f"/snapshots/{detection_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and not cached.content
+
+    part = client.get(f"/snapshots/{detection_id}", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206 and part.content == data[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    suffix = client.get(f"/snapshots/{detection_id}", headers={"Range": "bytes=-5"})
+    assert suffix.content == data[-5:]
+    outside = client.get(f"/snapshots/{detection_id}", headers={"Range": "bytes=5000-"})
+    assert outside.status_code == 416
+    assert snapshots.cache.stats()["hits"] >= 2
+
+
+def test_resized_variant_is_generated_once(snapshots):
+    image_module = pytest.importorskip("PIL.Image")
+    original = io.BytesIO()
+    image_module.new("RGB", (1280, 720), (200, 30, 30)).save(original, "JPEG")
+    detection_id = store_snapshot(snapshots, "frame.jpg", original.getvalue())
+
+    responses = [client.get(f"/snapshots/{detection_id}", params={"width": 160}) for _ in range(3)]
+    assert {r.status_code for r in responses} == {200}
+    with image_module.open(io.BytesIO(responses[0].content)) as thumbnail:
+        assert thumbnail.size == (160, 90)
+    assert responses[0].headers["etag"] != client.get(f"/snapshots/{detection_id}").headers["etag"]
+    assert snapshots.generated == 1
+
+    assert client.get(f"/snapshots/{detection_id}", params={"width": 123}).status_code == 422
+
+    # not an image Pillow can decode: the original is served as is, a thumbnail can't be made
+    broken = store_snapshot(snapshots, "broken.jpg", b"not a jpeg")
+    assert client.get(f"/snapshots/{broken}").status_code == 200
+    assert client.get(f"/snapshots/{broken}", params={"width": 160}).status_code == 502
+
+
+def test_missing_snapshots(snapshots):
+    assert client.get("/snapshots/00000000-0000-0000-0000-000000000000").status_code == 404
+    detection_id = store_snapshot(snapshots, "gone.jpg", b"x")
+    os.remove(os.path.join(snapshots.store, "detections", "gone.jpg"))
+    assert client.get(f"/snapshots/{detection_id}").status_code == 404
+
+
+def test_disk_lru_evicts_least_recently_used(tmp_path):
+    cache = DiskLRU(tmp_path, max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") is not None  # b is now the least recently used
+    cache.put("c", b"c" * 100)
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.size == 200
+    # recency and size are picked up again from the directory
+    assert DiskLRU(tmp_path, max_bytes=250).size == 200
+
+
+def test_http_snapshots_only_from_allowed_hosts(snapshots):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SnapshotHost)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        snapshots.http_hosts = {"127.0.0.1"}
+        image = client.get(f"/snapshots/{post_detection(f'{base}/frame.png')}")
+        assert image.status_code == 200 and image.content == b"png bytes"
+        # not an image
+        assert client.get(f"/snapshots/{post_detection(f'{base}/admin')}").status_code == 502
+        # redirected to a host that isn't allowed (localhost is the same server)
+        assert client.get(f"/snapshots/{post_detection(f'{base}/moved.png')}").status_code == 403
+        snapshots.http_hosts = set()
+        other = post_detection(f"{base}/frame.png?again")
+        assert client.get(f"/snapshots/{other}").status_code == 403
+    finally:
+        server.shutdown()
@@ -0,0 +1,82 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from app.main import app
+from app.models.detection import Detection
+from app.repositories import TrackRepository
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+
+client = TestClient(app)
+
+
+def post_track_event(track_id, event, detected_at, confidence):
+    response = client.post(
+        "/detections",
+        json={
+            "detected_at": detected_at,
+            "confidence": confidence,
+            "fused_score": confidence,
+            "direction": "NE",
+            "stream_name": "tracktest",
+            "track_id": track_id,
+            "track_event": event,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_track_events_build_summary():
+    """Start, update and end events fold into a single track summary."""
+    track_id = str(uuid4())
+    post_track_event(track_id, "start", "2026-03-01T10:15:00Z", 0.7)
+    post_track_event(track_id, "update", "2026-03-01T10:15:01Z", 0.95)
+
+    response = client.get(f"/tracks/{track_id}")
+    assert response.status_code == 200
+    track = response.json()
+    assert track["status"] == "active"
+    assert track["detection_count"] == 2
+    assert track["peak_confidence"] == 0.95
+
+    post_track_event(track_id, "end", "2026-03-01T10:15:02Z", 0.6)
+    track = client.get(f"/tracks/{track_id}").json()
+    assert track["status"] == "ended"
+    assert track["detection_count"] == 3
+    assert track["ended_at"].startswith("2026-03-01T10:15:02")
+
+    detections = client.get(f"/tracks/{track_id}/detections").json()
+    assert [d["track_event"] for d in detections] == ["start", "update", "end"]
+
+    active = client.get("/tracks", params={"stream_name": "tracktest", "active_only": True})
+    assert track_id not in [t["id"] for t in active.json()]
+
+
+def test_zero_distance_is_the_last_distance():
+    """A detection at 0 ft (stored directly, the API only takes positive distances) replaces
+    the track's last distance, one without a distance doesn't."""
+    track_id = uuid4()
+    with TestingSessionLocal() as db:
+        repo = TrackRepository(db)
+        for second, distance in ((0, 250.0), (1, 0.0), (2, None)):
+            repo.apply_detection(
+                Detection(
+                    detected_at=datetime(2026, 3, 3, 10, 0, second, tzinfo=UTC),
+                    confidence=0.8,
+                    fused_score=0.8,
+                    distance_ft=distance,
+                    stream_name="tracktest",
+                    track_id=track_id,
+                )
+            )
+        db.commit()
+    track = client.get(f"/tracks/{track_id}").json()
+    assert track["detection_count"] == 3 and track["last_distance_ft"] == 0.0
+
+
+def test_unknown_track_returns_404():
+    """Requesting a track that was never reported returns 404."""
+    response = client.get(f"/tracks/{uuid4()}")
+    assert response.status_code == 404
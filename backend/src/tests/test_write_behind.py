@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+import pytest
+from app.database.schemas import DetectionCreate
+from app.main import app
+from app.repositories import DetectionRepository, TraceRepository
+from app.write_behind import WriteBehindQueue
+from fastapi.testclient import TestClient
+
+from tests.conftest import TestingSessionLocal
+from tests.test_latency_traces import traced_detection
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def write_behind(request):
+    """POST /detections through a write-behind queue on the test database for one test"""
+    queue = WriteBehindQueue(TestingSessionLocal, **getattr(request, "param", {}))
+    app.state.write_behind = queue
+    yield queue
+    app.state.write_behind = None
+    queue.stop(timeout=5)
+
+
+def test_queued_detections_are_group_committed_and_drained(write_behind):
+    """Accepted mode answers before the write, stop() drains everything still queued."""
+    write_behind.start()
+    captured = datetime.now(UTC) - timedelta(seconds=1)
+    posts = [
+        traced_detection("wb-accepted", captured + timedelta(milliseconds=i)) for i in range(60)
+    ]
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda d: client.post("/detections", json=d), posts))
+    assert {r.status_code for r in responses} == {202}
+    assert {r.json()["status"] for r in responses} == {"queued"}
+
+    assert write_behind.stop(timeout=5)
+    health = client.get("/health/ingest").json()
+    assert health["written"] == 60 and health["queue_depth"] == 0 and health["failed"] == 0
+    assert health["batches"] < 60
+
+    with TestingSessionLocal() as db:
+        repo = DetectionRepository(db)
+        assert repo.count_by_stream("wb-accepted") == 60
+        # the ID in the response is the stored one, the trace keeps when the post arrived
+        detection_id = UUID(responses[0].json()["id"])
+        assert repo.get_by_id(detection_id) is not None
+        trace = TraceRepository(db).get_by_detection(detection_id)
+        assert trace.received_at <= trace.committed_at
+
+
+@pytest.mark.parametrize("write_behind", [{"durability": "committed"}], indirect=True)
+def test_committed_durability_answers_after_the_commit(write_behind):
+    write_behind.start()
+    detection = traced_detection("wb-committed", datetime.now(UTC), trace=False)
+    response = client.post("/detections", json=detection)
+    assert response.status_code == 202
+    assert response.json()["status"] == "committed"
+    assert client.get(f"/detections/{response.json()['id']}").status_code == 200
+
+    health = client.get("/health/ingest").json()
+    assert health["enabled"] and health["durability"] == "committed"
+    assert health["written"] == 1 and health["batches"] == 1
+
+
+@pytest.mark.parametrize("write_behind", [{"max_queue": 2}], indirect=True)
+def test_full_queue_pushes_back(write_behind):
+    """Writer not started: the queue fills and further posts get 503 with Retry-After."""
+    detection = traced_detection("wb-full", datetime.now(UTC), trace=False)
+    statuses = [client.post("/detections", json=detection).status_code for _ in range(3)]
+    assert statuses == [202, 202, 503]
+    assert client.get("/health/ingest").json()["queue_depth"] == 2
+    assert write_behind.rejected == 1
+
+    write_behind.start()
+    assert write_behind.stop(timeout=5)
+    assert write_behind.written == 2
+    response = client.post("/detections", json=detection)
+    assert response.status_code == 503 and "Retry-After" in response.headers
+
+
+@pytest.mark.parametrize("write_behind", [{"durability": "committed"}], indirect=True)
+def test_bad_detection_fails_alone(write_behind):
+    """A row the database rejects is split out of its group, the others still commit."""
+    good = DetectionCreate(**traced_detection("wb-poison", datetime.now(UTC), trace=False))
+    # no confidence: passes the queue, violates NOT NULL in the insert
+    bad = good.model_copy(update={"confidence": None})
+    futures = [write_behind.submit(d)[1] for d in [good] * 5 + [bad] + [good] * 4]
+    write_behind.start()
+    outcomes = [future.exception(timeout=5) for future in futures]
+    assert [e is None for e in outcomes] == [True] * 5 + [False] + [True] * 4
+    assert write_behind.written == 9 and write_behind.failed == 1
+
+    # the writer is still alive for the next group
+    assert write_behind.submit(good)[1].exception(timeout=5) is None
+    with TestingSessionLocal() as db:
+        assert DetectionRepository(db).count_by_stream("wb-poison") == 10
@@ -0,0 +1,270 @@
+# Near-duplicate suppression for detection snapshots
+# A hovering drone is detected frame after frame in a scene that hardly changes, and every one
+# of those detections used to get its own snapshot: a JPEG encode on the Jetson and an upload
+# over the backhaul, for pictures nobody can tell apart. Each snapshot candidate is now hashed
+# first and looked up among the stream's recent snapshots:
+#
+#   dHash   9x8 grey thumbnail, one bit per horizontal neighbour pair (left brighter than right)
+#   pHash   32x32 grey thumbnail, 2-D DCT, one bit per low frequency coefficient (8x8 minus DC)
+#           above their median
+#
+# The frame is shrunk to one 32x32 thumbnail first (the only step that touches the frame) and
+# both 64 bit hashes come from it in NumPy, for a whole stack of thumbnails at once (the DCT is
+# two matrix products). A candidate is a duplicate of an indexed snapshot when both hashes are
+# within DEDUP_PHASH_DISTANCE / DEDUP_DHASH_DISTANCE bits (Hamming distance, XOR + popcount over
+# the index in one go). A few pixel drone barely changes a frame hash, so with a detection box
+# the box also can't have moved more than DEDUP_MAX_SHIFT of the frame, and a drone crossing a
+# static sky still gets new snapshots. (Hashes of the crop around the box were tried and are
+# too noisy to be useful: a few pixels of hover jitter flip a third of their bits.)
+# Duplicates reuse the indexed snapshot's URL, nothing is encoded or sent. Matches are only made
+# against snapshots from the last DEDUP_MAX_AGE_S, so a long hover still refreshes its picture
+# now and then.
+#
+# Hit rate and hashing cost against JPEG encoding on a synthetic hover: python3 -m ml.dedup
+
+import os
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+SNAPSHOT_DEDUP = os.getenv("SNAPSHOT_DEDUP", "1") != "0"
+DEDUP_PHASH_DISTANCE = int(os.getenv("DEDUP_PHASH_DISTANCE", 8))
+DEDUP_DHASH_DISTANCE = int(os.getenv("DEDUP_DHASH_DISTANCE", 12))
+DEDUP_MAX_SHIFT = float(os.getenv("DEDUP_MAX_SHIFT", 0.05))
+DEDUP_MAX_AGE_S = float(os.getenv("DEDUP_MAX_AGE_S", 30))
+# snapshots remembered per stream
+DEDUP_INDEX_SIZE = int(os.getenv("DEDUP_INDEX_SIZE", 256))
+
+# orthonormal DCT-II matrix for 32 samples, pHash's transform is DCT @ block @ DCT.T
+_N = 32
+_k = np.arange(_N)
+DCT = np.sqrt(2.0 / _N) * np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _N))
+DCT[0] /= np.sqrt(2.0)
+# set bits per byte value, for popcounts of uint64 arrays viewed as bytes
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def thumbnails(images):
+    """Each image (BGR or grey) as a 32x32 float32 grey thumbnail, stacked"""
+    thumbs = []
+    for image in images:
+        # every step-th pixel first, still 4x the thumbnail, then an area average: a fifth of
+        # the cost of averaging the full frame and the hash hardly notices. Colour conversion
+        # comes last, on 32x32 pixels
+        step = max(min(image.shape[:2]) // (_N * 4), 1)
+        thumb = cv2.resize(
+            np.ascontiguousarray(image[::step, ::step]), (_N, _N), interpolation=cv2.INTER_AREA
+        )
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        thumbs.append(thumb)
+    return np.stack(thumbs).astype(np.float32)
+
+
+def _pack(bits):
+    """(n, 64) booleans -> n uint64"""
+    return (bits.astype(np.uint64) * _WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def dhash(thumbs):
+    """64 bit difference hash of each thumbnail, as a uint64 array"""
+    # 9x8 by averaging the 32x32 thumbnail: columns in 9 strips, rows in 8 bands of 4
+    strips = np.add.reduceat(thumbs, np.linspace(0, _N, 10).astype(int)[:-1], axis=2)
+    small = strips.reshape(len(thumbs), 8, 4, 9).mean(axis=2)
+    return _pack((small[:, :, :-1] > small[:, :, 1:]).reshape(len(thumbs), 64))
+
+
+def phash(thumbs):
+    """64 bit DCT hash of each thumbnail, as a uint64 array"""
+    coefficients = np.matmul(np.matmul(DCT, thumbs), DCT.T)[:, :8, :8].reshape(len(thumbs), 64)
+    # the DC term is the mean brightness, leave it out of the median
+    median = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+    return _pack(coefficients > median)
+
+
+def hamming(value, hashes):
+    """Bits differing between value and each of hashes"""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value))
+    return POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """A stream's most recent snapshots: their hashes, box centres, times and URLs"""
+
+    def __init__(self, size=DEDUP_INDEX_SIZE):
+        self.size = size
+        self.hashes = np.zeros((size, 2), dtype=np.uint64)  # pHash, dHash
+        self.centres = np.full((size, 2), np.nan)  # box centre as a fraction of the frame
+        self.times = np.full(size, -np.inf)
+        self.urls = [None] * size
+        self.next = 0
+
+    def nearest(self, hashes, centre, now, phash_distance, dhash_distance, max_shift, max_age):
+        """URL of the closest recent snapshot within the distances, or None"""
+        recent = self.times >= now - max_age
+        if not recent.any():
+            return None
+        distances = np.stack([hamming(value, self.hashes[:, i]) for i, value in enumerate(hashes)])
+        limits = np.array([phash_distance, dhash_distance])[:, None]
+        match = recent & (distances <= limits).all(axis=0)
+        if centre is None:
+            match &= np.isnan(self.centres[:, 0])
+        else:
+            match &= np.hypot(*(self.centres - centre).T) <= max_shift
+        if not match.any():
+            return None
+        best = np.flatnonzero(match)[np.argmin(distances.sum(axis=0)[match])]
+        return self.urls[best]
+
+    def add(self, hashes, centre, now, url):
+        i = self.next % self.size
+        self.hashes[i] = hashes
+        self.centres[i] = np.nan if centre is None else centre
+        self.times[i] = now
+        self.urls[i] = url
+        self.next += 1
+
+
+class SnapshotDeduplicator:
+    """Snapshot URLs for detections, reusing the URL of a near-identical recent snapshot.
+
+    store(stream, image, detected_at) encodes and uploads a new snapshot and returns its URL;
+    it is only called for snapshots that aren't duplicates.
+    """
+
+    def __init__(
+        self,
+        store,
+        phash_distance=DEDUP_PHASH_DISTANCE,
+        dhash_distance=DEDUP_DHASH_DISTANCE,
+        max_shift=DEDUP_MAX_SHIFT,
+        max_age_s=DEDUP_MAX_AGE_S,
+        index_size=DEDUP_INDEX_SIZE,
+        enabled=SNAPSHOT_DEDUP,
+        clock=time.monotonic,
+    ):
+        self.store = store
+        self.phash_distance = phash_distance
+        self.dhash_distance = dhash_distance
+        self.max_shift = max_shift
+        self.max_age_s = max_age_s
+        self.index_size = index_size
+        self.enabled = enabled
+        self.clock = clock
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+        self.per_stream = {}  # stream -> [hits, misses]
+        self.hash_ms = deque(maxlen=500)
+
+    @staticmethod
+    def hashes(image, box=None):
+        """(pHash, dHash) of image and the box centre as a fraction of the frame"""
+        thumbs = thumbnails([image])
+        centre = None
+        if box is not None:
+            h, w = image.shape[:2]
+            centre = np.array([(box[0] + box[2]) / 2.0 / w, (box[1] + box[3]) / 2.0 / h])
+        return [phash(thumbs)[0], dhash(thumbs)[0]], centre
+
+    def snapshot_url(self, stream, image, box=None, detected_at=None):
+        """URL for a detection's snapshot of image: an indexed one if it's a duplicate, else a
+        new one from store()"""
+        if not self.enabled:
+            return self.store(stream, image, detected_at)
+        started = time.perf_counter()
+        hashes, centre = self.hashes(image, box)
+        now = self.clock()
+        index = self.indexes.setdefault(stream, HashIndex(self.index_size))
+        url = index.nearest(
+            hashes,
+            centre,
+            now,
+            self.phash_distance,
+            self.dhash_distance,
+            self.max_shift,
+            self.max_age_s,
+        )
+        self.hash_ms.append((time.perf_counter() - started) * 1000)
+        counts = self.per_stream.setdefault(stream, [0, 0])
+        if url is not None:
+            self.hits += 1
+            counts[0] += 1
+            return url
+        self.misses += 1
+        counts[1] += 1
+        url = self.store(stream, image, detected_at)
+        index.add(hashes, centre, now, url)
+        return url
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "mean_hash_ms": round(float(np.mean(self.hash_ms)), 3) if self.hash_ms else None,
+            "streams": {
+                stream: {"hits": h, "misses": m, "hit_rate": round(h / (h + m), 3)}
+                for stream, (h, m) in self.per_stream.items()
+            },
+        }
+
+
+def _scene(rng, shape=(720, 1280)):
+    """Sky gradient with some cloud texture"""
+    h, w = shape
+    sky = np.linspace(200, 150, h)[:, None] * np.ones((1, w))
+    clouds = cv2.GaussianBlur(rng.normal(0, 25, (h // 8, w // 8)), (0, 0), 3)
+    sky = sky + cv2.resize(clouds, (w, h))
+    return np.clip(np.repeat(sky[:, :, None], 3, axis=2), 0, 255).astype(np.uint8)
+
+
+def _frames(rng, count=600):
+    """A drone hovering with jitter and sensor noise, crossing the frame, then another scene"""
+    backgrounds = [_scene(rng), _scene(rng)]
+    for i in range(count):
+        if i < count // 2:
+            x, y = 640 + rng.integers(-3, 4), 300 + rng.integers(-3, 4)  # hovering
+        else:
+            x, y = 200 + (i - count // 2) * 3, 300  # crossing, 3 px a frame
+        background = backgrounds[0] if i < count * 5 // 6 else backgrounds[1]
+        frame = background.copy()
+        cv2.rectangle(frame, (x - 6, y - 3), (x + 6, y + 3), (40, 40, 40), -1)
+        noise = rng.normal(0, 3, frame.shape)
+        yield np.clip(frame + noise, 0, 255).astype(np.uint8), (x - 6, y - 3, x + 6, y + 3)
+
+
+def benchmark(count=600):
+    rng = np.random.default_rng(0)
+    stored = []
+    encode_ms = []
+
+    def store(stream, image, detected_at):
+        started = time.perf_counter()
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        encode_ms.append((time.perf_counter() - started) * 1000)
+        stored.append(len(jpeg))
+        return f"s3://detections/{stream}/{len(stored)}.jpg"
+
+    # frames at 30 fps on a simulated clock, so the age limit behaves as it would live
+    frame_time = [0.0]
+    dedup = SnapshotDeduplicator(store, clock=lambda: frame_time[0])
+    for i, (frame, box) in enumerate(_frames(rng, count)):
+        frame_time[0] = i / 30.0
+        dedup.snapshot_url("visual", frame, box)
+    stats = dedup.stats()
+    mean_jpeg = sum(stored) / len(stored)
+    print(f"{count} detections, {len(stored)} snapshots stored, hit rate {stats['hit_rate']:.1%}")
+    print(
+        f"hashing {stats['mean_hash_ms']:.2f} ms a detection, JPEG encode "
+        f"{np.mean(encode_ms):.2f} ms and {mean_jpeg / 1024:.0f} KiB a snapshot"
+    )
+    print(f"upload saved: {stats['hits'] * mean_jpeg / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,273 @@
+# Thermal <-> RGB registration and fused_score computation
+# The thermal camera is 160x120 and the RGB camera is 1280x720, so thermal candidates have to be
+# moved into RGB pixel space before they can be compared. A calibrated homography does that, but
+# instead of evaluating it per frame the mapping is baked into lookup tables once at startup, so
+# projecting boxes and warping whole thermal frames is plain array indexing. For a handful of box
+# corners that is about a wash with the direct math, for a full frame warp it's several times
+# faster, and the tables can absorb lens distortion later without changing the per-frame cost.
+# Homography refresher: https://docs.opencv.org/4.x/d9/dab/tutorial_homography.html
+#
+# Microbenchmark on synthetic candidates: python3 -m ml.fusion
+
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ml.tracker import iou_matrix
+
+THERMAL_SIZE = (160, 120)  # (width, height)
+RGB_SIZE = (1280, 720)
+
+FUSION_CALIBRATION = os.getenv("FUSION_CALIBRATION", "calibration/thermal_to_rgb.json")
+
+# Per candidate arrays, visual/thermal are NaN when that sensor didn't see the candidate
+FusionResult = namedtuple("FusionResult", ["boxes", "visual", "thermal", "fused"])
+
+
+def default_homography(thermal_size=THERMAL_SIZE, rgb_size=RGB_SIZE):
+    """Plain scale between the two frames, only good enough until the rig is calibrated"""
+    return np.array(
+        [
+            [rgb_size[0] / thermal_size[0], 0.0, 0.0],
+            [0.0, rgb_size[1] / thermal_size[1], 0.0],
+            [0.0, 0.0, 1.0],
+        ]
+    )
+
+
+def load_homography(path=FUSION_CALIBRATION, thermal_size=THERMAL_SIZE, rgb_size=RGB_SIZE):
+    """Load a 3x3 thermal -> RGB homography from a .npy file or a JSON file with a "homography"
+    key (e.g. the output of cv2.findHomography saved with .tolist()).
+    Falls back to a plain scale between the frame sizes if there is no calibration file yet."""
+    if not os.path.exists(path):
+        print(f"No fusion calibration at {path}, using plain thermal->RGB scaling")
+        return default_homography(thermal_size, rgb_size)
+    if path.endswith(".npy"):
+        homography = np.load(path)
+    else:
+        with open(path) as f:
+            homography = np.array(json.load(f)["homography"], dtype=np.float64)
+    if homography.shape != (3, 3):
+        raise ValueError(f"Homography in {path} must be 3x3, got {homography.shape}")
+    return homography
+
+
+def apply_homography(homography, xs, ys):
+    """Project points through a homography, the per-frame work the lookup tables replace"""
+    w = homography[2, 0] * xs + homography[2, 1] * ys + homography[2, 2]
+    u = (homography[0, 0] * xs + homography[0, 1] * ys + homography[0, 2]) / w
+    v = (homography[1, 0] * xs + homography[1, 1] * ys + homography[1, 2]) / w
+    return u, v
+
+
+class ThermalRgbRegistration:
+    """Precomputed thermal <-> RGB lookup tables for one calibrated homography.
+
+    corner_x/corner_y: RGB coordinates of every thermal pixel corner, shape (th + 1, tw + 1), so
+        a thermal box edge on any integer coordinate maps with a single lookup.
+    remap_x/remap_y: for every RGB pixel, the thermal pixel it comes from (cv2.remap style maps),
+        used to warp a whole thermal frame into RGB space for overlays/debugging.
+    """
+
+    def __init__(self, homography, thermal_size=THERMAL_SIZE, rgb_size=RGB_SIZE):
+        self.homography = np.asarray(homography, dtype=np.float64)
+        self.thermal_size = thermal_size
+        self.rgb_size = rgb_size
+
+        tw, th = thermal_size
+        ys, xs = np.mgrid[0 : th + 1, 0 : tw + 1].astype(np.float64)
+        u, v = apply_homography(self.homography, xs, ys)
+        self.corner_x = u.astype(np.float32)
+        self.corner_y = v.astype(np.float32)
+        # flat copies so a lookup is one np.take per axis
+        self._corner_x_flat = self.corner_x.ravel()
+        self._corner_y_flat = self.corner_y.ravel()
+
+        rw, rh = rgb_size
+        ys, xs = np.mgrid[0:rh, 0:rw].astype(np.float64)
+        # sample at pixel centers so the warp doesn't drift half a pixel
+        u, v = apply_homography(np.linalg.inv(self.homography), xs + 0.5, ys + 0.5)
+        self.remap_x = np.floor(u).astype(np.int16)
+        self.remap_y = np.floor(v).astype(np.int16)
+        self.remap_valid = (
+            (self.remap_x >= 0) & (self.remap_x < tw) & (self.remap_y >= 0) & (self.remap_y < th)
+        )
+        np.clip(self.remap_x, 0, tw - 1, out=self.remap_x)
+        np.clip(self.remap_y, 0, th - 1, out=self.remap_y)
+        self._remap_flat = (self.remap_y.astype(np.intp) * tw + self.remap_x).ravel()
+
+    @classmethod
+    def from_file(cls, path=FUSION_CALIBRATION):
+        return cls(load_homography(path))
+
+    def project_boxes(self, thermal_boxes):
+        """Thermal [x1, y1, x2, y2] boxes (N, 4) -> axis aligned RGB boxes (N, 4).
+        Corners snap to the thermal pixel grid, finer than thermal blobs are accurate anyway."""
+        boxes = np.asarray(thermal_boxes, dtype=np.float32).reshape(-1, 4)
+        tw, th = self.thermal_size
+        xi = np.clip((boxes[:, [0, 2, 0, 2]] + 0.5).astype(np.intp), 0, tw)
+        yi = np.clip((boxes[:, [1, 1, 3, 3]] + 0.5).astype(np.intp), 0, th)
+        flat = yi * (tw + 1) + xi
+        u = self._corner_x_flat.take(flat)
+        v = self._corner_y_flat.take(flat)
+        return np.stack([u.min(axis=1), v.min(axis=1), u.max(axis=1), v.max(axis=1)], axis=1)
+
+    def warp_thermal(self, thermal_frame):
+        """Resample a thermal frame into RGB pixel space, pixels outside the thermal FOV are 0"""
+        th, tw = thermal_frame.shape[:2]
+        pixels = thermal_frame.reshape((th * tw,) + thermal_frame.shape[2:])
+        warped = pixels.take(self._remap_flat, axis=0)
+        warped = warped.reshape(self.remap_x.shape + thermal_frame.shape[2:])
+        warped[~self.remap_valid] = 0
+        return warped
+
+
+class FusionScorer:
+    """Combines RGB and thermal candidates of one frame pair into fused scores.
+
+    Each RGB candidate is paired with the projected thermal candidate it overlaps most. Pairs with
+    IoU >= iou_threshold are corroborated and score visual_weight * v + thermal_weight * t plus a
+    small bonus for how well they line up. Anything seen by one sensor only keeps its own score
+    scaled by single_sensor_weight, since a drone should normally show up in both.
+    """
+
+    def __init__(
+        self,
+        registration,
+        iou_threshold=0.1,
+        visual_weight=0.6,
+        thermal_weight=0.4,
+        overlap_bonus=0.1,
+        single_sensor_weight=0.6,
+    ):
+        self.registration = registration
+        self.iou_threshold = iou_threshold
+        self.visual_weight = visual_weight
+        self.thermal_weight = thermal_weight
+        self.overlap_bonus = overlap_bonus
+        self.single_sensor_weight = single_sensor_weight
+
+    def fuse(self, rgb_boxes, rgb_scores, thermal_boxes, thermal_scores):
+        """rgb_boxes in RGB pixels, thermal_boxes in thermal pixels. Returns a FusionResult with
+        one row per RGB candidate followed by one row per thermal-only candidate."""
+        rgb_boxes = np.asarray(rgb_boxes, dtype=np.float32).reshape(-1, 4)
+        rgb_scores = np.asarray(rgb_scores, dtype=np.float32).reshape(-1)
+        thermal_scores = np.asarray(thermal_scores, dtype=np.float32).reshape(-1)
+        projected = self.registration.project_boxes(thermal_boxes)
+
+        n_rgb, n_thermal = len(rgb_boxes), len(projected)
+        visual = rgb_scores.copy()
+        thermal = np.full(n_rgb, np.nan, dtype=np.float32)
+        fused = rgb_scores * self.single_sensor_weight
+        thermal_used = np.zeros(n_thermal, dtype=bool)
+
+        if n_rgb and n_thermal:
+            iou = iou_matrix(rgb_boxes, projected)
+            best = iou.argmax(axis=1)
+            best_iou = iou[np.arange(n_rgb), best]
+            paired = best_iou >= self.iou_threshold
+            thermal[paired] = thermal_scores[best[paired]]
+            fused[paired] = (
+                self.visual_weight * visual[paired]
+                + self.thermal_weight * thermal[paired]
+                + self.overlap_bonus * best_iou[paired]
+            )
+            thermal_used[best[paired]] = True
+
+        only_thermal = ~thermal_used
+        boxes = np.concatenate([rgb_boxes, projected[only_thermal]])
+        visual = np.concatenate([visual, np.full(only_thermal.sum(), np.nan, dtype=np.float32)])
+        thermal = np.concatenate([thermal, thermal_scores[only_thermal]])
+        fused = np.concatenate([fused, thermal_scores[only_thermal] * self.single_sensor_weight])
+        return FusionResult(boxes, visual, thermal, np.clip(fused, 0.0, 1.0).astype(np.float32))
+
+
+def synthetic_candidates(rng, n, registration):
+    """n drones seen by both sensors plus n false alarms per sensor"""
+    tw, th = registration.thermal_size
+    tx = rng.uniform(0, tw - 8, n)
+    ty = rng.uniform(0, th - 8, n)
+    thermal_true = np.stack([tx, ty, tx + 4, ty + 3], axis=1)
+    rgb_true = registration.project_boxes(thermal_true) + rng.normal(0, 2, (n, 4))
+    fx = rng.uniform(0, tw - 8, n)
+    fy = rng.uniform(0, th - 8, n)
+    thermal_false = np.stack([fx, fy, fx + 4, fy + 3], axis=1)
+    rw, rh = registration.rgb_size
+    gx = rng.uniform(0, rw - 40, n)
+    gy = rng.uniform(0, rh - 30, n)
+    rgb_false = np.stack([gx, gy, gx + 32, gy + 24], axis=1)
+    return (
+        np.concatenate([rgb_true, rgb_false]),
+        rng.uniform(0.3, 1.0, 2 * n),
+        np.concatenate([thermal_true, thermal_false]),
+        rng.uniform(0.3, 1.0, 2 * n),
+    )
+
+
+def project_boxes_direct(homography, thermal_boxes):
+    """project_boxes without the lookup tables, only kept for the benchmark"""
+    boxes = np.asarray(thermal_boxes, dtype=np.float32).reshape(-1, 4)
+    u, v = apply_homography(homography, boxes[:, [0, 2, 0, 2]], boxes[:, [1, 1, 3, 3]])
+    return np.stack([u.min(axis=1), v.min(axis=1), u.max(axis=1), v.max(axis=1)], axis=1)
+
+
+def warp_thermal_direct(homography, thermal_frame, rgb_size=RGB_SIZE):
+    """warp_thermal without the lookup tables, only kept for the benchmark"""
+    th, tw = thermal_frame.shape[:2]
+    ys, xs = np.mgrid[0 : rgb_size[1], 0 : rgb_size[0]]
+    u, v = apply_homography(np.linalg.inv(homography), xs + 0.5, ys + 0.5)
+    u = np.clip(np.floor(u).astype(np.intp), 0, tw - 1)
+    v = np.clip(np.floor(v).astype(np.intp), 0, th - 1)
+    return thermal_frame[v, u]
+
+
+def _time_us(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def benchmark(candidates=8, iterations=2000):
+    rng = np.random.RandomState(0)
+
+    start = time.perf_counter()
+    registration = ThermalRgbRegistration(load_homography())
+    print(f"lookup tables built in {(time.perf_counter() - start) * 1e3:.1f} ms (once at startup)")
+
+    scorer = FusionScorer(registration)
+    frames = [synthetic_candidates(rng, candidates, registration) for _ in range(64)]
+    thermal_boxes = [f[2] for f in frames]
+
+    homography = registration.homography
+    thermal_frame = rng.randint(0, 255, (120, 160, 3)).astype(np.uint8)
+    results = [
+        (
+            "box projection via lookup table",
+            _time_us(lambda i: registration.project_boxes(thermal_boxes[i % 64]), iterations),
+        ),
+        (
+            "box projection via homography",
+            _time_us(lambda i: project_boxes_direct(homography, thermal_boxes[i % 64]), iterations),
+        ),
+        ("project + fuse", _time_us(lambda i: scorer.fuse(*frames[i % 64]), iterations)),
+        (
+            "frame warp via lookup table",
+            _time_us(lambda i: registration.warp_thermal(thermal_frame), 20),
+        ),
+        (
+            "frame warp via homography",
+            _time_us(lambda i: warp_thermal_direct(homography, thermal_frame), 20),
+        ),
+    ]
+
+    print(f"{2 * candidates} RGB + {2 * candidates} thermal candidates per frame")
+    for name, us in results:
+        print(f"{name:<32} {us:10.1f} us/frame")
+
+
+if __name__ == "__main__":
+    benchmark()
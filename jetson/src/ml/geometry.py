@@ -0,0 +1,180 @@
+# Bounding box -> compass direction and distance for the detections we post to the backend
+# The RGB camera's intrinsics and how it is mounted (heading from true north, tilt above the
+# horizon) are fixed, so the bearing/elevation of every pixel is computed once at startup and a
+# batch of boxes turns into DirectionEnum values with a couple of array lookups.
+# Pinhole model refresher: https://docs.opencv.org/4.x/d9/d0c/group__calib3d.html
+#
+# Microbenchmark: python3 -m ml.geometry
+
+import math
+import os
+import time
+
+import numpy as np
+
+from ml.fusion import RGB_SIZE
+
+# Same order/values as DirectionEnum in the backend, index i covers bearing i * 45 +- 22.5 deg
+DIRECTIONS = np.array(["N", "NE", "E", "SE", "S", "SW", "W", "NW"])
+
+
+class CameraGeometry:
+    """Per-pixel bearing/elevation tables for one mounted camera.
+
+    heading_deg: compass bearing the optical axis points at (0 = north, 90 = east)
+    tilt_deg: how far the optical axis is pitched up from the horizon
+    fx, fy, cx, cy: intrinsics in pixels, fx/fy default from hfov_deg with square pixels
+    drone_span_ft: assumed drone width, used to turn apparent size into a distance
+    """
+
+    def __init__(
+        self,
+        width=RGB_SIZE[0],
+        height=RGB_SIZE[1],
+        heading_deg=0.0,
+        tilt_deg=0.0,
+        hfov_deg=62.2,  # IMX219 (Jetson Nano CSI camera) horizontal FOV
+        fx=None,
+        fy=None,
+        cx=None,
+        cy=None,
+        drone_span_ft=1.2,
+    ):
+        self.width = width
+        self.height = height
+        self.heading_deg = heading_deg
+        self.tilt_deg = tilt_deg
+        self.fx = fx if fx is not None else (width / 2.0) / math.tan(math.radians(hfov_deg) / 2.0)
+        self.fy = fy if fy is not None else self.fx
+        self.cx = cx if cx is not None else width / 2.0
+        self.cy = cy if cy is not None else height / 2.0
+        self.drone_span_ft = drone_span_ft
+
+        self.bearing_deg, self.elevation_deg = self._build_tables()
+        # rounding to the nearest of 8 sectors is the only thing we need per detection
+        self.sector = (np.floor((self.bearing_deg + 22.5) / 45.0).astype(np.uint8)) % 8
+        self._sector_flat = self.sector.ravel()
+
+    @classmethod
+    def from_env(cls):
+        """Mounting comes from the environment so each sensor head can be set in its .env"""
+        return cls(
+            heading_deg=float(os.getenv("CAMERA_HEADING_DEG", 0.0)),
+            tilt_deg=float(os.getenv("CAMERA_TILT_DEG", 0.0)),
+            hfov_deg=float(os.getenv("CAMERA_HFOV_DEG", 62.2)),
+            drone_span_ft=float(os.getenv("DRONE_SPAN_FT", 1.2)),
+        )
+
+    def _build_tables(self):
+        ys, xs = np.mgrid[0 : self.height, 0 : self.width].astype(np.float64)
+        # camera frame: x right, y down, z along the optical axis
+        ray_x = (xs + 0.5 - self.cx) / self.fx
+        ray_y = (ys + 0.5 - self.cy) / self.fy
+
+        heading = math.radians(self.heading_deg)
+        tilt = math.radians(self.tilt_deg)
+        # camera axes expressed in world east/north/up
+        forward = np.array(
+            [math.sin(heading) * math.cos(tilt), math.cos(heading) * math.cos(tilt), math.sin(tilt)]
+        )
+        right = np.array([math.cos(heading), -math.sin(heading), 0.0])
+        up = np.array(
+            [
+                -math.sin(heading) * math.sin(tilt),
+                -math.cos(heading) * math.sin(tilt),
+                math.cos(tilt),
+            ]
+        )
+
+        east = ray_x * right[0] - ray_y * up[0] + forward[0]
+        north = ray_x * right[1] - ray_y * up[1] + forward[1]
+        vertical = ray_x * right[2] - ray_y * up[2] + forward[2]
+
+        bearing = np.degrees(np.arctan2(east, north)) % 360.0
+        elevation = np.degrees(np.arctan2(vertical, np.hypot(east, north)))
+        return bearing.astype(np.float32), elevation.astype(np.float32)
+
+    def _center_index(self, boxes):
+        cx = np.clip(((boxes[:, 0] + boxes[:, 2]) * 0.5).astype(np.intp), 0, self.width - 1)
+        cy = np.clip(((boxes[:, 1] + boxes[:, 3]) * 0.5).astype(np.intp), 0, self.height - 1)
+        return cy * self.width + cx
+
+    def directions(self, boxes):
+        """(N, 4) RGB boxes -> (N,) array of compass point strings"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        return DIRECTIONS[self._sector_flat.take(self._center_index(boxes))]
+
+    def bearings(self, boxes):
+        """(N, 4) RGB boxes -> (bearing_deg, elevation_deg) of the box centers"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        idx = self._center_index(boxes)
+        return self.bearing_deg.ravel().take(idx), self.elevation_deg.ravel().take(idx)
+
+    def distance_from_size(self, boxes):
+        """Distance in feet from apparent size, assuming the drone is drone_span_ft across.
+        Uses the longer box side since drones are wider than tall from most angles."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        span_px = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        with np.errstate(divide="ignore"):
+            distance = self.drone_span_ft * self.fx / span_px
+        return np.where(span_px > 0, distance, np.nan).astype(np.float32)
+
+    def distance_from_disparity(self, rgb_boxes, projected_thermal_boxes, baseline_ft, min_px=1.0):
+        """Distance in feet from thermal/RGB parallax.
+
+        projected_thermal_boxes must come from a homography calibrated on far away targets (plane
+        at infinity), so whatever horizontal offset is left between the two boxes is parallax from
+        the baseline between the cameras. Offsets under min_px are too far to resolve -> NaN."""
+        rgb_boxes = np.asarray(rgb_boxes, dtype=np.float32).reshape(-1, 4)
+        thermal = np.asarray(projected_thermal_boxes, dtype=np.float32).reshape(-1, 4)
+        disparity = np.abs(
+            (rgb_boxes[:, 0] + rgb_boxes[:, 2]) * 0.5 - (thermal[:, 0] + thermal[:, 2]) * 0.5
+        )
+        with np.errstate(divide="ignore"):
+            distance = baseline_ft * self.fx / disparity
+        return np.where(disparity >= min_px, distance, np.nan).astype(np.float32)
+
+    def locate(self, boxes, projected_thermal_boxes=None, baseline_ft=None):
+        """Direction and distance for a whole batch of boxes.
+        Stereo distance is used where it resolves, apparent size everywhere else.
+        Returns (directions, distance_ft), distance is NaN when it can't be estimated."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        distance = self.distance_from_size(boxes)
+        if projected_thermal_boxes is not None and baseline_ft:
+            stereo = self.distance_from_disparity(boxes, projected_thermal_boxes, baseline_ft)
+            distance = np.where(np.isnan(stereo), distance, stereo)
+        return self.directions(boxes), distance
+
+
+def detection_fields(directions, distances):
+    """locate() output -> per detection dicts ready to merge into a POST /detections body"""
+    return [
+        {
+            "direction": str(direction),
+            "distance_ft": round(float(distance), 1) if distance > 0 else None,
+        }
+        for direction, distance in zip(directions, distances)
+    ]
+
+
+def benchmark(batch=16, iterations=5000):
+    start = time.perf_counter()
+    geometry = CameraGeometry(heading_deg=45.0, tilt_deg=10.0)
+    print(f"tables built in {(time.perf_counter() - start) * 1e3:.1f} ms (once at startup)")
+
+    rng = np.random.RandomState(0)
+    x = rng.uniform(0, geometry.width - 40, (64, batch))
+    y = rng.uniform(0, geometry.height - 40, (64, batch))
+    size = rng.uniform(2, 40, (64, batch))
+    batches = [np.stack([x[i], y[i], x[i] + size[i], y[i] + size[i]], axis=1) for i in range(64)]
+    shifted = [b + np.array([3.0, 0.0, 3.0, 0.0]) for b in batches]
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        geometry.locate(batches[i % 64], shifted[i % 64], baseline_ft=0.25)
+    per_batch = (time.perf_counter() - start) / iterations * 1e6
+    print(f"locate() on {batch} boxes: {per_batch:.1f} us/frame")
+
+
+if __name__ == "__main__":
+    benchmark()
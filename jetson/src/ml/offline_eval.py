@@ -0,0 +1,318 @@
+# Offline batch evaluation over recorded video
+# Runs the detection (+ fusion for RGB/thermal pairs) stack over one or many video files as fast
+# as the CPU allows: every file is cut into chunks of frames, chunks are decoded and processed in
+# a pool of worker processes (one OpenCV thread each, so numbers are per core), and the results
+# are aggregated into a single JSON report with throughput and, if labels exist, precision/recall.
+#
+# Usage from jetson/src:
+#   python3 -m ml.offline_eval ../../simulator/videos/drone_thermal.mp4 --workers 4
+#   python3 -m ml.offline_eval rgb.mp4+thermal.mp4 --labels-dir labels --report report.json
+#
+# --tile-budget N runs the visual detector on N native resolution tiles per frame (ml/tiling.py,
+# 0 for all tiles) instead of the whole frame, to compare accuracy and fps across budgets.
+#
+# Labels: <video>.labels.csv next to the video (or <stem>.csv in --labels-dir) with a
+# "frame,x1,y1,x2,y2" header and one row per drone, in the pixel space of the (RGB) video.
+# Frames without rows contain no drone.
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+from ml.detector import BlobDetector
+from ml.fusion import FUSION_CALIBRATION, FusionScorer, ThermalRgbRegistration, load_homography
+from ml.tiling import TiledDetector, TileScheduler
+from ml.tracker import greedy_match, iou_matrix
+
+# Set up once per worker process by init_worker()
+_config = None
+_detectors = None
+_scorers = {}
+_labels = {}
+
+
+def parse_input(spec):
+    """Input spec -> paths: a single video, or "rgb.mp4+thermal.mp4" for a sensor pair"""
+    paths = tuple(spec.split("+"))
+    if len(paths) > 2:
+        raise ValueError(f"Expected a video or an rgb+thermal pair, got {spec}")
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+    return paths
+
+
+def label_path(video_path, labels_dir=None):
+    if labels_dir:
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        return os.path.join(labels_dir, stem + ".csv")
+    return os.path.splitext(video_path)[0] + ".labels.csv"
+
+
+def load_labels(path):
+    """{frame index: (N, 4) boxes} or None when there's no label file"""
+    if not os.path.exists(path):
+        return None
+    rows = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            box = [float(row[k]) for k in ("x1", "y1", "x2", "y2")]
+            rows.setdefault(int(row["frame"]), []).append(box)
+    return {frame: np.array(boxes, dtype=np.float32) for frame, boxes in rows.items()}
+
+
+def frame_count(path):
+    capture = cv2.VideoCapture(path)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        capture.release()
+
+
+def make_chunks(key, paths, chunk_size):
+    # container frame counts can be off a little, the last chunk just reads until decode fails
+    total = min(frame_count(p) for p in paths)
+    return [
+        (key, paths, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)
+    ]
+
+
+def init_worker(config):
+    global _config, _detectors
+    # one thread per process so frames/sec per worker really is frames/sec per core
+    cv2.setNumThreads(1)
+    _config = config
+    _detectors = {
+        "visual": BlobDetector(polarity="dark"),
+        "thermal": BlobDetector(polarity="bright"),
+    }
+
+
+def _scorer(thermal_shape, rgb_shape):
+    sizes = ((thermal_shape[1], thermal_shape[0]), (rgb_shape[1], rgb_shape[0]))
+    if sizes not in _scorers:
+        homography = load_homography(_config["calibration"], *sizes)
+        _scorers[sizes] = FusionScorer(ThermalRgbRegistration(homography, *sizes))
+    return _scorers[sizes]
+
+
+def _tiled(detector, shape, registration=None):
+    # per chunk: the scheduler's state (tile ages, tracked boxes) only makes sense within one
+    scheduler = TileScheduler((shape[1], shape[0]), budget=_config["tile_budget"])
+    return TiledDetector(detector, scheduler, registration)
+
+
+def _labels_for(paths):
+    key = paths[0]
+    if key not in _labels:
+        _labels[key] = load_labels(label_path(key, _config["labels_dir"]))
+    return _labels[key]
+
+
+def process_chunk(task):
+    """Decode and run the stack over frames [start, stop) of one input, worker side"""
+    key, paths, start, stop = task
+    cpu_start = time.process_time()
+    captures = [cv2.VideoCapture(p) for p in paths]
+    for capture in captures:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    labels = _labels_for(paths)
+    result = {
+        "key": key,
+        "frames": 0,
+        "decode_s": 0.0,
+        "detect_s": 0.0,
+        "detections": 0,
+        "tp": 0,
+        "fp": 0,
+        "fn": 0,
+        "tiles": 0,
+    }
+    tiled = None
+    tiling = _config.get("tile_budget") is not None
+    try:
+        for index in range(start, stop):
+            t0 = time.perf_counter()
+            frames = []
+            for capture in captures:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frames.append(frame)
+            if len(frames) != len(captures):
+                break
+            t1 = time.perf_counter()
+
+            if len(frames) == 1:
+                detector = _detectors[_config["modality"]]
+                if tiling:
+                    tiled = tiled or _tiled(detector, frames[0].shape)
+                    boxes, scores = tiled.detect(frames[0])
+                else:
+                    boxes, scores = detector.detect(frames[0])
+            else:
+                scorer = _scorer(frames[1].shape, frames[0].shape)
+                thermal_boxes, thermal_scores = _detectors["thermal"].detect(frames[1])
+                if tiling:
+                    # thermal hotspots steer the RGB tiles
+                    tiled = tiled or _tiled(
+                        _detectors["visual"], frames[0].shape, scorer.registration
+                    )
+                    rgb_boxes, rgb_scores = tiled.detect(frames[0], thermal_boxes, thermal_scores)
+                else:
+                    rgb_boxes, rgb_scores = _detectors["visual"].detect(frames[0])
+                fused = scorer.fuse(rgb_boxes, rgb_scores, thermal_boxes, thermal_scores)
+                boxes, scores = fused.boxes, fused.fused
+            t2 = time.perf_counter()
+
+            keep = scores >= _config["threshold"]
+            result["frames"] += 1
+            result["decode_s"] += t1 - t0
+            result["detect_s"] += t2 - t1
+            result["detections"] += int(keep.sum())
+            if labels is not None:
+                truth = labels.get(index, np.zeros((0, 4), dtype=np.float32))
+                matches, _, _ = greedy_match(iou_matrix(boxes[keep], truth), _config["iou"])
+                result["tp"] += len(matches)
+                result["fp"] += int(keep.sum()) - len(matches)
+                result["fn"] += len(truth) - len(matches)
+    finally:
+        for capture in captures:
+            capture.release()
+
+    result["tiles"] = tiled.tiles_run if tiled is not None else 0
+    result["cpu_s"] = time.process_time() - cpu_start
+    result["labelled"] = labels is not None
+    return result
+
+
+def _ratio(num, den):
+    return round(num / den, 4) if den else None
+
+
+def summarize(stats):
+    frames = stats["frames"]
+    summary = {
+        "frames": frames,
+        "chunks": stats["chunks"],
+        "cpu_s": round(stats["cpu_s"], 3),
+        "decode_ms_per_frame": _ratio(stats["decode_s"] * 1e3, frames),
+        "detect_ms_per_frame": _ratio(stats["detect_s"] * 1e3, frames),
+        "fps_per_core": _ratio(frames, stats["cpu_s"]),
+        "detections": stats["detections"],
+    }
+    if stats["tiles"]:
+        summary["tiles_per_frame"] = _ratio(stats["tiles"], frames)
+    if stats["labelled"]:
+        tp, fp, fn = stats["tp"], stats["fp"], stats["fn"]
+        summary.update(
+            {
+                "tp": tp,
+                "fp": fp,
+                "fn": fn,
+                "precision": _ratio(tp, tp + fp),
+                "recall": _ratio(tp, tp + fn),
+            }
+        )
+    return summary
+
+
+def run(inputs, workers, chunk_size, config):
+    inputs = {spec: parse_input(spec) for spec in inputs}
+    tasks = []
+    for spec, paths in inputs.items():
+        tasks.extend(make_chunks(spec, paths, chunk_size))
+
+    fields = ("frames", "decode_s", "detect_s", "cpu_s", "detections", "tp", "fp", "fn", "tiles")
+    per_file = {
+        spec: dict(dict.fromkeys(fields, 0), chunks=0, labelled=False, inputs=list(paths))
+        for spec, paths in inputs.items()
+    }
+
+    start = time.perf_counter()
+    # spawn instead of fork: OpenCV/FFmpeg state doesn't survive a fork reliably
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        for result in pool.imap_unordered(process_chunk, tasks):
+            stats = per_file[result["key"]]
+            for f in fields:
+                stats[f] += result[f]
+            stats["chunks"] += 1
+            stats["labelled"] = stats["labelled"] or result["labelled"]
+    wall_s = time.perf_counter() - start
+
+    totals = {f: sum(s[f] for s in per_file.values()) for f in fields}
+    totals["chunks"] = len(tasks)
+    totals["labelled"] = any(s["labelled"] for s in per_file.values())
+    overall = summarize(totals)
+    overall.update(
+        {
+            "wall_s": round(wall_s, 3),
+            "workers": workers,
+            "fps_wall": _ratio(totals["frames"], wall_s),
+        }
+    )
+    return {
+        "config": dict(config, workers=workers, chunk_size=chunk_size),
+        "files": {
+            key: dict(summarize(stats), inputs=stats["inputs"]) for key, stats in per_file.items()
+        },
+        "overall": overall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the detection stack over recorded video")
+    parser.add_argument("inputs", nargs="+", help="video files, or rgb.mp4+thermal.mp4 pairs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=300, help="frames per work item")
+    parser.add_argument(
+        "--modality",
+        choices=("thermal", "visual"),
+        default="thermal",
+        help="detector used for single (unpaired) videos",
+    )
+    parser.add_argument("--threshold", type=float, default=0.5, help="min score to count")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a true positive")
+    parser.add_argument(
+        "--tile-budget",
+        type=int,
+        default=None,
+        help="detect visual frames on this many tiles per frame (0 = all), default whole frame",
+    )
+    parser.add_argument("--labels-dir", default=None)
+    parser.add_argument("--calibration", default=FUSION_CALIBRATION)
+    parser.add_argument("--report", default="offline_eval_report.json")
+    args = parser.parse_args()
+
+    config = {
+        "modality": args.modality,
+        "threshold": args.threshold,
+        "iou": args.iou,
+        "labels_dir": args.labels_dir,
+        "calibration": args.calibration,
+        "tile_budget": args.tile_budget,
+    }
+    report = run(args.inputs, args.workers, args.chunk_size, config)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    overall = report["overall"]
+    print(
+        f"{overall['frames']} frames in {overall['wall_s']} s on {args.workers} workers: "
+        f"{overall['fps_wall']} fps total, {overall['fps_per_core']} fps/core"
+    )
+    if "precision" in overall:
+        print(f"precision {overall['precision']} recall {overall['recall']}")
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
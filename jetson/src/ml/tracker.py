@@ -0,0 +1,256 @@
+# SORT-style multi-object tracker so the edge reports tracks instead of every positive frame
+# Reference: Bewley et al., "Simple Online and Realtime Tracking" https://arxiv.org/abs/1602.00763
+# Boxes are always [x1, y1, x2, y2] in pixels. Everything is numpy only since this has to run
+# on the Jetson (Python 3.6, numpy 1.19) without scipy.
+
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+TRACK_START = "start"
+TRACK_UPDATE = "update"
+TRACK_END = "end"
+
+# One of these gets emitted per track lifecycle event, not per frame
+TrackEvent = namedtuple("TrackEvent", ["kind", "track_id", "box", "score", "timestamp", "hits"])
+
+
+def event_to_detection(event, stream_name=None, **fields):
+    """Turn a TrackEvent into a POST /detections body. Extra fields (direction, fused_score...)
+    can be passed in once the fusion/geometry stages have filled them in."""
+    payload = {
+        "detected_at": datetime.fromtimestamp(event.timestamp, timezone.utc).isoformat(),
+        "confidence": round(float(event.score), 3),
+        "fused_score": round(float(event.score), 3),
+        "track_id": event.track_id,
+        "track_event": event.kind,
+        "stream_name": stream_name,
+    }
+    payload.update(fields)
+    return payload
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4) and (M, 4) boxes, returns (N, M)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def greedy_match(iou, threshold):
+    """Match rows to columns by descending IoU. Returns (matches, unmatched_rows, unmatched_cols).
+    Greedy is within a hair of Hungarian for the handful of drones we see per frame and
+    avoids pulling in scipy on the Jetson."""
+    n_rows, n_cols = iou.shape
+    matches = []
+    if n_rows and n_cols:
+        rows, cols = np.nonzero(iou >= threshold)
+        order = np.argsort(-iou[rows, cols], kind="stable")
+        used_rows = np.zeros(n_rows, dtype=bool)
+        used_cols = np.zeros(n_cols, dtype=bool)
+        for r, c in zip(rows[order], cols[order]):
+            if used_rows[r] or used_cols[c]:
+                continue
+            used_rows[r] = True
+            used_cols[c] = True
+            matches.append((r, c))
+    matched_rows = {r for r, _ in matches}
+    matched_cols = {c for _, c in matches}
+    unmatched_rows = [r for r in range(n_rows) if r not in matched_rows]
+    unmatched_cols = [c for c in range(n_cols) if c not in matched_cols]
+    return matches, unmatched_rows, unmatched_cols
+
+
+def boxes_to_z(boxes):
+    """[x1, y1, x2, y2] -> [cx, cy, area, aspect] measurement vectors"""
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack(
+        [boxes[:, 0] + w / 2.0, boxes[:, 1] + h / 2.0, w * h, w / np.maximum(h, 1e-6)], axis=1
+    )
+
+
+def x_to_boxes(x):
+    """Kalman states -> [x1, y1, x2, y2]"""
+    area = np.clip(x[:, 2], 1e-6, None)
+    w = np.sqrt(area * np.clip(x[:, 3], 1e-6, None))
+    h = area / np.maximum(w, 1e-6)
+    return np.stack(
+        [x[:, 0] - w / 2.0, x[:, 1] - h / 2.0, x[:, 0] + w / 2.0, x[:, 1] + h / 2.0], axis=1
+    )
+
+
+class KalmanBank:
+    """Constant velocity Kalman filters for all tracks, stacked so predict/update are a couple of
+    batched matmuls instead of a python loop per track.
+    State is [cx, cy, area, aspect, vx, vy, varea] like the original SORT."""
+
+    def __init__(self):
+        self.F = np.eye(7, dtype=np.float64)
+        self.F[0, 4] = self.F[1, 5] = self.F[2, 6] = 1.0
+        self.H = np.eye(4, 7, dtype=np.float64)
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+        self.Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+        self.P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+
+    def __len__(self):
+        return self.x.shape[0]
+
+    def add(self, boxes):
+        z = boxes_to_z(np.asarray(boxes, dtype=np.float64).reshape(-1, 4))
+        x = np.zeros((z.shape[0], 7))
+        x[:, :4] = z
+        cov = np.repeat(self.P0[None], z.shape[0], axis=0)
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, cov])
+
+    def keep(self, mask):
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+
+    def predict(self):
+        # area can't go negative, so kill its velocity if it would
+        shrinking = (self.x[:, 2] + self.x[:, 6]) <= 0
+        self.x[shrinking, 6] = 0.0
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return x_to_boxes(self.x)
+
+    def update(self, idx, boxes):
+        if len(idx) == 0:
+            return
+        idx = np.asarray(idx)
+        z = boxes_to_z(np.asarray(boxes, dtype=np.float64).reshape(-1, 4))
+        x = self.x[idx]
+        cov = self.P[idx]
+        residual = z - x @ self.H.T
+        innovation = self.H @ cov @ self.H.T + self.R
+        gain = cov @ self.H.T @ np.linalg.inv(innovation)
+        self.x[idx] = x + np.einsum("nij,nj->ni", gain, residual)
+        self.P[idx] = (np.eye(7) - gain @ self.H) @ cov
+
+    def boxes(self):
+        return x_to_boxes(self.x)
+
+
+class _TrackState:
+    __slots__ = ("track_id", "hits", "misses", "confirmed", "since_emit", "score")
+
+    def __init__(self, score):
+        self.track_id = str(uuid.uuid4())
+        self.hits = 1
+        self.misses = 0
+        self.confirmed = False
+        self.since_emit = 0
+        self.score = score
+
+
+class SortTracker:
+    """Assigns track IDs to per-frame detections and emits start/update/end events.
+
+    min_hits: consecutive matches needed before a track is reported (filters one frame blips)
+    max_age: frames a track can go unmatched before it's ended
+    update_interval: a confirmed track emits an update event every this many matched frames
+    """
+
+    def __init__(self, iou_threshold=0.3, min_hits=3, max_age=15, update_interval=30):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.update_interval = update_interval
+        self.kalman = KalmanBank()
+        self.tracks = []
+
+    def update(self, boxes, scores, timestamp):
+        """Feed one frame of detections. boxes (N, 4), scores (N,), timestamp in unix seconds.
+        Returns the list of TrackEvents this frame produced (usually empty)."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        events = []
+
+        predicted = self.kalman.predict() if self.tracks else np.zeros((0, 4))
+        iou = iou_matrix(predicted, boxes)
+        matches, unmatched_tracks, unmatched_dets = greedy_match(iou, self.iou_threshold)
+
+        self.kalman.update([t for t, _ in matches], boxes[[d for _, d in matches]])
+        for t_idx, d_idx in matches:
+            track = self.tracks[t_idx]
+            track.hits += 1
+            track.misses = 0
+            track.since_emit += 1
+            track.score = float(scores[d_idx])
+            if not track.confirmed and track.hits >= self.min_hits:
+                track.confirmed = True
+                track.since_emit = 0
+                events.append(self._event(TRACK_START, track, boxes[d_idx], timestamp))
+            elif track.confirmed and track.since_emit >= self.update_interval:
+                track.since_emit = 0
+                events.append(self._event(TRACK_UPDATE, track, boxes[d_idx], timestamp))
+
+        keep = np.ones(len(self.tracks), dtype=bool)
+        current = self.kalman.boxes()
+        for t_idx in unmatched_tracks:
+            track = self.tracks[t_idx]
+            track.misses += 1
+            # tentative tracks have to match every frame, confirmed ones get max_age of slack
+            if not track.confirmed or track.misses > self.max_age:
+                keep[t_idx] = False
+                if track.confirmed:
+                    events.append(self._event(TRACK_END, track, current[t_idx], timestamp))
+
+        self.tracks = [t for t, k in zip(self.tracks, keep) if k]
+        self.kalman.keep(keep)
+
+        if unmatched_dets:
+            self.kalman.add(boxes[unmatched_dets])
+            self.tracks.extend(_TrackState(float(scores[d])) for d in unmatched_dets)
+            if self.min_hits <= 1:
+                start = len(self.tracks) - len(unmatched_dets)
+                for track, d_idx in zip(self.tracks[start:], unmatched_dets):
+                    track.confirmed = True
+                    events.append(self._event(TRACK_START, track, boxes[d_idx], timestamp))
+
+        return events
+
+    def flush(self, timestamp):
+        """End every confirmed track, e.g. on shutdown"""
+        current = self.kalman.boxes()
+        events = [
+            self._event(TRACK_END, track, current[i], timestamp)
+            for i, track in enumerate(self.tracks)
+            if track.confirmed
+        ]
+        self.tracks = []
+        self.kalman.keep(np.zeros(len(self.kalman), dtype=bool))
+        return events
+
+    def active_boxes(self):
+        """(track_ids, boxes) of confirmed tracks, handy for drawing/debugging"""
+        current = self.kalman.boxes()
+        idx = [i for i, t in enumerate(self.tracks) if t.confirmed]
+        return [self.tracks[i].track_id for i in idx], current[idx]
+
+    @staticmethod
+    def _event(kind, track, box, timestamp):
+        return TrackEvent(
+            kind=kind,
+            track_id=track.track_id,
+            box=np.asarray(box, dtype=np.float32).copy(),
+            score=track.score,
+            timestamp=timestamp,
+            hits=track.hits,
+        )
@@ -0,0 +1,371 @@
+# Compact binary transport of detections from the edge to the backend
+# Instead of one JSON POST /detections per detection, detections are queued and sent as batches
+# to POST /detections/batch over one kept-alive HTTP connection, in a fixed struct layout:
+#
+#   header   4s magic b"DDET", B version, B flags, H string count, I record count
+#   strings  per string: H byte length + UTF-8 bytes (stream names, snapshot URLs)
+#   record   q    detected_at, microseconds since the Unix epoch (UTC)
+#            4H   confidence, fused_score, visual_confidence, thermal_confidence,
+#                 scaled 0..1 -> 0..65534, 65535 = null
+#            f    distance_ft, NaN = null
+#            B    direction, index into N, NE, E, SE, S, SW, W, NW, 255 = null
+#            B    track_event, 0 = null, 1 = start, 2 = update, 3 = end
+#            16s  track_id, all zero = null
+#            2H   stream_name, frame_snapshot_url, index into the string table, 65535 = null
+#   traces   only with flags & FLAG_TRACES, one per record after the records:
+#            5i   captured, appsink, inference started, inference ended, uploaded, in
+#                 microseconds relative to detected_at (backend clock), -2**31 = null
+#            2f   clock_offset_ms, clock_error_ms, NaN = null
+#
+# 42 bytes a record against ~300 for the JSON body. The backend decoder is
+# backend/src/app/ingest.py, keep the two in sync.
+#
+# Bytes/encode time vs JSON: python3 -m ml.transport
+
+import http.client
+import json
+import math
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from sensor_ingestion.tracing import ClockOffset, now_us
+
+MEDIA_TYPE = "application/vnd.drone-detections"
+MAGIC = b"DDET"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+RECORD = struct.Struct("<qHHHHfBB16sHH")
+TRACE = struct.Struct("<iiiiiff")
+STRING_LENGTH = struct.Struct("<H")
+FLAG_TRACES = 0x01
+
+NULL_SCORE = 0xFFFF
+SCORE_SCALE = 0xFFFE
+NULL_CODE = 0xFF
+NULL_INDEX = 0xFFFF
+NULL_UUID = bytes(16)
+NULL_DELTA = -(2**31)
+TRACE_HOPS = [
+    "captured_at",
+    "appsink_at",
+    "inference_started_at",
+    "inference_ended_at",
+    "uploaded_at",
+]
+DIRECTION_CODES = {d: i for i, d in enumerate(["N", "NE", "E", "SE", "S", "SW", "W", "NW"])}
+TRACK_EVENT_CODES = {None: 0, "start": 1, "update": 2, "end": 3}
+
+# The PC end of the Jetson <-> PC Ethernet link (see README)
+BACKEND_URL = os.getenv("BACKEND_URL", "http://192.168.50.1:8000")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _score(name, value):
+    if value is None:
+        return NULL_SCORE
+    if not 0.0 <= value <= 1.0:
+        raise ValueError(f"{name} {value} is outside 0..1")
+    return int(round(value * SCORE_SCALE))
+
+
+def _epoch_us(value):
+    """detected_at as a datetime, Unix seconds or an isoformat() string -> epoch microseconds"""
+    if isinstance(value, (int, float)):
+        return int(round(value * 1e6))
+    if isinstance(value, str):
+        # datetime.fromisoformat() is 3.7+, event_to_detection() writes "...+00:00" or "...Z"
+        text, offset = value, 0
+        if text.endswith("Z"):
+            text = text[:-1]
+        elif len(text) > 6 and text[-6] in "+-" and text[-3] == ":":
+            sign = -1 if text[-6] == "-" else 1
+            offset = sign * (int(text[-5:-3]) * 3600 + int(text[-2:]) * 60)
+            text = text[:-6]
+        # slicing the fixed width fields is several times faster than strptime()
+        value = datetime(
+            int(text[0:4]),
+            int(text[5:7]),
+            int(text[8:10]),
+            int(text[11:13]),
+            int(text[14:16]),
+            int(text[17:19]),
+            int(text[20:26].ljust(6, "0")) if len(text) > 19 else 0,
+            timezone.utc,
+        )
+        return (value - _EPOCH) // _MICROSECOND - offset * 1000000
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _encode_trace(detected_at, trace):
+    if trace is None:
+        return TRACE.pack(*([NULL_DELTA] * len(TRACE_HOPS) + [math.nan, math.nan]))
+    deltas = []
+    for hop in TRACE_HOPS:
+        value = trace.get(hop)
+        delta = NULL_DELTA if value is None else _epoch_us(value) - detected_at
+        # more than ~35 minutes off isn't a latency worth keeping
+        deltas.append(delta if NULL_DELTA < delta < 2**31 else NULL_DELTA)
+    offset_ms, error_ms = trace.get("clock_offset_ms"), trace.get("clock_error_ms")
+    return TRACE.pack(
+        *deltas,
+        math.nan if offset_ms is None else offset_ms,
+        math.nan if error_ms is None else error_ms,
+    )
+
+
+def encode_batch(detections):
+    """POST /detections style dicts (e.g. from event_to_detection) -> binary batch bytes.
+    A "trace" (FrameTrace.to_backend()) on any of them adds the trace block."""
+    strings = {}
+
+    def string(value):
+        if value is None:
+            return NULL_INDEX
+        return strings.setdefault(value, len(strings))
+
+    records = []
+    traces = []
+    for d in detections:
+        distance = d.get("distance_ft")
+        track_id = d.get("track_id")
+        direction = d.get("direction")
+        detected_at = _epoch_us(d["detected_at"])
+        traces.append((detected_at, d.get("trace")))
+        records.append(
+            RECORD.pack(
+                detected_at,
+                _score("confidence", d["confidence"]),
+                _score("fused_score", d["fused_score"]),
+                _score("visual_confidence", d.get("visual_confidence")),
+                _score("thermal_confidence", d.get("thermal_confidence")),
+                math.nan if distance is None else distance,
+                DIRECTION_CODES[direction] if direction else NULL_CODE,
+                TRACK_EVENT_CODES[d.get("track_event")],
+                uuid.UUID(str(track_id)).bytes if track_id else NULL_UUID,
+                string(d.get("stream_name")),
+                string(d.get("frame_snapshot_url")),
+            )
+        )
+    flags = FLAG_TRACES if any(trace is not None for _, trace in traces) else 0
+    parts = [HEADER.pack(MAGIC, VERSION, flags, len(strings), len(records))]
+    for value in strings:
+        encoded = value.encode()
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    parts.extend(records)
+    if flags & FLAG_TRACES:
+        parts.extend(_encode_trace(detected_at, trace) for detected_at, trace in traces)
+    return b"".join(parts)
+
+
+class DetectionSender:
+    """Queues detections and sends them in batches from a background thread.
+
+    send() never blocks the pipeline. A batch goes out when batch_size detections are queued
+    or flush_s after the oldest one, over a single kept-alive connection. If the backend is
+    unreachable batches are retried with backoff; past max_pending queued detections the
+    oldest are dropped (and counted) so a long outage can't grow memory without bound.
+    Batches the backend rejects as invalid (4xx) are dropped, resending won't fix them.
+
+    Detections sent with a FrameTrace get it stamped with the upload time and converted to
+    the backend's clock, which is re-estimated against GET /health/clock every clock_every_s.
+    """
+
+    def __init__(
+        self,
+        base_url=BACKEND_URL,
+        batch_size=50,
+        flush_s=0.5,
+        max_pending=10000,
+        binary=True,
+        clock_every_s=60.0,
+    ):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path.rstrip("/") + "/detections/batch"
+        self.clock_path = url.path.rstrip("/") + "/health/clock"
+        self.clock = ClockOffset()
+        self.clock_every_us = clock_every_s * 1000000
+        self._next_probe = 0
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.binary = binary
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Condition()
+        self._closed = False
+        self._connection = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, detection, trace=None):
+        """Queue a detection, with the FrameTrace of the frame pair it came from if traced"""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((detection, trace))
+            if len(self._pending) >= self.batch_size:
+                self._lock.notify()
+
+    def close(self, timeout=5.0):
+        """Flush what's queued (waiting up to timeout) and stop"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        self._thread.join(timeout)
+        if self._connection is not None:
+            self._connection.close()
+
+    def _next_batch(self):
+        with self._lock:
+            if len(self._pending) < self.batch_size and not self._closed:
+                self._lock.wait(self.flush_s)
+            return [
+                self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+
+    def _requeue(self, batch):
+        with self._lock:
+            # back at the front, in order, unless newer detections filled the queue meanwhile
+            for detection in reversed(batch):
+                if len(self._pending) == self._pending.maxlen:
+                    self.dropped += 1
+                    continue
+                self._pending.appendleft(detection)
+
+    def _request(self, method, path, body=None, headers=None):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        try:
+            self._connection.request(method, path, body, headers or {})
+            response = self._connection.getresponse()
+            return response, response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            self._connection = None
+            raise
+
+    def _probe_clock(self, burst=3):
+        # a short burst, the first probe on a new connection also pays for the TCP handshake
+        for _ in range(burst):
+            t0 = now_us()
+            response, body = self._request("GET", self.clock_path)
+            t3 = now_us()
+            if response.status != 200:
+                print(f"Clock probe failed: {response.status}")
+                return
+            times = json.loads(body.decode())
+            self.clock.add(t0, times["received_at"] * 1e6, times["sent_at"] * 1e6, t3)
+
+    def _post(self, batch):
+        """Returns True when the batch is done with (stored or rejected), False to retry"""
+        uploaded = now_us()
+        detections = []
+        for detection, trace in batch:
+            if trace is not None:
+                detection = dict(detection, trace=trace.to_backend(self.clock, uploaded))
+            detections.append(detection)
+        if self.binary:
+            body, content_type = encode_batch(detections), MEDIA_TYPE
+        else:
+            body, content_type = json.dumps(detections).encode(), "application/json"
+        try:
+            response, detail = self._request(
+                "POST", self.path, body, {"Content-Type": content_type}
+            )
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Sending {len(batch)} detections failed: {e}")
+            return False
+        if response.status < 300:
+            self.sent += len(batch)
+            return True
+        if 400 <= response.status < 500:
+            self.rejected += len(batch)
+            print(f"Backend rejected {len(batch)} detections: {response.status} {detail[:200]}")
+            return True
+        print(f"Backend error {response.status} for {len(batch)} detections, retrying")
+        return False
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._closed:
+                    return
+                continue
+            if now_us() >= self._next_probe:
+                self._next_probe = now_us() + self.clock_every_us
+                try:
+                    self._probe_clock()
+                except (OSError, http.client.HTTPException, ValueError, KeyError) as e:
+                    print(f"Clock probe failed: {e}")
+            if self._post(batch):
+                backoff = 0.5
+                continue
+            self._requeue(batch)
+            if self._closed:
+                return
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def benchmark(batch=50, iterations=200):
+    from ml.tracker import TRACK_START, TRACK_UPDATE, TrackEvent, event_to_detection
+
+    detections = []
+    for i in range(batch):
+        event = TrackEvent(
+            TRACK_START if i % 20 == 0 else TRACK_UPDATE,
+            str(uuid.UUID(int=i // 20 + 1)),
+            None,
+            0.5 + (i % 50) / 100,
+            1777636800.0 + i * 0.2,
+            i % 20 + 1,
+        )
+        detections.append(
+            event_to_detection(
+                event,
+                stream_name="thermal",
+                direction="NE",
+                distance_ft=250.5 + i,
+                visual_confidence=0.9,
+                thermal_confidence=0.8,
+                frame_snapshot_url=f"s3://detections/thermal/2026-05-01/{i}.jpg",
+            )
+        )
+
+    json_bytes = sum(len(json.dumps(d).encode()) for d in detections)
+    binary_bytes = len(encode_batch(detections))
+    print(
+        f"{batch} detections: JSON {json_bytes / batch:.0f} B/detection (body only, one POST each)"
+    )
+    ratio = json_bytes / binary_bytes
+    print(f"binary batch {binary_bytes / batch:.1f} B/detection, {ratio:.1f}x less")
+
+    for label, fn in (
+        ("json.dumps per detection", lambda: [json.dumps(d).encode() for d in detections]),
+        ("encode_batch", lambda: encode_batch(detections)),
+    ):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        per_detection = (time.perf_counter() - start) / (iterations * batch) * 1e6
+        print(f"{label}: {per_detection:.1f} us/detection")
+
+
+if __name__ == "__main__":
+    benchmark()
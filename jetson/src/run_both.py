@@ -1,30 +1,287 @@
+# Supervisor for ingestion and inference
+# Starts both as child processes and keeps them running:
+#   - exits are noticed as they happen: SIGCHLD wakes the loop through a self-pipe
+#     (signal.set_wakeup_fd), it doesn't poll on a timer
+#   - a child that exits is restarted at once the first time, then with exponential backoff
+#     (RESTART_BACKOFF_S doubling up to RESTART_BACKOFF_MAX_S) while it keeps failing; the
+#     backoff resets once a run lasted RESTART_RESET_S
+#   - a child that is alive but stuck is killed and restarted: its heartbeat
+#     (sensor_ingestion/heartbeat.py) older than HEARTBEAT_TIMEOUT_S means a hung main loop,
+#     a frame counter that stopped for FRAME_TIMEOUT_S means a stalled pipeline. Both only
+#     count once the child has written its first beat or frame
+# Restart counts, stalls, exit codes and downtime per child are written to SUPERVISOR_STATUS
+# (JSON, /dev/shm/dronedetect-supervisor.json by default) on every change, printed on SIGUSR1
+# and when the supervisor stops.
+#
+# Children run in their own process groups, so a kill reaches the python under `uv run` too.
+#
+# To watch it restart a crashing, a stalled and a hung child, and leave a slow starting one
+# alone: python3 run_both.py --demo
+
+import contextlib
+import json
+import os
+import select
+import signal
 import subprocess
+import sys
 import time
 
-procs = {
-    "ingestion": subprocess.Popen(["uv", "run", "python3", "-m", "sensor_ingestion.ingest_gi"]),
-    "inference": subprocess.Popen(["uv", "run", "python3", "-m", "ml.inference"]),
-}
-
-while True:
-    for name, proc in procs.items():
-        ret = proc.poll()
-
-        # This is if the process is still running fine
-        if ret is None:
-            continue
-
-        print(f"{proc} exited. code: {ret}")
-
-        # We want to stop everything if ingestion dies, but if inference dies,
-        # keep going so we can at least continue streaming sensors
-        if name == "inference":
-            del procs["inference"]
-            continue
-        elif name == "ingestion":
-            del procs["ingestion"]
-            break
-
-    if not procs:
-        break
-    time.sleep(1)
+from sensor_ingestion.heartbeat import (
+    HEARTBEAT_DIR,
+    HEARTBEAT_INTERVAL_MS,
+    heartbeat_path,
+    read_heartbeat,
+)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEARTBEAT_TIMEOUT_S = float(os.getenv("HEARTBEAT_TIMEOUT_S", 5))
+FRAME_TIMEOUT_S = float(os.getenv("FRAME_TIMEOUT_S", 10))
+RESTART_BACKOFF_S = float(os.getenv("RESTART_BACKOFF_S", 0.5))
+RESTART_BACKOFF_MAX_S = float(os.getenv("RESTART_BACKOFF_MAX_S", 30))
+RESTART_RESET_S = float(os.getenv("RESTART_RESET_S", 60))
+# between SIGTERM and SIGKILL, for a stuck child and on shutdown
+STOP_TIMEOUT_S = float(os.getenv("STOP_TIMEOUT_S", 5))
+SUPERVISOR_STATUS = os.getenv(
+    "SUPERVISOR_STATUS", os.path.join(HEARTBEAT_DIR, "dronedetect-supervisor.json")
+)
+
+
+class Child:
+    """One supervised process, its restart schedule and its counters"""
+
+    def __init__(
+        self,
+        name,
+        command,
+        heartbeat_timeout_s=HEARTBEAT_TIMEOUT_S,
+        frame_timeout_s=FRAME_TIMEOUT_S,
+        backoff_s=RESTART_BACKOFF_S,
+        backoff_max_s=RESTART_BACKOFF_MAX_S,
+        reset_s=RESTART_RESET_S,
+    ):
+        self.name = name
+        self.command = command
+        self.heartbeat_timeout_s = heartbeat_timeout_s
+        self.frame_timeout_s = frame_timeout_s
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.reset_s = reset_s
+        self.heartbeat_path = heartbeat_path(name)
+        self.proc = None
+        self.started_at = None
+        self.down_since = None
+        self.restart_at = time.monotonic()
+        self.killed_at = None  # SIGTERM sent, escalate to SIGKILL after STOP_TIMEOUT_S
+        self.failures = 0  # in a row, for the backoff
+        self.restarts = 0
+        self.stalls = 0
+        self.downtime_s = 0.0
+        self.last_exit = None
+        self.last_recovery_ms = None
+
+    def start(self, now):
+        # a fresh heartbeat file, so the last run's beats can't vouch for this one
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.heartbeat_path)
+        env = dict(os.environ, HEARTBEAT_PATH=self.heartbeat_path)
+        self.proc = subprocess.Popen(self.command, cwd=SRC_DIR, env=env, start_new_session=True)
+        if self.down_since is not None:
+            down = now - self.down_since
+            self.downtime_s += down
+            self.last_recovery_ms = round(down * 1000, 1)
+            self.restarts += 1
+            log(f"{self.name} restarted as {self.proc.pid}, down {self.last_recovery_ms} ms")
+        else:
+            log(f"{self.name} started as {self.proc.pid}")
+        self.started_at = now
+        self.down_since = self.restart_at = self.killed_at = None
+
+    def exited(self, code, now):
+        """The process ended, schedule the restart"""
+        self.proc = None
+        self.last_exit = code
+        if self.down_since is None:
+            self.down_since = now
+        if now - self.started_at >= self.reset_s:
+            self.failures = 0
+        self.failures += 1
+        delay = (
+            0.0
+            if self.failures == 1
+            else min(self.backoff_s * 2 ** (self.failures - 2), self.backoff_max_s)
+        )
+        self.restart_at = now + delay
+        log(f"{self.name} exited with {code}, restarting in {delay:.1f} s")
+
+    def check(self, now):
+        """Why the running process looks stuck, or None"""
+        beat = read_heartbeat(self.heartbeat_path)
+        if beat is None:
+            return None
+        _, beat_at, frames, frame_at = beat
+        if now - beat_at > self.heartbeat_timeout_s:
+            return f"no heartbeat for {now - beat_at:.1f} s"
+        if frames and self.frame_timeout_s and now - frame_at > self.frame_timeout_s:
+            return f"no frames for {now - frame_at:.1f} s after {frames}"
+        return None
+
+    def signal_group(self, sig):
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self.proc.pid, sig)
+
+    def stats(self, now):
+        return {
+            "pid": self.proc.pid if self.proc else None,
+            "running": self.proc is not None,
+            "uptime_s": round(now - self.started_at, 1) if self.proc else 0.0,
+            "restarts": self.restarts,
+            "stalls": self.stalls,
+            "last_exit": self.last_exit,
+            "downtime_s": round(
+                self.downtime_s + (now - self.down_since if self.down_since else 0.0), 3
+            ),
+            "last_recovery_ms": self.last_recovery_ms,
+        }
+
+
+def log(message):
+    print(f"Supervisor: {message}", flush=True)
+
+
+class Supervisor:
+    def __init__(
+        self, children, status_path=SUPERVISOR_STATUS, check_s=HEARTBEAT_INTERVAL_MS / 1000.0
+    ):
+        self.children = children
+        self.status_path = status_path
+        self.check_s = check_s
+        self.started = time.monotonic()
+        self.stopping = False
+        self._wakeup = None
+
+    def _install_signals(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        # the C level handler writes the signal number to the pipe, waking select() at once
+        signal.set_wakeup_fd(write_fd)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        signal.signal(signal.SIGUSR1, lambda *_: log(json.dumps(self.stats())))
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._stop)
+        self._wakeup = read_fd
+
+    def _stop(self, *_):
+        self.stopping = True
+
+    def run(self, duration_s=None):
+        self._install_signals()
+        deadline = None if duration_s is None else time.monotonic() + duration_s
+        while not self.stopping and (deadline is None or time.monotonic() < deadline):
+            now = time.monotonic()
+            timeout = self.check_s
+            for child in self.children:
+                if child.proc is None:
+                    timeout = min(timeout, max(child.restart_at - now, 0.0))
+            select.select([self._wakeup], [], [], timeout)
+            try:
+                while os.read(self._wakeup, 512):
+                    pass
+            except BlockingIOError:
+                pass
+            if self.step(time.monotonic()):
+                self.write_status()
+        self.shutdown()
+
+    def step(self, now):
+        """Reap, check and restart the children, True if anything changed"""
+        changed = False
+        for child in self.children:
+            if child.proc is not None:
+                code = child.proc.poll()
+                if code is not None:
+                    child.exited(code, now)
+                    changed = True
+                elif child.killed_at is not None:
+                    if now - child.killed_at > STOP_TIMEOUT_S:
+                        child.signal_group(signal.SIGKILL)
+                else:
+                    reason = child.check(now)
+                    if reason is not None:
+                        log(f"{child.name} is stuck, {reason}, killing it")
+                        child.stalls += 1
+                        child.down_since = now
+                        child.killed_at = now
+                        child.signal_group(signal.SIGTERM)
+                        changed = True
+            if child.proc is None and now >= child.restart_at:
+                child.start(now)
+                changed = True
+        return changed
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "uptime_s": round(now - self.started, 1),
+            "children": {child.name: child.stats(now) for child in self.children},
+        }
+
+    def write_status(self):
+        temporary = self.status_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.stats(), f, indent=2)
+        os.replace(temporary, self.status_path)
+
+    def shutdown(self):
+        for child in self.children:
+            if child.proc is not None:
+                child.signal_group(signal.SIGTERM)
+        for child in self.children:
+            if child.proc is None:
+                continue
+            try:
+                child.proc.wait(STOP_TIMEOUT_S)
+            except subprocess.TimeoutExpired:
+                child.signal_group(signal.SIGKILL)
+                child.proc.wait()
+            child.last_exit = child.proc.returncode
+            child.proc = None
+            log(f"{child.name} stopped with {child.last_exit}")
+        self.write_status()
+        log(json.dumps(self.stats(), indent=2))
+
+
+def demo(seconds=12.0):
+    """Children that crash or stop producing frames after two seconds, with short timeouts, and
+    one that takes three times its heartbeat timeout to start and must not be restarted"""
+    python = [sys.executable, "-m", "sensor_ingestion.heartbeat"]
+    children = [
+        Child("demo-crash", python + ["crash"], backoff_s=0.2, reset_s=5.0),
+        Child("demo-stall", python + ["stall"], frame_timeout_s=1.0),
+        Child("demo-hang", python + ["hang"], heartbeat_timeout_s=1.0),
+        Child("demo-slow", python + ["slow"], heartbeat_timeout_s=1.0, frame_timeout_s=1.0),
+    ]
+    status = os.path.join(HEARTBEAT_DIR, "dronedetect-supervisor-demo.json")
+    Supervisor(children, status_path=status).run(duration_s=seconds)
+    slow = children[-1]
+    if slow.restarts or slow.stalls:
+        sys.exit(f"demo-slow was restarted {slow.restarts} times during its startup")
+
+
+def main():
+    uv = ["uv", "run", "python3", "-m"]
+    Supervisor(
+        [
+            Child("ingestion", uv + ["sensor_ingestion.ingest_gi"]),
+            Child("inference", uv + ["ml.inference"]),
+        ]
+    ).run()
+
+
+if __name__ == "__main__":
+    if "--demo" in sys.argv:
+        demo()
+    else:
+        main()
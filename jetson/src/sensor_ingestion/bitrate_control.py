@@ -0,0 +1,533 @@
+# RTCP driven encoder bitrate and keyframe interval for the RTP branches
+# Both encoders used to run at a fixed 4 Mbps: far more than the 160x120 thermal stream needs,
+# and when the link congested the leaky RTP queues and the network dropped frames at random.
+# The RTP branches now go through rtpbin, which sends RTCP sender reports next to each stream
+# (RTP on port P, RTCP on P + 1) and collects the receiver reports that come back. Every
+# interval the reports of each stream feed a BitrateController:
+#
+#   loss above high_loss                    -> bitrate *= 1 - loss / 2
+#   RTT well above its minimum, or jitter   -> bitrate *= 0.85 (queues building up)
+#   loss below low_loss and delay is flat   -> bitrate *= 1.08
+#   otherwise                               -> hold
+#
+# within the stream's [min, max] bounds, so the encoder backs off before the queues overflow and
+# probes back up when the link recovers. Each stream's keyframe interval starts at the one its
+# encoder had before (IFRAME_INTERVAL_START). Under loss it is halved down to
+# IFRAME_INTERVAL_MIN, since a lost reference frame corrupts the picture until the next
+# keyframe, and it only grows, a step at a time up to IFRAME_INTERVAL_MAX, after
+# IFRAME_CLEAN_REPORTS clean receiver reports in a row. Receivers that send no receiver reports
+# leave the stream at its start bitrate and keyframe interval.
+#
+# Simulated link whose capacity drops and recovers: python3 -m sensor_ingestion.bitrate_control
+# Controller through a LossyRelay (no GStreamer):   ... bitrate_control --relay --loss 0.05
+# GStreamer loopback through a lossy UDP relay:     ... bitrate_control --loopback --loss 0.05
+
+import argparse
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+ADAPTIVE_BITRATE = os.getenv("ADAPTIVE_BITRATE", "1") != "0"
+# (min, start, max) bits/s per stream
+BITRATE_BOUNDS = {
+    "visual": (
+        int(os.getenv("RGB_BITRATE_MIN", 500000)),
+        int(os.getenv("RGB_BITRATE_START", 2500000)),
+        int(os.getenv("RGB_BITRATE_MAX", 4000000)),
+    ),
+    "thermal": (
+        int(os.getenv("THERMAL_BITRATE_MIN", 50000)),
+        int(os.getenv("THERMAL_BITRATE_START", 250000)),
+        int(os.getenv("THERMAL_BITRATE_MAX", 600000)),
+    ),
+}
+# keyframe interval in frames; the encoders are set to the longest, KeyframeForcer adds the rest
+IFRAME_INTERVAL_MIN = int(os.getenv("IFRAME_INTERVAL_MIN", 15))
+IFRAME_INTERVAL_MAX = int(os.getenv("IFRAME_INTERVAL_MAX", 60))
+# what the encoders ran with before adaptive control: nvv4l2h264enc's default 30 for RGB, 15 for
+# thermal
+IFRAME_INTERVAL_START = {
+    "visual": int(os.getenv("RGB_IFRAME_INTERVAL", 30)),
+    "thermal": int(os.getenv("THERMAL_IFRAME_INTERVAL", 15)),
+}
+# clean receiver reports in a row before the keyframe interval grows a step
+IFRAME_CLEAN_REPORTS = int(os.getenv("IFRAME_CLEAN_REPORTS", 5))
+# how often rtpbin sends RTCP, and how often the controllers look at the reports
+RTCP_INTERVAL_MS = int(os.getenv("RTCP_INTERVAL_MS", 1000))
+
+
+class BitrateController:
+    """Adjusts one stream's encoder from its receiver reports.
+
+    apply(bitrate_bps, iframe_interval) is called whenever either changes. Call on_report()
+    with each new receiver report: fraction_lost (0..1), interarrival jitter and round trip
+    time in ms (None if unknown). The keyframe interval starts at iframe_start (default
+    iframe_min) and grows a step after clean_reports reports in a row without loss or delay.
+    """
+
+    def __init__(
+        self,
+        name,
+        apply,
+        min_bps,
+        start_bps,
+        max_bps,
+        iframe_start=None,
+        iframe_min=IFRAME_INTERVAL_MIN,
+        iframe_max=IFRAME_INTERVAL_MAX,
+        clean_reports=IFRAME_CLEAN_REPORTS,
+        low_loss=0.02,
+        high_loss=0.10,
+        increase=1.08,
+        delay_backoff=0.85,
+        rtt_margin_ms=40.0,
+        max_jitter_ms=30.0,
+        log=True,
+    ):
+        self.name = name
+        self.apply = apply
+        self.min_bps = min_bps
+        self.max_bps = max_bps
+        self.iframe_min = iframe_min
+        self.iframe_max = iframe_max
+        self.clean_reports = clean_reports
+        self.low_loss = low_loss
+        self.high_loss = high_loss
+        self.increase = increase
+        self.delay_backoff = delay_backoff
+        self.rtt_margin_ms = rtt_margin_ms
+        self.max_jitter_ms = max_jitter_ms
+        self.log = log
+        self.bitrate = int(min(max(start_bps, min_bps), max_bps))
+        if iframe_start is None:
+            iframe_start = iframe_min
+        self.iframe_interval = int(min(max(iframe_start, iframe_min), iframe_max))
+        self.clean = 0  # clean reports in a row
+        self.min_rtt_ms = None
+        self.reports = 0
+        self.last = None
+        apply(self.bitrate, self.iframe_interval)
+
+    def delayed(self, jitter_ms, rtt_ms):
+        """Whether the delay signals say queues are building up along the path"""
+        if jitter_ms is not None and jitter_ms > self.max_jitter_ms:
+            return True
+        if rtt_ms is None or self.min_rtt_ms is None:
+            return False
+        return rtt_ms > self.min_rtt_ms + self.rtt_margin_ms
+
+    def on_report(self, fraction_lost, jitter_ms=None, rtt_ms=None):
+        self.reports += 1
+        self.last = (fraction_lost, jitter_ms, rtt_ms)
+        delayed = self.delayed(jitter_ms, rtt_ms)
+        if rtt_ms is not None and rtt_ms > 0:
+            self.min_rtt_ms = rtt_ms if self.min_rtt_ms is None else min(self.min_rtt_ms, rtt_ms)
+
+        if fraction_lost > self.high_loss:
+            bitrate = self.bitrate * (1 - fraction_lost / 2)
+        elif delayed:
+            bitrate = self.bitrate * self.delay_backoff
+        elif fraction_lost < self.low_loss:
+            bitrate = self.bitrate * self.increase
+        else:
+            bitrate = self.bitrate
+        bitrate = int(min(max(bitrate, self.min_bps), self.max_bps))
+
+        self.clean = self.clean + 1 if fraction_lost < self.low_loss and not delayed else 0
+        if fraction_lost >= self.low_loss:
+            iframe = max(self.iframe_interval // 2, self.iframe_min)
+        elif self.clean >= self.clean_reports:
+            iframe = min(self.iframe_interval + self.iframe_min, self.iframe_max)
+            self.clean = 0  # the next step takes as many clean reports again
+        else:
+            iframe = self.iframe_interval
+
+        if (bitrate, iframe) != (self.bitrate, self.iframe_interval):
+            self.bitrate, self.iframe_interval = bitrate, iframe
+            self.apply(bitrate, iframe)
+            if self.log:
+                print(
+                    f"{self.name}: loss {fraction_lost:.1%}, jitter {_ms(jitter_ms)}, RTT "
+                    f"{_ms(rtt_ms)} -> {bitrate / 1e6:.2f} Mbps, keyframe every {iframe}",
+                    flush=True,
+                )
+        return bitrate
+
+    def stats(self):
+        fraction_lost, jitter_ms, rtt_ms = self.last or (None, None, None)
+        return {
+            "bitrate_bps": self.bitrate,
+            "iframe_interval": self.iframe_interval,
+            "fraction_lost": fraction_lost,
+            "jitter_ms": jitter_ms,
+            "rtt_ms": rtt_ms,
+            "reports": self.reports,
+        }
+
+
+def _ms(value):
+    return "?" if value is None else f"{value:.0f} ms"
+
+
+def receiver_report(rtpbin, session_id):
+    """Latest receiver report about what rtpbin sends in a session, as
+    ((fraction_lost, jitter_ms, rtt_ms), report_id), or None before the first one.
+
+    The stats of our own (internal) source carry the rb-* fields of the last report block
+    received about it; report_id changes with every new report.
+    """
+    session = rtpbin.emit("get-internal-session", session_id)
+    if session is None:
+        return None
+    for source in session.get_property("sources"):
+        stats = source.get_property("stats")
+        if not stats.get_value("internal") or not stats.get_value("have-rb"):
+            continue
+        clock_rate = stats.get_value("clock-rate") or 90000
+        # RTT is in 1/65536 s, jitter in RTP timestamp units
+        rtt = stats.get_value("rb-round-trip")
+        report = (
+            stats.get_value("rb-fractionlost") / 256.0,
+            stats.get_value("rb-jitter") * 1000.0 / clock_rate,
+            rtt * 1000.0 / 65536 if rtt else None,
+        )
+        return report, (stats.get_value("rb-exthighestseq"), stats.get_value("rb-lsr"))
+    return None
+
+
+class RtcpFeedback:
+    """Polls rtpbin for new receiver reports and hands them to each session's controller"""
+
+    def __init__(self, rtpbin, controllers):
+        self.rtpbin = rtpbin
+        self.controllers = controllers  # session id -> BitrateController
+        self._seen = {}
+
+    def tick(self):
+        """Returns True so GLib.timeout_add keeps calling"""
+        for session_id, controller in self.controllers.items():
+            found = receiver_report(self.rtpbin, session_id)
+            if found is None:
+                continue
+            report, report_id = found
+            if self._seen.get(session_id) != report_id:
+                self._seen[session_id] = report_id
+                controller.on_report(*report)
+        return True
+
+
+def set_rtcp_interval(rtpbin, session_id, interval_ms=RTCP_INTERVAL_MS):
+    """RTCP every interval_ms instead of rtpsession's 5 s default, for faster feedback"""
+    session = rtpbin.emit("get-internal-session", session_id)
+    session.set_property("rtcp-min-interval", interval_ms * 1000000)
+
+
+def set_encoder_bitrate(encoder, bps):
+    """nvv4l2h264enc takes bits/s, x264enc and x265enc kbit/s"""
+    if encoder.get_factory().get_name() in ("x264enc", "x265enc"):
+        encoder.set_property("bitrate", max(bps // 1000, 1))
+    else:
+        encoder.set_property("bitrate", bps)
+
+
+def encoder_bitrate(encoder):
+    """The encoder's bitrate in bits/s"""
+    bitrate = encoder.get_property("bitrate")
+    if encoder.get_factory().get_name() in ("x264enc", "x265enc"):
+        return bitrate * 1000
+    return bitrate
+
+
+class KeyframeForcer:
+    """Forces a keyframe every interval frames on an encoder, plus one at once on request.
+
+    Encoders only read their own keyframe interval at startup, so the encoder runs with the
+    longest interval and this asks for the extra keyframes with force-key-unit events, starting
+    at the interval the encoder used to run with.
+    """
+
+    def __init__(self, encoder, interval):
+        self.interval = interval
+        self.encoder = None
+        self.attach(encoder)
+
+    def attach(self, encoder):
+        """Follow a new encoder, e.g. after control.py swapped it"""
+        from gi.repository import Gst
+
+        self.encoder = encoder
+        self.frames = 0
+        encoder.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self._on_buffer)
+
+    def _on_buffer(self, _pad, _info):
+        from gi.repository import Gst
+
+        self.frames += 1
+        if self.frames >= self.interval:
+            self.force()
+        return Gst.PadProbeReturn.OK
+
+    def set_interval(self, interval):
+        if interval < self.interval:
+            self.force()  # loss just started, repair the picture now
+        self.interval = interval
+
+    def force(self):
+        from gi.repository import Gst, GstVideo
+
+        self.frames = 0
+        event = GstVideo.video_event_new_upstream_force_key_unit(Gst.CLOCK_TIME_NONE, True, 0)
+        self.encoder.get_static_pad("src").send_event(event)
+
+
+class LossyRelay(threading.Thread):
+    """UDP relay that drops a fraction of the packets and caps the rate like a congested link.
+
+    Packets over rate_bps wait in a queue of queue_ms at most, then get dropped (tail drop).
+    """
+
+    def __init__(self, listen_port, target, loss=0.0, rate_bps=None, queue_ms=100):
+        super().__init__(daemon=True)
+        self.target = target
+        self.loss = loss
+        self.rate_bps = rate_bps
+        self.queue_s = queue_ms / 1000.0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", listen_port))
+        self.sock.settimeout(0.2)
+        self.out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.stop = threading.Event()
+        self.forwarded = self.dropped = 0
+        self._busy_until = 0.0  # when the link has sent what is queued
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                packet = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            if random.random() < self.loss or not self._admit(len(packet)):
+                self.dropped += 1
+                continue
+            self.out.sendto(packet, self.target)
+            self.forwarded += 1
+
+    def _admit(self, size):
+        if not self.rate_bps:
+            return True
+        now = time.monotonic()
+        start = max(self._busy_until, now)
+        if start - now > self.queue_s:
+            return False
+        # the backlog is only accounted, admitted packets go out at once (no added delay)
+        self._busy_until = start + size * 8.0 / self.rate_bps
+        return True
+
+
+def simulate(seconds=60, link=((0, 3.0e6), (20, 1.0e6), (40, 3.0e6)), base_rtt_ms=20.0):
+    """Controller against a modelled link: 1% random loss, capacity changing over time, a
+    100 ms queue that adds delay and drops whatever doesn't fit"""
+    low, start, high = BITRATE_BOUNDS["visual"]
+    controller = BitrateController(
+        "visual",
+        lambda bps, iframe: None,
+        low,
+        start,
+        high,
+        iframe_start=IFRAME_INTERVAL_START["visual"],
+        log=False,
+    )
+    queue_s = 0.0
+    delivered = offered = 0.0
+    for t in range(seconds):
+        capacity = [c for at, c in link if at <= t][-1]
+        sent = controller.bitrate
+        # one second of traffic through the queue
+        queue_s = max(queue_s + (sent - capacity) / capacity, 0.0)
+        overflow = max(queue_s - 0.1, 0.0)
+        queue_s = min(queue_s, 0.1)
+        loss = min(0.01 + overflow * capacity / sent, 1.0)
+        offered += sent
+        delivered += sent * (1 - loss)
+        rtt = base_rtt_ms + queue_s * 1000
+        controller.on_report(loss, jitter_ms=queue_s * 100, rtt_ms=rtt)
+        print(
+            f"t={t:2d}s link {capacity / 1e6:.1f} Mbps  sent {sent / 1e6:.2f} Mbps  "
+            f"loss {loss:5.1%}  RTT {rtt:4.0f} ms  -> {controller.bitrate / 1e6:.2f} Mbps, "
+            f"keyframe every {controller.iframe_interval}"
+        )
+    print(f"delivered {delivered / offered:.1%} of the packets sent")
+
+
+def relay_test(seconds=30, loss=0.05, rate_bps=None, report_s=0.5, port=5610):
+    """Controller against real UDP traffic through a LossyRelay, no GStreamer needed: a sender
+    paces 1200 byte numbered packets at the controller's bitrate, and every report_s a
+    receiver works out the fraction lost since its last report (as an RTCP receiver report
+    does) and hands it to the controller. Loss is random at first, then the relay turns clean
+    for the second half, so the keyframe interval should drop under loss and only grow back
+    after the clean reports. Returns the controller and its (loss, bitrate, keyframe interval)
+    per report."""
+    low, start, high = BITRATE_BOUNDS["visual"]
+    controller = BitrateController(
+        "visual",
+        lambda bps, iframe: None,
+        low,
+        start,
+        high,
+        iframe_start=IFRAME_INTERVAL_START["visual"],
+        log=False,
+    )
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", port + 1))
+    receiver.settimeout(0.05)
+    relay = LossyRelay(port, ("127.0.0.1", port + 1), loss, rate_bps)
+    relay.start()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stop = threading.Event()
+    payload = bytes(1196)
+
+    def send():
+        seq, next_at = 0, time.monotonic()
+        while not stop.is_set():
+            now = time.monotonic()
+            if now < next_at:
+                time.sleep(min(next_at - now, 0.005))
+                continue
+            sender.sendto(struct.pack("!I", seq) + payload, ("127.0.0.1", port))
+            seq += 1
+            # spaced by the controller's current bitrate, without bursting to catch up
+            next_at = max(next_at, now - 0.01) + 1200 * 8.0 / controller.bitrate
+
+    sending = threading.Thread(target=send, daemon=True)
+    sending.start()
+    history = []
+    highest, received, expected_prior, received_prior = -1, 0, 0, 0
+    next_report = time.monotonic() + report_s
+    end = time.monotonic() + seconds
+    try:
+        while time.monotonic() < end:
+            try:
+                packet = receiver.recv(2048)
+                highest = max(highest, struct.unpack_from("!I", packet)[0])
+                received += 1
+            except socket.timeout:
+                pass
+            if time.monotonic() < next_report:
+                continue
+            next_report += report_s
+            expected = highest + 1
+            interval_expected = expected - expected_prior
+            interval_lost = interval_expected - (received - received_prior)
+            expected_prior, received_prior = expected, received
+            if interval_expected <= 0:
+                continue
+            fraction_lost = max(interval_lost, 0) / interval_expected
+            controller.on_report(fraction_lost)
+            history.append((fraction_lost, controller.bitrate, controller.iframe_interval))
+            if time.monotonic() > end - seconds / 2:
+                relay.loss = 0.0
+    finally:
+        stop.set()
+        relay.stop.set()
+        sending.join()
+    for fraction_lost, bitrate, iframe in history:
+        print(
+            f"loss {fraction_lost:5.1%} -> {bitrate / 1e6:.2f} Mbps, keyframe every {iframe}",
+            flush=True,
+        )
+    print(f"relay dropped {relay.dropped} of {relay.forwarded + relay.dropped} packets")
+    return controller, history
+
+
+def loopback(seconds=60, loss=0.05, rate_bps=None, port=5600):
+    """Real pipelines on localhost: a 720p test pattern encoded with x264enc through rtpbin,
+    RTP through a LossyRelay to a receiving rtpbin whose receiver reports come back directly
+    (so RTT doesn't see the relay's queue, loss and jitter do)"""
+    import gi
+
+    gi.require_version("Gst", "1.0")
+    gi.require_version("GstVideo", "1.0")
+    from gi.repository import GLib, Gst
+
+    Gst.init(None)
+    relay_port, recv_rtp, recv_rtcp, send_rtcp = port, port + 2, port + 3, port + 5
+    sender = Gst.parse_launch(
+        "rtpbin name=rtpbin videotestsrc is-live=true pattern=ball "
+        "! video/x-raw,width=1280,height=720,framerate=30/1 "
+        "! x264enc name=encoder tune=zerolatency speed-preset=ultrafast "
+        f"key-int-max={IFRAME_INTERVAL_MAX} ! rtph264pay config-interval=-1 pt=96 "
+        f"! rtpbin.send_rtp_sink_0 rtpbin.send_rtp_src_0 ! udpsink port={relay_port} "
+        f"rtpbin.send_rtcp_src_0 ! udpsink port={recv_rtcp} sync=false async=false "
+        f"udpsrc port={send_rtcp} ! rtpbin.recv_rtcp_sink_0"
+    )
+    receiver = Gst.parse_launch(
+        "rtpbin name=rtpbin "
+        f"udpsrc port={recv_rtp} caps=application/x-rtp,media=video,encoding-name=H264,"
+        "clock-rate=90000,payload=96 ! rtpbin.recv_rtp_sink_0 "
+        f"udpsrc port={recv_rtcp} ! rtpbin.recv_rtcp_sink_0 "
+        f"rtpbin.send_rtcp_src_0 ! udpsink port={send_rtcp} sync=false async=false"
+    )
+
+    def on_pad(_rtpbin, pad):
+        if pad.get_name().startswith("recv_rtp_src"):
+            sink = Gst.ElementFactory.make("fakesink")
+            receiver.add(sink)
+            sink.sync_state_with_parent()
+            pad.link(sink.get_static_pad("sink"))
+
+    receiver.get_by_name("rtpbin").connect("pad-added", on_pad)
+    relay = LossyRelay(relay_port, ("127.0.0.1", recv_rtp), loss, rate_bps)
+    relay.start()
+
+    encoder = sender.get_by_name("encoder")
+    keyframes = KeyframeForcer(encoder, IFRAME_INTERVAL_START["visual"])
+
+    def apply(bps, iframe):
+        set_encoder_bitrate(encoder, bps)
+        keyframes.set_interval(iframe)
+
+    low, start, high = BITRATE_BOUNDS["visual"]
+    controller = BitrateController(
+        "visual", apply, low, start, high, iframe_start=IFRAME_INTERVAL_START["visual"]
+    )
+    rtpbin = sender.get_by_name("rtpbin")
+    feedback = RtcpFeedback(rtpbin, {0: controller})
+    for pipeline in (receiver, sender):
+        pipeline.set_state(Gst.State.PLAYING)
+    set_rtcp_interval(rtpbin, 0)
+    set_rtcp_interval(receiver.get_by_name("rtpbin"), 0)
+
+    loop = GLib.MainLoop()
+    GLib.timeout_add(RTCP_INTERVAL_MS, feedback.tick)
+    GLib.timeout_add(int(seconds * 1000), loop.quit)
+    try:
+        loop.run()
+    finally:
+        for pipeline in (sender, receiver):
+            pipeline.set_state(Gst.State.NULL)
+        relay.stop.set()
+    total = relay.forwarded + relay.dropped
+    print(
+        f"relay dropped {relay.dropped} of {total} packets; controller at "
+        f"{controller.bitrate / 1e6:.2f} Mbps after {controller.reports} receiver reports"
+    )
+    return controller
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RTCP driven bitrate control")
+    parser.add_argument("--loopback", action="store_true", help="GStreamer loopback test")
+    parser.add_argument("--relay", action="store_true", help="UDP test through a LossyRelay")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--loss", type=float, default=0.05, help="relay random loss")
+    parser.add_argument("--rate", type=float, default=None, help="relay link rate, bits/s")
+    args = parser.parse_args()
+    if args.loopback:
+        loopback(args.seconds, args.loss, args.rate)
+    elif args.relay:
+        relay_test(args.seconds, args.loss, args.rate)
+    else:
+        simulate(int(args.seconds))
@@ -0,0 +1,580 @@
+# Live reconfiguration of the ingestion pipeline over a local HTTP API
+# Changing encoder settings, the inference resolution or starting a recording used to mean
+# restarting ingest_gi.py, which stops both RTP streams and inference for seconds. Each change
+# here touches one branch while the pipeline keeps PLAYING:
+#
+#   encoder bitrate / keyframe interval    property set on the running encoder
+#   other encoder settings or element      branch blocked at its RTP queue, encoder swapped
+#   inference resolution                   branch blocked at its inference queue, caps changed
+#   video recording branch                 queue ! encoder ! h264parse ! matroskamux ! filesink
+#                                          added to a sensor's tee, finished with EOS on removal
+#   frame pair recording                   recording.py's FrameRecorder started or stopped
+#
+# A pad probe at the end of every branch (udpsinks and appsinks) notes when buffers arrive, and
+# every change reports the longest gap each branch saw in the second after it, next to its usual
+# frame interval: the interruption of the changed branch, and that the others kept flowing.
+#
+# Only listens on localhost by default (CONTROL_HOST, CONTROL_PORT):
+#   curl localhost:8091/status
+#   curl -X POST localhost:8091/encoder/visual -d '{"bitrate": 1500000}'
+#   curl -X POST localhost:8091/encoder/thermal -d '{"preset-level": 2}'
+#   curl -X POST localhost:8091/inference/visual -d '{"width": 640, "height": 360}'
+#   curl -X POST localhost:8091/recording/visual -d '{"path": "/data/visual.mkv"}'
+#   curl -X DELETE localhost:8091/recording/visual
+#   curl -X POST localhost:8091/frame-recorder -d '{"path": "/data/pairs.ddrec"}'
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst  # noqa: E402
+
+from sensor_ingestion.bitrate_control import encoder_bitrate, set_encoder_bitrate  # noqa: E402
+
+CONTROL_ENABLED = os.getenv("CONTROL_ENABLED", "1") != "0"
+CONTROL_HOST = os.getenv("CONTROL_HOST", "127.0.0.1")
+CONTROL_PORT = int(os.getenv("CONTROL_PORT", 8091))
+# how long after a change the branches are watched for gaps
+CONTROL_SETTLE_S = float(os.getenv("CONTROL_SETTLE_S", 1.0))
+RECORDING_BITRATE = int(os.getenv("RECORDING_BITRATE", 8000000))
+
+# element names from ingest_gi.build_gst_pipeline()
+PREFIX = {"visual": "rgb", "thermal": "thermal"}
+# encoder properties that carry over when the encoder is swapped
+ENCODER_PROPERTIES = ("bitrate", "iframeinterval", "insert-sps-pps", "control-rate", "preset-level")
+# settable on the running encoder, everything else needs a new one
+LIVE_PROPERTIES = ("bitrate", "iframeinterval")
+
+
+class ChangeError(Exception):
+    """A change that can't be applied, reported as 400"""
+
+
+class BranchMonitor:
+    """When buffers last reached the end of each branch, to measure interruptions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last = {}
+        self.interval = {}  # moving average of the normal gap between buffers
+        self.max_gap = None
+
+    def watch(self, name, pad):
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._on_buffer, name)
+
+    def _on_buffer(self, _pad, _info, name):
+        now = time.monotonic()
+        with self._lock:
+            last = self.last.get(name)
+            self.last[name] = now
+            if last is not None:
+                gap = now - last
+                if self.max_gap is not None:
+                    self.max_gap[name] = max(self.max_gap.get(name, 0.0), gap)
+                else:
+                    self.interval[name] = 0.9 * self.interval.get(name, gap) + 0.1 * gap
+        return Gst.PadProbeReturn.OK
+
+    def arm(self):
+        with self._lock:
+            self.max_gap = {}
+
+    def disarm(self):
+        """Per branch: longest gap since arm() and the usual interval, in ms. A branch that
+        hasn't had a buffer since counts the time until now."""
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for name, last in self.last.items():
+                gap = max(self.max_gap.get(name, 0.0), now - last)
+                usual = self.interval.get(name)
+                report[name] = {
+                    "max_gap_ms": round(gap * 1000, 1),
+                    "usual_gap_ms": None if usual is None else round(usual * 1000, 1),
+                    "interruption_ms": round(max(gap - (usual or 0.0), 0.0) * 1000, 1),
+                }
+            self.max_gap = None
+        return report
+
+
+def block(pad, change, timeout=2.0):
+    """Run change() from the streaming thread while pad is blocked, then let data flow again.
+    Live sources push a buffer every frame, so the block takes effect within one frame. On a
+    timeout the probe is removed, so change() doesn't run after the caller was told it failed;
+    if data arrived just as it timed out and change() already started, it's waited for."""
+    done = threading.Event()
+    outcome = {}
+    state_lock = threading.Lock()
+    state = {"started": False, "cancelled": False}
+
+    def on_blocked(_pad, _info):
+        with state_lock:
+            if state["cancelled"]:
+                return Gst.PadProbeReturn.REMOVE
+            state["started"] = True
+        try:
+            outcome["result"] = change()
+        except Exception as e:  # reported to the caller, the streaming thread carries on
+            outcome["error"] = e
+        done.set()
+        return Gst.PadProbeReturn.REMOVE
+
+    probe_id = pad.add_probe(Gst.PadProbeType.BLOCK_DOWNSTREAM, on_blocked)
+    if not done.wait(timeout):
+        with state_lock:
+            state["cancelled"] = not state["started"]
+        if state["cancelled"]:
+            pad.remove_probe(probe_id)
+            raise ChangeError(f"{pad.get_parent_element().get_name()} had no data to block on")
+        done.wait()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+
+class PipelineControl:
+    """Applies changes to one branch of the running pipeline and measures the interruption.
+
+    controllers and keyframes are bitrate_control.py's BitrateController and KeyframeForcer
+    per sensor, kept in step with manual encoder changes. set_frame_recording(path or None)
+    starts or stops ingest_gi.py's frame pair recorder. analysis is rate_control.py's
+    AdaptiveRateController, whose effective analysis rate /status reports.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        controllers=None,
+        keyframes=None,
+        set_frame_recording=None,
+        analysis=None,
+        settle_s=CONTROL_SETTLE_S,
+    ):
+        self.pipeline = pipeline
+        self.controllers = controllers or {}
+        self.keyframes = keyframes or {}
+        self.set_frame_recording = set_frame_recording
+        self.analysis = analysis
+        self.settle_s = settle_s
+        self.recordings = {}
+        self.frame_recording = None
+        self.changes = deque(maxlen=20)
+        self._lock = threading.Lock()  # one change at a time
+        self.monitor = BranchMonitor()
+        for sensor, prefix in PREFIX.items():
+            self.monitor.watch(
+                f"{sensor}_rtp", self._element(f"{prefix}_udpsink").get_static_pad("sink")
+            )
+            self.monitor.watch(
+                f"{sensor}_inference", self._element(f"{prefix}_appsink").get_static_pad("sink")
+            )
+
+    def _element(self, name):
+        element = self.pipeline.get_by_name(name)
+        if element is None:
+            raise ChangeError(f"No element {name} in the pipeline")
+        return element
+
+    def _prefix(self, sensor):
+        if sensor not in PREFIX:
+            raise ChangeError(f"Unknown sensor {sensor!r}, expected one of {', '.join(PREFIX)}")
+        return PREFIX[sensor]
+
+    def apply(self, description, change):
+        """Run change(), watch the branches for settle_s and report how each was affected"""
+        with self._lock:
+            self.monitor.arm()
+            started = time.monotonic()
+            try:
+                result = change()
+            finally:
+                applied_ms = round((time.monotonic() - started) * 1000, 1)
+                time.sleep(self.settle_s)
+                branches = self.monitor.disarm()
+            report = {
+                "change": description,
+                "applied_ms": applied_ms,
+                "branches": branches,
+                "at": time.time(),
+            }
+            if result:
+                report["result"] = result
+            self.changes.append(report)
+        worst = max(branches.items(), key=lambda kv: kv[1]["interruption_ms"], default=None)
+        if worst is not None:
+            print(
+                f"Control: {description} applied in {applied_ms} ms, longest interruption "
+                f"{worst[1]['interruption_ms']} ms on {worst[0]}",
+                flush=True,
+            )
+        return report
+
+    def configure_encoder(self, sensor, settings):
+        """bitrate (bits/s) and iframeinterval are set live, anything else (properties, or
+        "element" for another encoder) swaps the encoder"""
+        prefix = self._prefix(sensor)
+        settings = dict(settings)
+        if "iframe_interval" in settings:
+            settings["iframeinterval"] = settings.pop("iframe_interval")
+        factory = settings.pop("element", None)
+        live = {k: v for k, v in settings.items() if k in LIVE_PROPERTIES}
+        rebuild = {k: v for k, v in settings.items() if k not in LIVE_PROPERTIES}
+        if not live and not rebuild and factory is None:
+            raise ChangeError("Nothing to change")
+
+        def change():
+            encoder = self._element(f"{prefix}_encoder")
+            if rebuild or factory is not None:
+                encoder = self._swap_encoder(prefix, encoder, factory, dict(settings))
+                keyframes = self.keyframes.get(sensor)
+                if keyframes is not None:
+                    keyframes.attach(encoder)
+            else:
+                if "bitrate" in live:
+                    set_encoder_bitrate(encoder, int(live["bitrate"]))
+                if "iframeinterval" in live and encoder.find_property("iframeinterval"):
+                    encoder.set_property("iframeinterval", int(live["iframeinterval"]))
+            self._sync_adaptive(sensor, live)
+            return {"element": encoder.get_factory().get_name()}
+
+        return self.apply(f"encoder {sensor} {json.dumps(settings, sort_keys=True)}", change)
+
+    def _sync_adaptive(self, sensor, live):
+        """The adaptive controller and keyframe forcer continue from the new values"""
+        keyframes = self.keyframes.get(sensor)
+        if "iframeinterval" in live and keyframes is not None:
+            keyframes.set_interval(int(live["iframeinterval"]))
+        controller = self.controllers.get(sensor)
+        if controller is None:
+            return
+        if "bitrate" in live:
+            # widen its bounds rather than have it pull a manual bitrate back in
+            controller.min_bps = min(controller.min_bps, int(live["bitrate"]))
+            controller.max_bps = max(controller.max_bps, int(live["bitrate"]))
+            controller.bitrate = int(live["bitrate"])
+        if "iframeinterval" in live:
+            controller.iframe_interval = int(live["iframeinterval"])
+
+    def _swap_encoder(self, prefix, old, factory, settings):
+        name = old.get_name()
+        factory = factory or old.get_factory().get_name()
+        new = Gst.ElementFactory.make(factory)
+        if new is None:
+            raise ChangeError(f"No GStreamer element {factory}")
+        # another element type keeps only the bitrate, its other properties needn't match
+        carried = ENCODER_PROPERTIES if factory == old.get_factory().get_name() else ("bitrate",)
+        for key in carried:
+            if key in settings or new.find_property(key) is None:
+                continue
+            if key == "bitrate":
+                set_encoder_bitrate(new, encoder_bitrate(old))
+            elif old.find_property(key) is not None:
+                new.set_property(key, old.get_property(key))
+        for key, value in settings.items():
+            if new.find_property(key) is None:
+                raise ChangeError(f"{factory} has no property {key}")
+            if key == "bitrate":
+                set_encoder_bitrate(new, int(value))
+            else:
+                new.set_property(key, value)
+
+        queue = self._element(f"{prefix}_rtp_queue")
+        payload = self._element(f"{prefix}_rtp_payload")
+
+        def swap():
+            # the queue's streaming thread is blocked, so nothing is inside the old encoder's
+            # chain function; what it still holds (a frame or two) is dropped
+            old.set_state(Gst.State.NULL)
+            queue.unlink(old)
+            old.unlink(payload)
+            self.pipeline.remove(old)
+            new.set_property("name", name)
+            self.pipeline.add(new)
+            if not (queue.link(new) and new.link(payload)):
+                raise ChangeError(f"{factory} can't link into the {prefix} RTP branch")
+            new.sync_state_with_parent()
+
+        block(queue.get_static_pad("src"), swap)
+        return new
+
+    def configure_inference(self, sensor, settings):
+        """Resolution the inference branch converts to (width and height, or null for the
+        sensor's own)"""
+        prefix = self._prefix(sensor)
+        caps_filter = self._element(f"{prefix}_inf_nv12_caps")
+        caps = "video/x-raw,format=NV12"
+        width, height = settings.get("width"), settings.get("height")
+        if (width is None) != (height is None):
+            raise ChangeError("Give both width and height, or neither")
+        if width is not None:
+            caps += f",width={int(width)},height={int(height)}"
+        queue = self._element(f"{prefix}_inf_queue")
+
+        def change():
+            # setting the caps makes capsfilter ask upstream to renegotiate (nvvidconv scales)
+            block(
+                queue.get_static_pad("src"),
+                lambda: caps_filter.set_property("caps", Gst.Caps.from_string(caps)),
+            )
+            return {"caps": caps}
+
+        return self.apply(f"inference {sensor} {caps}", change)
+
+    def start_recording(self, sensor, path):
+        """Tee branch encoding the sensor's video to a Matroska file"""
+        prefix = self._prefix(sensor)
+        if sensor in self.recordings:
+            raise ChangeError(f"{sensor} is already being recorded")
+        if not path:
+            raise ChangeError("path is required")
+        tee = self._element(f"{prefix}_tee")
+
+        def change():
+            elements = []
+            for factory in ("queue", "nvv4l2h264enc", "h264parse", "matroskamux", "filesink"):
+                element = Gst.ElementFactory.make(factory, f"{prefix}_rec_{factory}")
+                if element is None:
+                    raise ChangeError(f"No GStreamer element {factory}")
+                elements.append(element)
+            queue, encoder, _, _, sink = elements
+            queue.set_property("leaky", 2)
+            queue.set_property("max-size-buffers", 5)
+            set_encoder_bitrate(encoder, RECORDING_BITRATE)
+            encoder.set_property("insert-sps-pps", 1)
+            sink.set_property("location", path)
+            sink.set_property("async", False)
+            added, tee_pad = [], None
+            try:
+                for element in elements:
+                    self.pipeline.add(element)
+                    added.append(element)
+                for first, second in zip(elements, elements[1:]):
+                    if not first.link(second):
+                        raise ChangeError(
+                            f"Failed to link {first.get_name()} to {second.get_name()}"
+                        )
+                # downstream first, so the branch is ready before the tee pushes into it
+                for element in reversed(elements):
+                    element.sync_state_with_parent()
+                tee_pad = tee.get_request_pad("src_%u")
+                if tee_pad.link(queue.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+                    raise ChangeError(f"Failed to link the {sensor} tee to the recording")
+            except Exception:
+                # nothing left behind, so the fixed element names are free for the next start
+                if tee_pad is not None:
+                    tee.release_request_pad(tee_pad)
+                for element in added:
+                    element.set_state(Gst.State.NULL)
+                    self.pipeline.remove(element)
+                raise
+            self.recordings[sensor] = {"path": path, "elements": elements, "tee_pad": tee_pad}
+            return {"path": path}
+
+        return self.apply(f"start recording {sensor}", change)
+
+    def stop_recording(self, sensor):
+        """Detach the branch from the tee and send it EOS, so the muxer finishes the file
+        before the branch is removed. The recording is only forgotten once its elements are out
+        of the pipeline: if EOS doesn't get through, stopping it again removes the branch
+        without finishing the file."""
+        self._prefix(sensor)
+        recording = self.recordings.get(sensor)
+        if recording is None:
+            raise ChangeError(f"{sensor} is not being recorded")
+        tee = self._element(f"{PREFIX[sensor]}_tee")
+        elements, tee_pad = recording["elements"], recording["tee_pad"]
+        finished = recording.setdefault("finished", threading.Event())
+
+        def on_eos(_pad, info):
+            if info.get_event().type != Gst.EventType.EOS:
+                return Gst.PadProbeReturn.PASS
+            # the last element's streaming thread can't set its own state, finish in the loop
+            GLib.idle_add(remove)
+            return Gst.PadProbeReturn.DROP
+
+        def remove():
+            # once, whether EOS or a second stop gets here first
+            if not finished.is_set():
+                for element in elements:
+                    element.set_state(Gst.State.NULL)
+                    self.pipeline.remove(element)
+                finished.set()
+            return False
+
+        def detach():
+            tee_pad.unlink(elements[0].get_static_pad("sink"))
+            tee.release_request_pad(tee_pad)
+
+        def change():
+            if recording.get("detached"):
+                # EOS didn't get through last time, drop the branch as it is
+                GLib.idle_add(remove)
+                complete = False
+            else:
+                elements[-1].get_static_pad("sink").add_probe(
+                    Gst.PadProbeType.EVENT_DOWNSTREAM, on_eos
+                )
+                block(tee_pad, detach)
+                recording["detached"] = True
+                elements[0].get_static_pad("sink").send_event(Gst.Event.new_eos())
+                complete = True
+            if not finished.wait(5.0):
+                raise ChangeError(
+                    f"Recording of {sensor} didn't finish, {recording['path']}; stop it again "
+                    "to remove it unfinished"
+                )
+            self.recordings.pop(sensor, None)
+            return {"path": recording["path"], "finished": complete}
+
+        return self.apply(f"stop recording {sensor}", change)
+
+    def configure_frame_recording(self, path):
+        if self.set_frame_recording is None:
+            raise ChangeError("Frame pair recording isn't available")
+
+        def change():
+            self.set_frame_recording(path or None)
+            self.frame_recording = path or None
+            return {"path": self.frame_recording}
+
+        return self.apply("frame recorder " + (path or "off"), change)
+
+    def status(self):
+        encoders = {}
+        for sensor, prefix in PREFIX.items():
+            encoder = self._element(f"{prefix}_encoder")
+            encoders[sensor] = {
+                "element": encoder.get_factory().get_name(),
+                **{
+                    key: encoder.get_property(key)
+                    for key in ENCODER_PROPERTIES[1:]
+                    if encoder.find_property(key) is not None
+                },
+                "bitrate": encoder_bitrate(encoder),
+            }
+            controller = self.controllers.get(sensor)
+            if controller is not None:
+                encoders[sensor]["adaptive"] = controller.stats()
+        return {
+            "encoders": encoders,
+            "inference_caps": {
+                sensor: self._element(f"{prefix}_inf_nv12_caps").get_property("caps").to_string()
+                for sensor, prefix in PREFIX.items()
+            },
+            "analysis": self.analysis.stats() if self.analysis is not None else None,
+            "recordings": {sensor: r["path"] for sensor, r in self.recordings.items()},
+            "frame_recording": self.frame_recording,
+            "changes": list(self.changes),
+        }
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _handler(control):
+    routes = {
+        ("POST", "encoder"): lambda sensor, body: control.configure_encoder(sensor, body),
+        ("POST", "inference"): lambda sensor, body: control.configure_inference(sensor, body),
+        ("POST", "recording"): lambda sensor, body: control.start_recording(
+            sensor, body.get("path")
+        ),
+        ("DELETE", "recording"): lambda sensor, body: control.stop_recording(sensor),
+        ("POST", "frame-recorder"): lambda _, body: control.configure_frame_recording(
+            body.get("path")
+        ),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method):
+            parts = self.path.strip("/").split("/")
+            if method == "GET" and parts == ["status"]:
+                return self._reply(200, control.status())
+            route = routes.get((method, parts[0]))
+            if route is None or len(parts) > 2:
+                return self._reply(404, {"error": f"No route {method} {self.path}"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                if not isinstance(body, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                return self._reply(400, {"error": f"Invalid JSON body: {e}"})
+            try:
+                return self._reply(200, route(parts[1] if len(parts) > 1 else None, body))
+            except (ChangeError, TypeError, ValueError) as e:
+                return self._reply(400, {"error": str(e)})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+        def log_message(self, fmt, *args):
+            print("Control:", fmt % args, flush=True)
+
+    return Handler
+
+
+def serve(control, host=CONTROL_HOST, port=CONTROL_PORT):
+    """Serve the control API from a daemon thread, returns the server"""
+    server = _Server((host, port), _handler(control))
+    threading.Thread(target=server.serve_forever, name="control", daemon=True).start()
+    print(f"Pipeline control on http://{host}:{port}", flush=True)
+    return server
+
+
+def _request(method, path, body=None, host=CONTROL_HOST, port=CONTROL_PORT):
+    from urllib.request import Request, urlopen
+
+    data = None if body is None else json.dumps(body).encode()
+    request = Request(f"http://{host}:{port}{path}", data=data, method=method)
+    with urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    # Against a running ingest_gi.py: apply one change of each kind, undo it, and print how long
+    # each branch was interrupted
+    import tempfile
+
+    status = _request("GET", "/status")
+    bitrate = status["encoders"]["visual"].get("bitrate", 2500000)
+    iframes = status["encoders"]["visual"].get("iframeinterval", 60)
+    path = os.path.join(tempfile.gettempdir(), "control_demo.mkv")
+    changes = [
+        ("POST", "/encoder/visual", {"bitrate": bitrate // 2}),
+        ("POST", "/encoder/visual", {"bitrate": bitrate}),
+        ("POST", "/encoder/visual", {"iframeinterval": iframes}),
+        ("POST", "/encoder/thermal", {"preset-level": 2}),
+        ("POST", "/inference/visual", {"width": 640, "height": 360}),
+        ("POST", "/inference/visual", {}),
+        ("POST", "/recording/visual", {"path": path}),
+        ("DELETE", "/recording/visual", None),
+    ]
+    print(f"{'change':48s} {'applied':>9s}  interruption per branch (ms)")
+    for method, route, body in changes:
+        report = _request(method, route, body)
+        branches = "  ".join(
+            f"{name} {b['interruption_ms']:.0f}" for name, b in sorted(report["branches"].items())
+        )
+        print(f"{report['change'][:48]:48s} {report['applied_ms']:7.1f}ms  {branches}")
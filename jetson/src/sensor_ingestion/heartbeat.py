@@ -0,0 +1,128 @@
+# Shared memory heartbeats between the supervised processes and run_both.py
+# A process that is alive but stuck (a wedged GLib main loop, a pipeline that stopped delivering
+# frames, inference blocked on the GPU) looks healthy to waitpid(). Each supervised process maps
+# a small file under HEARTBEAT_DIR (/dev/shm when there is one, so it never touches the disk)
+# and keeps two things up to date in it:
+#
+#   beat     CLOCK_MONOTONIC seconds, written from the process's main loop every interval
+#   frames   a counter bumped for every frame (pair) it gets through, and when that last happened
+#
+# run_both.py reads the same file to tell a hung process (beat too old) from a stalled one
+# (beating, but frames stopped) and restarts either. Writing is a couple of stores into the
+# mapping, no syscall, so it can go on the per frame path. The supervisor passes the path in
+# HEARTBEAT_PATH; without it (running a module on its own) heartbeats do nothing. The file is
+# written from the first beat or frame on, so however long a process takes to start, the
+# supervisor doesn't hold it against it.
+#
+# Fields are 8 byte aligned and written individually, so a reader sees each one whole; the
+# monotonic clock is system wide on Linux, so times compare across processes.
+#
+# Child that beats, counts frames and then stalls or crashes, to try the supervisor with:
+#   python3 -m sensor_ingestion.heartbeat stall|crash|hang|slow
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+HEARTBEAT_DIR = os.getenv(
+    "HEARTBEAT_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+HEARTBEAT_INTERVAL_MS = int(os.getenv("HEARTBEAT_INTERVAL_MS", 200))
+
+# pid, beat time, frame count, last frame time
+LAYOUT = struct.Struct("<qdqd")
+PID, BEAT, FRAMES, FRAME_AT = 0, 8, 16, 24
+
+
+def heartbeat_path(name):
+    return os.path.join(HEARTBEAT_DIR, f"dronedetect-{name}.hb")
+
+
+class Heartbeat:
+    """Writer side, one per process. path defaults to $HEARTBEAT_PATH."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("HEARTBEAT_PATH")
+        self.frames = 0
+        self._map = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _open(self):
+        """The mapping, created by the first beat or frame. Not at import: startup (registering
+        with the backend, building the pipeline) can take longer than the supervisor's timeout,
+        and it only starts watching a child once there is a beat."""
+        if self._map is None and self.path:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, LAYOUT.size)
+                self._map = mmap.mmap(fd, LAYOUT.size)
+            finally:
+                os.close(fd)
+            LAYOUT.pack_into(self._map, 0, os.getpid(), time.monotonic(), 0, 0.0)
+        return self._map
+
+    def beat(self):
+        """Still alive. Returns True so it can be a GLib.timeout_add() callback."""
+        if self._open() is not None:
+            struct.pack_into("<d", self._map, BEAT, time.monotonic())
+        return True
+
+    def frame(self, count=1):
+        """count more frames processed"""
+        self.frames += count
+        if self._open() is not None:
+            struct.pack_into("<qd", self._map, FRAMES, self.frames, time.monotonic())
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def read_heartbeat(path):
+    """(pid, beat, frames, frame_at) from a heartbeat file, None until a process has written it"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(LAYOUT.size)
+    except FileNotFoundError:
+        return None
+    if len(data) < LAYOUT.size:
+        return None
+    values = LAYOUT.unpack(data)
+    # created but not written yet (pid 0)
+    return values if values[0] else None
+
+
+# this process's heartbeat, what ingest_gi.py and inference use
+heartbeat = Heartbeat()
+
+
+def _demo_child(mode, frames=40, fps=20.0, startup_s=3.0):
+    """Beats and counts frames for a while, then stops counting frames (stall), exits with an
+    error (crash) or stops beating altogether (hang). slow takes startup_s to start, like
+    ingestion retrying an unreachable backend, and then keeps going."""
+    if mode == "slow":
+        time.sleep(startup_s)
+        print(f"Demo child {os.getpid()} started after {startup_s:.0f} s", flush=True)
+        frames = sys.maxsize
+    for _ in range(frames):
+        heartbeat.beat()
+        heartbeat.frame()
+        time.sleep(1.0 / fps)
+    print(f"Demo child {os.getpid()} {mode}", flush=True)
+    if mode == "crash":
+        sys.exit(3)
+    while True:
+        if mode == "stall":
+            heartbeat.beat()
+        time.sleep(HEARTBEAT_INTERVAL_MS / 1000.0)
+
+
+if __name__ == "__main__":
+    _demo_child(sys.argv[1] if len(sys.argv) > 1 else "stall")
@@ -9,6 +9,7 @@
 # https://forums.developer.nvidia.com/t/appsink-element-in-python-deepstream-pipeline/311528
 
 import os
+import threading
 from datetime import datetime
 
 import cv2
@@ -17,6 +18,25 @@ import numpy as np
 from dotenv import load_dotenv
 
 from sensor_ingestion import buffer
+from sensor_ingestion.bitrate_control import (
+    ADAPTIVE_BITRATE,
+    BITRATE_BOUNDS,
+    IFRAME_INTERVAL_MAX,
+    IFRAME_INTERVAL_START,
+    RTCP_INTERVAL_MS,
+    BitrateController,
+    KeyframeForcer,
+    RtcpFeedback,
+    set_encoder_bitrate,
+    set_rtcp_interval,
+)
+from sensor_ingestion.control import CONTROL_ENABLED, PipelineControl
+from sensor_ingestion.control import serve as serve_control
+from sensor_ingestion.heartbeat import HEARTBEAT_INTERVAL_MS, heartbeat
+from sensor_ingestion.rate_control import ADAPTIVE_ANALYSIS_RATE, AdaptiveRateController
+from sensor_ingestion.recording import FrameRecorder
+from sensor_ingestion.registration import NODE_ID, register
+from sensor_ingestion.tracing import FrameTrace, now_us
 
 gi.require_version("GLib", "2.0")
 gi.require_version("GObject", "2.0")
@@ -27,10 +47,17 @@ load_dotenv()
 
 latest_rgb = None
 latest_thermal = None
+latest_rgb_trace = None
+latest_thermal_trace = None
 
 BACKEND_IP = os.getenv("BACKEND_IP", "192.168.50.1")
 BACKEND_PORT = int(os.getenv("BACKEND_PORT", 3000))
 
+# Set RECORD_PATH to record every frame pair handed to the buffer for offline replay
+RECORD_PATH = os.getenv("RECORD_PATH")
+recorder = FrameRecorder(RECORD_PATH) if RECORD_PATH else None
+recorder_lock = threading.Lock()  # control.py starts and stops it while frames arrive
+
 frame_dir = "saved_frames"
 os.makedirs(frame_dir, exist_ok=True)
 frame_num = 0
@@ -58,7 +85,40 @@ def link_tee(tee, element):
         raise RuntimeError(f"Failed to link tee {tee.name} to {element.name}")
 
 
-def build_gst_pipeline():
+def link_pads(src_pad, sink_pad):
+    if src_pad is None or sink_pad is None or src_pad.link(sink_pad) != Gst.PadLinkReturn.OK:
+        raise RuntimeError("Failed to link rtpbin pads")
+
+
+def link_rtpbin(pipeline, rtpbin, session, payload, udpsink):
+    """payload -> rtpbin session -> udpsink (RTP to port P), with RTCP going to P + 1.
+    RTCP is sent from and received on the same local socket, the address receivers send
+    their receiver reports back to."""
+    link_pads(payload.get_static_pad("src"), rtpbin.get_request_pad(f"send_rtp_sink_{session}"))
+    link_pads(rtpbin.get_static_pad(f"send_rtp_src_{session}"), udpsink.get_static_pad("sink"))
+
+    rtcp_src = Gst.ElementFactory.make("udpsrc", f"rtcp_src_{session}")
+    rtcp_src.set_property("port", 0)  # any free port
+    rtcp_src.set_property("caps", Gst.Caps.from_string("application/x-rtcp"))
+    rtcp_sink = Gst.ElementFactory.make("udpsink", f"rtcp_sink_{session}")
+    rtcp_sink.set_property("host", udpsink.get_property("host"))
+    rtcp_sink.set_property("port", udpsink.get_property("port") + 1)
+    rtcp_sink.set_property("sync", False)
+    rtcp_sink.set_property("async", False)
+    pipeline.add(rtcp_src)
+    pipeline.add(rtcp_sink)
+    rtcp_src.set_state(Gst.State.READY)  # binds the socket
+    rtcp_sink.set_property("socket", rtcp_src.get_property("used-socket"))
+    link_pads(rtpbin.get_request_pad(f"send_rtcp_src_{session}"), rtcp_sink.get_static_pad("sink"))
+    link_pads(rtcp_src.get_static_pad("src"), rtpbin.get_request_pad(f"recv_rtcp_sink_{session}"))
+
+
+def keyframe_interval(sensor):
+    """Keyframe interval the encoder itself is set to"""
+    return IFRAME_INTERVAL_MAX if ADAPTIVE_BITRATE else IFRAME_INTERVAL_START[sensor]
+
+
+def build_gst_pipeline(rgb_port=BACKEND_PORT, thermal_port=BACKEND_PORT + 2):
     Gst.init(None)
     pipeline = Gst.Pipeline.new("rgb-thermal-pipeline")
 
@@ -89,7 +149,13 @@ def build_gst_pipeline():
     rgb_tee = Gst.ElementFactory.make("tee", "rgb_tee")
 
     # RGB into inference
+    # leaky so a slow inference branch never backs up into the tee and stalls the RTP branch
     rgb_inf_queue = Gst.ElementFactory.make("queue", "rgb_inf_queue")
+    rgb_inf_queue.set_property("max-size-buffers", 2)
+    rgb_inf_queue.set_property("leaky", 2)
+    # drop-only rate limit before the converters, max-rate set by AdaptiveRateController
+    rgb_inf_rate = Gst.ElementFactory.make("videorate", "rgb_inf_rate")
+    rgb_inf_rate.set_property("drop-only", True)
     rgb_inf_nvconv = Gst.ElementFactory.make("nvvidconv", "rgb_inf_nvconv")  # NV12 to BGR
     rgb_inf_nv12_caps = Gst.ElementFactory.make("capsfilter", "rgb_inf_nv12_caps")
     rgb_inf_nv12_caps.set_property("caps", Gst.Caps.from_string("video/x-raw,format=NV12"))
@@ -112,14 +178,19 @@ def build_gst_pipeline():
     # Gst.Caps.from_string("video/x-raw(memory:NVMM),format=NV12"))
     rgb_encoder = Gst.ElementFactory.make("nvv4l2h264enc", "rgb_encoder")  # H.264 encoder
     # rgb_encoder = Gst.ElementFactory.make("x264enc", "rgb_encoder") # H.264 encoder
-    rgb_encoder.set_property("bitrate", 4000000)  # 4Mbps for now? change later
+    # start bitrate, then set from RTCP receiver reports by bitrate_control.py
+    rgb_encoder.set_property("bitrate", BITRATE_BOUNDS["visual"][1])
     rgb_encoder.set_property("insert-sps-pps", 1)
+    # the longest keyframe interval, KeyframeForcer asks for more keyframes; without adaptive
+    # control the interval it used to run with
+    rgb_encoder.set_property("iframeinterval", keyframe_interval("visual"))
+    rgb_encoder.set_property("control-rate", 1)
     rgb_rtp_payload = Gst.ElementFactory.make("rtph264pay", "rgb_rtp_payload")
     rgb_rtp_payload.set_property("pt", 96)  # Payload type for H.264 rtp streams
     rgb_rtp_payload.set_property("config-interval", 1)
     rgb_udpsink = Gst.ElementFactory.make("udpsink", "rgb_udpsink")
     rgb_udpsink.set_property("host", BACKEND_IP)
-    rgb_udpsink.set_property("port", BACKEND_PORT)
+    rgb_udpsink.set_property("port", rgb_port)
     rgb_udpsink.set_property("sync", False)
     rgb_udpsink.set_property("async", False)
 
@@ -144,6 +215,10 @@ def build_gst_pipeline():
 
     # thermal into inference
     thermal_inf_queue = Gst.ElementFactory.make("queue", "thermal_inf_queue")
+    thermal_inf_queue.set_property("max-size-buffers", 2)
+    thermal_inf_queue.set_property("leaky", 2)
+    thermal_inf_rate = Gst.ElementFactory.make("videorate", "thermal_inf_rate")
+    thermal_inf_rate.set_property("drop-only", True)
     # Convert to BGR for inference
     thermal_inf_nvconv = Gst.ElementFactory.make("nvvidconv", "thermal_inf_nvconv")
     thermal_inf_nv12_caps = Gst.ElementFactory.make("capsfilter", "thermal_inf_nv12_caps")
@@ -172,10 +247,10 @@ def build_gst_pipeline():
     thermal_encoder = Gst.ElementFactory.make("nvv4l2h264enc", "thermal_encoder")  # H.264 encoder
     # thermal_encoder = Gst.ElementFactory.make("x264enc", "thermal_encoder") # H.264 encoder
     # thermal_encoder.set_property("tune", "zerolatency")
-    thermal_encoder.set_property("bitrate", 4000000)  # 4Mbps for now? change later
+    thermal_encoder.set_property("bitrate", BITRATE_BOUNDS["thermal"][1])
     thermal_encoder.set_property("insert-sps-pps", 1)
     thermal_encoder.set_property("preset-level", 1)
-    thermal_encoder.set_property("iframeinterval", 15)
+    thermal_encoder.set_property("iframeinterval", keyframe_interval("thermal"))
     thermal_encoder.set_property("control-rate", 1)
     # thermal_encoder_sink = thermal_encoder.get_static_pad("sink")
     # print("THERMAL ENCODER CAPS:", thermal_encoder_sink.get_current_caps())
@@ -192,11 +267,14 @@ def build_gst_pipeline():
     thermal_rtp_payload.set_property("config-interval", 1)
     thermal_udpsink = Gst.ElementFactory.make("udpsink", "thermal_udpsink")
     thermal_udpsink.set_property("host", BACKEND_IP)
-    thermal_udpsink.set_property("port", BACKEND_PORT + 2)
+    thermal_udpsink.set_property("port", thermal_port)
     thermal_udpsink.set_property("sync", False)
     thermal_udpsink.set_property("async", False)
     print("THERMAL PORT:", thermal_udpsink.get_property("port"))
 
+    # RTP sessions 0 (RGB) and 1 (thermal), with RTCP sender and receiver reports
+    rtpbin = Gst.ElementFactory.make("rtpbin", "rtpbin")
+
     elements = [
         rgb_src,
         rgb_caps,
@@ -204,6 +282,7 @@ def build_gst_pipeline():
         rgb_nvmm_caps,
         rgb_tee,
         rgb_inf_queue,
+        rgb_inf_rate,
         rgb_inf_nvconv,
         rgb_inf_nv12_caps,
         rgb_inf_videoconv,
@@ -221,6 +300,7 @@ def build_gst_pipeline():
         thermal_inf_bgr_caps,
         thermal_tee,
         thermal_inf_queue,
+        thermal_inf_rate,
         thermal_inf_nvconv,
         thermal_inf_nv12_caps,
         thermal_appsink,
@@ -228,6 +308,7 @@ def build_gst_pipeline():
         thermal_encoder,
         thermal_rtp_payload,
         thermal_udpsink,
+        rtpbin,
     ]
 
     # Add all of the elements to the pipeline
@@ -245,7 +326,8 @@ def build_gst_pipeline():
     link_check(rgb_nvmm_caps, rgb_tee)
 
     link_tee(rgb_tee, rgb_inf_queue)
-    link_check(rgb_inf_queue, rgb_inf_nvconv)
+    link_check(rgb_inf_queue, rgb_inf_rate)
+    link_check(rgb_inf_rate, rgb_inf_nvconv)
     link_check(rgb_inf_nvconv, rgb_inf_nv12_caps)
     link_check(rgb_inf_nv12_caps, rgb_inf_videoconv)
     link_check(rgb_inf_videoconv, rgb_inf_bgr_caps)
@@ -254,7 +336,7 @@ def build_gst_pipeline():
     link_tee(rgb_tee, rgb_rtp_queue)
     link_check(rgb_rtp_queue, rgb_encoder)
     link_check(rgb_encoder, rgb_rtp_payload)
-    link_check(rgb_rtp_payload, rgb_udpsink)
+    link_rtpbin(pipeline, rtpbin, 0, rgb_rtp_payload, rgb_udpsink)
 
     # Linking thermal stuff
     link_check(thermal_src, thermal_caps)
@@ -263,7 +345,8 @@ def build_gst_pipeline():
     link_check(thermal_nvmm_caps, thermal_tee)
 
     link_tee(thermal_tee, thermal_inf_queue)
-    link_check(thermal_inf_queue, thermal_inf_nvconv)
+    link_check(thermal_inf_queue, thermal_inf_rate)
+    link_check(thermal_inf_rate, thermal_inf_nvconv)
     link_check(thermal_inf_nvconv, thermal_inf_nv12_caps)
     link_check(thermal_inf_nv12_caps, thermal_inf_videoconv)
     link_check(thermal_inf_videoconv, thermal_inf_bgr_caps)
@@ -272,9 +355,50 @@ def build_gst_pipeline():
     link_tee(thermal_tee, thermal_rtp_queue)
     link_check(thermal_rtp_queue, thermal_encoder)
     link_check(thermal_encoder, thermal_rtp_payload)
-    link_check(thermal_rtp_payload, thermal_udpsink)
+    link_rtpbin(pipeline, rtpbin, 1, thermal_rtp_payload, thermal_udpsink)
+
+    return pipeline, rgb_appsink, thermal_appsink, [rgb_inf_rate, thermal_inf_rate]
+
+
+def set_analysis_rate(rate_elements, fps):
+    """Frame rate limit of the inference branches, the RTP branches aren't affected"""
+    for element in rate_elements:
+        element.set_property("max-rate", fps)
+    print(f"Inference branches limited to {fps} fps", flush=True)
 
-    return pipeline, rgb_appsink, thermal_appsink
+
+def start_bitrate_control(pipeline):
+    """One BitrateController per RTP session, fed by RTCP receiver reports every interval.
+    Returns the feedback poller and the keyframe forcers per sensor."""
+    rtpbin = pipeline.get_by_name("rtpbin")
+    controllers = {}
+    forcers = {}
+    for session, (sensor, encoder_name) in enumerate(
+        [("visual", "rgb_encoder"), ("thermal", "thermal_encoder")]
+    ):
+        keyframes = forcers[sensor] = KeyframeForcer(
+            pipeline.get_by_name(encoder_name), IFRAME_INTERVAL_START[sensor]
+        )
+
+        # through the forcer, which follows the encoder if control.py swaps it
+        def apply(bps, iframe, keyframes=keyframes):
+            set_encoder_bitrate(keyframes.encoder, bps)
+            keyframes.set_interval(iframe)
+
+        controllers[session] = BitrateController(
+            sensor, apply, *BITRATE_BOUNDS[sensor], iframe_start=IFRAME_INTERVAL_START[sensor]
+        )
+        set_rtcp_interval(rtpbin, session)
+    return RtcpFeedback(rtpbin, controllers), forcers
+
+
+def capture_time_us(appsink, buf):
+    """Monotonic us a buffer was captured at: live sources stamp buffers with the running time
+    of capture, and the pipeline's system clock is CLOCK_MONOTONIC, so base time + PTS is the
+    capture time on the same clock as GLib.get_monotonic_time()"""
+    if buf.pts == Gst.CLOCK_TIME_NONE:
+        return None
+    return (appsink.get_base_time() + buf.pts) // 1000
 
 
 def update_buffer():
@@ -282,13 +406,28 @@ def update_buffer():
 
     if latest_rgb is not None and latest_thermal is not None:
         timestamp = GLib.get_monotonic_time()
-        buffer.update(timestamp, latest_rgb, latest_thermal)
+        trace = FrameTrace.pair(latest_rgb_trace, latest_thermal_trace)
+        buffer.update(timestamp, latest_rgb, latest_thermal, trace=trace)
+        heartbeat.frame()
+        with recorder_lock:
+            if recorder is not None:
+                recorder.write(timestamp, latest_rgb, latest_thermal)
+
+
+def set_frame_recording(path):
+    """Record frame pairs to a new file at path, or stop recording with None"""
+    global recorder
+    with recorder_lock:
+        previous, recorder = recorder, FrameRecorder(path) if path else None
+    if previous is not None:
+        previous.close()
 
 
 # This function is what actually makes the RGB sample available to Python for inference
 def on_new_rgb_sample(appsink):
-    global latest_rgb, frame_num
+    global latest_rgb, latest_rgb_trace, frame_num
 
+    arrived = now_us()
     sample = appsink.emit("pull-sample")
     buf = sample.get_buffer()
     caps = sample.get_caps()
@@ -304,6 +443,7 @@ def on_new_rgb_sample(appsink):
         frame = np.frombuffer(map_info.data, dtype=np.uint8)
         frame = frame.reshape((height, width, 3))  # in BGR format now in np array
         latest_rgb = frame
+        latest_rgb_trace = FrameTrace(capture_time_us(appsink, buf), arrived)
         # save_frame(frame, "rgb")
         frame_num += 1
         update_buffer()
@@ -318,8 +458,9 @@ def on_new_rgb_sample(appsink):
 
 # This function is what actually makes the thermal sample available to Python for inference
 def on_new_thermal_sample(appsink):
-    global latest_thermal, frame_num
+    global latest_thermal, latest_thermal_trace, frame_num
 
+    arrived = now_us()
     sample = appsink.emit("pull-sample")
     buf = sample.get_buffer()
     caps = sample.get_caps()
@@ -335,6 +476,7 @@ def on_new_thermal_sample(appsink):
         frame = np.frombuffer(map_info.data, dtype=np.uint8)
         frame = frame.reshape((height, width, 3))
         latest_thermal = frame
+        latest_thermal_trace = FrameTrace(capture_time_us(appsink, buf), arrived)
         # save_frame(frame, "thermal")
         frame_num += 1
         update_buffer()
@@ -359,9 +501,26 @@ def on_message(_bus, message, loop):
         loop.quit()
 
 
+def rtp_ports():
+    """(rgb port, thermal port): assigned by the backend when NODE_ID is set, else fixed"""
+    if not NODE_ID:
+        return BACKEND_PORT, BACKEND_PORT + 2
+    assignments = register(NODE_ID)
+    if assignments is None:
+        print("Registration failed, streaming to the fixed ports")
+        return BACKEND_PORT, BACKEND_PORT + 2
+    for sensor, stream in assignments.items():
+        buffer.stream_names[sensor] = stream["stream_name"]
+        print(f"Node {NODE_ID} {sensor}: port {stream['rtp_port']}, {stream['hls_url']}")
+    return assignments["visual"]["rtp_port"], assignments["thermal"]["rtp_port"]
+
+
 def main():
     Gst.init(None)
-    pipeline, rgb_appsink, thermal_appsink = build_gst_pipeline()
+    rgb_port, thermal_port = rtp_ports()
+    pipeline, rgb_appsink, thermal_appsink, rate_elements = build_gst_pipeline(
+        rgb_port, thermal_port
+    )
 
     rgb_appsink.connect("new-sample", on_new_rgb_sample)
     thermal_appsink.connect("new-sample", on_new_thermal_sample)
@@ -371,7 +530,24 @@ def main():
     bus.add_signal_watch()
     bus.connect("message", on_message, loop)
 
+    analysis = None
+    if ADAPTIVE_ANALYSIS_RATE:
+        analysis = AdaptiveRateController(buffer, lambda fps: set_analysis_rate(rate_elements, fps))
+        GLib.timeout_add(1000, analysis.tick)
+
     pipeline.set_state(Gst.State.PLAYING)
+    # run_both.py restarts ingestion when these stop, see heartbeat.py
+    GLib.timeout_add(HEARTBEAT_INTERVAL_MS, heartbeat.beat)
+    controllers, keyframes = {}, {}
+    if ADAPTIVE_BITRATE:
+        feedback, keyframes = start_bitrate_control(pipeline)
+        controllers = {c.name: c for c in feedback.controllers.values()}
+        GLib.timeout_add(RTCP_INTERVAL_MS, feedback.tick)
+    if CONTROL_ENABLED:
+        control = PipelineControl(
+            pipeline, controllers, keyframes, set_frame_recording, analysis=analysis
+        )
+        serve_control(control)
     print("Ingestion started")
     try:
         loop.run()
@@ -380,6 +556,7 @@ def main():
     finally:
         # Stopped state
         pipeline.set_state(Gst.State.NULL)
+        set_frame_recording(None)
         print("Ingestion stopped")
 
 
@@ -0,0 +1,156 @@
+# Backpressure-aware analysis frame rate for the inference branches
+# The appsinks keep only the newest frame (max-buffers=1, drop=True), so when inference falls
+# behind the extra frames were still converted (nvvidconv -> NV12 -> videoconvert -> BGR) and
+# then thrown away. Each inference branch now starts with a drop-only videorate; this
+# controller sets its max-rate to what the consumer of the SharedBuffer actually takes, plus
+# some headroom, so the converters only do work that gets used. The RTP branches are on the
+# other side of the tees and keep the full sensor rate.
+#
+# Every interval it compares the pairs handed out by SharedBuffer.get() (the analysis rate)
+# with the current limit:
+#   consumer keeping up (analysis >= keep_up * limit)  -> probe up by step fps
+#   consumer falling behind                             -> limit = analysis * headroom
+# so the limit settles just above what inference sustains and follows it when scenes get
+# harder or easier. Until the buffer has handed out its first pair there is no consumer to
+# match (nothing in the process reads the buffer yet, or inference is still starting) and the
+# branches stay at max_fps, so the recorder, heartbeat frame counts and traces behind the
+# appsinks run at the sensor rate. A consumer that stops later takes the limit down to min_fps.
+#
+# Simulated consumer capped at N fps that starts a few seconds late:
+#   python3 -m sensor_ingestion.rate_control
+
+import os
+import threading
+import time
+
+ANALYSIS_MIN_FPS = float(os.getenv("ANALYSIS_MIN_FPS", 1))
+ANALYSIS_MAX_FPS = float(os.getenv("ANALYSIS_MAX_FPS", 30))
+# Set ADAPTIVE_ANALYSIS_RATE=0 to run the inference branches at the full sensor rate
+ADAPTIVE_ANALYSIS_RATE = os.getenv("ADAPTIVE_ANALYSIS_RATE", "1") != "0"
+
+
+class AdaptiveRateController:
+    """Matches the inference branches' frame rate to what the buffer's consumer takes.
+
+    apply_rate(fps) is called with the new limit (an int, videorate's max-rate) whenever it
+    changes. Call tick() every interval_s, e.g. from GLib.timeout_add(); analysis_fps is the
+    consumer's measured rate over the last interval, the metric to watch.
+    """
+
+    def __init__(
+        self,
+        buffer,
+        apply_rate,
+        min_fps=ANALYSIS_MIN_FPS,
+        max_fps=ANALYSIS_MAX_FPS,
+        headroom=1.2,
+        keep_up=0.8,
+        step=1,
+        log_every_s=10.0,
+    ):
+        self.buffer = buffer
+        self.apply_rate = apply_rate
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.headroom = headroom
+        self.keep_up = keep_up
+        self.step = step
+        self.log_every_s = log_every_s
+        self.limit = int(max_fps)
+        self.analysis_fps = 0.0
+        self.published_fps = 0.0
+        self._last = None
+        self._last_log = time.monotonic()
+        apply_rate(self.limit)
+
+    def tick(self):
+        """Measure the last interval and adjust the limit. Returns True so GLib keeps calling."""
+        now = time.monotonic()
+        consumed, published = self.buffer.consumed, self.buffer.seq
+        if self._last is not None:
+            then, last_consumed, last_published = self._last
+            elapsed = now - then
+            if elapsed > 0:
+                self.analysis_fps = (consumed - last_consumed) / elapsed
+                self.published_fps = (published - last_published) / elapsed
+                # no consumer yet, nothing to match (or it started during the interval)
+                if last_consumed:
+                    self._adjust()
+        self._last = (now, consumed, published)
+        if now - self._last_log >= self.log_every_s:
+            self._last_log = now
+            print(
+                f"Analysis {self.analysis_fps:.1f} fps, inference branches limited to "
+                f"{self.limit} fps",
+                flush=True,
+            )
+        return True
+
+    def _adjust(self):
+        if self.analysis_fps >= self.keep_up * self.limit:
+            target = self.limit + self.step
+        else:
+            target = self.analysis_fps * self.headroom
+        target = int(round(min(max(target, self.min_fps), self.max_fps)))
+        if target != self.limit:
+            self.limit = target
+            self.apply_rate(target)
+
+    def stats(self):
+        return {
+            "analysis_fps": round(self.analysis_fps, 2),
+            "published_fps": round(self.published_fps, 2),
+            "inference_fps_limit": self.limit,
+        }
+
+
+def simulate(consumer_fps=8.0, sensor_fps=30.0, seconds=20.0, interval_s=0.5, consumer_after_s=3.0):
+    """Producer throttled like the videorates, consumer that can only do consumer_fps and
+    starts after consumer_after_s"""
+    from sensor_ingestion.shared_buffer import SharedBuffer
+
+    buffer = SharedBuffer()
+    limit = [sensor_fps]
+    converted = [0]
+    stop = threading.Event()
+
+    def producer():
+        # stand-in for both inference branches: a new pair at the videorate's max-rate
+        while not stop.is_set():
+            time.sleep(1.0 / min(limit[0], sensor_fps))
+            converted[0] += 1
+            buffer.update(time.monotonic(), None, None)
+
+    def consumer():
+        stop.wait(consumer_after_s)
+        while not stop.is_set():
+            if buffer.get(wait=0.1) is not None:
+                time.sleep(1.0 / consumer_fps)
+
+    controller = AdaptiveRateController(
+        buffer, lambda fps: limit.__setitem__(0, fps), max_fps=sensor_fps, log_every_s=1e9
+    )
+    threads = [threading.Thread(target=producer), threading.Thread(target=consumer)]
+    for thread in threads:
+        thread.start()
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        time.sleep(interval_s)
+        controller.tick()
+        print(
+            f"t={time.monotonic() - start:5.1f}s analysis {controller.analysis_fps:5.1f} fps, "
+            f"limit {controller.limit:2d} fps"
+        )
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wasted = 1 - buffer.consumed / max(converted[0], 1)
+    print(
+        f"converted {converted[0]} pairs, analysed {buffer.consumed}: {wasted:.0%} of the "
+        f"conversion work thrown away (vs {1 - consumer_fps / sensor_fps:.0%} at a fixed "
+        f"{sensor_fps:.0f} fps)"
+    )
+
+
+if __name__ == "__main__":
+    simulate()
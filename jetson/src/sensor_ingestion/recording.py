@@ -0,0 +1,248 @@
+# Raw RGB/thermal frame pair recorder and replay source
+# Recording what the appsinks hand to update_buffer() lets inference/fusion be benchmarked and
+# regression tested on any CPU-only machine without GStreamer or a live (is-live=True) source.
+#
+# File layout: a fixed 64 byte header followed by fixed-size records
+#   header: magic, version, rgb (h, w, c), thermal (h, w, c)
+#   record: int64 timestamp (GLib monotonic us, same as update_buffer), rgb bytes, thermal bytes
+# Because every record is the same size the file maps straight onto a numpy structured array, so
+# the timestamp column is the index (searchsorted for seeking) and frames are zero-copy views.
+#
+# Usage from jetson/src:
+#   python3 -m sensor_ingestion.recording synthetic test.ddrec --frames 300
+#   python3 -m sensor_ingestion.recording replay test.ddrec [--realtime] [--loop N]
+# Or set RECORD_PATH before running sensor_ingestion.ingest_gi to record the live pipeline.
+
+import argparse
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"DDREC\x00\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sI3I3I")
+HEADER_SIZE = 64
+
+
+def record_dtype(rgb_shape, thermal_shape):
+    return np.dtype(
+        [("timestamp", "<i8"), ("rgb", np.uint8, rgb_shape), ("thermal", np.uint8, thermal_shape)]
+    )
+
+
+class FrameRecorder:
+    """Appends timestamped RGB/thermal pairs to a recording file.
+    Frame shapes are taken from the first pair, every later pair has to match."""
+
+    def __init__(self, path, flush_every=30):
+        self.path = path
+        self.flush_every = flush_every
+        self.frames = 0
+        self._file = None
+        self._shapes = None
+        self._lock = threading.Lock()
+
+    def write(self, timestamp, rgb, thermal):
+        with self._lock:
+            if self._file is None:
+                self._open(rgb.shape, thermal.shape)
+            if (rgb.shape, thermal.shape) != self._shapes:
+                raise ValueError(
+                    f"Frame shapes changed mid recording: {rgb.shape}, {thermal.shape} "
+                    f"(recording has {self._shapes})"
+                )
+            self._file.write(struct.pack("<q", timestamp))
+            self._file.write(np.ascontiguousarray(rgb, dtype=np.uint8).data)
+            self._file.write(np.ascontiguousarray(thermal, dtype=np.uint8).data)
+            self.frames += 1
+            # a crash only loses what hasn't been flushed, records are self delimiting by size
+            if self.frames % self.flush_every == 0:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self, rgb_shape, thermal_shape):
+        if len(rgb_shape) != 3 or len(thermal_shape) != 3:
+            raise ValueError("Frames must be (height, width, channels) uint8 arrays")
+        self._shapes = (tuple(rgb_shape), tuple(thermal_shape))
+        self._file = open(self.path, "wb")  # noqa: SIM115 - stays open until close()
+        header = HEADER.pack(MAGIC, VERSION, *rgb_shape, *thermal_shape)
+        self._file.write(header.ljust(HEADER_SIZE, b"\x00"))
+        print(f"Recording frames to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """Read-only memory mapped view of a recording file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, *dims = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        if version != VERSION:
+            raise ValueError(f"{path} has unsupported recording version {version}")
+        self.rgb_shape = tuple(dims[:3])
+        self.thermal_shape = tuple(dims[3:])
+        self.dtype = record_dtype(self.rgb_shape, self.thermal_shape)
+
+        # a partially written trailing record (recorder killed mid write) is ignored
+        count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(
+                path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,)
+            )
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        record = self.records[i]
+        return int(record["timestamp"]), record["rgb"], record["thermal"]
+
+    @property
+    def timestamps(self):
+        return self.records["timestamp"]
+
+    def index_at(self, timestamp):
+        """Index of the first record at or after a timestamp"""
+        return int(np.searchsorted(self.timestamps, timestamp))
+
+    def duration_s(self):
+        if len(self) < 2:
+            return 0.0
+        return (int(self.timestamps[-1]) - int(self.timestamps[0])) / 1e6
+
+
+class ReplaySource:
+    """Feeds a recording back through the same interface the live pipeline uses.
+
+    realtime=True sleeps to reproduce the recorded pacing, otherwise frames go out as fast as the
+    consumer takes them: into a SharedBuffer via run() (waiting for each frame to be consumed so
+    nothing is dropped), or pulled directly with frames().
+    """
+
+    def __init__(self, recording, realtime=False, loops=1, start=0, stop=None):
+        self.recording = recording if isinstance(recording, Recording) else Recording(recording)
+        self.realtime = realtime
+        self.loops = loops
+        self.start = start
+        self.stop = stop if stop is not None else len(self.recording)
+
+    def frames(self):
+        """Yields (timestamp, rgb, thermal). Timestamps keep increasing across loops."""
+        if self.stop <= self.start:
+            return
+        timestamps = self.recording.timestamps
+        span = int(timestamps[self.stop - 1]) - int(timestamps[self.start])
+        # one average frame gap between the last frame of a loop and the first of the next
+        gap = span // max(self.stop - self.start - 1, 1)
+        wall_start = time.monotonic()
+        first = int(timestamps[self.start])
+
+        for loop in range(self.loops):
+            offset = loop * (span + gap)
+            for i in range(self.start, self.stop):
+                timestamp, rgb, thermal = self.recording[i]
+                timestamp += offset
+                if self.realtime:
+                    delay = (timestamp - first) / 1e6 - (time.monotonic() - wall_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                yield timestamp, rgb, thermal
+
+    def run(self, target, timeout=None):
+        """Push every frame into a SharedBuffer. Returns the number of frames delivered."""
+        delivered = 0
+        for timestamp, rgb, thermal in self.frames():
+            if not self.realtime and not target.wait_consumed(timeout):
+                break
+            target.update(timestamp, rgb, thermal)
+            delivered += 1
+        return delivered
+
+
+def write_synthetic(path, frames, rgb_shape=(720, 1280, 3), thermal_shape=(120, 160, 3), fps=30):
+    """Deterministic test recording: a bright blob crossing both frames"""
+    rng = np.random.RandomState(0)
+    rgb = rng.randint(0, 64, rgb_shape).astype(np.uint8)
+    thermal = rng.randint(0, 64, thermal_shape).astype(np.uint8)
+    with FrameRecorder(path) as recorder:
+        for i in range(frames):
+            rgb_frame = rgb.copy()
+            thermal_frame = thermal.copy()
+            x = i * 4 % (rgb_shape[1] - 16)
+            rgb_frame[300:316, x : x + 16] = 255
+            tx = x * thermal_shape[1] // rgb_shape[1]
+            thermal_frame[50:53, tx : tx + 3] = 255
+            recorder.write(int(i * 1e6 / fps), rgb_frame, thermal_frame)
+
+
+def replay_throughput(path, realtime, loops):
+    """Replay into a SharedBuffer with a consumer thread that touches every frame"""
+    from sensor_ingestion.shared_buffer import SharedBuffer
+
+    target = SharedBuffer()
+    source = ReplaySource(path, realtime=realtime, loops=loops)
+    consumed = []
+    done = threading.Event()
+
+    def consumer():
+        while not done.is_set():
+            data = target.get(wait=0.1)
+            if data is not None:
+                consumed.append(int(data["rgb"][0, 0, 0]))
+
+    thread = threading.Thread(target=consumer, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    delivered = source.run(target)
+    target.wait_consumed(1.0)
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+
+    recording = source.recording
+    mb = delivered * recording.dtype.itemsize / 1e6
+    print(f"{delivered} frame pairs ({recording.rgb_shape} + {recording.thermal_shape})")
+    print(f"recorded duration {recording.duration_s() * loops:.2f} s, replayed in {elapsed:.2f} s")
+    print(f"{delivered / elapsed:.1f} pairs/s, {mb / elapsed:.1f} MB/s, consumed {len(consumed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay raw RGB+thermal frame pairs")
+    sub = parser.add_subparsers(dest="command")
+    synthetic = sub.add_parser("synthetic", help="write a deterministic synthetic recording")
+    synthetic.add_argument("path")
+    synthetic.add_argument("--frames", type=int, default=300)
+    replay = sub.add_parser("replay", help="replay a recording into a SharedBuffer")
+    replay.add_argument("path")
+    replay.add_argument("--realtime", action="store_true", help="keep the recorded pacing")
+    replay.add_argument("--loop", type=int, default=1, help="number of passes")
+    args = parser.parse_args()
+
+    if args.command == "synthetic":
+        write_synthetic(args.path, args.frames)
+    elif args.command == "replay":
+        replay_throughput(args.path, args.realtime, args.loop)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
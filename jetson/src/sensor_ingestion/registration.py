@@ -0,0 +1,66 @@
+# Edge node registration with the backend's stream registry
+# With several Jetsons feeding one backend, fixed RTP ports and the shared visual/thermal
+# MediaMTX paths no longer work: every node would publish over the others. A node with a
+# NODE_ID registers its sensors with POST /nodes/register instead and gets, per sensor, a
+# stream name ("<node id>-<sensor>") and an RTP port on the MediaMTX host. Registering again
+# after a reboot returns the same ports, so viewers and MediaMTX paths stay put.
+#
+# The stream name is also what the node's detections must carry as stream_name, the backend
+# looks their node up from it (GET /detections?node_id=... for one node's detections).
+#
+# Without NODE_ID nothing changes: RTP goes to BACKEND_PORT and BACKEND_PORT + 2 and is
+# published on the visual and thermal paths.
+#
+# Register by hand: NODE_ID=jetson01 python3 -m sensor_ingestion.registration
+
+import http.client
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+NODE_ID = os.getenv("NODE_ID")
+BACKEND_URL = os.getenv("BACKEND_URL", "http://192.168.50.1:8000")
+
+# what ingest_gi.py publishes, announced so MediaMTX can describe the streams
+SENSORS = [
+    {"name": "visual", "codec": "H264", "width": 1280, "height": 720, "fps": 30},
+    {"name": "thermal", "codec": "H264", "width": 160, "height": 120, "fps": 30},
+]
+
+
+def register(node_id, sensors=None, base_url=BACKEND_URL, attempts=5, retry_s=2.0):
+    """Register node_id's sensors, returns {sensor: assignment} or None if the backend can't
+    be reached. An assignment has stream_name, rtp_port, rtsp_url and hls_url."""
+    url = urlsplit(base_url)
+    path = url.path.rstrip("/") + "/nodes/register"
+    body = json.dumps({"node_id": node_id, "sensors": sensors or SENSORS}).encode()
+    for attempt in range(attempts):
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+        try:
+            connection.request("POST", path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            detail = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Registering node {node_id} failed: {e}")
+        else:
+            if response.status == 200:
+                node = json.loads(detail.decode())
+                return {stream["sensor"]: stream for stream in node["streams"]}
+            print(f"Backend refused node {node_id}: {response.status} {detail[:200]}")
+            if 400 <= response.status < 500:
+                return None
+        finally:
+            connection.close()
+        if attempt < attempts - 1:
+            time.sleep(retry_s)
+    return None
+
+
+if __name__ == "__main__":
+    if not NODE_ID:
+        raise SystemExit("Set NODE_ID")
+    assignments = register(NODE_ID, attempts=1)
+    for sensor, stream in sorted((assignments or {}).items()):
+        print(f"{sensor}: RTP to port {stream['rtp_port']}, stream {stream['stream_name']}")
+        print(f"  {stream['hls_url']}")
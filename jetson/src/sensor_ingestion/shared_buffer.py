@@ -4,16 +4,51 @@ import threading
 class SharedBuffer:
     def __init__(self):
         self.lock = threading.Lock()
+        # signalled whenever a frame is published or handed out, used by replay and
+        # consumers that want to block instead of polling
+        self.changed = threading.Condition(self.lock)
         self.frame_data = None
+        self.seq = 0
+        self.consumed_seq = 0
+        # pairs handed out by get() that hadn't been before, the analysis rate counter
+        self.consumed = 0
+        # stream name per sensor, what detections made from the pairs should carry as
+        # stream_name. ingest_gi.py replaces them with the registered "<node id>-<sensor>"
+        # names when NODE_ID is set (see registration.py)
+        self.stream_names = {"visual": "visual", "thermal": "thermal"}
 
-    def update(self, timestamp, rgb, thermal):
+    def update(self, timestamp, rgb, thermal, trace=None):
         with self.lock:
-            self.frame_data = {"timestamp": timestamp, "rgb": rgb, "thermal": thermal}
+            # trace is the pair's FrameTrace (sensor_ingestion/tracing.py), if it's traced
+            self.frame_data = {
+                "timestamp": timestamp,
+                "rgb": rgb,
+                "thermal": thermal,
+                "trace": trace,
+                "stream_names": self.stream_names,
+            }
+            self.seq += 1
+            self.changed.notify_all()
 
-    def get(self):
+    def get(self, wait=None):
+        """Latest frame pair. With wait (seconds), block until there is a pair that hasn't been
+        handed out yet and return None if none shows up in time."""
         with self.lock:
+            if wait is not None and not self.changed.wait_for(
+                lambda: self.seq > self.consumed_seq, wait
+            ):
+                return None
+            if self.consumed_seq != self.seq:
+                self.consumed += 1
+            self.consumed_seq = self.seq
+            self.changed.notify_all()
             return self.frame_data
 
+    def wait_consumed(self, timeout=None):
+        """Block until the latest pair has been picked up by get(), False on timeout"""
+        with self.lock:
+            return self.changed.wait_for(lambda: self.consumed_seq >= self.seq, timeout)
+
 
 # this singleton is what gets used in ingest_gi.py
 buffer = SharedBuffer()
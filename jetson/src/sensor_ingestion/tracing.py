@@ -0,0 +1,107 @@
+# End-to-end latency tracing, from sensor capture to the operator's dashboard
+# Every frame pair handed to the SharedBuffer carries a FrameTrace: when the frames were captured
+# (buffer PTS) and reached the appsinks, in monotonic microseconds. time.monotonic(),
+# GLib.get_monotonic_time() and GStreamer's system clock are all CLOCK_MONOTONIC, so the stamps
+# compare directly and don't jump when NTP or the RTC adjusts the wall clock.
+#
+# The consumer of the buffer marks inference and hands the trace to the uploader with the
+# detections it made from the pair:
+#
+#   frame = buffer.get(wait=1.0)
+#   trace = (frame["trace"] or FrameTrace()).copy().mark("inference_started")  # None on replay
+#   ... detect, fuse, track ...
+#   trace.mark("inference_ended")
+#   for event in events:
+#       sender.send(event_to_detection(event, frame["stream_names"]["thermal"], ...), trace)
+#
+# DetectionSender (ml/transport.py) stamps the upload and converts the trace to the backend's
+# clock with a ClockOffset it keeps up to date against GET /health/clock. The backend adds when
+# it received and committed the detection, dashboards acknowledge delivery, and
+# GET /detections/traces/latency reports the per hop latency distributions.
+
+import time
+from collections import deque
+
+# edge hops in pipeline order, uploaded is stamped by the uploader
+HOPS = ("captured", "appsink", "inference_started", "inference_ended")
+
+
+def now_us():
+    """Monotonic microseconds, same clock as GLib.get_monotonic_time()"""
+    return int(time.monotonic() * 1000000)
+
+
+class FrameTrace:
+    """Monotonic microsecond timestamps of a frame (pair) at each hop on the edge"""
+
+    __slots__ = ("stamps",)
+
+    def __init__(self, captured=None, appsink=None):
+        self.stamps = {}
+        if captured is not None:
+            self.stamps["captured"] = captured
+        if appsink is not None:
+            self.stamps["appsink"] = appsink
+
+    def mark(self, hop, t=None):
+        self.stamps[hop] = now_us() if t is None else t
+        return self
+
+    def copy(self):
+        trace = FrameTrace()
+        trace.stamps = dict(self.stamps)
+        return trace
+
+    @classmethod
+    def pair(cls, *traces):
+        """Trace of a frame pair: captured when its oldest frame was, complete when the last
+        frame reached its appsink"""
+        traces = [trace for trace in traces if trace is not None]
+        captured = [t.stamps["captured"] for t in traces if "captured" in t.stamps]
+        appsink = [t.stamps["appsink"] for t in traces if "appsink" in t.stamps]
+        return cls(min(captured) if captured else None, max(appsink) if appsink else None)
+
+    def to_backend(self, clock, uploaded=None):
+        """POST /detections "trace" body: each hop as Unix seconds on the backend's clock"""
+        offset, error = clock.estimate()
+        body = {hop + "_at": (t + offset) / 1e6 for hop, t in self.stamps.items()}
+        if uploaded is not None:
+            body["uploaded_at"] = (uploaded + offset) / 1e6
+        # reported against the edge's wall clock, which is what an operator can check
+        wall_offset = offset - (time.time() * 1000000 - now_us())
+        body["clock_offset_ms"] = round(wall_offset / 1000, 3)
+        body["clock_error_ms"] = None if error is None else round(error / 1000, 3)
+        return body
+
+
+class ClockOffset:
+    """Edge monotonic clock -> backend Unix time, estimated NTP style.
+
+    Each probe records t0 (edge, request sent), t1 (backend, received), t2 (backend, replied)
+    and t3 (edge, reply received). The offset is ((t1 - t0) + (t2 - t3)) / 2, exact if the
+    request and reply took equally long and off by at most half the round trip
+    (t3 - t0) - (t2 - t1) otherwise. Like NTP's clock filter the estimate is the probe with
+    the smallest round trip of the last few, the one least delayed by queueing. Probes older
+    than max_age_s are dropped since the two clocks drift apart (tens of ppm).
+
+    Until the first probe the edge's own wall clock stands in, with an unknown error.
+    """
+
+    def __init__(self, window=8, max_age_s=600.0):
+        self._samples = deque(maxlen=window)
+        self.max_age_us = max_age_s * 1000000
+
+    def add(self, t0, t1, t2, t3):
+        """Add a probe, t0/t3 in edge monotonic us and t1/t2 in backend Unix us"""
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        delay = (t3 - t0) - (t2 - t1)
+        self._samples.append((t3, offset, max(delay, 0)))
+
+    def estimate(self):
+        """(offset_us, error_us): backend Unix us = edge monotonic us + offset_us"""
+        oldest = now_us() - self.max_age_us
+        samples = [s for s in self._samples if s[0] >= oldest]
+        if not samples:
+            return time.time() * 1000000 - now_us(), None
+        _, offset, delay = min(samples, key=lambda s: s[2])
+        return offset, delay / 2
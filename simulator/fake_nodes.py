@@ -0,0 +1,190 @@
+"""N fake edge nodes for exercising the multi-node fan-in.
+
+Each node registers a visual and a thermal sensor with POST /nodes/register, streams a looped
+video to each assigned RTP port on the MediaMTX host with ffmpeg, and posts batches of
+synthetic detections tagged with its stream names. Standard library only, so it runs in the
+simulator image next to stream.sh.
+
+    python3 fake_nodes.py --nodes 4 --backend http://backend:8000 --rtp-host mediamtx
+    python3 fake_nodes.py --nodes 20 --no-video --duration 60   # registry and detections only
+
+Stop with Ctrl-C; the nodes stay registered (their ports are kept for the next run) unless
+--unregister is given.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+VIDEOS = {"visual": "drone_visual.mp4", "thermal": "drone_thermal.mp4"}
+SENSORS = [
+    {"name": "visual", "codec": "H264", "width": 1280, "height": 720, "fps": 30},
+    {"name": "thermal", "codec": "H264", "width": 640, "height": 512, "fps": 30},
+]
+DIRECTIONS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+
+
+class Backend:
+    """One kept-alive connection to the backend per thread that uses it"""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host, self.port, self.prefix = url.hostname, url.port or 80, url.path.rstrip("/")
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            self.connection.request(
+                method, self.prefix + path, None if body is None else json.dumps(body), headers
+            )
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+
+def register(backend, node_id, sensors=SENSORS, attempts=30):
+    for _ in range(attempts):
+        try:
+            status, body = backend.request(
+                "POST", "/nodes/register", {"node_id": node_id, "sensors": sensors}
+            )
+        except (OSError, http.client.HTTPException) as e:
+            print(f"{node_id}: backend not reachable ({e}), retrying", flush=True)
+            time.sleep(2)
+            continue
+        if status != 200:
+            sys.exit(f"{node_id}: registration refused: {status} {body[:200]!r}")
+        return {stream["sensor"]: stream for stream in json.loads(body)["streams"]}
+    sys.exit(f"{node_id}: backend not reachable")
+
+
+def stream_video(video, host, port):
+    """ffmpeg looping video as RTP H.264 to host:port, what a Jetson's udpsink sends"""
+    command = [
+        "ffmpeg", "-loglevel", "error", "-re", "-stream_loop", "-1", "-i", str(video),
+        "-an", "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+        "-g", "30", "-b:v", "1000k", "-bsf:v", "dump_extra",
+        "-f", "rtp", "-payload_type", "96", f"rtp://{host}:{port}?pkt_size=1200",
+    ]  # fmt: skip
+    return subprocess.Popen(command, stdin=subprocess.DEVNULL)
+
+
+def post_detections(backend, node_id, stream_name, rate, batch_s, stop, counts):
+    """Poisson detections at rate per second, posted every batch_s as one JSON batch"""
+    direction = random.choice(DIRECTIONS)
+    while not stop.wait(batch_s):
+        batch = []
+        # arrivals of a Poisson process over the last batch_s
+        t = random.expovariate(rate)
+        while t < batch_s:
+            t += random.expovariate(rate)
+            score = round(random.uniform(0.3, 0.99), 3)
+            batch.append(
+                {
+                    "detected_at": datetime.now().astimezone().isoformat(),
+                    "confidence": score,
+                    "fused_score": score,
+                    "direction": direction,
+                    "distance_ft": random.randint(50, 2000),
+                    "stream_name": stream_name,
+                }
+            )
+        if not batch:
+            continue
+        try:
+            status, body = backend.request("POST", "/detections/batch", batch)
+        except (OSError, http.client.HTTPException) as e:
+            print(f"{node_id}: sending detections failed: {e}", flush=True)
+            continue
+        if status == 201:
+            counts[node_id] = counts.get(node_id, 0) + len(batch)
+        else:
+            print(f"{node_id}: detections rejected: {status} {body[:200]!r}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3, help="number of fake nodes")
+    parser.add_argument("--prefix", default="sim", help="node IDs are <prefix><n>")
+    parser.add_argument("--backend", default="http://backend:8000", help="backend base URL")
+    parser.add_argument("--rtp-host", default="mediamtx", help="where to send RTP")
+    parser.add_argument("--videos", type=Path, default=Path(__file__).parent / "videos")
+    parser.add_argument("--no-video", action="store_true", help="register and post only")
+    parser.add_argument("--rate", type=float, default=2.0, help="detections/s per node")
+    parser.add_argument("--batch-s", type=float, default=1.0, help="seconds between batches")
+    parser.add_argument("--duration", type=float, default=0, help="seconds, 0 runs until ^C")
+    parser.add_argument("--unregister", action="store_true", help="unregister on exit")
+    args = parser.parse_args()
+
+    control = Backend(args.backend)
+    nodes = {}
+    for i in range(1, args.nodes + 1):
+        node_id = f"{args.prefix}{i:02d}"
+        nodes[node_id] = register(control, node_id)
+        ports = ", ".join(f"{s} {a['rtp_port']}" for s, a in sorted(nodes[node_id].items()))
+        print(f"{node_id}: registered, RTP ports {ports}", flush=True)
+
+    processes = []
+    if not args.no_video:
+        for streams in nodes.values():
+            for sensor, stream in streams.items():
+                video = args.videos / VIDEOS[sensor]
+                processes.append(stream_video(video, args.rtp_host, stream["rtp_port"]))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    counts = {}
+    threads = [
+        threading.Thread(
+            target=post_detections,
+            args=(
+                Backend(args.backend),
+                node_id,
+                streams["visual"]["stream_name"],
+                args.rate,
+                args.batch_s,
+                stop,
+                counts,
+            ),
+            daemon=True,
+        )
+        for node_id, streams in nodes.items()
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while not stop.wait(10 if deadline is None else min(10, deadline - time.monotonic())):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            print(f"detections stored per node: {dict(sorted(counts.items()))}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for process in processes:
+        process.terminate()
+    if args.unregister:
+        for node_id in nodes:
+            control.request("DELETE", f"/nodes/{node_id}")
+    print(f"detections stored per node: {dict(sorted(counts.items()))}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""Synthetic multi-stream load for finding where a single backend host saturates.
+
+Every synthetic camera is a fake edge node ("load01", "load02"...) registered with the
+backend, so its video takes the real path: ffmpeg encodes a generated test pattern at the
+requested resolution, fps, bitrate and codec and sends it as RTP to the node's assigned
+MediaMTX port. Alongside, a publisher posts synthetic detections for the streams at a fixed
+total rate, and an HLS prober pulls playlists and the newest segment of every stream through
+the backend's /streams proxy, like a dashboard tile would.
+
+Each step reports achieved against requested: frames/s and bitrate per stream (from ffmpeg's
+-progress output), detections/s stored, and HLS fetch success and latency. --sweep runs one
+step per stream count and flags the first one where anything falls below --threshold of what
+was asked for, the saturation point.
+
+    python3 loadgen.py --streams 8 --size 1280x720 --fps 30 --bitrate 2000 --duration 60
+    python3 loadgen.py --sweep 1,2,4,8,16 --codec h265 --detections 200 --report sweep.json
+    python3 loadgen.py --streams 16 --no-video --detections 2000   # detection API only
+
+Standard library only, it runs in the simulator image next to fake_nodes.py.
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from fake_nodes import DIRECTIONS, Backend, register
+
+ENCODERS = {"h264": "libx264", "h265": "libx265"}
+
+
+def percentile(ordered, q):
+    """q-th percentile (0-100) of sorted values, interpolating between the closest ranks"""
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": _ms(percentile(ordered, 50)),
+        "p99_ms": _ms(percentile(ordered, 99)),
+        "max_ms": _ms(ordered[-1] if ordered else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class SyntheticStream:
+    """One ffmpeg encoding a test pattern to RTP, with its progress read in the background"""
+
+    def __init__(self, name, port, args):
+        self.name = name
+        source = f"testsrc2=size={args.width}x{args.height}:rate={args.fps}"
+        command = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+            "-re", "-f", "lavfi", "-i", source, "-an",
+            "-c:v", ENCODERS[args.codec], "-preset", "ultrafast", "-tune", "zerolatency",
+            "-g", str(args.fps), "-b:v", f"{args.bitrate}k", "-maxrate", f"{args.bitrate}k",
+            "-bufsize", f"{args.bitrate}k", "-bsf:v", "dump_extra",
+            "-f", "rtp", "-payload_type", "96", f"rtp://{args.rtp_host}:{port}?pkt_size=1200",
+        ]  # fmt: skip
+        self.frames = 0
+        self.bytes = 0
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True
+        )
+        self._reader = threading.Thread(target=self._read_progress, daemon=True)
+        self._reader.start()
+
+    def _read_progress(self):
+        # key=value lines, one block per progress report
+        for line in self._process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "frame":
+                self.frames = int(value)
+            elif key == "total_size" and value.isdigit():
+                self.bytes = int(value)
+
+    def counters(self):
+        return self.frames, self.bytes
+
+    @property
+    def running(self):
+        return self._process.poll() is None
+
+    def stop(self):
+        self._process.terminate()
+        try:
+            self._process.wait(5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+
+
+def publish_detections(base_url, stream_names, rate, batch_s, stop, stats):
+    """Post rate * batch_s detections every batch_s, round robin over the streams.
+
+    A post that takes longer than batch_s delays the next one, so a backend that can't keep
+    up shows as a stored rate below the requested one rather than as a growing backlog.
+    """
+    backend = Backend(base_url)
+    carry = 0.0
+    streams = list(stream_names)
+    random.shuffle(streams)
+    next_post = time.monotonic() + batch_s
+    while not stop.wait(max(next_post - time.monotonic(), 0)):
+        next_post += batch_s
+        carry += rate * batch_s
+        count, carry = int(carry), carry - int(carry)
+        if not count:
+            continue
+        now = datetime.now().astimezone().isoformat()
+        batch = []
+        for i in range(count):
+            score = round(random.uniform(0.3, 0.99), 3)
+            batch.append(
+                {
+                    "detected_at": now,
+                    "confidence": score,
+                    "fused_score": score,
+                    "direction": random.choice(DIRECTIONS),
+                    "distance_ft": random.randint(50, 2000),
+                    "stream_name": streams[i % len(streams)],
+                }
+            )
+        start = time.monotonic()
+        try:
+            status, _ = backend.request("POST", "/detections/batch", batch)
+        except (OSError, http.client.HTTPException):
+            stats["errors"] += 1
+            continue
+        stats["latencies"].append(time.monotonic() - start)
+        if status == 201:
+            stats["stored"] += count
+        else:
+            stats["errors"] += 1
+        # behind by more than a batch: skip ahead instead of bursting to catch up
+        next_post = max(next_post, time.monotonic())
+
+
+def probe_hls(base_url, stream_names, interval_s, stop, stats):
+    """Playlist plus newest segment of every stream through the /streams proxy, every
+    interval_s. A stream counts as served when both came back."""
+    backend = Backend(base_url)
+    while not stop.wait(interval_s):
+        for name in stream_names:
+            start = time.monotonic()
+            ok = False
+            with contextlib.suppress(OSError, http.client.HTTPException, UnicodeDecodeError):
+                ok = _fetch_newest_segment(backend, f"/streams/{name}/hls/")
+            stats["probes"] += 1
+            if ok:
+                stats["served"] += 1
+                stats["latencies"].append(time.monotonic() - start)
+
+
+def _fetch_newest_segment(backend, prefix):
+    playlist = "index.m3u8"
+    # MediaMTX's index.m3u8 is a multivariant playlist pointing at the media playlist
+    for _ in range(2):
+        status, body = backend.request("GET", prefix + playlist)
+        if status != 200:
+            return False
+        uris = [line for line in body.decode().splitlines() if line and not line.startswith("#")]
+        if not uris:
+            return False
+        if not uris[-1].split("?")[0].endswith(".m3u8"):
+            break
+        playlist = uris[-1]
+    status, _ = backend.request("GET", prefix + uris[-1])
+    return status == 200
+
+
+def run_step(args, count):
+    """Run count synthetic streams for args.duration after args.warmup, return the report"""
+    control = Backend(args.backend)
+    sensor = {
+        "name": "cam",
+        "codec": args.codec.upper(),
+        "width": args.width,
+        "height": args.height,
+        "fps": args.fps,
+    }
+    assignments = {}
+    for i in range(1, count + 1):
+        node_id = f"{args.prefix}{i:02d}"
+        assignments[node_id] = register(control, node_id, [sensor])["cam"]
+    stream_names = [assignment["stream_name"] for assignment in assignments.values()]
+
+    streams = []
+    if not args.no_video:
+        streams = [
+            SyntheticStream(a["stream_name"], a["rtp_port"], args) for a in assignments.values()
+        ]
+    stop = threading.Event()
+    detection_stats = {"stored": 0, "errors": 0, "latencies": []}
+    hls_stats = {"probes": 0, "served": 0, "latencies": []}
+    threads = []
+    if args.detections > 0:
+        threads.append(
+            threading.Thread(
+                target=publish_detections,
+                args=(
+                    args.backend,
+                    stream_names,
+                    args.detections,
+                    args.batch_s,
+                    stop,
+                    detection_stats,
+                ),
+                daemon=True,
+            )
+        )
+    if not args.no_hls and not args.no_video:
+        threads.append(
+            threading.Thread(
+                target=probe_hls,
+                args=(args.backend, stream_names, args.hls_interval, stop, hls_stats),
+                daemon=True,
+            )
+        )
+    # publishers run through the warm-up too, so the window only sees steady state
+    for thread in threads:
+        thread.start()
+    print(f"{count} streams: warming up for {args.warmup:.0f}s", flush=True)
+    time.sleep(args.warmup)
+
+    # measure over [start, end] only, ffmpeg and MediaMTX need the warm-up to get going
+    start, video_start = time.monotonic(), [s.counters() for s in streams]
+    stored_start, posts_start = detection_stats["stored"], len(detection_stats["latencies"])
+    hls_start = hls_stats["probes"], hls_stats["served"], len(hls_stats["latencies"])
+    time.sleep(args.duration)
+    elapsed, video_end = time.monotonic() - start, [s.counters() for s in streams]
+    stored = detection_stats["stored"] - stored_start
+    probes, served = hls_stats["probes"] - hls_start[0], hls_stats["served"] - hls_start[1]
+    stop.set()
+    for thread in threads:
+        thread.join()
+    exited = [s.name for s in streams if not s.running]
+    for stream in streams:
+        stream.stop()
+    if args.unregister:
+        for node_id in assignments:
+            control.request("DELETE", f"/nodes/{node_id}")
+
+    per_stream = []
+    for stream, (f0, b0), (f1, b1) in zip(streams, video_start, video_end, strict=True):
+        per_stream.append(
+            {
+                "stream": stream.name,
+                "fps": round((f1 - f0) / elapsed, 2),
+                "kbps": round((b1 - b0) * 8 / elapsed / 1000, 1),
+            }
+        )
+    report = {
+        "streams": count,
+        "seconds": round(elapsed, 1),
+        "video": {
+            "requested_fps": args.fps,
+            "requested_kbps": args.bitrate,
+            "min_fps": min((s["fps"] for s in per_stream), default=None),
+            "mean_fps": _mean([s["fps"] for s in per_stream]),
+            "mean_kbps": _mean([s["kbps"] for s in per_stream]),
+            "fps_ratio": _ratio(_mean([s["fps"] for s in per_stream]), args.fps),
+            "exited": exited,
+            "per_stream": per_stream,
+        },
+        "detections": {
+            "requested_per_s": args.detections,
+            "stored_per_s": round(stored / elapsed, 1),
+            "ratio": _ratio(stored / elapsed, args.detections),
+            "errors": detection_stats["errors"],
+            **latency_summary(detection_stats["latencies"][posts_start:]),
+        },
+        "hls": {
+            "probes": probes,
+            "served_ratio": _ratio(served, probes),
+            **latency_summary(hls_stats["latencies"][hls_start[2] :]),
+        },
+    }
+    ratios = [
+        report["video"]["fps_ratio"],
+        report["detections"]["ratio"],
+        report["hls"]["served_ratio"],
+    ]
+    report["saturated"] = bool(exited) or any(r is not None and r < args.threshold for r in ratios)
+    return report
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def _ratio(achieved, requested):
+    if achieved is None or not requested:
+        return None
+    return round(achieved / requested, 3)
+
+
+def print_step(report):
+    video, detections, hls = report["video"], report["detections"], report["hls"]
+    parts = []
+    if video["per_stream"]:
+        parts.append(
+            f"video {video['mean_fps']}/{video['requested_fps']} fps"
+            f" (min {video['min_fps']}), {video['mean_kbps']}/{video['requested_kbps']} kbps"
+        )
+    if detections["requested_per_s"]:
+        parts.append(
+            f"detections {detections['stored_per_s']}/{detections['requested_per_s']}/s"
+            f" p99 {detections['p99_ms']} ms, {detections['errors']} errors"
+        )
+    if hls["probes"]:
+        parts.append(f"HLS served {hls['served_ratio']:.0%} p99 {hls['p99_ms']} ms")
+    line = f"{report['streams']:3d} streams: " + " | ".join(parts)
+    if report["saturated"]:
+        line += "  <- SATURATED"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=4, help="concurrent synthetic streams")
+    parser.add_argument("--sweep", help="comma separated stream counts, one step each")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--bitrate", type=int, default=2000, help="kbit/s per stream")
+    parser.add_argument("--codec", choices=sorted(ENCODERS), default="h264")
+    parser.add_argument("--detections", type=float, default=50, help="total detections/s")
+    parser.add_argument("--batch-s", type=float, default=0.5, help="seconds between batches")
+    parser.add_argument("--hls-interval", type=float, default=2.0, help="seconds between probes")
+    parser.add_argument("--backend", default="http://backend:8000", help="backend base URL")
+    parser.add_argument("--rtp-host", default="mediamtx", help="where to send RTP")
+    parser.add_argument("--prefix", default="load", help="node IDs are <prefix><n>")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds before measuring")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured a step")
+    parser.add_argument("--threshold", type=float, default=0.95, help="saturated below this")
+    parser.add_argument("--no-video", action="store_true", help="detections only")
+    parser.add_argument("--no-hls", action="store_true", help="don't probe HLS")
+    parser.add_argument("--unregister", action="store_true", help="unregister after each step")
+    parser.add_argument("--report", help="write the JSON report here")
+    args = parser.parse_args()
+    try:
+        args.width, args.height = (int(v) for v in args.size.split("x"))
+    except ValueError:
+        parser.error("--size must be WIDTHxHEIGHT")
+    counts = sorted({int(n) for n in args.sweep.split(",")}) if args.sweep else [args.streams]
+
+    steps = []
+    for count in counts:
+        report = run_step(args, count)
+        print_step(report)
+        steps.append(report)
+    saturation = next((step["streams"] for step in steps if step["saturated"]), None)
+    if saturation is None:
+        print(f"Not saturated up to {counts[-1]} streams", flush=True)
+    else:
+        print(f"Saturated at {saturation} streams", flush=True)
+    if args.report:
+        config = {
+            "size": f"{args.width}x{args.height}",
+            "fps": args.fps,
+            "bitrate_kbps": args.bitrate,
+            "codec": args.codec,
+            "detections_per_s": args.detections,
+            "backend": urlsplit(args.backend).netloc,
+            "threshold": args.threshold,
+        }
+        with open(args.report, "w") as f:
+            json.dump({"config": config, "saturated_at": saturation, "steps": steps}, f, indent=2)
+        print(f"Report written to {args.report}", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,10 @@ CREATE TABLE IF NOT EXISTS detections (
     fused_score NUMERIC(4, 3) CHECK (fused_score >= 0 AND fused_score <= 1),
     frame_snapshot_url TEXT,
     stream_name VARCHAR(20) DEFAULT 'drone',
+    track_id UUID,
+    track_event VARCHAR(6) CHECK (track_event IN ('start', 'update', 'end')),
+    incident_id UUID,
+    node_id VARCHAR(12),
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
@@ -23,6 +27,143 @@ CREATE TABLE IF NOT EXISTS detections (
 -- Create index on detected_at for faster queries
 CREATE INDEX idx_detections_detected_at ON detections(detected_at DESC);
 CREATE INDEX idx_detections_confidence ON detections(confidence DESC);
+CREATE INDEX ix_detections_track_id ON detections(track_id);
+CREATE INDEX ix_detections_incident_id ON detections(incident_id);
+
+-- Indexes for the filtered GET /detections queries (newest first within a time range)
+CREATE INDEX idx_detections_stream_detected_at ON detections(stream_name, detected_at DESC);
+CREATE INDEX idx_detections_direction_detected_at ON detections(direction, detected_at DESC);
+CREATE INDEX idx_detections_fused_score ON detections(fused_score DESC);
+-- Per edge node views: a node's detections newest first without touching the other nodes'
+CREATE INDEX idx_detections_node_detected_at ON detections(node_id, detected_at DESC);
+-- Partial indexes: high confidence detections are what the incidents page asks for most,
+-- and most detections have no distance estimate
+CREATE INDEX idx_detections_high_confidence ON detections(detected_at DESC)
+    WHERE confidence >= 0.8;
+CREATE INDEX idx_detections_distance ON detections(distance_ft)
+    WHERE distance_ft IS NOT NULL;
+
+-- Create track summary table (one row per drone track reported by the edge tracker)
+CREATE TABLE IF NOT EXISTS tracks (
+    id UUID PRIMARY KEY,
+    stream_name VARCHAR(20),
+    status VARCHAR(10) NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'ended')),
+    started_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ,
+    detection_count INTEGER NOT NULL DEFAULT 0,
+    peak_confidence NUMERIC(4, 3),
+    peak_fused_score NUMERIC(4, 3),
+    last_direction VARCHAR(2),
+    last_distance_ft INTEGER,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_tracks_last_seen_at ON tracks(last_seen_at DESC);
+CREATE INDEX idx_tracks_stream_status ON tracks(stream_name, status);
+
+-- Create incident table (detections of one stream grouped by time gap and direction,
+-- maintained incrementally by the backend on every insert)
+CREATE TABLE IF NOT EXISTS incidents (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    stream_name VARCHAR(20),
+    started_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ NOT NULL,
+    detection_count INTEGER NOT NULL DEFAULT 0,
+    peak_confidence NUMERIC(4, 3),
+    peak_fused_score NUMERIC(4, 3),
+    first_direction VARCHAR(2),
+    last_direction VARCHAR(2),
+    min_distance_ft INTEGER,
+    snapshot_url TEXT,
+    snapshot_fused_score NUMERIC(4, 3),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_incidents_started_at ON incidents(started_at DESC);
+-- Finding a stream's current incident on insert
+CREATE INDEX idx_incidents_stream_started_at ON incidents(stream_name, started_at DESC);
+
+-- Create detection trace table (when a detection passed each hop from sensor capture to a
+-- dashboard, edge hops converted to the backend clock by the edge; only traced detections)
+CREATE TABLE IF NOT EXISTS detection_traces (
+    detection_id UUID PRIMARY KEY REFERENCES detections(id) ON DELETE CASCADE,
+    captured_at TIMESTAMPTZ,
+    appsink_at TIMESTAMPTZ,
+    inference_started_at TIMESTAMPTZ,
+    inference_ended_at TIMESTAMPTZ,
+    uploaded_at TIMESTAMPTZ,
+    received_at TIMESTAMPTZ NOT NULL,
+    committed_at TIMESTAMPTZ NOT NULL,
+    delivered_at TIMESTAMPTZ,
+    clock_offset_ms DOUBLE PRECISION,
+    clock_error_ms DOUBLE PRECISION
+);
+
+-- Latency report over the most recently received traces
+CREATE INDEX idx_detection_traces_received_at ON detection_traces(received_at DESC);
+
+-- Create detection sketch table (t-digests of the scores of one stream's detections per hour
+-- and per day, folded in from detection_sketch_deltas, merged by GET /detections/stats/quantiles;
+-- detections without a stream are under '')
+CREATE TABLE IF NOT EXISTS detection_sketches (
+    stream_name VARCHAR(20) NOT NULL,
+    bucket_s INTEGER NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    detection_count INTEGER NOT NULL DEFAULT 0,
+    confidence BYTEA,
+    visual_confidence BYTEA,
+    thermal_confidence BYTEA,
+    fused_score BYTEA,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (stream_name, bucket_s, bucket_start)
+);
+
+-- Create score sketch delta table (sketches of the detections one insert added to a bucket,
+-- folded into detection_sketches every few seconds by the backend)
+CREATE TABLE IF NOT EXISTS detection_sketch_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    stream_name VARCHAR(20) NOT NULL,
+    bucket_s INTEGER NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    detection_count INTEGER NOT NULL,
+    confidence BYTEA,
+    visual_confidence BYTEA,
+    thermal_confidence BYTEA,
+    fused_score BYTEA,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX idx_detection_sketch_deltas_bucket ON detection_sketch_deltas(stream_name, bucket_s, bucket_start);
+
+-- Create edge node table (nodes that registered their sensors with POST /nodes/register)
+CREATE TABLE IF NOT EXISTS edge_nodes (
+    id VARCHAR(12) PRIMARY KEY,
+    address VARCHAR(45),
+    registered_at TIMESTAMPTZ DEFAULT NOW(),
+    last_seen_at TIMESTAMPTZ DEFAULT NOW(),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Create stream registry table (one row per registered sensor, named "<node id>-<sensor>",
+-- with the UDP port MediaMTX receives its RTP on)
+CREATE TABLE IF NOT EXISTS streams (
+    name VARCHAR(20) PRIMARY KEY,
+    node_id VARCHAR(12) NOT NULL REFERENCES edge_nodes(id) ON DELETE CASCADE,
+    sensor VARCHAR(7) NOT NULL,
+    rtp_port INTEGER NOT NULL UNIQUE,
+    codec VARCHAR(4) NOT NULL DEFAULT 'H264',
+    width INTEGER,
+    height INTEGER,
+    fps INTEGER,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX ix_streams_node_id ON streams(node_id);
 
 -- Create a function to update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -36,3 +177,18 @@ $$ language 'plpgsql';
 -- Create a trigger to automatically update updated_at
 CREATE TRIGGER update_detections_updated_at BEFORE UPDATE ON detections
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_tracks_updated_at BEFORE UPDATE ON tracks
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_incidents_updated_at BEFORE UPDATE ON incidents
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_detection_sketches_updated_at BEFORE UPDATE ON detection_sketches
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_edge_nodes_updated_at BEFORE UPDATE ON edge_nodes
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_streams_updated_at BEFORE UPDATE ON streams
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();